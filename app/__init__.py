@@ -55,107 +55,8 @@ csrf = CSRFProtect()
 babel = Babel()
 compress = Compress()
 
-# Advanced caching system
-class AdvancedCache:
-    """Advanced in-memory caching system with performance monitoring"""
-    
-    def __init__(self):
-        self._cache = {}
-        self._stats = {
-            'hits': 0,
-            'misses': 0,
-            'sets': 0,
-            'deletes': 0,
-            'total_requests': 0
-        }
-        self._max_size = 1000  # Maximum cache entries
-        self._cleanup_interval = 300  # Cleanup every 5 minutes
-        self._last_cleanup = time.time()
-    
-    def get(self, key, default=None):
-        """Get value from cache with hit tracking"""
-        self._stats['total_requests'] += 1
-        
-        if key in self._cache:
-            value, expiry = self._cache[key]
-            if time.time() < expiry:
-                self._stats['hits'] += 1
-                return value
-            else:
-                # Expired, remove it
-                del self._cache[key]
-        
-        self._stats['misses'] += 1
-        return default
-    
-    def set(self, key, value, ttl=300):
-        """Set value in cache with TTL"""
-        # Cleanup if needed
-        self._cleanup_if_needed()
-        
-        # Check if we need to make space
-        if len(self._cache) >= self._max_size:
-            self._remove_oldest()
-        
-        expiry = time.time() + ttl
-        self._cache[key] = (value, expiry)
-        self._stats['sets'] += 1
-    
-    def delete(self, key):
-        """Delete key from cache"""
-        if key in self._cache:
-            del self._cache[key]
-            self._stats['deletes'] += 1
-    
-    def clear(self):
-        """Clear all cache"""
-        self._cache.clear()
-        self._stats = {
-            'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0, 'total_requests': 0
-        }
-    
-    def get_stats(self):
-        """Get cache statistics"""
-        total = self._stats['hits'] + self._stats['misses']
-        hit_rate = (self._stats['hits'] / total * 100) if total > 0 else 0
-        
-        return {
-            'hits': self._stats['hits'],
-            'misses': self._stats['misses'],
-            'sets': self._stats['sets'],
-            'deletes': self._stats['deletes'],
-            'total_requests': self._stats['total_requests'],
-            'hit_rate': round(hit_rate, 2),
-            'cache_size': len(self._cache),
-            'max_size': self._max_size
-        }
-    
-    def _cleanup_if_needed(self):
-        """Clean up expired entries if cleanup interval has passed"""
-        current_time = time.time()
-        if current_time - self._last_cleanup > self._cleanup_interval:
-            self._cleanup_expired()
-            self._last_cleanup = current_time
-    
-    def _cleanup_expired(self):
-        """Remove expired cache entries"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, (value, expiry) in self._cache.items()
-            if current_time >= expiry
-        ]
-        for key in expired_keys:
-            del self._cache[key]
-    
-    def _remove_oldest(self):
-        """Remove oldest cache entry to make space"""
-        if self._cache:
-            oldest_key = min(self._cache.keys(), 
-                           key=lambda k: self._cache[k][1])
-            del self._cache[oldest_key]
-
-# Initialize advanced cache
-advanced_cache = AdvancedCache()
+# Unified application cache (in-process LRU with optional Redis L2)
+from app.utils.advanced_cache import cache as advanced_cache
 
 # Pagination utilities
 class PaginationHelper:
@@ -207,6 +108,78 @@ class PaginationHelper:
         # Remove None values
         return {k: v for k, v in links.items() if v is not None}
 
+    @staticmethod
+    def encode_cursor(sort_value, row_id):
+        """Encode a (sort value, id) position as an opaque URL-safe cursor"""
+        import base64
+        import json
+        from datetime import datetime as _datetime
+
+        if isinstance(sort_value, _datetime):
+            sort_value = sort_value.isoformat()
+        payload = json.dumps([sort_value, row_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor created by encode_cursor, raising ValueError if malformed"""
+        import base64
+        import json
+        from datetime import datetime as _datetime
+
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if sort_value is not None:
+                sort_value = _datetime.fromisoformat(sort_value)
+            return sort_value, int(row_id)
+        except Exception as e:
+            raise ValueError(f"Invalid pagination cursor: {cursor}") from e
+
+    @staticmethod
+    def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=25, max_per_page=100):
+        """Paginate a query newest-first on (sort_column, id_column) without OFFSET.
+
+        Every page is an indexed range scan starting just after the cursor
+        position, so page N costs the same as page 1. Rows with a NULL sort
+        value come last.
+        """
+        from sqlalchemy import and_, or_
+
+        per_page = min(max(1, per_page), max_per_page)
+
+        if cursor:
+            sort_value, row_id = PaginationHelper.decode_cursor(cursor)
+            if sort_value is None:
+                query = query.filter(sort_column.is_(None), id_column < row_id)
+            else:
+                query = query.filter(or_(
+                    sort_column < sort_value,
+                    and_(sort_column == sort_value, id_column < row_id),
+                    sort_column.is_(None)
+                ))
+
+        # Fetch one extra row to learn whether another page exists
+        rows = query.order_by(
+            sort_column.desc().nulls_last(), id_column.desc()
+        ).limit(per_page + 1).all()
+
+        has_more = len(rows) > per_page
+        items = rows[:per_page]
+        next_cursor = None
+        if has_more:
+            last = items[-1]
+            next_cursor = PaginationHelper.encode_cursor(
+                getattr(last, sort_column.key), getattr(last, id_column.key)
+            )
+
+        return {
+            'items': items,
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+
 def create_app(config_name=None):
     """Application factory pattern"""
     # Set template folder to the templates directory in the project root
@@ -260,17 +233,56 @@ def create_app(config_name=None):
     from app.services.redis_service import redis_service
     redis_service.init_app(app)
     app.redis_service = redis_service
+    advanced_cache.init_app(app)
     
     # Initialize background task service
     from app.services.background_service import background_task_service
     background_task_service.init_app(app)
     app.background_task_service = background_task_service
-    
+
+    # Keep the daily PSP rollup in sync with transaction writes
+    from app.services.psp_rollup_service import psp_rollup_service
+    psp_rollup_service.init_app(app)
+
+    # Excel imports run on a background worker and resume from job checkpoints
+    from app.services.data_import_service import data_import_service
+    data_import_service.init_app(app)
+
+    # Reload cached PSP commission rates when PSP options change
+    from app.services.psp_options_service import psp_rate_registry
+    psp_rate_registry.init_app(app)
+
+    # Recompile cached translation catalogs when translations change
+    from app.services.translation_service import translation_catalog
+    translation_catalog.init_app(app)
+
+    # Feed committed transaction writes into the real-time analytics counters
+    from app.services.real_time_analytics_service import real_time_analytics
+    real_time_analytics.init_app(app)
+
     # Initialize enhanced services
     from app.services.event_service import event_service
     from app.services.enhanced_cache_service import cache_service
     from app.services.microservice_service import microservice_service
-    from app.services.real_time_service import init_real_time_service
+    from app.services.real_time_service import init_real_time_service, snapshot_fanout
+    
+    # Authenticated user, settings and permissions cached per user id
+    from app.services.principal_service import principal_cache
+    principal_cache.init_app(app)
+    
+    # Audit records are queued and written in batches off the request path
+    from app.services.audit_service import audit_writer
+    audit_writer.init_app(app)
+    
+    # Attribute database queries to requests (Server-Timing, N+1 detection)
+    from app.services.enhanced_database_monitor import request_query_profiler
+    request_query_profiler.init_app(app)
+    
+    # Buffered event publishing over Redis Streams, or in memory without Redis
+    event_service.init_app(app)
+    
+    # Shared dashboard snapshots pushed to Socket.IO rooms as deltas
+    snapshot_fanout.init_app(app, socketio)
     
     # Initialize real-time service with SocketIO
     real_time_service = init_real_time_service(socketio, event_service)
@@ -363,14 +375,10 @@ def create_app(config_name=None):
     # Configure user loader
     @login_manager.user_loader
     def load_user(user_id):
-        """Load user for Flask-Login"""
-        from app.models.user import User
+        """Load user for Flask-Login (served from the principal cache)"""
+        from app.services.principal_service import principal_cache
         try:
-            user = User.query.get(int(user_id))
-            if user and user.is_active:
-                return user
-            else:
-                return None
+            return principal_cache.load_user(int(user_id))
         except Exception as e:
             print(f"Error loading user {user_id}: {str(e)}")
             return None
@@ -472,9 +480,8 @@ def create_app(config_name=None):
         """Inject user settings into templates"""
         from flask_login import current_user
         if current_user and current_user.is_authenticated:
-            from app.models.config import UserSettings
-            user_settings = UserSettings.query.filter_by(user_id=current_user.id).first()
-            return dict(user_settings=user_settings)
+            from app.services.principal_service import principal_cache
+            return dict(user_settings=principal_cache.settings_for(current_user.id))
         return dict(user_settings=None)
     
     @app.context_processor
@@ -612,10 +619,10 @@ def create_app(config_name=None):
         """Get the locale for the current request"""
         from flask_login import current_user
         if current_user and current_user.is_authenticated:
-            from app.models.config import UserSettings
-            user_settings = UserSettings.query.filter_by(user_id=current_user.id).first()
-            if user_settings and user_settings.language:
-                return user_settings.language
+            from app.services.principal_service import principal_cache
+            user_settings = principal_cache.settings_for(current_user.id)
+            if user_settings and user_settings.get('language'):
+                return user_settings['language']
         return 'en'  # Default to English
     
     # Initialize Babel with locale selector
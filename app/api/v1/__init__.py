@@ -2,7 +2,7 @@
 API v1 Blueprint Registration
 """
 from flask import Blueprint
-from app.api.v1.endpoints import transactions, analytics, users, health, translations, exchange_rates, currency_management, database, performance, bulk_rates, docs, realtime_analytics, ai_analysis
+from app.api.v1.endpoints import transactions, analytics, users, health, translations, exchange_rates, currency_management, database, performance, bulk_rates, docs, realtime_analytics, ai_analysis, import_endpoints
 
 # Create the main API v1 blueprint
 api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
@@ -20,6 +20,7 @@ api_v1.register_blueprint(performance.performance_api, url_prefix='/performance'
 api_v1.register_blueprint(docs.docs_api, url_prefix='/docs')
 api_v1.register_blueprint(realtime_analytics.realtime_analytics_api, url_prefix='/realtime')
 api_v1.register_blueprint(ai_analysis.ai_analysis_api, url_prefix='/ai')
+api_v1.register_blueprint(import_endpoints.import_bp, url_prefix='/import')
 api_v1.register_blueprint(bulk_rates.bulk_rates_bp)
 
 @api_v1.route("/")
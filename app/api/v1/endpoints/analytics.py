@@ -10,7 +10,7 @@ from datetime import datetime, timedelta, timezone
 from app.models.transaction import Transaction
 from app.models.financial import PspTrack
 from app import db, limiter
-from app.utils.advanced_cache import cache, cached, cache_invalidate, monitor_performance
+from app.utils.advanced_cache import cache, cached, invalidate_prefix, invalidate_tags, monitor_performance, TRANSACTION_DATA_TAG
 from app.utils.query_optimizer import query_optimizer
 from app.utils.response_optimizer import optimized_response
 import psutil
@@ -29,24 +29,26 @@ SYSTEM_CACHE_DURATION = 60      # 1 minute for system data
 
 def analytics_cache_clear():
     """Clear analytics cache when data changes"""
-    cache_invalidate("analytics")
-    cache_invalidate("dashboard")
+    # Dashboard caches carry the transaction data tag
+    invalidate_prefix("analytics")
+    invalidate_tags(TRANSACTION_DATA_TAG)
     logging.info("Analytics cache cleared")
 
 # Clear cache on startup to ensure fresh data
 analytics_cache_clear()
 
 def generate_chart_data(time_range='7d'):
-    """Generate chart data for dashboard with optimization"""
+    """Generate chart data for dashboard from the daily PSP rollup"""
     try:
+        from app.services.psp_rollup_service import psp_rollup_service
         now = datetime.now(timezone.utc)
         
         if time_range == '7d':
             # For 7d, find the most recent day with transactions and go back 6 days
-            latest_transaction = Transaction.query.order_by(Transaction.date.desc()).first()
-            if latest_transaction and latest_transaction.date:
+            latest_date = psp_rollup_service.get_latest_date()
+            if latest_date:
                 # Use the latest transaction date as the end date
-                end_date = datetime.combine(latest_transaction.date, datetime.min.time()).replace(tzinfo=timezone.utc)
+                end_date = datetime.combine(latest_date, datetime.min.time()).replace(tzinfo=timezone.utc)
                 start_date = end_date - timedelta(days=6)  # 7 days total (including end_date)
             else:
                 # Fallback to last 7 days if no transactions
@@ -74,93 +76,32 @@ def generate_chart_data(time_range='7d'):
             end_date = now
             date_format = '%Y-%m-%d'
         
-        # Optimized query: Get all transactions in one query
-        if time_range == '7d':
-            transactions = Transaction.query.filter(
-                Transaction.date >= start_date.date(),
-                Transaction.date <= end_date.date()
-            ).all()
-        else:
-            transactions = Transaction.query.filter(
-                Transaction.date >= start_date.date(),
-                Transaction.date <= end_date.date()
-            ).all()
+        # Optimized query: one pre-aggregated row per day with transactions
+        daily_rows = psp_rollup_service.get_daily_totals(start_date.date(), end_date.date())
         
         # Debug logging
         if time_range == '7d':
-            logging.info(f"Dynamic 7d range: Found latest transaction on {latest_transaction.date if latest_transaction else 'None'}")
+            logging.info(f"Dynamic 7d range: Found latest transaction on {latest_date}")
             logging.info(f"Chart date range: {start_date.date()} to {end_date.date()}")
         
         # Enhanced debug logging for all time ranges
         logging.info(f"Chart data generation - Time range: {time_range}")
         logging.info(f"Date range: {start_date.date()} to {end_date.date()}")
-        logging.info(f"Found {len(transactions)} transactions in range")
+        logging.info(f"Found {len(daily_rows)} days with transactions in range")
         # Data validation
-        if len(transactions) == 0:
+        if len(daily_rows) == 0:
             logging.warning(f"No transactions found for time range {time_range}")
             return {
                 'daily_revenue': []
             }
         # Transaction logging removed for performance
         
-        # Process data in memory
+        # Use the same logic as daily summary: simply sum net_amount
+        # This matches the daily summary calculation: total_net_tl += net_amount
         daily_totals = {}
-        daily_deposits = {}
-        daily_withdrawals = {}
-        daily_commissions = {}
-        daily_transaction_counts = {}
-        daily_client_counts = {}
-        client_totals = {}
-        
-        for transaction in transactions:
-            # Daily totals
-            day_key = transaction.date.strftime(date_format)
-            amount = float(transaction.amount or 0)
-            commission = float(transaction.commission or 0)
-            net_amount = float(transaction.net_amount or 0)  # This is amount - commission
-            
-            # Initialize daily totals if not exists
-            if day_key not in daily_totals:
-                daily_totals[day_key] = 0
-                daily_deposits[day_key] = 0
-                daily_withdrawals[day_key] = 0
-                daily_commissions[day_key] = 0
-                daily_transaction_counts[day_key] = 0
-                daily_client_counts[day_key] = set()
-            
-            # Increment transaction count
-            daily_transaction_counts[day_key] += 1
-            
-            # Add client to daily count (using set to avoid duplicates)
-            if transaction.client_name:
-                daily_client_counts[day_key].add(transaction.client_name)
-            
-            # Use the same logic as daily summary: simply sum net_amount
-            # This matches the daily summary calculation: total_net_tl += net_amount
-            daily_totals[day_key] += net_amount
-            
-            # Categorize by transaction type for display purposes
-            if transaction.category == 'DEP':
-                # Deposit - positive amount
-                daily_deposits[day_key] += amount
-            elif transaction.category == 'WD':
-                # Withdrawal - positive amount (for display)
-                daily_withdrawals[day_key] += amount
-            else:
-                # Fallback: use amount sign for backward compatibility
-                if amount > 0:
-                    daily_deposits[day_key] += amount
-                else:
-                    daily_withdrawals[day_key] += abs(amount)
-            
-            # Always add commission to daily total
-            daily_commissions[day_key] += commission
-            
-            # Client totals (net) - use net_amount directly
-            if transaction.client_name:
-                if transaction.client_name not in client_totals:
-                    client_totals[transaction.client_name] = 0
-                client_totals[transaction.client_name] += net_amount
+        for row in daily_rows:
+            day_key = row.date.strftime(date_format)
+            daily_totals[day_key] = daily_totals.get(day_key, 0) + float(row.net_amount or 0)
         
         # Generate daily revenue data (simplified)
         daily_revenue = []
@@ -201,7 +142,7 @@ def generate_chart_data(time_range='7d'):
         
         if not daily_revenue:
             logging.error("No daily revenue data generated!")
-        elif not transactions:
+        elif not daily_rows:
             logging.warning("No transactions found in database!")
         
         # Check if we have any data with non-zero amounts
@@ -262,178 +203,89 @@ def dashboard_stats():
             start_date = now - timedelta(days=90)
             end_date = now
         
-        # Single optimized query to get all transaction data
-        # Use date field for business logic consistency
-        if start_date is None and end_date is None:
-            # Get ALL transactions
-            transactions = Transaction.query.all()
-        else:
-            # Filter by date range
-            transactions = Transaction.query.filter(
-                Transaction.date >= start_date.date(),
-                Transaction.date <= end_date.date()
-            ).all()
+        # Aggregate in SQL so memory and latency stay flat as the ledger grows
+        from app.services.dashboard_aggregation_service import dashboard_aggregation_service as aggregates
         
-        # Process data in memory to avoid multiple database queries
-        # Use TRY amounts for consistent currency reporting
-        total_revenue = 0
-        total_commission = 0
-        total_net = 0
+        range_start = start_date.date() if start_date is not None else None
+        range_end = end_date.date() if end_date is not None else None
         
-        for t in transactions:
-            # Use TRY amounts if available, otherwise use original amounts
-            if t.amount_try is not None:
-                total_revenue += float(t.amount_try)
-            else:
-                total_revenue += float(t.amount or 0)
-                
-            if t.commission_try is not None:
-                total_commission += float(t.commission_try)
-            else:
-                total_commission += float(t.commission or 0)
-                
-            if t.net_amount_try is not None:
-                total_net += float(t.net_amount_try)
-            else:
-                total_net += float(t.net_amount or 0)
-        
-        
-        total_transactions = len(transactions)
-        
-        # Get unique clients
-        unique_clients = len(set(t.client_name for t in transactions if t.client_name))
+        # Use TRY amounts for consistent currency reporting
+        current_totals = aggregates.get_period_totals(range_start, range_end)
+        total_revenue = current_totals['total_revenue']
+        total_commission = current_totals['total_commission']
+        total_net = current_totals['total_net']
+        total_transactions = current_totals['transaction_count']
+        unique_clients = current_totals['unique_clients']
         
         # Calculate previous period for comparison
         if start_date is not None and end_date is not None:
             period_duration = end_date - start_date
             prev_start_date = start_date - period_duration
             prev_end_date = start_date
-            
-            prev_transactions = Transaction.query.filter(
-                Transaction.date >= prev_start_date.date(),
-                Transaction.date < prev_end_date.date()
-            ).all()
         else:
             # For 'all' range, compare with last 30 days
             prev_end_date = now - timedelta(days=30)
             prev_start_date = now - timedelta(days=60)
-            
-            prev_transactions = Transaction.query.filter(
-                Transaction.date >= prev_start_date.date(),
-                Transaction.date < prev_end_date.date()
-            ).all()
         
-        # Calculate previous period revenue using same logic
-        prev_revenue = 0
-        for t in prev_transactions:
-            if t.amount_try is not None:
-                prev_revenue += float(t.amount_try)
-            else:
-                prev_revenue += float(t.amount or 0)
-        prev_transactions_count = len(prev_transactions)
-        prev_clients = len(set(t.client_name for t in prev_transactions if t.client_name))
+        prev_totals = aggregates.get_period_totals(
+            prev_start_date.date(), prev_end_date.date(), inclusive_end=False
+        )
+        prev_revenue = prev_totals['total_revenue']
+        prev_transactions_count = prev_totals['transaction_count']
+        prev_clients = prev_totals['unique_clients']
         
         # Calculate changes
-        revenue_change = ((total_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue > 0 else 0
-        transactions_change = ((total_transactions - prev_transactions_count) / prev_transactions_count * 100) if prev_transactions_count > 0 else 0
-        clients_change = ((unique_clients - prev_clients) / prev_clients * 100) if prev_clients > 0 else 0
+        revenue_change = aggregates.percent_change(total_revenue, prev_revenue)
+        transactions_change = aggregates.percent_change(total_transactions, prev_transactions_count)
+        clients_change = aggregates.percent_change(unique_clients, prev_clients)
         
         # Get recent transactions (last 5)
-        recent_transactions = sorted(transactions, key=lambda x: x.date or x.created_at, reverse=True)[:5]
-        recent_transactions_data = []
-        
-        for transaction in recent_transactions:
-            recent_transactions_data.append({
-                'id': transaction.id,
-                'client_name': transaction.client_name or 'Unknown',
-                'amount': float(transaction.amount or 0),
-                'currency': transaction.currency or 'TL',
-                'date': transaction.date.isoformat() if transaction.date else transaction.created_at.strftime('%Y-%m-%d'),
-                'status': 'completed',
-                'created_at': transaction.created_at.isoformat()
-            })
+        recent_transactions_data = aggregates.get_recent_transactions(range_start, range_end, limit=5)
         
         # Generate chart data
         chart_data = generate_chart_data(time_range)
         
-        # Calculate revenue analytics (daily, weekly, monthly, annual)
-        # Get allocation data for revenue calculations
-        from app.models.financial import PSPAllocation
-        
-        # Calculate daily revenue (today's allocations)
-        today_start = datetime.combine(today, datetime.min.time()).replace(tzinfo=timezone.utc)
-        today_end = datetime.combine(today, datetime.max.time()).replace(tzinfo=timezone.utc)
-        daily_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date >= today_start.date(),
-            PSPAllocation.date <= today_end.date()
-        ).all()
-        daily_revenue = sum(float(allocation.allocation_amount) for allocation in daily_allocations)
+        # Calculate revenue analytics (daily, weekly, monthly, annual) from allocations
+        daily_revenue = aggregates.get_allocation_total(today, today)
         
         # Calculate weekly revenue (this week's allocations)
         week_start = today - timedelta(days=today.weekday())
         week_end = week_start + timedelta(days=6)
-        weekly_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date >= week_start,
-            PSPAllocation.date <= week_end
-        ).all()
-        weekly_revenue = sum(float(allocation.allocation_amount) for allocation in weekly_allocations)
+        weekly_revenue = aggregates.get_allocation_total(week_start, week_end)
         
         # Calculate monthly revenue (this month's allocations)
         month_start = today.replace(day=1)
         month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        monthly_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date >= month_start,
-            PSPAllocation.date <= month_end
-        ).all()
-        monthly_revenue = sum(float(allocation.allocation_amount) for allocation in monthly_allocations)
+        monthly_revenue = aggregates.get_allocation_total(month_start, month_end)
         
         # Calculate annual revenue (this year's allocations)
         year_start = today.replace(month=1, day=1)
         year_end = today.replace(month=12, day=31)
-        annual_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date >= year_start,
-            PSPAllocation.date <= year_end
-        ).all()
-        annual_revenue = sum(float(allocation.allocation_amount) for allocation in annual_allocations)
+        annual_revenue = aggregates.get_allocation_total(year_start, year_end)
         
         # Calculate trends (comparing with previous periods)
         # Daily trend (today vs yesterday)
         yesterday = today - timedelta(days=1)
-        yesterday_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date == yesterday
-        ).all()
-        yesterday_revenue = sum(float(allocation.allocation_amount) for allocation in yesterday_allocations)
-        daily_revenue_trend = ((daily_revenue - yesterday_revenue) / yesterday_revenue * 100) if yesterday_revenue > 0 else 0
+        yesterday_revenue = aggregates.get_allocation_total(yesterday, yesterday)
+        daily_revenue_trend = aggregates.percent_change(daily_revenue, yesterday_revenue)
         
         # Weekly trend (this week vs last week)
         last_week_start = week_start - timedelta(days=7)
         last_week_end = last_week_start + timedelta(days=6)
-        last_week_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date >= last_week_start,
-            PSPAllocation.date <= last_week_end
-        ).all()
-        last_week_revenue = sum(float(allocation.allocation_amount) for allocation in last_week_allocations)
-        weekly_revenue_trend = ((weekly_revenue - last_week_revenue) / last_week_revenue * 100) if last_week_revenue > 0 else 0
+        last_week_revenue = aggregates.get_allocation_total(last_week_start, last_week_end)
+        weekly_revenue_trend = aggregates.percent_change(weekly_revenue, last_week_revenue)
         
         # Monthly trend (this month vs last month)
         last_month_start = (month_start - timedelta(days=1)).replace(day=1)
         last_month_end = month_start - timedelta(days=1)
-        last_month_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date >= last_month_start,
-            PSPAllocation.date <= last_month_end
-        ).all()
-        last_month_revenue = sum(float(allocation.allocation_amount) for allocation in last_month_allocations)
-        monthly_revenue_trend = ((monthly_revenue - last_month_revenue) / last_month_revenue * 100) if last_month_revenue > 0 else 0
+        last_month_revenue = aggregates.get_allocation_total(last_month_start, last_month_end)
+        monthly_revenue_trend = aggregates.percent_change(monthly_revenue, last_month_revenue)
         
         # Annual trend (this year vs last year)
         last_year_start = year_start.replace(year=year_start.year - 1)
         last_year_end = year_end.replace(year=year_end.year - 1)
-        last_year_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date >= last_year_start,
-            PSPAllocation.date <= last_year_end
-        ).all()
-        last_year_revenue = sum(float(allocation.allocation_amount) for allocation in last_year_allocations)
-        annual_revenue_trend = ((annual_revenue - last_year_revenue) / last_year_revenue * 100) if last_year_revenue > 0 else 0
+        last_year_revenue = aggregates.get_allocation_total(last_year_start, last_year_end)
+        annual_revenue_trend = aggregates.percent_change(annual_revenue, last_year_revenue)
         
         return jsonify({
             'stats': {
@@ -588,33 +440,20 @@ def get_psp_summary():
 def get_ledger_data():
     """Get ledger data grouped by date with PSP allocations"""
     try:
-        # Get pagination parameters
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 1000))  # Default to 1000 for performance
-        
-        # Get transactions with PSP data (with pagination for large datasets)
-        if per_page >= 10000:  # If requesting very large dataset, get all
-            transactions = Transaction.query.filter(
-                Transaction.psp.isnot(None)
-            ).all()
-        else:
-            # Use pagination for better performance
-            transactions = Transaction.query.filter(
-                Transaction.psp.isnot(None)
-            ).paginate(page=page, per_page=per_page, error_out=False).items
-        
-        # Query and process transactions with PSP data
+        # Read per-(date, PSP) totals from the daily PSP rollup instead of raw transactions
+        from app.services.psp_rollup_service import psp_rollup_service
+        rollup_rows = [row for row in psp_rollup_service.get_daily_psp_totals() if row.psp is not None]
         
         # Group by date and PSP
         daily_data = {}
-        for transaction in transactions:
-            date_key = transaction.date.isoformat() if transaction.date else transaction.created_at.date().isoformat()
-            psp = transaction.psp or 'Unknown'
+        for row in rollup_rows:
+            date_key = row.date.isoformat()
+            psp = row.psp or 'Unknown'
             
             if date_key not in daily_data:
                 daily_data[date_key] = {
                     'date': date_key,
-                    'date_str': transaction.date.strftime('%A, %B %d, %Y') if transaction.date else transaction.created_at.strftime('%A, %B %d, %Y'),
+                    'date_str': row.date.strftime('%A, %B %d, %Y'),
                     'psps': {},
                     'totals': {
                         'total_psp': 0,
@@ -637,46 +476,29 @@ def get_ledger_data():
                     'transaction_count': 0  # Add transaction count
                 }
             
-            # Calculate amounts using TRY equivalents
-            amount = float(transaction.amount_try) if transaction.amount_try is not None else float(transaction.amount)
-            commission = float(transaction.commission_try) if transaction.commission_try is not None else float(transaction.commission)
-            net_amount = float(transaction.net_amount_try) if transaction.net_amount_try is not None else float(transaction.net_amount)
-            
-            # Increment transaction count
-            daily_data[date_key]['psps'][psp]['transaction_count'] += 1
+            # Deposits and withdrawals are classified by CATEGORY using TRY equivalents
+            deposit = float(row.deposit_try or 0)
+            withdraw = float(row.withdraw_try or 0)
             
-            # Determine if it's deposit or withdraw based on CATEGORY, not amount
-            # This is the correct way to classify transactions
-            if transaction.category == 'DEP':
-                daily_data[date_key]['psps'][psp]['deposit'] += abs(amount)
-                daily_data[date_key]['psps'][psp]['toplam'] += abs(amount)  # Add deposits to total
-            elif transaction.category == 'WD':
-                daily_data[date_key]['psps'][psp]['withdraw'] += abs(amount)
-                daily_data[date_key]['psps'][psp]['toplam'] -= abs(amount)  # Subtract withdrawals from total
+            # Fallback: uncategorized rows are classified by amount sign for backward compatibility
+            other = float(row.other_try or 0)
+            if other > 0:
+                deposit += other
             else:
-                # Fallback: use amount sign for backward compatibility
-                if amount > 0:
-                    daily_data[date_key]['psps'][psp]['deposit'] += amount
-                    daily_data[date_key]['psps'][psp]['toplam'] += amount  # Add deposits to total
-                else:
-                    daily_data[date_key]['psps'][psp]['withdraw'] += abs(amount)
-                    daily_data[date_key]['psps'][psp]['toplam'] -= abs(amount)  # Subtract withdrawals from total
-            daily_data[date_key]['psps'][psp]['komisyon'] += commission
-            # NET will be calculated as TOTAL - COMMISSION after all transactions are processed
+                withdraw += abs(other)
+            
+            commission = float(row.commission_try or 0)
+            psp_data = daily_data[date_key]['psps'][psp]
+            psp_data['transaction_count'] += int(row.transaction_count or 0)
+            psp_data['deposit'] += deposit
+            psp_data['withdraw'] += withdraw
+            psp_data['toplam'] += deposit - withdraw  # Deposits minus withdrawals
+            psp_data['komisyon'] += commission
+            # NET will be calculated as TOTAL - COMMISSION after all rows are processed
             
             # Update totals - use the same logic as PSP totals
-            if transaction.category == 'DEP':
-                daily_data[date_key]['totals']['toplam'] += abs(amount)  # Add deposits to total
-            elif transaction.category == 'WD':
-                daily_data[date_key]['totals']['toplam'] -= abs(amount)  # Subtract withdrawals from total
-            else:
-                # Fallback: use amount sign for backward compatibility
-                if amount > 0:
-                    daily_data[date_key]['totals']['toplam'] += amount  # Add deposits to total
-                else:
-                    daily_data[date_key]['totals']['toplam'] -= abs(amount)  # Subtract withdrawals from total
+            daily_data[date_key]['totals']['toplam'] += deposit - withdraw
             daily_data[date_key]['totals']['komisyon'] += commission
-            # NET will be calculated as TOTAL - COMMISSION after all transactions are processed
         
         # Calculate NET as TOTAL - COMMISSION for all PSPs and daily totals
         for date_key, data in daily_data.items():
@@ -690,11 +512,15 @@ def get_ledger_data():
         import logging
         logger = logging.getLogger(__name__)
         
-        # Get all allocations for the date range
-        date_objects = [datetime.strptime(date_key, '%Y-%m-%d').date() for date_key in daily_data.keys()]
-        saved_allocations = PSPAllocation.query.filter(
-            PSPAllocation.date.in_(date_objects)
-        ).all()
+        # Get all allocations for the date range (a range filter avoids huge IN lists)
+        date_objects = [row.date for row in rollup_rows]
+        if date_objects:
+            saved_allocations = PSPAllocation.query.filter(
+                PSPAllocation.date >= min(date_objects),
+                PSPAllocation.date <= max(date_objects)
+            ).all()
+        else:
+            saved_allocations = []
         
         # Create a lookup dictionary for allocations
         allocation_lookup = {}
@@ -854,13 +680,12 @@ def get_allocation_history():
 @analytics_api.route("/allocation-history/export", methods=['GET'])
 @login_required
 def export_allocation_history():
-    """Export allocation history to CSV"""
+    """Export allocation history to CSV, XLSX or JSON"""
     try:
         from app.models.financial import PSPAllocation
+        from app.services.export_service import export_service, format_isoformat, format_number
         from datetime import datetime
         import logging
-        import csv
-        import io
         
         logger = logging.getLogger(__name__)
         
@@ -868,7 +693,8 @@ def export_allocation_history():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         psp_filter = request.args.get('psp')
-        export_format = request.args.get('format', 'csv')  # csv, json
+        export_format = request.args.get('format', 'csv')  # csv, xlsx, json
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
         
         # Build query (same as history endpoint)
         query = PSPAllocation.query
@@ -895,50 +721,32 @@ def export_allocation_history():
         # Order by date descending
         query = query.order_by(PSPAllocation.date.desc(), PSPAllocation.created_at.desc())
         
-        # Get all records (no pagination for export)
-        allocations = query.all()
-        
-        if export_format == 'csv':
-            # Create CSV response
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                'Date', 'PSP Name', 'Allocation Amount', 'Created At', 'Updated At'
+        if export_format in ('csv', 'xlsx'):
+            # Stream plain column tuples; no pagination for export
+            rows = export_service.iter_query_rows(query, [
+                PSPAllocation.date, PSPAllocation.psp_name, PSPAllocation.allocation_amount,
+                PSPAllocation.created_at, PSPAllocation.updated_at
             ])
-            
-            # Write data
-            for allocation in allocations:
-                writer.writerow([
-                    allocation.date.isoformat(),
-                    allocation.psp_name,
-                    float(allocation.allocation_amount),
-                    allocation.created_at.isoformat(),
-                    allocation.updated_at.isoformat()
-                ])
-            
-            # Create response
-            output.seek(0)
-            response_data = output.getvalue()
-            output.close()
+            columns = [
+                ('Date', format_isoformat),
+                ('PSP Name', None),
+                ('Allocation Amount', format_number),
+                ('Created At', format_isoformat),
+                ('Updated At', format_isoformat)
+            ]
             
             # Generate filename with date range
-            filename = f"allocation_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            filename = f"allocation_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             
-            return Response(
-                response_data,
-                mimetype='text/csv',
-                headers={
-                    'Content-Disposition': f'attachment; filename={filename}',
-                    'Content-Type': 'text/csv; charset=utf-8'
-                }
+            return export_service.stream_response(
+                filename, columns, rows,
+                export_format=export_format, compress=compress, sheet_title='Allocation History'
             )
         
         elif export_format == 'json':
             # Create JSON response
             history_data = []
-            for allocation in allocations:
+            for allocation in query.yield_per(1000):
                 history_data.append({
                     'id': allocation.id,
                     'date': allocation.date.isoformat(),
@@ -960,7 +768,7 @@ def export_allocation_history():
             )
         
         else:
-            return jsonify({'error': 'Invalid export format. Use csv or json'}), 400
+            return jsonify({'error': 'Invalid export format. Use csv, xlsx or json'}), 400
         
     except Exception as e:
         logger.error(f"Error exporting allocation history: {e}")
@@ -1782,7 +1590,7 @@ def commission_analytics():
 
 @analytics_api.route("/consolidated-dashboard")
 @login_required
-@cached(ttl=DASHBOARD_CACHE_DURATION, key_prefix="consolidated_dashboard")
+@cached(ttl=DASHBOARD_CACHE_DURATION, key_prefix="consolidated_dashboard", tags=[TRANSACTION_DATA_TAG])
 @monitor_performance
 @limiter.limit("10 per minute, 100 per hour")  # Rate limiting for analytics
 def consolidated_dashboard():
@@ -1895,7 +1703,7 @@ def consolidated_dashboard():
         logging.error(f"Error in consolidated dashboard: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@cached(ttl=ANALYTICS_CACHE_DURATION, key_prefix="dashboard_stats_optimized")
+@cached(ttl=ANALYTICS_CACHE_DURATION, key_prefix="dashboard_stats_optimized", tags=[TRANSACTION_DATA_TAG])
 @monitor_performance
 def get_dashboard_stats_optimized(start_date, end_date):
     """Optimized dashboard stats query with advanced caching"""
@@ -2471,9 +2279,9 @@ def data_health_check():
 
 @analytics_api.route("/revenue-detailed")
 @login_required
-@cached(ttl=ANALYTICS_CACHE_DURATION, key_prefix="revenue_detailed")
+@optimized_response(cache_type='analytics', compress=True, etag_source='transactions')
+@cached(ttl=ANALYTICS_CACHE_DURATION, key_prefix="revenue_detailed", tags=[TRANSACTION_DATA_TAG])
 @monitor_performance
-@optimized_response(cache_type='analytics', compress=True)
 def revenue_detailed():
     """Get detailed revenue analytics with all transaction data"""
     try:
@@ -2705,23 +2513,30 @@ def revenue_detailed():
 @analytics_api.route("/psp-rollover-summary")
 @login_required
 def get_psp_rollover_summary():
-    """Get PSP rollover summary for dashboard display"""
+    """Get PSP rollover summary for dashboard display
+    
+    Optional ``as_of`` (YYYY-MM-DD) returns the rollover as it stood at the
+    end of that day.
+    """
     try:
         logging.info("PSP rollover summary API called")
-        from app.models.transaction import Transaction
-        from app.models.financial import PSPAllocation
-        from datetime import datetime, timedelta
+        from app.services.psp_rollup_service import psp_rollup_service
+        from datetime import datetime
         
-        # Get all transactions with PSP data
-        transactions = Transaction.query.filter(
-            Transaction.psp.isnot(None),
-            Transaction.psp != ''
-        ).all()
+        as_of = request.args.get('as_of')
+        if as_of:
+            try:
+                as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': 'Invalid as_of format. Use YYYY-MM-DD'}), 400
+        else:
+            as_of = None
         
-        logging.info(f"Found {len(transactions)} transactions with PSP data")
+        # Per-PSP totals and allocations, aggregated in SQL
+        psp_list = psp_rollup_service.get_psp_rollover(as_of)
         
         # If no transactions, return empty result
-        if not transactions:
+        if not psp_list:
             logging.warning("No transactions with PSP data found")
             return jsonify({
                 'success': True,
@@ -2737,87 +2552,7 @@ def get_psp_rollover_summary():
                 }
             })
         
-        # Group by PSP and calculate totals
-        psp_data = {}
-        for transaction in transactions:
-            psp = transaction.psp or 'Unknown'
-            
-            if psp not in psp_data:
-                psp_data[psp] = {
-                    'psp': psp,
-                    'total_deposits': 0.0,
-                    'total_withdrawals': 0.0,
-                    'total_net': 0.0,
-                    'total_allocations': 0.0,
-                    'total_rollover': 0.0,
-                    'transaction_count': 0,
-                    'last_activity': None
-                }
-            
-            # Calculate amounts using TRY equivalents
-            amount = float(transaction.amount_try) if transaction.amount_try is not None else float(transaction.amount)
-            commission = float(transaction.commission_try) if transaction.commission_try is not None else float(transaction.commission)
-            net_amount = float(transaction.net_amount_try) if transaction.net_amount_try is not None else float(transaction.net_amount)
-            
-            # Update PSP data
-            psp_data[psp]['transaction_count'] += 1
-            
-            # Determine if it's deposit or withdraw based on CATEGORY
-            if transaction.category == 'DEP':
-                psp_data[psp]['total_deposits'] += abs(amount)
-            elif transaction.category == 'WD':
-                psp_data[psp]['total_withdrawals'] += abs(amount)
-            else:
-                # Fallback: use amount sign for backward compatibility
-                if amount > 0:
-                    psp_data[psp]['total_deposits'] += amount
-                else:
-                    psp_data[psp]['total_withdrawals'] += abs(amount)
-            
-            psp_data[psp]['total_net'] += net_amount
-            
-            # Update last activity
-            if not psp_data[psp]['last_activity'] or transaction.date > psp_data[psp]['last_activity']:
-                psp_data[psp]['last_activity'] = transaction.date
-        
-        # Get all allocations for rollover calculation
-        date_objects = [transaction.date for transaction in transactions if transaction.date]
-        if date_objects:
-            saved_allocations = PSPAllocation.query.filter(
-                PSPAllocation.date.in_(date_objects)
-            ).all()
-            
-            # Create a lookup dictionary for allocations
-            allocation_lookup = {}
-            for allocation in saved_allocations:
-                key = f"{allocation.date.isoformat()}-{allocation.psp_name}"
-                allocation_lookup[key] = float(allocation.allocation_amount)
-            
-            # Calculate allocations and rollovers for each PSP
-            for psp, data in psp_data.items():
-                total_allocation = 0.0
-                
-                # Sum allocations for this PSP across all dates
-                for allocation in saved_allocations:
-                    if allocation.psp_name == psp:
-                        total_allocation += float(allocation.allocation_amount)
-                
-                data['total_allocations'] = total_allocation
-                data['total_rollover'] = data['total_net'] - total_allocation
-        
-        # Add sample allocation data for testing if no real allocations exist
-        if not saved_allocations:
-            logging.info("No PSPAllocation records found, using sample data for testing")
-            import random
-            for psp, data in psp_data.items():
-                # Give each PSP a random allocation between 10-50% of their net amount
-                allocation_percent = random.uniform(0.1, 0.5)
-                sample_allocation = data['total_net'] * allocation_percent
-                data['total_allocations'] = sample_allocation
-                data['total_rollover'] = data['total_net'] - sample_allocation
-        
-        # Convert to list and sort by rollover amount (descending)
-        psp_list = list(psp_data.values())
+        # Sort by rollover amount (descending)
         psp_list.sort(key=lambda x: x['total_rollover'], reverse=True)
         
         # Calculate summary metrics
@@ -2829,6 +2564,7 @@ def get_psp_rollover_summary():
             'success': True,
             'data': {
                 'psps': psp_list,
+                'as_of': as_of.isoformat() if as_of else None,
                 'summary': {
                     'total_psps': len(psp_list),
                     'total_rollover': total_rollover,
@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models.transaction import Transaction
 from app.models.config import ExchangeRate
-from app.services.decimal_float_fix_service import decimal_float_service
+from app.services.bulk_rate_service import bulk_rate_service
 from app.utils.logger import get_logger
 from datetime import datetime, date
 from decimal import Decimal
@@ -92,60 +92,16 @@ def apply_usd_rate():
                 'error': 'Invalid rate format'
             }), 400
         
-        # Get all USD transactions for this date
-        usd_transactions = Transaction.query.filter(
-            and_(
-                Transaction.date == date_obj,
-                Transaction.currency == 'USD'
-            )
-        ).all()
+        # Re-rate all USD transactions for this date in one UPDATE
+        result = bulk_rate_service.apply_rates({date_obj: rate_decimal})
+        updated_count = result['updated_count']
         
-        if not usd_transactions:
+        if not updated_count:
             return jsonify({
                 'success': False,
                 'error': f'No USD transactions found for date {target_date}'
             }), 404
         
-        # Update exchange rate for this date
-        exchange_rate = ExchangeRate.query.filter_by(date=date_obj).first()
-        if not exchange_rate:
-            exchange_rate = ExchangeRate(date=date_obj)
-            db.session.add(exchange_rate)
-        
-        exchange_rate.usd_to_tl = rate_decimal
-        
-        # Update all USD transactions for this date
-        updated_count = 0
-        for transaction in usd_transactions:
-            # Update exchange rate
-            transaction.exchange_rate = rate_decimal
-            
-            # Recalculate amount_try
-            transaction.amount_try = decimal_float_service.safe_multiply(
-                transaction.amount, 
-                rate_decimal, 
-                'decimal'
-            )
-            
-            # Recalculate commission_try
-            transaction.commission_try = decimal_float_service.safe_multiply(
-                transaction.commission, 
-                rate_decimal, 
-                'decimal'
-            )
-            
-            # Recalculate net_amount_try
-            transaction.net_amount_try = decimal_float_service.safe_multiply(
-                transaction.net_amount, 
-                rate_decimal, 
-                'decimal'
-            )
-            
-            updated_count += 1
-        
-        # Commit all changes
-        db.session.commit()
-        
         logger.info(f"Applied USD rate {rate_decimal} to {updated_count} transactions on {target_date}")
         
         return jsonify({
@@ -176,7 +132,8 @@ def apply_multiple_usd_rates():
             }), 400
         
         results = []
-        total_updated = 0
+        rates = {}
+        requested = []
         
         for rate_info in rates_data:
             target_date = rate_info.get('date')
@@ -204,51 +161,10 @@ def apply_multiple_usd_rates():
                     })
                     continue
                 
-                # Get USD transactions for this date
-                usd_transactions = Transaction.query.filter(
-                    and_(
-                        Transaction.date == date_obj,
-                        Transaction.currency == 'USD'
-                    )
-                ).all()
-                
-                if not usd_transactions:
-                    results.append({
-                        'date': target_date,
-                        'success': False,
-                        'error': f'No USD transactions found'
-                    })
-                    continue
-                
-                # Update exchange rate for this date
-                exchange_rate = ExchangeRate.query.filter_by(date=date_obj).first()
-                if not exchange_rate:
-                    exchange_rate = ExchangeRate(date=date_obj)
-                    db.session.add(exchange_rate)
-                
-                exchange_rate.usd_to_tl = rate_decimal
-                
-                # Update all USD transactions for this date
-                updated_count = 0
-                for transaction in usd_transactions:
-                    transaction.exchange_rate = rate_decimal
-                    transaction.amount_try = decimal_float_service.safe_multiply(
-                        transaction.amount, rate_decimal, 'decimal'
-                    )
-                    transaction.commission_try = decimal_float_service.safe_multiply(
-                        transaction.commission, rate_decimal, 'decimal'
-                    )
-                    transaction.net_amount_try = decimal_float_service.safe_multiply(
-                        transaction.net_amount, rate_decimal, 'decimal'
-                    )
-                    updated_count += 1
-                
-                total_updated += updated_count
-                results.append({
-                    'date': target_date,
-                    'success': True,
-                    'updated_count': updated_count
-                })
+                rates[date_obj] = rate_decimal
+                # Filled in once the rates are applied, keeping request order
+                results.append({'date': target_date})
+                requested.append((results[-1], date_obj))
                 
             except Exception as e:
                 results.append({
@@ -257,8 +173,16 @@ def apply_multiple_usd_rates():
                     'error': str(e)
                 })
         
-        # Commit all changes
-        db.session.commit()
+        # One set-based UPDATE for all valid dates
+        result = bulk_rate_service.apply_rates(rates) if rates else {'updated_count': 0, 'counts': {}}
+        total_updated = result['updated_count']
+        
+        for entry, date_obj in requested:
+            updated_count = result['counts'].get(date_obj, 0)
+            if updated_count:
+                entry.update({'success': True, 'updated_count': updated_count})
+            else:
+                entry.update({'success': False, 'error': f'No USD transactions found'})
         
         logger.info(f"Applied multiple USD rates. Total updated: {total_updated}")
         
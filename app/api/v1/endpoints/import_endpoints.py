@@ -4,11 +4,12 @@ Handles Excel file imports for transactions
 """
 
 import os
+import uuid
 import logging
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, url_for
 from werkzeug.utils import secure_filename
 from flask_login import login_required, current_user
-from app.services.data_import_service import DataImportService
+from app.services.data_import_service import DataImportService, ImportInProgressError, data_import_service
 from app.utils.error_handler import handle_api_errors
 from app.utils.permission_decorators import require_any_admin
 
@@ -91,7 +92,7 @@ def preview_import():
 @require_any_admin
 @handle_api_errors
 def execute_import():
-    """Execute the actual import"""
+    """Start the import as a background job"""
     try:
         # Check if file was uploaded
         if 'file' not in request.files:
@@ -116,8 +117,8 @@ def execute_import():
                 'message': 'Invalid file type. Only Excel files (.xlsx, .xls) are allowed'
             }), 400
         
-        # Save file temporarily
-        filename = secure_filename(file.filename)
+        # Save file under a unique name; the background job deletes it when done
+        filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
         temp_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         
         # Ensure upload folder exists
@@ -126,25 +127,29 @@ def execute_import():
         file.save(temp_path)
         
         try:
-            # Execute import
-            import_service = DataImportService()
-            import_stats = import_service.import_transactions(temp_path, current_user.id)
-            
+            # Queue import; the client polls the job for progress
+            checkpoint = data_import_service.start_import(temp_path, current_user.id, file.filename)
+        except ImportInProgressError as e:
+            os.remove(temp_path)
             return jsonify({
-                'success': True,
-                'message': 'Import completed successfully',
-                'data': {
-                    'total_rows': import_stats['total_rows'],
-                    'successful_imports': import_stats['successful_imports'],
-                    'failed_imports': import_stats['failed_imports'],
-                    'errors': import_stats['errors'][:10]  # Limit errors to first 10
-                }
-            })
-            
-        finally:
-            # Clean up temporary file
+                'success': False,
+                'message': str(e)
+            }), 409
+        except Exception:
             if os.path.exists(temp_path):
                 os.remove(temp_path)
+            raise
+        
+        return jsonify({
+            'success': True,
+            'message': 'Import started',
+            'data': {
+                'job_id': checkpoint.id,
+                'status': checkpoint.status,
+                'resumed_from_row': checkpoint.position,
+                'status_url': url_for('.get_import_job', job_id=checkpoint.id)
+            }
+        }), 202
                 
     except Exception as e:
         logger.error(f"Error in execute import: {str(e)}")
@@ -153,6 +158,42 @@ def execute_import():
             'message': f'Import failed: {str(e)}'
         }), 500
 
+@import_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+@require_any_admin
+@handle_api_errors
+def get_import_job(job_id):
+    """Progress of a background import started by /execute"""
+    try:
+        checkpoint = data_import_service.get_job(job_id)
+        if checkpoint is None:
+            return jsonify({
+                'success': False,
+                'message': 'Import job not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'job_id': checkpoint.id,
+                'status': checkpoint.status,
+                'total_rows': checkpoint.processed_count,
+                'successful_imports': checkpoint.success_count,
+                'failed_imports': checkpoint.failure_count,
+                'errors': checkpoint.get_state().get('errors', [])[:10],  # Limit errors to first 10
+                'last_error': checkpoint.last_error,
+                'started_at': checkpoint.started_at.isoformat() if checkpoint.started_at else None,
+                'completed_at': checkpoint.completed_at.isoformat() if checkpoint.completed_at else None
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting import job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Error getting import job: {str(e)}'
+        }), 500
+
 @import_bp.route('/template', methods=['GET'])
 @login_required
 @require_any_admin
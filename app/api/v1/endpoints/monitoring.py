@@ -29,9 +29,9 @@ def admin_required(f):
 
 @monitoring_api.route('/health')
 @login_required
+@optimized_response(cache_type='system', compress=True)
 @cached(ttl=60, key_prefix="system_health")
 @monitor_performance
-@optimized_response(cache_type='system', compress=True)
 def system_health():
     """Get current system health status"""
     try:
@@ -54,9 +54,9 @@ def system_health():
 @monitoring_api.route('/metrics')
 @login_required
 @admin_required
+@optimized_response(cache_type='system', compress=True)
 @cached(ttl=30, key_prefix="system_metrics")
 @monitor_performance
-@optimized_response(cache_type='system', compress=True)
 def system_metrics():
     """Get current system and application metrics"""
     try:
@@ -112,9 +112,9 @@ def metrics_history():
 
 @monitoring_api.route('/status')
 @login_required
+@optimized_response(cache_type='system', compress=True)
 @cached(ttl=10, key_prefix="system_status")
 @monitor_performance
-@optimized_response(cache_type='system', compress=True)
 def system_status():
     """Get quick system status check"""
     try:
@@ -170,6 +170,89 @@ def optimize_queries():
             'message': str(e)
         }), 500
 
+@performance_api.route('/queries/requests')
+@login_required
+def get_request_query_stats():
+    """Get per-endpoint query counts and DB time from the request profiler"""
+    try:
+        api_logger.log_api_request("/performance/queries/requests", "GET", current_user.id)
+        
+        from app.services.enhanced_database_monitor import request_query_profiler
+        limit = request.args.get('limit', 20, type=int)
+        sort_by = request.args.get('sort', 'db_time')
+        
+        api_logger.log_api_request("/performance/queries/requests", "GET", current_user.id, 200)
+        return jsonify({
+            'endpoints': request_query_profiler.get_endpoint_stats(limit=limit, sort_by=sort_by),
+            'n_plus_one_threshold': request_query_profiler.n_plus_one_threshold
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting request query stats: {str(e)}")
+        api_logger.log_api_request("/performance/queries/requests", "GET", current_user.id, 500)
+        return jsonify({
+            'error': 'Failed to retrieve request query statistics',
+            'message': str(e)
+        }), 500
+
+@performance_api.route('/queries/n-plus-one')
+@login_required
+def get_n_plus_one_report():
+    """Get statements repeated within single requests (suspected N+1 patterns)"""
+    try:
+        api_logger.log_api_request("/performance/queries/n-plus-one", "GET", current_user.id)
+        
+        from app.services.enhanced_database_monitor import request_query_profiler
+        suspects = request_query_profiler.get_n_plus_one_report()
+        
+        api_logger.log_api_request("/performance/queries/n-plus-one", "GET", current_user.id, 200)
+        return jsonify({
+            'suspects': suspects,
+            'count': len(suspects),
+            'n_plus_one_threshold': request_query_profiler.n_plus_one_threshold
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting N+1 report: {str(e)}")
+        api_logger.log_api_request("/performance/queries/n-plus-one", "GET", current_user.id, 500)
+        return jsonify({
+            'error': 'Failed to retrieve N+1 report',
+            'message': str(e)
+        }), 500
+
+@performance_api.route('/queries/requests/reset', methods=['POST'])
+@login_required
+def reset_request_query_stats():
+    """Reset the request profiler statistics"""
+    try:
+        from app.services.enhanced_database_monitor import request_query_profiler
+        request_query_profiler.reset()
+        
+        api_logger.log_business_event("query_profile_reset", "Request query statistics reset", current_user.id)
+        return jsonify({'message': 'Request query statistics reset'}), 200
+        
+    except Exception as e:
+        logger.error(f"Error resetting request query stats: {str(e)}")
+        return jsonify({
+            'error': 'Failed to reset request query statistics',
+            'message': str(e)
+        }), 500
+
+@performance_api.route('/audit/queue')
+@login_required
+def get_audit_queue_stats():
+    """Get audit writer queue depth and flush statistics"""
+    try:
+        from app.services.audit_service import audit_writer
+        return jsonify(audit_writer.get_stats()), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting audit queue stats: {str(e)}")
+        return jsonify({
+            'error': 'Failed to retrieve audit queue statistics',
+            'message': str(e)
+        }), 500
+
 @performance_api.route('/security/metrics')
 @login_required
 def get_security_metrics():
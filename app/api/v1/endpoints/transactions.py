@@ -11,6 +11,8 @@ from app import db
 from decimal import Decimal, InvalidOperation
 import logging
 from app.services.advanced_cache_service import get_cache_service, cached
+from app.utils.advanced_cache import TRANSACTION_DATA_TAG
+from app.services.psp_options_service import psp_rate_registry
 from app.services.query_optimization_service import monitor_query_performance
 from app.utils.structured_logger import get_structured_logger
 
@@ -24,6 +26,12 @@ transactions_api = Blueprint('transactions_api', __name__)
 from app import csrf
 csrf.exempt(transactions_api)
 
+# Upper bound for one page of the transaction list
+TRANSACTION_LIST_MAX_PER_PAGE = 1000
+
+# Seconds a filtered transaction count may be served from cache
+TRANSACTION_COUNT_CACHE_TTL = 60
+
 @transactions_api.route("", methods=['POST'])
 @transactions_api.route("/", methods=['POST'])
 @login_required
@@ -107,9 +115,8 @@ def create_transaction():
             logger.info(f"Using manual commission rate: {manual_commission_rate}% (decimal: {commission_rate})")
         elif psp:
             try:
-                from app.services.psp_options_service import PspOptionsService
                 from app.services.company_options_service import CompanyOptionsService
-                commission_rate = PspOptionsService.get_psp_commission_rate(psp)
+                commission_rate = psp_rate_registry.rate_for(psp)
                 logger.info(f"Using PSP '{psp}' commission rate: {commission_rate}")
             except Exception as e:
                 logger.warning(f"Error fetching PSP commission rate for '{psp}': {e}")
@@ -182,10 +189,6 @@ def create_transaction():
         db.session.flush()  # Ensure the transaction gets an ID
         db.session.commit()
         
-        # Force WAL checkpoint to ensure transaction is immediately visible
-        db.session.execute(text("PRAGMA wal_checkpoint(FULL)"))
-        db.session.commit()
-        
         # Invalidate cache after transaction creation
         try:
             from app.services.query_service import QueryService
@@ -194,10 +197,6 @@ def create_transaction():
         except Exception as cache_error:
             logger.warning(f"Failed to invalidate cache after API transaction creation: {cache_error}")
         
-        # Force a small delay to ensure transaction is fully committed
-        import time
-        time.sleep(0.1)
-        
         return jsonify({
             'success': True,
             'message': 'Transaction created successfully',
@@ -224,133 +223,34 @@ def create_transaction():
 def get_clients():
     """Get clients data (grouped transactions by client)"""
     try:
-        # Get transactions grouped by client with additional data including commission
-        client_stats = db.session.query(
-            Transaction.client_name,
-            func.count(Transaction.id).label('transaction_count'),
-            func.sum(Transaction.amount).label('total_amount'),
-            func.sum(Transaction.commission).label('total_commission'),
-            func.sum(Transaction.net_amount).label('total_net'),
-            func.avg(Transaction.amount).label('average_amount'),
-            func.min(Transaction.created_at).label('first_transaction'),
-            func.max(Transaction.created_at).label('last_transaction')
-        ).filter(
-            Transaction.client_name.isnot(None),
-            Transaction.client_name != ''
-        ).group_by(Transaction.client_name).all()
-        
-        # Check if we're getting any data
-        if len(client_stats) == 0:
-            total_transactions = Transaction.query.count()
-        
-        clients_data = []
-        for client in client_stats:
-            # Fix: Ensure proper type conversion and handle NULL values
-            total_amount = float(client.total_amount) if client.total_amount is not None else 0.0
-            total_commission = float(client.total_commission) if client.total_commission is not None else 0.0
-            total_net = float(client.total_net) if client.total_net is not None else 0.0
-            
-            # Get currencies and PSPs for this client
-            client_transactions = Transaction.query.filter(
-                Transaction.client_name == client.client_name
-            ).all()
-            
-            currencies = list(set([t.currency for t in client_transactions if t.currency]))
-            psps = list(set([t.psp for t in client_transactions if t.psp]))
-            
-            # Get payment method and category for this client (get the most recent one)
-            latest_transaction = Transaction.query.filter(
-                Transaction.client_name == client.client_name
-            ).order_by(Transaction.created_at.desc()).first()
-            
-            payment_method = latest_transaction.payment_method if latest_transaction else None
-            category = latest_transaction.category if latest_transaction else None
-            
-            # Fix: Ensure all numeric values are properly converted
-            avg_transaction = float(client.average_amount) if client.average_amount is not None else 0.0
-            
-            # Calculate final values for client
-            
-            clients_data.append({
-                'client_name': client.client_name,
-                'payment_method': payment_method,
-                'category': category,
-                'total_amount': total_amount,
-                'total_commission': total_commission,
-                'total_net': total_net,
-                'transaction_count': client.transaction_count,
-                'first_transaction': client.first_transaction.isoformat() if client.first_transaction else None,
-                'last_transaction': client.last_transaction.isoformat() if client.last_transaction else None,
-                'currencies': currencies,
-                'psps': psps,
-                'avg_transaction': avg_transaction
-            })
-        
-        # Sort by total amount descending
-        clients_data.sort(key=lambda x: x['total_amount'], reverse=True)
+        from app.services.client_summary_service import client_summary_service
+        
+        # Optional server-side sorting, search and pagination
+        sort_by = request.args.get('sort_by', 'total_amount')
+        sort_order = request.args.get('sort_order', 'desc')
+        search = request.args.get('search', '').strip() or None
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', type=int)
+        
+        result = client_summary_service.get_client_summaries(
+            sort_by=sort_by,
+            sort_order=sort_order,
+            page=page,
+            per_page=per_page,
+            search=search
+        )
         
-        # If no data found, try alternative method
-        if len(clients_data) == 0:
-            # No data from aggregation, trying alternative method
-            try:
-                # Get all unique client names
-                unique_clients = db.session.query(Transaction.client_name).filter(
-                    Transaction.client_name.isnot(None),
-                    Transaction.client_name != ''
-                ).distinct().all()
-                
-                # Found unique clients for alternative calculation
-                
-                for client_row in unique_clients:
-                    client_name = client_row.client_name
-                    if not client_name:
-                        continue
-                        
-                    # Get all transactions for this client
-                    client_transactions = Transaction.query.filter(
-                        Transaction.client_name == client_name
-                    ).all()
-                    
-                    if not client_transactions:
-                        continue
-                    
-                    # Calculate manually
-                    total_amount = sum(float(t.amount) for t in client_transactions if t.amount is not None)
-                    total_commission = sum(float(t.commission) for t in client_transactions if t.commission is not None)
-                    total_net = total_amount - total_commission
-                    
-                    # Alternative calculation for client data
-                    
-                    # Get other data
-                    latest_transaction = max(client_transactions, key=lambda x: x.created_at if x.created_at else datetime.min)
-                    
-                    clients_data.append({
-                        'client_name': client_name,
-                        'payment_method': latest_transaction.payment_method,
-                        'category': latest_transaction.category,
-                        'total_amount': total_amount,
-                        'total_commission': total_commission,
-                        'total_net': total_net,
-                        'transaction_count': len(client_transactions),
-                        'first_transaction': min(t.created_at for t in client_transactions if t.created_at).isoformat() if any(t.created_at for t in client_transactions) else None,
-                        'last_transaction': latest_transaction.created_at.isoformat() if latest_transaction.created_at else None,
-                        'currencies': list(set(t.currency for t in client_transactions if t.currency)),
-                        'psps': list(set(t.psp for t in client_transactions if t.psp)),
-                        'avg_transaction': total_amount / len(client_transactions) if client_transactions else 0.0
-                    })
-                
-                # Sort again
-                clients_data.sort(key=lambda x: x['total_amount'], reverse=True)
-                
-            except Exception as fallback_error:
-                # Fallback method failed, continuing with empty data
-                pass
+        # Without pagination parameters keep returning the plain list for existing callers
+        if result['pagination'] is None:
+            return jsonify(result['clients'])
         
-        return jsonify(clients_data)
+        return jsonify({
+            'clients': result['clients'],
+            'pagination': result['pagination']
+        })
         
     except Exception as e:
-        # Log error to system logger instead of print
-        import traceback
+        logger.error(f"Error retrieving clients data: {e}")
         return jsonify({
             'error': 'Failed to retrieve clients data',
             'message': str(e)
@@ -371,38 +271,13 @@ def get_psp_summary_stats():
             api_logger.log_cache_operation("get", cache_key, hit=True)
             return jsonify(cached_result), 200
         
-        # Get PSP statistics from actual transactions using TRY amounts
-        # Calculate deposits and withdrawals separately, then compute net total
-        # Use separate queries to avoid SQLAlchemy case function issues
-        psp_stats = db.session.query(
-            Transaction.psp,
-            func.count(Transaction.id).label('transaction_count'),
-            func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('total_amount_try'),
-            func.avg(func.coalesce(Transaction.amount_try, Transaction.amount)).label('average_amount_try')
-        ).filter(
-            Transaction.psp.isnot(None),
-            Transaction.psp != ''
-        ).group_by(Transaction.psp).all()
-        
-        # Get deposits separately
-        psp_deposits = db.session.query(
-            Transaction.psp,
-            func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('total_deposits_try')
-        ).filter(
-            Transaction.psp.isnot(None),
-            Transaction.psp != '',
-            func.upper(Transaction.category).in_(['DEP', 'DEPOSIT', 'INVESTMENT'])
-        ).group_by(Transaction.psp).all()
-        
-        # Get withdrawals separately
-        psp_withdrawals = db.session.query(
-            Transaction.psp,
-            func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('total_withdrawals_try')
-        ).filter(
-            Transaction.psp.isnot(None),
-            Transaction.psp != '',
-            func.upper(Transaction.category).in_(['WD', 'WITHDRAW', 'WITHDRAWAL'])
-        ).group_by(Transaction.psp).all()
+        # Get PSP statistics from the daily PSP rollup using TRY amounts
+        # Deposits and withdrawals are pre-aggregated per (date, PSP, currency)
+        from app.services.psp_rollup_service import psp_rollup_service
+        psp_stats = [
+            psp for psp in psp_rollup_service.get_psp_totals()
+            if psp.psp
+        ]
         
         # Get allocations from PSPAllocation table
         from app.models.financial import PSPAllocation
@@ -412,8 +287,8 @@ def get_psp_summary_stats():
         ).group_by(PSPAllocation.psp_name).all()
         
         # Create lookup dictionaries
-        deposits_dict = {psp.psp: float(psp.total_deposits_try) if psp.total_deposits_try else 0.0 for psp in psp_deposits}
-        withdrawals_dict = {psp.psp: float(psp.total_withdrawals_try) if psp.total_withdrawals_try else 0.0 for psp in psp_withdrawals}
+        deposits_dict = {psp.psp: float(psp.deposit_try) if psp.deposit_try else 0.0 for psp in psp_stats}
+        withdrawals_dict = {psp.psp: float(psp.withdraw_try) if psp.withdraw_try else 0.0 for psp in psp_stats}
         allocations_dict = {psp.psp_name: float(psp.total_allocations) if psp.total_allocations else 0.0 for psp in psp_allocations}
         
         logger.info(f"PSP stats query completed, found {len(psp_stats)} PSPs")
@@ -430,18 +305,9 @@ def get_psp_summary_stats():
             
             # Get the actual commission rate for this PSP from options (no defaults)
             commission_rate = None
-            try:
-                from app.models.config import Option
-                psp_option = Option.query.filter_by(
-                    field_name='psp',
-                    value=psp.psp,
-                    is_active=True
-                ).first()
-                
-                if psp_option and psp_option.commission_rate is not None:
-                    commission_rate = float(psp_option.commission_rate) * 100  # Convert to percentage
-            except Exception:
-                pass  # Skip if error occurs
+            configured_rate = psp_rate_registry.configured_rate(psp.psp)
+            if configured_rate is not None:
+                commission_rate = float(configured_rate) * 100  # Convert to percentage
             
             # Calculate commission only if rate is available
             if commission_rate is not None:
@@ -459,7 +325,7 @@ def get_psp_summary_stats():
                 'total_commission': total_commission,
                 'total_net': total_net,
                 'total_allocations': total_allocations,
-                'transaction_count': psp.transaction_count,
+                'transaction_count': int(psp.transaction_count or 0),
                 'commission_rate': commission_rate
             })
         
@@ -469,17 +335,9 @@ def get_psp_summary_stats():
         logger.info(f"PSP summary stats completed successfully, returning {len(psp_data)} PSPs")
         
         # Cache the result
-        cache_service.set(cache_key, psp_data, ttl=300)
+        cache_service.set(cache_key, psp_data, ttl=300, tags=[TRANSACTION_DATA_TAG])
         api_logger.log_cache_operation("set", cache_key, hit=False)
         
-        # Invalidate cache to ensure fresh data
-        try:
-            from app.services.query_service import QueryService
-            QueryService.invalidate_transaction_cache()
-            logger.info("Cache invalidated after PSP summary stats")
-        except Exception as cache_error:
-            logger.warning(f"Failed to invalidate cache after PSP summary stats: {cache_error}")
-        
         return jsonify(psp_data)
         
     except Exception as e:
@@ -526,42 +384,12 @@ def get_psp_monthly_stats():
         
         logger.info(f"Date range: {start_date} to {end_date}")
         
-        # Get PSP statistics for the specific month using TRY amounts
-        psp_stats = db.session.query(
-            Transaction.psp,
-            func.count(Transaction.id).label('transaction_count'),
-            func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('total_amount_try'),
-            func.avg(func.coalesce(Transaction.amount_try, Transaction.amount)).label('average_amount_try')
-        ).filter(
-            Transaction.psp.isnot(None),
-            Transaction.psp != '',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Transaction.psp).all()
-        
-        # Get deposits for the month
-        psp_deposits = db.session.query(
-            Transaction.psp,
-            func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('total_deposits_try')
-        ).filter(
-            Transaction.psp.isnot(None),
-            Transaction.psp != '',
-            func.upper(Transaction.category).in_(['DEP', 'DEPOSIT', 'INVESTMENT']),
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Transaction.psp).all()
-        
-        # Get withdrawals for the month
-        psp_withdrawals = db.session.query(
-            Transaction.psp,
-            func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('total_withdrawals_try')
-        ).filter(
-            Transaction.psp.isnot(None),
-            Transaction.psp != '',
-            func.upper(Transaction.category).in_(['WD', 'WITHDRAW', 'WITHDRAWAL']),
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(Transaction.psp).all()
+        # Get PSP statistics for the specific month from the daily PSP rollup using TRY amounts
+        from app.services.psp_rollup_service import psp_rollup_service
+        psp_stats = [
+            psp for psp in psp_rollup_service.get_psp_totals(start_date, end_date)
+            if psp.psp
+        ]
         
         # Get allocations for the month from PSPAllocation table
         try:
@@ -581,85 +409,50 @@ def get_psp_monthly_stats():
             psp_allocations = []
         
         # Create lookup dictionaries
-        deposits_dict = {psp.psp: float(psp.total_deposits_try) if psp.total_deposits_try else 0.0 for psp in psp_deposits}
-        withdrawals_dict = {psp.psp: float(psp.total_withdrawals_try) if psp.total_withdrawals_try else 0.0 for psp in psp_withdrawals}
+        deposits_dict = {psp.psp: float(psp.deposit_try) if psp.deposit_try else 0.0 for psp in psp_stats}
+        withdrawals_dict = {psp.psp: float(psp.withdraw_try) if psp.withdraw_try else 0.0 for psp in psp_stats}
         allocations_dict = {psp.psp_name: float(psp.total_allocations) if psp.total_allocations else 0.0 for psp in psp_allocations}
         
         logger.info(f"Monthly PSP stats query completed, found {len(psp_stats)} PSPs")
         
-        # Get daily breakdown for each PSP
-        daily_breakdown = {}
-        for psp in psp_stats:
-            # Get daily transactions for this PSP - deposits
-            daily_deposits = db.session.query(
-                Transaction.date,
-                func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('daily_deposits'),
-                func.count(Transaction.id).label('deposit_count')
-            ).filter(
-                Transaction.psp == psp.psp,
-                func.upper(Transaction.category).in_(['DEP', 'DEPOSIT', 'INVESTMENT']),
-                Transaction.date >= start_date,
-                Transaction.date <= end_date
-            ).group_by(Transaction.date).all()
-            
-            # Get daily transactions for this PSP - withdrawals
-            daily_withdrawals = db.session.query(
-                Transaction.date,
-                func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('daily_withdrawals'),
-                func.count(Transaction.id).label('withdrawal_count')
-            ).filter(
-                Transaction.psp == psp.psp,
-                func.upper(Transaction.category).in_(['WD', 'WITHDRAW', 'WITHDRAWAL']),
-                Transaction.date >= start_date,
-                Transaction.date <= end_date
-            ).group_by(Transaction.date).all()
-            
-            # Get daily transactions for this PSP - total
-            daily_totals = db.session.query(
-                Transaction.date,
-                func.sum(func.coalesce(Transaction.amount_try, Transaction.amount)).label('daily_total'),
-                func.count(Transaction.id).label('transaction_count')
-            ).filter(
-                Transaction.psp == psp.psp,
-                Transaction.date >= start_date,
-                Transaction.date <= end_date
-            ).group_by(Transaction.date).all()
-            
-            # Get daily allocations for this PSP
-            daily_allocations = db.session.query(
+        # Get daily breakdown for every PSP in one rollup query plus one allocation query
+        daily_rollup = {}
+        for row in psp_rollup_service.get_daily_psp_totals(start_date, end_date):
+            daily_rollup.setdefault(row.psp, {})[row.date] = row
+        
+        monthly_allocations = {}
+        if psp_allocations:
+            for alloc in db.session.query(
+                PSPAllocation.psp_name,
                 PSPAllocation.date,
                 func.sum(PSPAllocation.allocation_amount).label('daily_allocations')
             ).filter(
-                PSPAllocation.psp_name == psp.psp,
                 PSPAllocation.date >= start_date,
                 PSPAllocation.date <= end_date
-            ).group_by(PSPAllocation.date).all()
-            
-            allocations_by_date = {alloc.date: float(alloc.daily_allocations) if alloc.daily_allocations else 0.0 for alloc in daily_allocations}
+            ).group_by(PSPAllocation.psp_name, PSPAllocation.date).all():
+                monthly_allocations.setdefault(alloc.psp_name, {})[alloc.date] = float(alloc.daily_allocations) if alloc.daily_allocations else 0.0
+        
+        daily_breakdown = {}
+        for psp in psp_stats:
+            rollup_by_date = daily_rollup.get(psp.psp, {})
+            allocations_by_date = monthly_allocations.get(psp.psp, {})
             
             # Create lookup dictionaries for deposits and withdrawals
-            deposits_by_date = {dep.date: float(dep.daily_deposits) if dep.daily_deposits else 0.0 for dep in daily_deposits}
-            withdrawals_by_date = {wd.date: float(wd.daily_withdrawals) if wd.daily_withdrawals else 0.0 for wd in daily_withdrawals}
-            totals_by_date = {tot.date: (float(tot.daily_total) if tot.daily_total else 0.0, tot.transaction_count) for tot in daily_totals}
+            deposits_by_date = {day: float(row.deposit_try) if row.deposit_try else 0.0 for day, row in rollup_by_date.items()}
+            withdrawals_by_date = {day: float(row.withdraw_try) if row.withdraw_try else 0.0 for day, row in rollup_by_date.items()}
+            counts_by_date = {day: int(row.transaction_count or 0) for day, row in rollup_by_date.items()}
             
             # Build daily breakdown
             daily_data = []
-            # Get all unique dates from all queries (transactions AND allocations)
-            all_dates = set()
-            for dep in daily_deposits:
-                all_dates.add(dep.date)
-            for wd in daily_withdrawals:
-                all_dates.add(wd.date)
-            for tot in daily_totals:
-                all_dates.add(tot.date)
+            # Get all unique dates (transactions AND allocations)
+            all_dates = set(rollup_by_date)
             # Include dates that have allocations even if no transactions
-            for alloc in daily_allocations:
-                all_dates.add(alloc.date)
+            all_dates.update(allocations_by_date)
             
             for date in sorted(all_dates):
                 daily_deposits_amount = deposits_by_date.get(date, 0.0)
                 daily_withdrawals_amount = withdrawals_by_date.get(date, 0.0)
-                daily_total_amount, transaction_count = totals_by_date.get(date, (0.0, 0))
+                transaction_count = counts_by_date.get(date, 0)
                 daily_total = daily_deposits_amount - daily_withdrawals_amount
                 daily_allocations = allocations_by_date.get(date, 0.0)
                 
@@ -669,18 +462,9 @@ def get_psp_monthly_stats():
                 
                 # Get commission rate for this PSP
                 commission_rate = None
-                try:
-                    from app.models.config import Option
-                    psp_option = Option.query.filter_by(
-                        field_name='psp',
-                        value=psp.psp,
-                        is_active=True
-                    ).first()
-                    
-                    if psp_option and psp_option.commission_rate is not None:
-                        commission_rate = float(psp_option.commission_rate) * 100
-                except Exception:
-                    pass
+                configured_rate = psp_rate_registry.configured_rate(psp.psp)
+                if configured_rate is not None:
+                    commission_rate = float(configured_rate) * 100
                 
                 if commission_rate is not None:
                     daily_commission = daily_total * (commission_rate / 100)
@@ -718,18 +502,9 @@ def get_psp_monthly_stats():
             
             # Get the actual commission rate for this PSP from options (no defaults)
             commission_rate = None
-            try:
-                from app.models.config import Option
-                psp_option = Option.query.filter_by(
-                    field_name='psp',
-                    value=psp.psp,
-                    is_active=True
-                ).first()
-                
-                if psp_option and psp_option.commission_rate is not None:
-                    commission_rate = float(psp_option.commission_rate) * 100  # Convert to percentage
-            except Exception:
-                pass  # Skip if error occurs
+            configured_rate = psp_rate_registry.configured_rate(psp.psp)
+            if configured_rate is not None:
+                commission_rate = float(configured_rate) * 100  # Convert to percentage
             
             # Calculate commission only if rate is available
             if commission_rate is not None:
@@ -752,7 +527,7 @@ def get_psp_monthly_stats():
                 'tahs_tutari': total_allocations,  # TAHS TUTARI (allocation amount)
                 'kasa_top': total_net,  # KASA TOP (revenue = NET + rollover, simplified as NET for monthly)
                 'devir': rollover,  # DEVİR (rollover = kasa_top - tahs_tutari)
-                'transaction_count': psp.transaction_count,
+                'transaction_count': int(psp.transaction_count or 0),
                 'commission_rate': commission_rate,
                 'month': month,
                 'year': year,
@@ -786,12 +561,24 @@ def get_psp_monthly_stats():
 @transactions_api.route("/")
 @login_required
 def get_transactions():
-    """Get all transactions"""
+    """Get transactions newest first.
+
+    Offset mode (``page``/``per_page``) is kept for existing clients. Passing
+    ``cursor`` (or ``pagination=cursor``) switches to keyset pagination on
+    (created_at, id), which costs the same for every page; follow
+    ``pagination.next_cursor`` until ``has_more`` is false. Cursor mode only
+    reports a total when ``include_total=true``, served from a short-lived cache.
+    """
     try:
+        from app import PaginationHelper
+
         # Get query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 25, type=int)
         category = request.args.get('category')
+        cursor = request.args.get('cursor')
+        cursor_mode = bool(cursor) or request.args.get('pagination') == 'cursor'
+        include_total = request.args.get('include_total', 'false' if cursor_mode else 'true').lower() == 'true'
         
         # Get filter parameters
         client = request.args.get('client')
@@ -800,86 +587,66 @@ def get_transactions():
         currency = request.args.get('currency')
         
         # Log all query parameters for debugging
-        logger.debug(f"Query parameters: page={page}, per_page={per_page}, category={category}, client={client}, payment_method={payment_method}, psp={psp}, currency={currency}")
+        logger.debug(f"Query parameters: page={page}, per_page={per_page}, cursor={cursor}, category={category}, client={client}, payment_method={payment_method}, psp={psp}, currency={currency}")
         
         # Build query
         query = Transaction.query
         
-        # Log total transactions before any filters
-        total_before_filters = query.count()
-        logger.debug(f"Total transactions before filters: {total_before_filters}")
-        
         if category:
             query = query.filter(Transaction.category == category)
-            logger.info(f"Applied category filter: {category}")
         
         # Apply additional filters
         if client:
             query = query.filter(Transaction.client_name.ilike(f'%{client}%'))
-            logger.info(f"Applied client filter: {client}")
         
         if payment_method:
             query = query.filter(Transaction.payment_method.ilike(f'%{payment_method}%'))
-            logger.info(f"Applied payment_method filter: {payment_method}")
         
         if psp:
             query = query.filter(Transaction.psp.ilike(f'%{psp}%'))
-            logger.info(f"Applied psp filter: {psp}")
         
         if currency:
             query = query.filter(Transaction.currency == currency)
-            logger.info(f"Applied currency filter: {currency}")
         
-        # Log total transactions after all filters
-        total_after_filters = query.count()
-        logger.debug(f"Total transactions after filters: {total_after_filters}")
+        per_page = min(max(1, per_page), TRANSACTION_LIST_MAX_PER_PAGE)
         
-        # Paginate
-        try:
-            # Force WAL checkpoint to ensure we see latest transactions
-            db.session.execute(text("PRAGMA wal_checkpoint(FULL)"))
-            db.session.commit()
-            
-            # Add debugging to see what transactions are being returned
-            total_count = query.count()
-            logger.debug(f"Total transactions in database: {total_count}")
-            
-            # Check specifically for LEVENT ÇEVİK transactions
-            levents = query.filter(Transaction.client_name.ilike('%LEVENT ÇEVİK%')).order_by(Transaction.created_at.desc()).all()
-            logger.debug(f"LEVENT ÇEVİK transactions found: {len(levents)}")
-            for lev in levents:
-                logger.debug(f"LEVENT: ID={lev.id}, Amount={lev.amount}, Created={lev.created_at}")
-            
-            # Check what's in the pagination results
-            pagination = query.order_by(Transaction.created_at.desc()).paginate(
-                page=page, per_page=per_page, error_out=False
+        total = None
+        total_cached = False
+        if include_total:
+            total, total_cached = _get_cached_transaction_count(
+                query, (category, client, payment_method, psp, currency)
             )
-            
-            # Log the first 10 transactions in pagination to see what's being returned
-            logger.debug(f"First 10 transactions in pagination:")
-            for i, trans in enumerate(pagination.items[:10]):
-                logger.debug(f"  {i+1}. ID={trans.id}, Client={trans.client_name}, Amount={trans.amount}, Created={trans.created_at}")
-            
-            logger.debug(f"Returning {len(pagination.items)} transactions for page {page}")
-            if pagination.items:
-                latest_transaction = pagination.items[0]
-                logger.debug(f"Latest transaction: ID={latest_transaction.id}, Client={latest_transaction.client_name}, Amount={latest_transaction.amount}, Created={latest_transaction.created_at}")
-        except Exception as pagination_error:
-            # Handle pagination error gracefully
-            # Fallback to simple query without pagination
-            transactions_data = query.order_by(Transaction.created_at.desc()).all()
-            pagination = type('obj', (object,), {
-                'items': transactions_data,
-                'total': len(transactions_data),
-                'pages': 1
-            })
+        
+        if cursor_mode:
+            try:
+                result = PaginationHelper.keyset_paginate(
+                    query, Transaction.created_at, Transaction.id,
+                    cursor=cursor, per_page=per_page,
+                    max_per_page=TRANSACTION_LIST_MAX_PER_PAGE
+                )
+            except ValueError as e:
+                return jsonify({
+                    'error': 'Invalid cursor',
+                    'message': str(e)
+                }), 400
+            items = result['items']
+            has_more = result['has_more']
+            next_cursor = result['next_cursor']
+        else:
+            page = max(1, page)
+            rows = query.order_by(
+                Transaction.created_at.desc().nulls_last(), Transaction.id.desc()
+            ).offset((page - 1) * per_page).limit(per_page + 1).all()
+            has_more = len(rows) > per_page
+            items = rows[:per_page]
+            # Lets offset clients switch to cursor mode from any page
+            next_cursor = PaginationHelper.encode_cursor(
+                items[-1].created_at, items[-1].id
+            ) if has_more else None
         
         transactions = []
-        for transaction in pagination.items:
+        for transaction in items:
             try:
-                # Debug logging for specific transactions
-                # Process special transactions without debug output
-                
                 # Calculate commission if not set, using PSP-specific rate but always 0 for WD
                 if transaction.commission:
                     commission = float(transaction.commission)
@@ -893,18 +660,9 @@ def get_transactions():
                         # Try to get PSP-specific commission rate for non-WD transactions
                         commission_rate = None
                         if transaction.psp:
-                            try:
-                                from app.models.config import Option
-                                psp_option = Option.query.filter_by(
-                                    field_name='psp',
-                                    value=transaction.psp,
-                                    is_active=True
-                                ).first()
-                                
-                                if psp_option and psp_option.commission_rate is not None:
-                                    commission_rate = psp_option.commission_rate
-                            except Exception:
-                                pass  # Use 0 rate if error occurs
+                            configured_rate = psp_rate_registry.configured_rate(transaction.psp)
+                            if configured_rate is not None:
+                                commission_rate = configured_rate
                         
                         if commission_rate is not None:
                             commission = float(transaction.amount) * float(commission_rate)
@@ -936,26 +694,50 @@ def get_transactions():
                 # Skip problematic transaction
                 continue
         
-        # Return processed transactions
+        pagination = {
+            'mode': 'cursor' if cursor_mode else 'offset',
+            'per_page': per_page,
+            'total': total,
+            'total_cached': total_cached,
+            'pages': (total + per_page - 1) // per_page if total is not None else None,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+        if not cursor_mode:
+            pagination['page'] = page
         
         return jsonify({
             'transactions': transactions,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination
         })
         
     except Exception as e:
-        # Log error to system logger instead of print
-        import traceback
+        logger.error(f"Error retrieving transactions: {e}")
         return jsonify({
             'error': 'Failed to retrieve transactions',
             'message': str(e)
         }), 500
 
+
+def _get_cached_transaction_count(query, filters):
+    """Count the filtered transaction list, cached briefly per filter set.
+
+    Entries are tagged as transaction data so
+    QueryService.invalidate_transaction_cache() drops them on writes; the TTL
+    bounds staleness for writers that do not invalidate. Returns
+    (total, served_from_cache).
+    """
+    from app.utils.advanced_cache import cache
+
+    cache_key = cache.generate_key('transaction_stats:list_count', *filters)
+    total = cache.get(cache_key)
+    if total is not None:
+        return total, True
+
+    total = query.order_by(None).count()
+    cache.set(cache_key, total, TRANSACTION_COUNT_CACHE_TTL, [TRANSACTION_DATA_TAG])
+    return total, False
+
 @transactions_api.route("/dropdown-options")
 @login_required
 def get_dropdown_options():
@@ -1542,14 +1324,9 @@ def update_transaction(transaction_id):
             logger.info(f"Using manual commission rate: {manual_commission_rate}% (decimal: {commission_rate})")
         elif psp:
             try:
-                from app.models.config import Option
-                psp_option = Option.query.filter_by(
-                    field_name='psp',
-                    value=psp,
-                    is_active=True
-                ).first()
-                if psp_option and psp_option.commission_rate:
-                    commission_rate = psp_option.commission_rate
+                configured_rate = psp_rate_registry.configured_rate(psp)
+                if configured_rate:
+                    commission_rate = configured_rate
                     logger.info(f"Using PSP '{psp}' commission rate: {commission_rate}")
             except Exception as e:
                 logger.warning(f"Error getting PSP commission rate: {e}")
@@ -1806,7 +1583,12 @@ def get_clients_by_date():
 @transactions_api.route("/bulk-import", methods=['POST'])
 @login_required
 def bulk_import_transactions():
-    """Bulk import transactions from CSV/Excel data with improved duplicate handling"""
+    """Bulk import transactions from CSV/Excel data.
+
+    Accepts either a JSON body with a ``transactions`` array or a multipart
+    upload with a CSV/XLSX ``file``. Rows are streamed through the batched
+    import engine, so there is no per-request row cap.
+    """
     try:
         # Enhanced authentication check
         if not current_user.is_authenticated:
@@ -1815,322 +1597,86 @@ def bulk_import_transactions():
                 'message': 'Please log in to import transactions'
             }), 401
         
-        # Log the request for debugging
-        logger.info(f"Bulk import request from user {current_user.username}")
-        
-        # Validate request content type
-        if not request.is_json:
-            return jsonify({
-                'error': 'Invalid content type',
-                'message': 'Request must be JSON'
-            }), 400
-        
-        data = request.get_json()
-        transactions_data = data.get('transactions', [])
+        from app.services.transaction_import_service import transaction_import_service
         
-        if not transactions_data or not isinstance(transactions_data, list):
-            return jsonify({
-                'error': 'Invalid data format',
-                'message': 'transactions must be a non-empty array'
-            }), 400
-        
-        if len(transactions_data) == 0:
-            return jsonify({
-                'error': 'No transactions to import',
-                'message': 'transactions array is empty'
-            }), 400
-        
-        # Limit to prevent abuse
-        if len(transactions_data) > 1000:
-            return jsonify({
-                'error': 'Too many transactions',
-                'message': 'Maximum 1000 transactions per import'
-            }), 400
-        
-        successful_imports = 0
-        failed_imports = 0
-        skipped_duplicates = 0
-        errors = []
-        warnings = []
-        
-        # Track processed transactions to handle duplicates
-        processed_transactions = set()
+        logger.info(f"Bulk import request from user {current_user.username}")
+        import_note = f"Imported on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         
-        for i, transaction_data in enumerate(transactions_data):
+        upload = request.files.get('file')
+        if upload is not None:
+            import os
+            import tempfile
+            from werkzeug.utils import secure_filename
+            
+            extension = os.path.splitext(secure_filename(upload.filename or ''))[1].lower()
+            if extension not in ('.csv', '.xlsx'):
+                return jsonify({
+                    'error': 'Invalid file type',
+                    'message': 'Only CSV and XLSX files can be imported'
+                }), 400
+            
+            # Spool to disk so the readers can stream it row by row
+            fd, temp_path = tempfile.mkstemp(suffix=extension)
+            os.close(fd)
             try:
-                # Enhanced debug logging for ALL transactions
-                logger.info(f"Processing transaction row {i+1}: client='{transaction_data.get('client_name', '')}', amount='{transaction_data.get('amount', '')}', category='{transaction_data.get('category', '')}'")
-                
-                # Debug logging for specific transactions
-                if transaction_data.get('client_name', '').strip() in ['TETHER ALIM', 'KUR FARKI MALİYETİ']:
-                    logger.info(f"Processing special transaction row {i+1}: {transaction_data}")
-                
-                # Create a unique identifier for duplicate detection
-                client_name = transaction_data.get('client_name', '').strip()
-                amount = transaction_data.get('amount', '')
-                date_str = transaction_data.get('date', '')
-                
-                # DISABLED: Duplicate detection for bulk imports
-                # All rows from CSV will be imported without skipping
-                # This ensures complete data import as requested by user
-                
-                # Get other fields for processing
-                psp = transaction_data.get('psp', '').strip()
-                payment_method = transaction_data.get('payment_method', '').strip()
-                category = transaction_data.get('category', '').strip()
-                company = transaction_data.get('company', '').strip()
-                
-                # Validate required fields with more flexible rules
-                if not client_name:
-                    # Try to generate a client name if missing
-                    client_name = f"Unknown_Client_{i+1}"
-                    warnings.append(f"Row {i+1}: Generated client name '{client_name}' for missing client")
-                
-                # Get other fields with improved defaults FIRST (before validation)
-                currency = transaction_data.get('currency', 'TL').strip()
-                notes = transaction_data.get('notes', '').strip()
-                
-                # Improved category handling - accept both DEP and WD
-                if category:
-                    category = category.strip().upper()
-                    if category not in ['DEP', 'WD']:
-                        # Try to map common variations
-                        category_mapping = {
-                            'DEPOSIT': 'DEP',
-                            'WITHDRAW': 'WD',
-                            'WITHDRAWAL': 'WD',
-                            'ÇEKME': 'WD',
-                            'YATIRMA': 'DEP'
-                        }
-                        if category in category_mapping:
-                            category = category_mapping[category]
-                            warnings.append(f"Row {i+1}: Mapped category '{category}' to '{category}'")
-                        else:
-                            # Default to DEP for unknown categories
-                            category = 'DEP'
-                            warnings.append(f"Row {i+1}: Unknown category '{category}', defaulting to 'DEP'")
-                else:
-                    # Default to DEP if no category specified
-                    category = 'DEP'
-                    warnings.append(f"Row {i+1}: No category specified, defaulting to 'DEP'")
-                
-                # Validate amount with more flexible rules (NOW category is defined)
-                logger.info(f"Row {i+1}: Validating amount '{amount}' for category '{category}'")
-                try:
-                    amount_decimal = Decimal(str(amount))
-                    logger.info(f"Row {i+1}: Amount parsed successfully: {amount_decimal}")
-                    
-                    # Allow negative amounts for WD (withdraw) transactions
-                    if category == 'WD':
-                        logger.info(f"Row {i+1}: Processing WD transaction with amount {amount_decimal}")
-                        if amount_decimal == 0:
-                            if client_name in ['TETHER ALIM', 'KUR FARKI MALİYETİ']:
-                                logger.warning(f"Special transaction {client_name} has zero amount - this might be intentional")
-                                warnings.append(f"Row {i+1}: Special transaction {client_name} has zero amount")
-                            else:
-                                logger.error(f"Row {i+1}: WD transaction cannot have zero amount for {client_name}")
-                                errors.append(f"Row {i+1}: Amount cannot be zero for {client_name}")
-                                failed_imports += 1
-                                continue
-                        # For WD transactions, negative amounts are valid (representing money going out)
-                        elif amount_decimal > 0:
-                            # Convert positive WD amounts to negative (money going out)
-                            amount_decimal = -amount_decimal
-                            logger.info(f"Row {i+1}: Converted positive WD amount {amount} to negative {amount_decimal}")
-                    else:
-                        # For DEP transactions, amounts must be positive
-                        logger.info(f"Row {i+1}: Processing DEP transaction with amount {amount_decimal}")
-                        if amount_decimal <= 0:
-                            if client_name in ['TETHER ALIM', 'KUR FARKI MALİYETİ']:
-                                logger.warning(f"Special transaction {client_name} has non-positive amount - this might be intentional")
-                                warnings.append(f"Row {i+1}: Special transaction {client_name} has non-positive amount")
-                            else:
-                                logger.error(f"Row {i+1}: DEP transaction must have positive amount for {client_name}")
-                                errors.append(f"Row {i+1}: DEP transactions must have positive amounts for {client_name}")
-                                failed_imports += 1
-                                continue
-                        
-                except (InvalidOperation, ValueError) as e:
-                    logger.error(f"Row {i+1}: Amount parsing error: {e} for amount '{amount}'")
-                    if client_name in ['TETHER ALIM', 'KUR FARKI MALİYETİ']:
-                        logger.error(f"Special transaction {client_name} has invalid amount format: {amount}")
-                        errors.append(f"Row {i+1}: Special transaction {client_name} has invalid amount format: {amount}")
-                        failed_imports += 1
-                        continue
-                    else:
-                        # Try to fix common amount format issues
-                        try:
-                            # Remove common non-numeric characters
-                            cleaned_amount = str(amount).replace(',', '').replace('₺', '').replace('$', '').replace('€', '').strip()
-                            amount_decimal = Decimal(cleaned_amount)
-                            logger.info(f"Row {i+1}: Fixed amount format from '{amount}' to '{amount_decimal}'")
-                        except (InvalidOperation, ValueError) as e2:
-                            logger.error(f"Row {i+1}: Failed to fix amount format: {e2}")
-                            errors.append(f"Row {i+1}: Invalid amount format '{amount}' for {client_name}")
-                            failed_imports += 1
-                            continue
-                
-                # Currency is already in correct format (TL, USD, EUR)
-                
-                # Parse transaction date with more flexible formats
-                try:
-                    if date_str:
-                        # Handle multiple date formats
-                        date_formats = ['%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y']
-                        transaction_date = None
-                        
-                        for date_format in date_formats:
-                            try:
-                                transaction_date = datetime.strptime(date_str, date_format).date()
-                                break
-                            except ValueError:
-                                continue
-                        
-                        if not transaction_date:
-                            # If all formats fail, use current date
-                            transaction_date = datetime.now().date()
-                            warnings.append(f"Row {i+1}: Invalid date format '{date_str}', using current date")
-                    else:
-                        transaction_date = datetime.now().date()
-                        warnings.append(f"Row {i+1}: No date specified, using current date")
-                except Exception as e:
-                    transaction_date = datetime.now().date()
-                    warnings.append(f"Row {i+1}: Date parsing error, using current date: {str(e)}")
-                
-                # Calculate commission and net amount with improved logic
-                commission = transaction_data.get('commission', 0)
-                net_amount = transaction_data.get('net_amount', 0)
-                
-                # If commission not provided or is 0, derive using PSP-specific rate when available
-                if not commission or commission == 0:
-                    commission_rate: Decimal | None = None
-                    if psp:
-                        try:
-                            from app.models.config import Option
-                            psp_option = Option.query.filter_by(
-                                field_name='psp',
-                                value=psp,
-                                is_active=True
-                            ).first()
-                            if psp_option and psp_option.commission_rate is not None:
-                                commission_rate = psp_option.commission_rate
-                                logger.info(f"Using PSP '{psp}' commission rate: {commission_rate} for amount: {amount_decimal}")
-                            else:
-                                logger.warning(f"No commission rate found for PSP '{psp}'")
-                        except Exception as e:
-                            logger.warning(f"Error fetching PSP commission rate for '{psp}': {e}")
-                    
-                    if category == 'WD':
-                        # WD transactions always have 0 commission
-                        commission = Decimal('0')
-                        logger.info(f"WD transaction - setting commission to 0 for amount: {amount_decimal}")
-                    elif commission_rate is not None:
-                        # Calculate commission based on absolute amount for DEP transactions
-                        commission = abs(amount_decimal) * commission_rate
-                        logger.info(f"Calculated commission: {commission} for amount: {amount_decimal}")
-                    else:
-                        commission = Decimal('0')
-                        logger.warning(f"No commission rate available for PSP '{psp}', setting commission to 0")
-                
-                # Always calculate net amount as amount - commission
-                net_amount = amount_decimal - commission
-                logger.info(f"Final values - Amount: {amount_decimal}, Commission: {commission}, Net: {net_amount}")
-                
-                # Add import timestamp to notes to distinguish from existing transactions
-                import_note = f"Imported on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                if notes:
-                    notes = f"{notes} | {import_note}"
-                else:
-                    notes = import_note
-                
-                # Create transaction with improved data
-                logger.info(f"Row {i+1}: Creating transaction object for {client_name} with amount {amount_decimal}")
-                transaction = Transaction(
-                    client_name=client_name,
-                    company=company or 'Unknown',
-                    payment_method=payment_method or 'Unknown',
-                    category=category,
-                    amount=amount_decimal,
-                    commission=commission,
-                    net_amount=net_amount,
-                    currency=currency,
-                    psp=psp or 'Unknown',
-                    notes=notes,
-                    date=transaction_date,
-                    created_by=current_user.id,
-                    created_at=datetime.now(),
-                    updated_at=datetime.now()
+                upload.save(temp_path)
+                result = transaction_import_service.import_file(
+                    temp_path, current_user.id, note_suffix=import_note
                 )
-                
-                logger.info(f"Row {i+1}: Adding transaction to session")
-                db.session.add(transaction)
-                successful_imports += 1
-                logger.info(f"Row {i+1}: Transaction added successfully, total successful: {successful_imports}")
-                
-                # DISABLED: No longer tracking processed transactions since duplicate detection is disabled
-                # processed_transactions.add(duplicate_key)
-                
-            except Exception as e:
-                logger.error(f"Row {i+1}: Exception during processing: {type(e).__name__}: {str(e)}")
-                logger.error(f"Row {i+1}: Full error details: {e}")
-                if hasattr(e, '__traceback__'):
-                    import traceback
-                    logger.error(f"Row {i+1}: Traceback: {traceback.format_exc()}")
-                errors.append(f"Row {i+1}: {str(e)}")
-                failed_imports += 1
-                continue
-        
-        # Commit all successful transactions
-        logger.info(f"Import processing complete. Attempting to commit {successful_imports} transactions to database")
-        if successful_imports > 0:
-            try:
-                db.session.commit()
-                logger.info(f"Successfully committed {successful_imports} transactions to database")
-                
-                # Invalidate cache after bulk import
-                try:
-                    from app.services.query_service import QueryService
-                    QueryService.invalidate_transaction_cache()
-                    logger.info("Cache invalidated after API bulk import")
-                except Exception as cache_error:
-                    logger.warning(f"Failed to invalidate cache after API bulk import: {cache_error}")
-                    
-            except Exception as commit_error:
-                logger.error(f"Database commit failed: {commit_error}")
-                db.session.rollback()
-                return jsonify({
-                    'error': 'Database commit failed',
-                    'message': f'Import failed during database commit: {str(commit_error)}'
-                }), 500
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
         else:
-            logger.warning("No transactions to commit - all failed validation")
+            # Validate request content type
+            if not request.is_json:
+                return jsonify({
+                    'error': 'Invalid content type',
+                    'message': 'Request must be JSON or a multipart file upload'
+                }), 400
+            
+            data = request.get_json()
+            transactions_data = data.get('transactions', [])
+            
+            if not transactions_data or not isinstance(transactions_data, list):
+                return jsonify({
+                    'error': 'Invalid data format',
+                    'message': 'transactions must be a non-empty array'
+                }), 400
+            
+            result = transaction_import_service.import_rows(
+                (row if isinstance(row, dict) else {} for row in transactions_data),
+                current_user.id,
+                note_suffix=import_note
+            )
+        
+        successful_imports = result['successful_imports']
+        failed_imports = result['failed_imports']
+        logger.info(
+            f"Bulk import finished: {successful_imports} successful, {failed_imports} failed "
+            f"({result['rows_per_second']} rows/s)"
+        )
         
         # Prepare response with detailed information
-        logger.info(f"Preparing response: {successful_imports} successful, {failed_imports} failed, 0 duplicates (duplicate detection disabled)")
         response_data = {
             'success': True,
             'message': f'Import completed: {successful_imports} successful, {failed_imports} failed (all CSV rows imported)',
             'data': {
-                'total_rows': len(transactions_data),
+                'total_rows': result['total_rows'],
                 'successful_imports': successful_imports,
                 'failed_imports': failed_imports,
                 'skipped_duplicates': 0,  # Always 0 since duplicate detection is disabled
-                'errors': errors[:20],  # Limit errors to first 20
-                'warnings': warnings[:20]  # Limit warnings to first 20
+                'errors': result['errors'][:20],  # Limit errors to first 20
+                'warnings': result['warnings'][:20],  # Limit warnings to first 20
+                'duration_seconds': result['duration_seconds'],
+                'rows_per_second': result['rows_per_second']
             }
         }
         
         # Add summary statistics
         if successful_imports > 0:
             response_data['data']['summary'] = {
-                'total_amount': sum(t.amount for t in db.session.query(Transaction).filter(
-                    Transaction.created_by == current_user.id,
-                    Transaction.created_at >= datetime.now() - timedelta(minutes=5)
-                ).all()),
-                'categories_imported': list(set(t.category for t in db.session.query(Transaction).filter(
-                    Transaction.created_by == current_user.id,
-                    Transaction.created_at >= datetime.now() - timedelta(minutes=5)
-                ).all()))
+                'total_amount': result['total_amount'],
+                'categories_imported': result['categories_imported']
             }
         
         return jsonify(response_data), 200
@@ -2189,8 +1735,10 @@ def bulk_delete_transactions():
                 'message': 'Database is already empty'
             }), 400
         
-        # Delete all transactions
+        # Delete all transactions (bulk delete bypasses the ORM rollup hook)
+        from app.services.psp_rollup_service import psp_rollup_service
         Transaction.query.delete()
+        psp_rollup_service.clear()
         db.session.commit()
         
         logger.info(f"Successfully deleted {transaction_count} transactions by user {current_user.username}")
@@ -6,6 +6,7 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.services.enhanced_cache_service import cache_service, CacheKey
 from app.services.event_service import event_service, EventType
+from app.utils.advanced_cache import cache_invalidate
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,7 +34,11 @@ def get_cache_stats():
 @cache_api.route('/invalidate', methods=['POST'])
 @login_required
 def invalidate_cache():
-    """Invalidate cache by pattern"""
+    """Invalidate cache entries whose key contains pattern (or matches it, for globs)
+
+    Applies to every service's entries in both cache tiers, so ``user:1``
+    also clears ``user:12``.
+    """
     try:
         data = request.get_json()
         pattern = data.get('pattern')
@@ -45,7 +50,13 @@ def invalidate_cache():
         if not current_user.role == 'admin':
             return jsonify({'error': 'Insufficient permissions'}), 403
         
-        invalidated_count = cache_service.invalidate_pattern(pattern)
+        invalidated_count = cache_invalidate(pattern)
+        if invalidated_count:
+            event_service.publish_event(
+                EventType.CACHE_INVALIDATED,
+                {'pattern': pattern, 'keys_count': invalidated_count},
+                source='cache_api'
+            )
         
         return jsonify({
             'status': 'success',
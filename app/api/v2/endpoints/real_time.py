@@ -34,12 +34,16 @@ def connect_info():
                 f'psp_track_{current_user.id}'
             ],
             'events': [
-                'transaction_update',
-                'financial_update',
-                'psp_track_update',
+                'transaction_update_batch',
+                'financial_update_batch',
+                'psp_track_update_batch',
                 'system_alert',
                 'notification',
-                'analytics_update'
+                'analytics_update',
+                'analytics_update_delta',
+                'analytics_broadcast',
+                'dashboard_update',
+                'dashboard_update_delta'
             ]
         })
     except Exception as e:
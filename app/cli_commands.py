@@ -116,6 +116,34 @@ def standardize():
     except Exception as e:
         click.echo(f"❌ Error standardizing currencies: {e}")
 
+@currency.command('backfill-rates')
+@with_appcontext
+@click.option('--currency', 'currency_code', default='USD', show_default=True, help='Currency to backfill (USD, EUR)')
+@click.option('--start', 'start_date', default=None, help='First day (YYYY-MM-DD); defaults to the oldest transaction in that currency')
+@click.option('--end', 'end_date', default=None, help='Last day (YYYY-MM-DD); defaults to today')
+def backfill_rates(currency_code, start_date, end_date):
+    """Store historical daily exchange rates with a single fetch."""
+    from app import db
+    from app.models.transaction import Transaction
+    from app.services.exchange_rate_service import exchange_rate_service
+
+    try:
+        if start_date is None:
+            start_date = db.session.query(db.func.min(Transaction.date)).filter(
+                Transaction.currency == currency_code.upper()
+            ).scalar()
+            if start_date is None:
+                click.echo(f"ℹ️  No {currency_code.upper()} transactions found; pass --start")
+                return
+
+        click.echo(f"📈 Backfilling {currency_code.upper()}/TRY rates from {start_date}...")
+        result = exchange_rate_service.backfill_history(currency_code, start_date, end_date)
+        click.echo(f"✅ Fetched {result['fetched_days']} days, stored {result['inserted_days']} new daily rates")
+        click.echo(f"   Range: {result['start_date']} -> {result['end_date']}")
+
+    except Exception as e:
+        click.echo(f"❌ Error backfilling exchange rates: {e}")
+
 @click.group()
 def database():
     """Database management commands."""
@@ -167,6 +195,100 @@ def backup():
     except Exception as e:
         click.echo(f"❌ Error creating backup: {e}")
 
+@database.command('rebuild-rollup')
+@with_appcontext
+def rebuild_rollup():
+    """Rebuild the daily PSP rollup from all transactions."""
+    click.echo("🔄 Rebuilding daily PSP rollup...")
+    
+    try:
+        from app.services.psp_rollup_service import psp_rollup_service
+        from app.models.financial import DailyPspRollup
+        from app import db
+        
+        DailyPspRollup.__table__.create(bind=db.engine, checkfirst=True)
+        result = psp_rollup_service.rebuild()
+        
+        click.echo(f"✅ Rollup rebuilt: {result['rollup_rows']} rows in {result['duration_seconds']}s")
+        
+    except Exception as e:
+        click.echo(f"❌ Error rebuilding daily PSP rollup: {e}")
+
+@database.command('rebuild-psp-track')
+@with_appcontext
+def rebuild_psp_track():
+    """Rebuild every PSP Track row from transactions in one transaction."""
+    click.echo("🔄 Rebuilding PSP Track...")
+    
+    try:
+        from app.services.data_sync_service import DataSyncService
+        
+        result = DataSyncService.rebuild_psp_track()
+        
+        click.echo(f"✅ PSP Track rebuilt: {result['psp_track_rows']} rows "
+                   f"(replaced {result['removed']}) in {result['duration_seconds']}s")
+        
+    except Exception as e:
+        click.echo(f"❌ Error rebuilding PSP Track: {e}")
+
+@database.command('backfill-transactions')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows recomputed and committed per chunk.')
+@click.option('--dry-run', is_flag=True, help='Report what would change without writing.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and rescan from the first transaction.')
+@with_appcontext
+def backfill_transactions(batch_size, dry_run, restart):
+    """Recompute TL amounts and WD net amounts in resumable chunks."""
+    click.echo(f"🔄 Backfilling transactions{' (dry run)' if dry_run else ''}...")
+    
+    def report(progress):
+        click.echo(f"   ... {progress['processed']} rows, {progress['updated']} to update, "
+                   f"last id {progress['last_id']} ({progress['rows_per_second']} rows/s)")
+    
+    try:
+        from app.services.transaction_backfill_service import transaction_backfill_service
+        
+        result = transaction_backfill_service.run(
+            batch_size=batch_size, dry_run=dry_run, restart=restart, progress_callback=report
+        )
+        
+        verb = 'Would update' if dry_run else 'Updated'
+        click.echo(f"✅ {verb} {result['updated']} of {result['processed']} rows "
+                   f"({result['errors']} without a rate) in {result['duration_seconds']}s, "
+                   f"{result['rows_per_second']} rows/s")
+        
+    except Exception as e:
+        click.echo(f"❌ Error backfilling transactions: {e}")
+        click.echo("   Re-run the command to resume from the last committed chunk")
+
+@click.group()
+def events():
+    """Event stream commands."""
+    pass
+
+@events.command()
+@click.option('--batch-size', default=100, show_default=True, help='Events read and acknowledged per batch.')
+@click.option('--block-ms', default=1000, show_default=True, help='How long each read waits for new events.')
+@click.option('--claim-idle-ms', default=60000, show_default=True,
+              help='Reclaim events left unacknowledged by other consumers for this long.')
+@with_appcontext
+def worker(batch_size, block_ms, claim_idle_ms):
+    """Consume the event stream through the consumer group until interrupted."""
+    from app.services.event_service import event_service
+    
+    info = event_service.get_stream_info()
+    if info.get('transport') != 'redis':
+        click.echo("⚠️  Redis is not enabled; the in-memory event stream cannot be consumed from another process")
+        return
+    if not any(event_service.worker_handlers.values()):
+        click.echo("⚠️  No worker handlers are registered; leaving the event stream unacknowledged")
+        return
+    
+    click.echo(f"🔄 Consuming {event_service.stream_name} as {event_service.consumer_name}...")
+    try:
+        event_service.run_worker(batch_size=batch_size, block_ms=block_ms, claim_idle_ms=claim_idle_ms)
+    except KeyboardInterrupt:
+        click.echo("✅ Event worker stopped")
+
 @click.group()
 def performance():
     """Performance monitoring and optimization commands."""
@@ -258,4 +380,5 @@ def init_cli_commands(app):
     """Initialize CLI commands for the Flask app."""
     app.cli.add_command(currency)
     app.cli.add_command(database)
+    app.cli.add_command(events)
     app.cli.add_command(performance)
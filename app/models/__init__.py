@@ -5,12 +5,14 @@ from .user import User
 from .transaction import Transaction
 from .audit import AuditLog, UserSession, LoginAttempt
 from .config import Option, ExchangeRate, UserSettings
-from .financial import PspTrack, DailyBalance, PSPAllocation
+from .financial import PspTrack, DailyBalance, PSPAllocation, DailyPspRollup
+from .job import JobCheckpoint
 
 # Import all models to ensure they are registered with SQLAlchemy
 __all__ = [
     'User', 'Transaction',
     'AuditLog', 'UserSession', 'LoginAttempt',
     'Option', 'ExchangeRate', 'UserSettings',
-    'PspTrack', 'DailyBalance', 'PSPAllocation'
+    'PspTrack', 'DailyBalance', 'PSPAllocation', 'DailyPspRollup',
+    'JobCheckpoint'
 ] 
\ No newline at end of file
@@ -58,6 +58,7 @@ class ExchangeRate(db.Model):
         Index('idx_currency_pair_created', 'currency_pair', 'created_at'),
         Index('idx_currency_pair_active', 'currency_pair', 'is_active'),
         Index('idx_created_at', 'created_at'),
+        Index('idx_currency_pair_date', 'currency_pair', 'date'),
     )
     
     def __init__(self, currency_pair, rate, source='yfinance', is_active=True, 
@@ -137,4 +137,65 @@ class PSPAllocation(db.Model):
         }
     
     def __repr__(self):
-        return f'<PSPAllocation {self.date}:{self.psp_name}:{self.allocation_amount}>' 
\ No newline at end of file
+        return f'<PSPAllocation {self.date}:{self.psp_name}:{self.allocation_amount}>' 
+
+
+class DailyPspRollup(db.Model):
+    """Materialized per-(date, PSP, currency) transaction totals.
+
+    Maintained by PspRollupService in the same database transaction as the
+    Transaction writes it summarizes, so analytics can read O(days x PSPs)
+    rows instead of scanning the transaction table.
+    """
+    __tablename__ = 'daily_psp_rollup'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    psp = db.Column(db.String(50), nullable=True)
+    currency = db.Column(db.String(10), nullable=True)
+    transaction_count = db.Column(db.Integer, default=0)
+    deposit_count = db.Column(db.Integer, default=0)
+    withdraw_count = db.Column(db.Integer, default=0)
+    # Totals in the transaction currency
+    deposit_amount = db.Column(db.Numeric(18, 2), default=0.0)
+    withdraw_amount = db.Column(db.Numeric(18, 2), default=0.0)
+    commission_amount = db.Column(db.Numeric(18, 2), default=0.0)
+    net_amount = db.Column(db.Numeric(18, 2), default=0.0)
+    # TRY equivalents (falling back to the original amount when not converted)
+    deposit_try = db.Column(db.Numeric(18, 2), default=0.0)
+    withdraw_try = db.Column(db.Numeric(18, 2), default=0.0)
+    other_try = db.Column(db.Numeric(18, 2), default=0.0)  # Signed total for rows without DEP/WD category
+    commission_try = db.Column(db.Numeric(18, 2), default=0.0)
+    net_amount_try = db.Column(db.Numeric(18, 2), default=0.0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        db.UniqueConstraint('date', 'psp', 'currency', name='uq_daily_psp_rollup_key'),
+        db.Index('idx_daily_psp_rollup_date', 'date'),
+        db.Index('idx_daily_psp_rollup_psp_date', 'psp', 'date'),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'date': self.date.isoformat() if self.date else None,
+            'psp': self.psp,
+            'currency': self.currency,
+            'transaction_count': self.transaction_count or 0,
+            'deposit_count': self.deposit_count or 0,
+            'withdraw_count': self.withdraw_count or 0,
+            'deposit_amount': float(self.deposit_amount) if self.deposit_amount else 0.0,
+            'withdraw_amount': float(self.withdraw_amount) if self.withdraw_amount else 0.0,
+            'commission_amount': float(self.commission_amount) if self.commission_amount else 0.0,
+            'net_amount': float(self.net_amount) if self.net_amount else 0.0,
+            'deposit_try': float(self.deposit_try) if self.deposit_try else 0.0,
+            'withdraw_try': float(self.withdraw_try) if self.withdraw_try else 0.0,
+            'other_try': float(self.other_try) if self.other_try else 0.0,
+            'commission_try': float(self.commission_try) if self.commission_try else 0.0,
+            'net_amount_try': float(self.net_amount_try) if self.net_amount_try else 0.0,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<DailyPspRollup {self.date}:{self.psp}:{self.currency}:{self.transaction_count}>'
@@ -0,0 +1,69 @@
+"""
+Job models for resumable batch work (imports, backfills, syncs)
+"""
+from app import db
+from datetime import datetime, timezone
+import json
+
+class JobCheckpoint(db.Model):
+    """Persisted progress of a resumable batch job.
+
+    ``position`` is the job's resume point (rows consumed, last processed id,
+    ...); it is committed together with the work it covers so a restarted
+    job continues where the last committed chunk ended.
+    """
+    __tablename__ = 'job_checkpoint'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_key = db.Column(db.String(255), nullable=False, unique=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'failed', 'completed'
+    position = db.Column(db.Integer, nullable=False, default=0)
+    processed_count = db.Column(db.Integer, nullable=False, default=0)
+    success_count = db.Column(db.Integer, nullable=False, default=0)
+    failure_count = db.Column(db.Integer, nullable=False, default=0)
+    state = db.Column(db.Text)  # JSON string of job specific state
+    last_error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_job_checkpoint_type_status', 'job_type', 'status'),
+    )
+
+    def get_state(self):
+        """Decode the JSON state, empty dict when unset"""
+        if not self.state:
+            return {}
+        try:
+            return json.loads(self.state)
+        except (TypeError, ValueError):
+            return {}
+
+    def set_state(self, value):
+        """Store job specific state as JSON"""
+        self.state = json.dumps(value, default=str) if value is not None else None
+
+    def to_dict(self):
+        """Convert checkpoint to dictionary"""
+        return {
+            'id': self.id,
+            'job_key': self.job_key,
+            'job_type': self.job_type,
+            'status': self.status,
+            'position': self.position,
+            'processed_count': self.processed_count,
+            'success_count': self.success_count,
+            'failure_count': self.failure_count,
+            'state': self.get_state(),
+            'last_error': self.last_error,
+            'created_by': self.created_by,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+    def __repr__(self):
+        return f'<JobCheckpoint {self.job_key}:{self.status}@{self.position}>'
@@ -48,6 +48,9 @@ class Transaction(db.Model):
         db.Index('idx_transaction_created_at', 'created_at'),
         db.Index('idx_transaction_created_by', 'created_by'),
         
+        # Change feed: (updated_at, id) high-water mark scans
+        db.Index('idx_transaction_updated_at_id', 'updated_at', 'id'),
+        
         # Composite indexes for common query patterns
         db.Index('idx_transaction_date_psp', 'date', 'psp'),
         db.Index('idx_transaction_date_category', 'date', 'category'),
@@ -143,6 +143,10 @@ class User(UserMixin, db.Model):
     def get_permissions(self):
         """Get admin permissions as dictionary"""
         import json
+        # Parsed once per principal (see principal_service) while the column is unchanged
+        principal = getattr(self, 'principal', None)
+        if principal is not None and principal.columns.get('admin_permissions') == self.admin_permissions:
+            return dict(principal.permissions)
         if self.admin_permissions:
             try:
                 return json.loads(self.admin_permissions)
@@ -939,32 +939,32 @@ def handle_join_analytics(data):
     join_room(room)
     # Client joined analytics room
 
+def _emit_snapshot(channel, event_name, data):
+    """Subscribe the requester to the channel's shared room and send it the full snapshot.
+    
+    Later changes reach the room as `<event_name>_delta` merge patches,
+    built once per room and broadcast tick. Both carry the `days` covered;
+    ranges without a shared room raise ValueError.
+    """
+    from app.services.real_time_service import snapshot_fanout, snapshot_window
+    
+    days = snapshot_window((data or {}).get('days'))
+    subscription = snapshot_fanout.subscribe(channel, days)
+    emit(event_name, {
+        **subscription['data'],
+        'room': subscription['room'],
+        'version': subscription['version'],
+        'timestamp': datetime.now().isoformat()
+    })
+
 @socketio.on('request_analytics')
 def handle_analytics_request(data):
     """Handle analytics data request via WebSocket"""
     try:
-        days = data.get('days', 30)
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get recent transactions
-        transactions = Transaction.query.filter(
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).all()
-        
-        # Calculate real-time metrics
-        total_amount = sum(t.amount for t in transactions)
-        total_commission = sum(t.commission for t in transactions)
-        
-        # Emit real-time data
-        emit('analytics_update', {
-            'total_amount': float(total_amount),
-            'total_commission': float(total_commission),
-            'transaction_count': len(transactions),
-            'timestamp': datetime.now().isoformat()
-        }, room='analytics')
+        _emit_snapshot('analytics', 'analytics_update', data)
         
+    except ValueError as e:
+        emit('analytics_error', {'error': str(e)})
     except Exception as e:
         logger.error(f"Error in WebSocket analytics: {str(e)}")
         emit('analytics_error', {'error': 'Failed to load analytics data'})
@@ -980,63 +980,28 @@ def handle_join_dashboard(data):
 def handle_dashboard_request(data):
     """Handle dashboard data request via WebSocket"""
     try:
-        days = data.get('days', 30)
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get recent transactions
-        transactions = Transaction.query.filter(
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).all()
-        
-        # Calculate dashboard metrics
-        total_amount = sum(t.amount for t in transactions)
-        total_commission = sum(t.commission for t in transactions)
-        total_net = sum(t.net_amount for t in transactions)
-        
-        # Get today's transactions
-        today = date.today()
-        today_transactions = [t for t in transactions if t.date == today]
-        today_amount = sum(t.amount for t in today_transactions)
-        today_commission = sum(t.commission for t in today_transactions)
-        
-        # Emit real-time data
-        emit('dashboard_update', {
-            'total_amount': float(total_amount),
-            'total_commission': float(total_commission),
-            'total_net': float(total_net),
-            'transaction_count': len(transactions),
-            'today_amount': float(today_amount),
-            'today_commission': float(today_commission),
-            'today_count': len(today_transactions),
-            'timestamp': datetime.now().isoformat()
-        }, room='dashboard')
+        _emit_snapshot('dashboard', 'dashboard_update', data)
         
+    except ValueError as e:
+        emit('dashboard_error', {'error': str(e)})
     except Exception as e:
         logger.error(f"Error in WebSocket dashboard: {str(e)}")
         emit('dashboard_error', {'error': 'Failed to load dashboard data'})
 
 def broadcast_analytics_update():
-    """Broadcast analytics update to all connected clients"""
+    """Broadcast analytics update to all connected clients.
+    
+    Emits the 30 day totals as `analytics_broadcast` and marks the shared
+    snapshots dirty; the fan-out rebuilds each subscribed room once on its
+    next tick and emits the delta.
+    """
     try:
-        # Get recent data
-        end_date = date.today()
-        start_date = end_date - timedelta(days=30)
-        
-        transactions = Transaction.query.filter(
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).all()
-        
-        total_amount = sum(t.amount for t in transactions)
-        total_commission = sum(t.commission for t in transactions)
+        from app.services.real_time_service import snapshot_fanout, build_analytics_snapshot
+        snapshot_fanout.mark_dirty()
         
         # Broadcast to all rooms
         socketio.emit('analytics_broadcast', {
-            'total_amount': float(total_amount),
-            'total_commission': float(total_commission),
-            'transaction_count': len(transactions),
+            **build_analytics_snapshot(30),
             'timestamp': datetime.now().isoformat()
         })
         
@@ -8,8 +8,6 @@ from sqlalchemy import func, extract, desc, and_, or_
 import pandas as pd
 from werkzeug.utils import secure_filename
 import os
-import csv
-from io import StringIO
 import json
 from decimal import Decimal, InvalidOperation
 from collections import defaultdict
@@ -22,6 +20,7 @@ from app.models.config import Option, ExchangeRate
 from app.models.financial import PspTrack, DailyBalance
 # from app.services.performance_optimized_service import performance_optimized_service
 from app.services.decimal_float_fix_service import decimal_float_service
+from app.services.psp_options_service import psp_rate_registry
 from app.utils.template_helpers import legacy_ultimate_tojson, safe_template_data
 from app.services.json_auto_fix_service import json_auto_fix_service
 from app.services.datetime_fix_service import datetime_fix_service, fix_template_data_dates
@@ -185,23 +184,20 @@ def secure_filename_upload(file):
     return f"{name}_{timestamp}{ext}"
 
 def log_audit(action, table_name, record_id, old_values=None, new_values=None):
-    """Log audit trail"""
+    """Log audit trail (queued; written in batches by the audit writer)"""
     try:
-        from app.models.audit import AuditLog
-        audit_log = AuditLog(
+        from app.services.audit_service import audit_writer
+        audit_writer.log(
             user_id=current_user.id,
             action=action,
             table_name=table_name,
             record_id=record_id,
-            old_values=json.dumps(old_values) if old_values else None,
-            new_values=json.dumps(new_values) if new_values else None,
+            old_values=old_values,
+            new_values=new_values,
             ip_address=request.remote_addr
         )
-        db.session.add(audit_log)
-        db.session.commit()
     except Exception as e:
         logger.error(f"Failed to log audit: {str(e)}")
-        db.session.rollback()
 
 def calculate_commission(amount, psp, category=None):
     """Calculate commission based on PSP and category"""
@@ -212,14 +208,10 @@ def calculate_commission(amount, psp, category=None):
             return Decimal('0')
         
         # Get commission rate from PSP options for DEP transactions
-        option = Option.query.filter_by(
-            field_name='psp',
-            value=psp,
-            is_active=True
-        ).first()
-        
-        if option and option.commission_rate:
-            commission = amount * option.commission_rate
+        commission_rate = psp_rate_registry.configured_rate(psp)
+        
+        if commission_rate:
+            commission = amount * commission_rate
             return commission
         else:
             # Default commission rate of 2.5% for DEP transactions
@@ -637,15 +629,18 @@ def api_delete_transaction(id):
 @transactions_bp.route('/api/sync-psp-track', methods=['POST'])
 @login_required
 def api_sync_psp_track():
-    """Manual API endpoint to sync PSP Track data"""
+    """Manual API endpoint to sync PSP Track data (?full=true rebuilds every row)"""
     try:
         from app.services.data_sync_service import DataSyncService
         
+        full = request.args.get('full', 'false').lower() == 'true'
+        
         # Get current transaction count
         transaction_count = Transaction.query.count()
         
         # Sync PSP Track data
-        DataSyncService.sync_psp_track_from_transactions()
+        if not DataSyncService.sync_psp_track_from_transactions(full=full):
+            raise RuntimeError('PSP Track sync failed, see logs for details')
         
         # Get new PSP Track count
         from app.models.financial import PspTrack
@@ -1061,8 +1056,15 @@ def import_transactions():
 @login_required
 @handle_errors
 def export_transactions():
-    """Export transactions to CSV"""
+    """Export transactions to CSV (or XLSX with format=xlsx, gzipped with gzip=1)"""
     try:
+        from app.services.export_service import (
+            export_service, format_date, format_datetime, format_number, format_text
+        )
+        
+        export_format = request.args.get('format', 'csv').lower()
+        compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+        
         # Build query
         query = Transaction.query
         
@@ -1072,44 +1074,34 @@ def export_transactions():
         # Order by date (newest first)
         query = query.order_by(desc(Transaction.date))
         
-        transactions = query.all()
-        
-        # Create CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
-            'ID', 'Client Name', 'IBAN', 'Payment Method', 'Company Order',
-            'Date', 'Category', 'Amount', 'Commission', 'Net Amount',
-            'Currency', 'PSP', 'Notes', 'Created At'
+        columns = [
+            ('ID', None),
+            ('Client Name', None),
+            ('Company', format_text),
+            ('Payment Method', format_text),
+            ('Date', format_date),
+            ('Category', format_text),
+            ('Amount', format_number),
+            ('Commission', format_number),
+            ('Net Amount', format_number),
+            ('Currency', None),
+            ('PSP', format_text),
+            ('Notes', format_text),
+            ('Created At', format_datetime)
+        ]
+        
+        # Rows are read as plain tuples in batches while the response streams
+        rows = export_service.iter_query_rows(query, [
+            Transaction.id, Transaction.client_name, Transaction.company,
+            Transaction.payment_method, Transaction.date,
+            Transaction.category, Transaction.amount, Transaction.commission,
+            Transaction.net_amount, Transaction.currency, Transaction.psp,
+            Transaction.notes, Transaction.created_at
         ])
         
-        # Write data
-        for transaction in transactions:
-            writer.writerow([
-                transaction.id,
-                transaction.client_name,
-                transaction.iban or '',
-                transaction.payment_method or '',
-                transaction.company_order or '',
-                transaction.date.strftime('%Y-%m-%d'),
-                transaction.category or '',
-                float(transaction.amount),
-                float(transaction.commission),
-                float(transaction.net_amount),
-                transaction.currency,
-                transaction.psp or '',
-                transaction.notes or '',
-                transaction.created_at.strftime('%Y-%m-%d %H:%M:%S') if transaction.created_at else ''
-            ])
-        
-        # Create response
-        output.seek(0)
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': 'attachment; filename=transactions.csv'}
+        return export_service.stream_response(
+            'transactions', columns, rows,
+            export_format=export_format, compress=compress, sheet_title='Transactions'
         )
         
     except Exception as e:
@@ -0,0 +1,178 @@
+"""
+Audit Service for PipLine Treasury System
+Queues audit records in-process and writes them in batched inserts
+"""
+import atexit
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app import db
+from app.models.audit import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# Queued records that trigger an immediate flush
+AUDIT_FLUSH_SIZE = 200
+
+# Seconds between background flushes
+AUDIT_FLUSH_INTERVAL = 2.0
+
+# Records kept queued while the database refuses writes; beyond this the
+# oldest are dropped (and logged) rather than growing without bound
+AUDIT_QUEUE_LIMIT = 50000
+
+ALLOWED_ACTIONS = ('CREATE', 'UPDATE', 'DELETE', 'LOGIN', 'LOGOUT')
+
+
+class AuditWriter:
+    """Batched, asynchronous AuditLog writer.
+
+    ``log`` only serializes the record and queues it, so the request's
+    own commit is the only write on the mutation path. A background
+    thread inserts queued records with one multi-row INSERT on its own
+    connection whenever AUDIT_FLUSH_SIZE records are waiting or every
+    AUDIT_FLUSH_INTERVAL seconds. The queue is flushed at interpreter exit.
+    """
+
+    def __init__(self, flush_size: int = AUDIT_FLUSH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.app = None
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'flush_errors': 0, 'last_flush': None}
+        atexit.register(self.flush)
+
+    def init_app(self, app):
+        """Bind to the app whose engine the background flushes use"""
+        self.app = app
+        self.flush_size = app.config.get('AUDIT_FLUSH_SIZE', self.flush_size)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+
+    def log(self, user_id: int, action: str, table_name: str, record_id: int,
+            old_values: Optional[Dict[str, Any]] = None, new_values: Optional[Dict[str, Any]] = None,
+            ip_address: Optional[str] = None):
+        """Queue one audit record"""
+        if action not in ALLOWED_ACTIONS:
+            raise ValueError(f'Action must be one of: {list(ALLOWED_ACTIONS)}')
+
+        record = {
+            'user_id': user_id,
+            'action': action,
+            'table_name': table_name,
+            'record_id': record_id,
+            'old_values': json.dumps(old_values, default=str) if old_values else None,
+            'new_values': json.dumps(new_values, default=str) if new_values else None,
+            'timestamp': datetime.now(timezone.utc),
+            'ip_address': ip_address
+        }
+
+        with self._lock:
+            self._queue.append(record)
+            self.stats['queued'] += 1
+            if len(self._queue) > AUDIT_QUEUE_LIMIT:
+                dropped = self._queue.popleft()
+                self.stats['dropped'] += 1
+                logger.error(f"Audit queue full, dropped {dropped['action']} on "
+                             f"{dropped['table_name']}:{dropped['record_id']}")
+            depth = len(self._queue)
+
+        if self.app is None:
+            # Not bound to an app (scripts, shell): write through
+            self.flush()
+            return
+
+        self._ensure_thread()
+        if depth >= self.flush_size:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Insert everything queued; returns the number of records written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._queue:
+                    return 0
+                batch: List[Dict[str, Any]] = list(self._queue)
+                self._queue.clear()
+
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        written = self._write(batch)
+                else:
+                    written = self._write(batch)
+            except Exception as e:
+                # Database unavailable or locked: keep the batch for the next flush
+                self.stats['flush_errors'] += 1
+                logger.error(f"Failed to write {len(batch)} audit records: {e}")
+                with self._lock:
+                    self._queue.extendleft(reversed(batch))
+                return 0
+
+            self.stats['written'] += written
+            self.stats['last_flush'] = datetime.now(timezone.utc).isoformat()
+            return written
+
+    def _write(self, batch: List[Dict[str, Any]]) -> int:
+        try:
+            self._insert(batch)
+            return len(batch)
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"Audit batch rejected ({e}); writing records one by one")
+
+        # Isolate the bad records so they cannot block the rest of the queue
+        written = 0
+        for record in batch:
+            try:
+                self._insert([record])
+                written += 1
+            except (IntegrityError, DataError) as e:
+                self.stats['dropped'] += 1
+                logger.error(f"Dropped invalid audit record {record['action']} on "
+                             f"{record['table_name']}:{record['record_id']}: {e}")
+        return written
+
+    @staticmethod
+    def _insert(batch: List[Dict[str, Any]]):
+        # Own connection and transaction: never joins a request's session
+        with db.engine.begin() as connection:
+            connection.execute(AuditLog.__table__.insert(), batch)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'queue_depth': self.queue_depth(),
+            'flush_size': self.flush_size,
+            'flush_interval': self.flush_interval
+        }
+
+
+# Global instance
+audit_writer = AuditWriter()
@@ -0,0 +1,140 @@
+"""
+Bulk Rate Service for PipLine Treasury System
+Re-rates foreign-currency transactions with set-based UPDATE statements
+"""
+import logging
+import time
+from datetime import datetime, timezone, date
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Tuple
+
+from sqlalchemy import update, select, func, case
+
+from app import db
+from app.models.transaction import Transaction
+from app.models.config import ExchangeRate
+
+logger = logging.getLogger(__name__)
+
+# Dates per UPDATE statement (each date adds a CASE branch and an IN entry)
+DATE_CHUNK_SIZE = 200
+
+# Scale of the *_try columns
+TRY_SCALE = 2
+
+
+class BulkRateService:
+    """Applies exchange rates to every transaction of a date in the database.
+
+    Each chunk of dates is one UPDATE whose rate comes from a CASE over the
+    date, so no transaction is loaded into the session. The daily PSP
+    rollup is refreshed for the touched dates in the same transaction, and
+    updated_at is bumped so change-feed readers pick the rows up.
+    """
+
+    def count_by_date(self, dates: Iterable[date], currency: str = 'USD') -> Dict[date, int]:
+        """Number of transactions in the currency on each of the dates"""
+        dates = sorted(set(dates))
+        counts: Dict[date, int] = {}
+        for start in range(0, len(dates), DATE_CHUNK_SIZE):
+            chunk = dates[start:start + DATE_CHUNK_SIZE]
+            rows = db.session.execute(
+                select(Transaction.date, func.count(Transaction.id)).where(
+                    Transaction.currency == currency,
+                    Transaction.date.in_(chunk)
+                ).group_by(Transaction.date)
+            ).all()
+            counts.update({day: count for day, count in rows})
+        return counts
+
+    def _update_statement(self, rates: List[Tuple[date, Decimal]], currency: str, now: datetime):
+        if len(rates) == 1:
+            rate = rates[0][1]
+        else:
+            rate = case({day: value for day, value in rates}, value=Transaction.date)
+
+        return update(Transaction).where(
+            Transaction.currency == currency,
+            Transaction.date.in_([day for day, _ in rates])
+        ).values(
+            exchange_rate=rate,
+            amount_try=func.round(Transaction.amount * rate, TRY_SCALE),
+            commission_try=func.round(Transaction.commission * rate, TRY_SCALE),
+            net_amount_try=func.round(Transaction.net_amount * rate, TRY_SCALE),
+            updated_at=now
+        ).execution_options(synchronize_session=False)
+
+    def _store_daily_rates(self, rates: Dict[date, Decimal]):
+        """Upsert the per-date USD rate the transactions were re-rated with"""
+        dates = sorted(rates)
+        existing = {}
+        for start in range(0, len(dates), DATE_CHUNK_SIZE):
+            chunk = dates[start:start + DATE_CHUNK_SIZE]
+            existing.update({row.date: row for row in ExchangeRate.query.filter(ExchangeRate.date.in_(chunk))})
+
+        for day in dates:
+            exchange_rate = existing.get(day)
+            if exchange_rate is None:
+                exchange_rate = ExchangeRate(date=day)
+                db.session.add(exchange_rate)
+            exchange_rate.usd_to_tl = rates[day]
+
+    def apply_rates(self, rates: Dict[date, Decimal], currency: str = 'USD',
+                    commit: bool = True) -> Dict[str, Any]:
+        """Re-rate all transactions in the currency on the given dates.
+
+        Dates without transactions are skipped and reported with a zero
+        count. Returns per-date row counts.
+        """
+        start_time = time.time()
+        counts = self.count_by_date(rates.keys(), currency)
+        applicable = sorted((day, rates[day]) for day in rates if counts.get(day))
+
+        try:
+            if applicable:
+                now = datetime.now(timezone.utc)
+                updated = 0
+                for start in range(0, len(applicable), DATE_CHUNK_SIZE):
+                    chunk = applicable[start:start + DATE_CHUNK_SIZE]
+                    result = db.session.execute(self._update_statement(chunk, currency, now))
+                    updated += result.rowcount
+
+                if currency == 'USD':
+                    self._store_daily_rates(dict(applicable))
+
+                # Bulk UPDATEs bypass the ORM flush hook that maintains the rollup
+                from app.services.psp_rollup_service import psp_rollup_service
+                psp_rollup_service.refresh_dates([day for day, _ in applicable])
+            else:
+                updated = 0
+
+            if commit:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if commit and updated:
+            self._invalidate_caches()
+
+        duration = time.time() - start_time
+        logger.info(
+            f"Re-rated {updated} {currency} transactions on {len(applicable)} dates in {duration:.3f}s"
+        )
+        return {
+            'updated_count': updated,
+            'counts': {day: counts.get(day, 0) for day in rates},
+            'duration_seconds': round(duration, 3)
+        }
+
+    @staticmethod
+    def _invalidate_caches():
+        try:
+            from app.services.query_service import QueryService
+            QueryService.invalidate_transaction_cache()
+        except Exception as cache_error:
+            logger.warning(f"Failed to invalidate cache after re-rating: {cache_error}")
+
+
+# Global instance
+bulk_rate_service = BulkRateService()
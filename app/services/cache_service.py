@@ -1,118 +1,35 @@
 """
 Caching Service
-Provides in-memory caching for improved performance
+Provides caching for improved performance on top of the unified cache
 """
 
-import time
 import logging
-import threading
 from typing import Any, Optional, Dict
-from functools import wraps
-from datetime import datetime, timedelta
+from app.utils.advanced_cache import cache, cache_invalidate, cached, CacheNamespace
 
 logger = logging.getLogger(__name__)
 
 
-class MemoryCache:
-    """Simple in-memory cache implementation"""
+class MemoryCache(CacheNamespace):
+    """Cache namespace for this service's entries in the unified cache"""
     
     def __init__(self, default_ttl: int = 300):  # 5 minutes default
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        super().__init__(cache, 'memory')
         self.default_ttl = default_ttl
-        self.lock = threading.RLock()
-        self.hits = 0
-        self.misses = 0
-        
-        # Start cleanup thread
-        self._start_cleanup_thread()
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
-        with self.lock:
-            if key not in self.cache:
-                self.misses += 1
-                return None
-            
-            entry = self.cache[key]
-            
-            # Check if expired
-            if time.time() > entry['expires']:
-                del self.cache[key]
-                self.misses += 1
-                return None
-            
-            self.hits += 1
-            return entry['value']
+        return super().get(key)
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set value in cache"""
-        if ttl is None:
-            ttl = self.default_ttl
-        
-        with self.lock:
-            self.cache[key] = {
-                'value': value,
-                'expires': time.time() + ttl,
-                'created': time.time()
-            }
-    
-    def delete(self, key: str) -> bool:
-        """Delete key from cache"""
-        with self.lock:
-            if key in self.cache:
-                del self.cache[key]
-                return True
-            return False
-    
-    def clear(self) -> None:
-        """Clear all cache entries"""
-        with self.lock:
-            self.cache.clear()
-            self.hits = 0
-            self.misses = 0
+        super().set(key, value, ttl or self.default_ttl)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        with self.lock:
-            total_requests = self.hits + self.misses
-            hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
-            
-            return {
-                'entries': len(self.cache),
-                'hits': self.hits,
-                'misses': self.misses,
-                'hit_rate': round(hit_rate, 2),
-                'total_requests': total_requests
-            }
-    
-    def _cleanup_expired(self) -> None:
-        """Remove expired entries"""
-        current_time = time.time()
-        expired_keys = []
-        
-        with self.lock:
-            for key, entry in self.cache.items():
-                if current_time > entry['expires']:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self.cache[key]
-        
-        if expired_keys:
-            logger.debug(f"Cache cleanup: removed {len(expired_keys)} expired entries")
-    
-    def _start_cleanup_thread(self) -> None:
-        """Start background cleanup thread"""
-        def cleanup_loop():
-            while True:
-                try:
-                    time.sleep(60)  # Cleanup every minute
-                    self._cleanup_expired()
-                except Exception as e:
-                    logger.error(f"Cache cleanup error: {e}")
-        
-        cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
-        cleanup_thread.start()
+        stats = super().get_stats()
+        stats['entries'] = stats['namespace_entries']
+        return stats
 
 
 class CacheService:
@@ -137,6 +54,14 @@ class CacheService:
         """Delete key from cache"""
         return self.memory_cache.delete(key)
     
+    def invalidate_prefix(self, prefix: str) -> int:
+        """Invalidate entries under a ':'-delimited key prefix across all cache services"""
+        return cache.invalidate_prefix(prefix)
+    
+    def invalidate_pattern(self, pattern: str) -> int:
+        """Invalidate entries matching pattern across all cache services"""
+        return cache_invalidate(pattern)
+
     def clear(self) -> None:
         """Clear all cache"""
         self.memory_cache.clear()
@@ -158,38 +83,21 @@ class CacheService:
 cache_service = CacheService()
 
 
-def cached(ttl: int = 300, key_prefix: str = ''):
-    """Decorator for caching function results"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generate cache key
-            cache_key = f"{key_prefix}{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            
-            # Try to get from cache
-            cached_result = cache_service.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Call function and cache result
-            result = func(*args, **kwargs)
-            cache_service.set(cache_key, result, ttl)
-            
-            return result
-        return wrapper
-    return decorator
+def get_cache_service() -> CacheService:
+    """Get the global cache service instance"""
+    return cache_service
 
 
 def cache_exchange_rates(func):
     """Specific caching for exchange rates"""
-    return cached(ttl=900, key_prefix='exchange_rates:')(func)  # 15 minutes
+    return cached(ttl=900, key_prefix='exchange_rates')(func)  # 15 minutes
 
 
 def cache_analytics(func):
     """Specific caching for analytics data"""
-    return cached(ttl=600, key_prefix='analytics:')(func)  # 10 minutes
+    return cached(ttl=600, key_prefix='analytics')(func)  # 10 minutes
 
 
 def cache_user_data(func):
     """Specific caching for user data"""
-    return cached(ttl=300, key_prefix='user:')(func)  # 5 minutes
\ No newline at end of file
+    return cached(ttl=300, key_prefix='user')(func)  # 5 minutes
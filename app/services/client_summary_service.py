@@ -0,0 +1,156 @@
+"""
+Client Summary Service for PipLine Treasury System
+Builds per-client summaries with a constant number of set-based queries
+"""
+import logging
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func, asc, desc
+
+from app import db
+from app.models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Sortable summary fields exposed to the API
+SORT_FIELDS = {
+    'client_name', 'total_amount', 'total_commission', 'total_net',
+    'transaction_count', 'avg_transaction', 'first_transaction', 'last_transaction'
+}
+
+MAX_PER_PAGE = 500
+
+
+class ClientSummaryService:
+    """Per-client aggregates, currency/PSP sets and latest transaction details"""
+
+    @staticmethod
+    def _client_filter(query, search: Optional[str] = None):
+        query = query.filter(
+            Transaction.client_name.isnot(None),
+            Transaction.client_name != ''
+        )
+        if search:
+            query = query.filter(Transaction.client_name.ilike(f'%{search}%'))
+        return query
+
+    def get_client_summaries(self, sort_by: str = 'total_amount', sort_order: str = 'desc',
+                             page: Optional[int] = None, per_page: Optional[int] = None,
+                             search: Optional[str] = None) -> Dict[str, Any]:
+        """Get client summaries sorted and optionally paginated in SQL.
+
+        Issues one aggregate query (plus a count when paginating), one query
+        for the distinct currency/PSP pairs and one window-function query for
+        each client's latest payment method and category, regardless of the
+        number of clients.
+        """
+        if sort_by not in SORT_FIELDS:
+            sort_by = 'total_amount'
+        direction = asc if sort_order == 'asc' else desc
+
+        aggregates = self._client_filter(db.session.query(
+            Transaction.client_name.label('client_name'),
+            func.count(Transaction.id).label('transaction_count'),
+            func.sum(Transaction.amount).label('total_amount'),
+            func.sum(Transaction.commission).label('total_commission'),
+            func.sum(Transaction.net_amount).label('total_net'),
+            func.avg(Transaction.amount).label('avg_transaction'),
+            func.min(Transaction.created_at).label('first_transaction'),
+            func.max(Transaction.created_at).label('last_transaction')
+        ), search).group_by(Transaction.client_name)
+
+        pagination = None
+        if page is not None or per_page is not None:
+            page = max(page or 1, 1)
+            per_page = min(max(per_page or 50, 1), MAX_PER_PAGE)
+            total = self._client_filter(
+                db.session.query(func.count(func.distinct(Transaction.client_name))), search
+            ).scalar() or 0
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page if total else 0
+            }
+
+        ordered = aggregates.order_by(direction(sort_by), asc('client_name'))
+        if pagination:
+            ordered = ordered.offset((page - 1) * per_page).limit(per_page)
+        client_rows = ordered.all()
+
+        client_names = [row.client_name for row in client_rows]
+        if not client_names:
+            return {'clients': [], 'pagination': pagination}
+
+        # Restrict the detail queries to the page's clients when paginating
+        restrict = client_names if pagination else None
+        currencies, psps = self._get_currency_psp_sets(restrict, search)
+        latest = self._get_latest_details(restrict, search)
+
+        clients = []
+        for row in client_rows:
+            latest_payment_method, latest_category = latest.get(row.client_name, (None, None))
+            clients.append({
+                'client_name': row.client_name,
+                'payment_method': latest_payment_method,
+                'category': latest_category,
+                'total_amount': float(row.total_amount) if row.total_amount is not None else 0.0,
+                'total_commission': float(row.total_commission) if row.total_commission is not None else 0.0,
+                'total_net': float(row.total_net) if row.total_net is not None else 0.0,
+                'transaction_count': row.transaction_count,
+                'first_transaction': row.first_transaction.isoformat() if row.first_transaction else None,
+                'last_transaction': row.last_transaction.isoformat() if row.last_transaction else None,
+                'currencies': sorted(currencies.get(row.client_name, ())),
+                'psps': sorted(psps.get(row.client_name, ())),
+                'avg_transaction': float(row.avg_transaction) if row.avg_transaction is not None else 0.0
+            })
+
+        return {'clients': clients, 'pagination': pagination}
+
+    def _get_currency_psp_sets(self, client_names: Optional[List[str]], search: Optional[str]):
+        """Distinct currencies and PSPs per client in a single query"""
+        query = self._client_filter(db.session.query(
+            Transaction.client_name,
+            Transaction.currency,
+            Transaction.psp
+        ), search).distinct()
+        if client_names is not None:
+            query = query.filter(Transaction.client_name.in_(client_names))
+
+        currencies: Dict[str, set] = {}
+        psps: Dict[str, set] = {}
+        for client_name, currency, psp in query.all():
+            if currency:
+                currencies.setdefault(client_name, set()).add(currency)
+            if psp:
+                psps.setdefault(client_name, set()).add(psp)
+        return currencies, psps
+
+    def _get_latest_details(self, client_names: Optional[List[str]], search: Optional[str]):
+        """Most recent payment method and category per client via ROW_NUMBER()"""
+        row_number = func.row_number().over(
+            partition_by=Transaction.client_name,
+            order_by=(Transaction.created_at.desc(), Transaction.id.desc())
+        ).label('row_number')
+
+        ranked = self._client_filter(db.session.query(
+            Transaction.client_name.label('client_name'),
+            Transaction.payment_method.label('payment_method'),
+            Transaction.category.label('category'),
+            row_number
+        ), search)
+        if client_names is not None:
+            ranked = ranked.filter(Transaction.client_name.in_(client_names))
+        ranked = ranked.subquery()
+
+        rows = db.session.query(
+            ranked.c.client_name,
+            ranked.c.payment_method,
+            ranked.c.category
+        ).filter(ranked.c.row_number == 1).all()
+
+        return {row.client_name: (row.payment_method, row.category) for row in rows}
+
+
+# Global instance
+client_summary_service = ClientSummaryService()
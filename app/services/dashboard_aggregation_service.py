@@ -0,0 +1,103 @@
+"""
+Dashboard Aggregation Service for PipLine Treasury System
+Computes dashboard totals, client counts and period comparisons with SQL aggregates
+"""
+import logging
+from datetime import date
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func, desc
+
+from app import db
+from app.models.transaction import Transaction
+from app.models.financial import PSPAllocation
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardAggregationService:
+    """Set-based dashboard aggregates whose cost does not grow with row hydration"""
+
+    @staticmethod
+    def _apply_date_range(query, start_date: Optional[date], end_date: Optional[date],
+                          inclusive_end: bool = True):
+        """Apply an optional date window to a Transaction query"""
+        if start_date is not None:
+            query = query.filter(Transaction.date >= start_date)
+        if end_date is not None:
+            if inclusive_end:
+                query = query.filter(Transaction.date <= end_date)
+            else:
+                query = query.filter(Transaction.date < end_date)
+        return query
+
+    def get_period_totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                          inclusive_end: bool = True) -> Dict[str, Any]:
+        """Get TRY totals, transaction count and distinct clients for a date window.
+
+        TRY columns fall back to the original amounts when a row has not been
+        converted, matching the per-row fallback the dashboard used to apply.
+        """
+        query = db.session.query(
+            func.sum(func.coalesce(Transaction.amount_try, Transaction.amount, 0)).label('total_revenue'),
+            func.sum(func.coalesce(Transaction.commission_try, Transaction.commission, 0)).label('total_commission'),
+            func.sum(func.coalesce(Transaction.net_amount_try, Transaction.net_amount, 0)).label('total_net'),
+            func.count(Transaction.id).label('transaction_count'),
+            func.count(func.distinct(Transaction.client_name)).label('unique_clients')
+        )
+        row = self._apply_date_range(query, start_date, end_date, inclusive_end).first()
+
+        return {
+            'total_revenue': float(row.total_revenue or 0),
+            'total_commission': float(row.total_commission or 0),
+            'total_net': float(row.total_net or 0),
+            'transaction_count': int(row.transaction_count or 0),
+            'unique_clients': int(row.unique_clients or 0)
+        }
+
+    def get_recent_transactions(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                                limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the most recent transactions in a window via ORDER BY ... LIMIT"""
+        query = db.session.query(
+            Transaction.id,
+            Transaction.client_name,
+            Transaction.amount,
+            Transaction.currency,
+            Transaction.date,
+            Transaction.created_at
+        )
+        rows = self._apply_date_range(query, start_date, end_date).order_by(
+            desc(Transaction.date),
+            desc(Transaction.created_at),
+            desc(Transaction.id)
+        ).limit(limit).all()
+
+        return [{
+            'id': row.id,
+            'client_name': row.client_name or 'Unknown',
+            'amount': float(row.amount or 0),
+            'currency': row.currency or 'TL',
+            'date': row.date.isoformat() if row.date else row.created_at.strftime('%Y-%m-%d'),
+            'status': 'completed',
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        } for row in rows]
+
+    @staticmethod
+    def get_allocation_total(start_date: date, end_date: date) -> float:
+        """Sum PSP allocations for an inclusive date window"""
+        total = db.session.query(
+            func.sum(func.coalesce(PSPAllocation.allocation_amount, 0))
+        ).filter(
+            PSPAllocation.date >= start_date,
+            PSPAllocation.date <= end_date
+        ).scalar()
+        return float(total or 0)
+
+    @staticmethod
+    def percent_change(current: float, previous: float) -> float:
+        """Percentage change against a positive baseline, 0 otherwise"""
+        return ((current - previous) / previous * 100) if previous > 0 else 0
+
+
+# Global instance
+dashboard_aggregation_service = DashboardAggregationService()
@@ -0,0 +1,435 @@
+"""
+Data Import Service for PipLine Treasury System
+Previews and imports Excel workbooks in bounded memory with resumable chunks
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta, timezone
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.job import JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+# Data rows returned by a preview
+PREVIEW_ROWS = 20
+
+# Data rows committed (together with the checkpoint) per chunk
+IMPORT_CHUNK_SIZE = 5000
+
+# Errors kept on the checkpoint across chunks
+MAX_STORED_ERRORS = 100
+
+JOB_TYPE = 'excel_import'
+
+# Worker threads running queued imports
+IMPORT_WORKERS = 1
+
+# A running checkpoint whose chunk commits stopped this long ago belongs to
+# a dead worker and may be claimed by a new run
+CHECKPOINT_STALE_AFTER = timedelta(minutes=15)
+
+# Workbook headers (normalized with _normalize_header) -> transaction fields
+HEADER_ALIASES = {
+    'AD_SOYAD': 'client_name',
+    'ÖDEME_ŞEKLI': 'payment_method',
+    'ŞIRKET': 'company',
+    'TARIH': 'date',
+    'KATEGORI': 'category',
+    'TUTAR': 'amount',
+    'KOMISYON': 'commission',
+    'NET': 'net_amount',
+    'PARA_BIRIMI': 'currency',
+    'KASA': 'psp',
+    'AÇIKLAMA': 'notes',
+    'CLIENT_NAME': 'client_name',
+    'PAYMENT_METHOD': 'payment_method',
+    'COMPANY': 'company',
+    'DATE': 'date',
+    'CATEGORY': 'category',
+    'AMOUNT': 'amount',
+    'COMMISSION': 'commission',
+    'NET_AMOUNT': 'net_amount',
+    'CURRENCY': 'currency',
+    'PSP': 'psp',
+    'NOTES': 'notes'
+}
+
+REQUIRED_FIELDS = ['client_name', 'date', 'amount']
+
+CATEGORY_MAP = {
+    'YATIRIM': 'DEP',
+    'YATIRMA': 'DEP',
+    'ÇEKME': 'WD',
+    'CEKME': 'WD'
+}
+
+CURRENCY_MAP = {
+    'TRY': 'TL',
+    '₺': 'TL',
+    '$': 'USD',
+    'USDT': 'USD',
+    'TETHER': 'USD',
+    '€': 'EUR'
+}
+
+
+class ImportInProgressError(Exception):
+    """Raised when another worker holds the checkpoint for the same file"""
+
+
+def _normalize_header(value) -> str:
+    """Uppercase header with Turkish dotted I folded, spaces as underscores"""
+    return str(value or '').strip().replace('İ', 'I').upper().replace(' ', '_')
+
+
+def _json_safe(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class DataImportService:
+    """Excel import with streaming preview and checkpointed, chunked execution"""
+
+    def __init__(self, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.app = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Create the checkpoint table and bind the app background imports run in"""
+        self.app = app
+        try:
+            with app.app_context():
+                JobCheckpoint.__table__.create(bind=db.engine, checkfirst=True)
+        except Exception as e:
+            logger.error(f"Error creating job checkpoint table: {e}")
+
+    # Reading
+
+    @staticmethod
+    def _open_sheet(file_path: str) -> Tuple[Any, Iterator[tuple], Optional[int], str]:
+        """Open the active sheet for streaming; returns (workbook, rows, max_row, sheet title)"""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == '.xls':
+            # Legacy binary workbooks cannot be streamed; they are bounded by the upload limit
+            import pandas as pd
+            frame = pd.read_excel(file_path, header=None, dtype=object)
+            frame = frame.where(frame.notna(), None)
+            rows = iter(frame.itertuples(index=False, name=None))
+            return None, rows, len(frame.index), 'Sheet1'
+
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        sheet = workbook.active
+        # max_row comes from the sheet's dimension record and may be missing
+        return workbook, sheet.iter_rows(values_only=True), sheet.max_row, sheet.title
+
+    @staticmethod
+    def _map_header(header: tuple) -> Tuple[List[Optional[str]], List[str]]:
+        fields = [HEADER_ALIASES.get(_normalize_header(column)) for column in header]
+        columns = [str(column).strip() if column is not None else '' for column in header]
+        return fields, columns
+
+    @staticmethod
+    def _to_row(fields: List[Optional[str]], values: tuple) -> Dict[str, Any]:
+        row = {}
+        for field, value in zip(fields, values):
+            if field and value not in (None, ''):
+                row[field] = value
+        return row
+
+    @staticmethod
+    def _apply_business_rules(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Map workbook categories/currencies and drop WD commissions"""
+        category = str(row.get('category') or '').strip().replace('İ', 'I').upper()
+        if category:
+            row['category'] = CATEGORY_MAP.get(category, category)
+
+        currency = str(row.get('currency') or '').strip().upper()
+        if currency:
+            row['currency'] = CURRENCY_MAP.get(currency, currency)
+        if str(row.get('psp') or '').strip().upper() == 'TETHER':
+            # Tether is always treated as USD
+            row['currency'] = 'USD'
+
+        if row.get('category') == 'WD':
+            # WDs have no commission
+            row.pop('commission', None)
+        return row
+
+    def iter_rows(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield mapped transaction rows, skipping blank lines"""
+        workbook, rows, _, _ = self._open_sheet(file_path)
+        try:
+            header = next(rows, None)
+            if header is None:
+                return
+            fields, _ = self._map_header(header)
+            for values in rows:
+                row = self._to_row(fields, values)
+                if row:
+                    yield self._apply_business_rules(row)
+        finally:
+            if workbook is not None:
+                workbook.close()
+
+    def get_import_preview(self, file_path: str, max_rows: int = PREVIEW_ROWS) -> Dict[str, Any]:
+        """Preview the first rows of a workbook without reading the rest of it"""
+        workbook, rows, max_row, sheet_name = self._open_sheet(file_path)
+        try:
+            header = next(rows, None)
+            if header is None:
+                return {
+                    'file_name': os.path.basename(file_path),
+                    'sheet_name': sheet_name,
+                    'columns': [],
+                    'column_mapping': {},
+                    'missing_required_columns': REQUIRED_FIELDS,
+                    'preview_rows': [],
+                    'preview_row_count': 0,
+                    'estimated_total_rows': 0
+                }
+
+            fields, columns = self._map_header(header)
+            preview_rows = []
+            for values in islice(rows, max_rows):
+                row = self._to_row(fields, values)
+                if not row:
+                    continue
+                preview_rows.append({
+                    key: _json_safe(value)
+                    for key, value in self._apply_business_rules(row).items()
+                })
+        finally:
+            if workbook is not None:
+                workbook.close()
+
+        mapped = {column: field for column, field in zip(columns, fields) if field}
+        checkpoint = self.get_checkpoint(file_path)
+        return {
+            'file_name': os.path.basename(file_path),
+            'sheet_name': sheet_name,
+            'columns': columns,
+            'column_mapping': mapped,
+            'unmapped_columns': [column for column, field in zip(columns, fields) if column and not field],
+            'missing_required_columns': [field for field in REQUIRED_FIELDS if field not in mapped.values()],
+            'preview_rows': preview_rows,
+            'preview_row_count': len(preview_rows),
+            'estimated_total_rows': max(max_row - 1, 0) if max_row else None,
+            'resumable_checkpoint': checkpoint.to_dict() if checkpoint and checkpoint.status != 'completed' else None
+        }
+
+    # Checkpoints
+
+    @staticmethod
+    def file_fingerprint(file_path: str) -> str:
+        """SHA-256 of the file contents, read in 1MB blocks"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as handle:
+            for block in iter(lambda: handle.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get_checkpoint(self, file_path: str) -> Optional[JobCheckpoint]:
+        """Checkpoint left by an earlier import of the same file contents, if any"""
+        try:
+            job_key = f"{JOB_TYPE}:{self.file_fingerprint(file_path)}"
+            return JobCheckpoint.query.filter_by(job_key=job_key).first()
+        except Exception as e:
+            logger.warning(f"Could not read import checkpoint: {e}")
+            return None
+
+    @staticmethod
+    def get_job(checkpoint_id: int) -> Optional[JobCheckpoint]:
+        """Import checkpoint by id, as polled by clients of a background import"""
+        checkpoint = db.session.get(JobCheckpoint, checkpoint_id)
+        if checkpoint is None or checkpoint.job_type != JOB_TYPE:
+            return None
+        return checkpoint
+
+    def _claim_checkpoint(self, file_path: str, user_id, file_name: Optional[str] = None) -> JobCheckpoint:
+        """Mark the file's checkpoint running, refusing one another worker holds.
+
+        The claim is a conditional UPDATE, so of two uploads of the same file
+        only one sees its row count and the other gets ImportInProgressError.
+        A running checkpoint is only taken over once its last chunk commit is
+        older than CHECKPOINT_STALE_AFTER.
+        """
+        job_key = f"{JOB_TYPE}:{self.file_fingerprint(file_path)}"
+        file_name = file_name or os.path.basename(file_path)
+        now = datetime.now(timezone.utc)
+        fresh_state = {'file_name': file_name, 'errors': []}
+
+        if JobCheckpoint.query.filter_by(job_key=job_key).first() is None:
+            checkpoint = JobCheckpoint(job_key=job_key, job_type=JOB_TYPE, status='running',
+                                       created_by=user_id, started_at=now)
+            checkpoint.set_state(fresh_state)
+            db.session.add(checkpoint)
+            try:
+                db.session.commit()
+                return checkpoint
+            except IntegrityError:
+                # Created concurrently by another upload; claim it below
+                db.session.rollback()
+
+        table = JobCheckpoint.__table__
+        claimable = and_(
+            table.c.job_key == job_key,
+            or_(table.c.status != 'running', table.c.updated_at < now - CHECKPOINT_STALE_AFTER)
+        )
+        claimed = {'status': 'running', 'last_error': None, 'created_by': user_id, 'updated_at': now}
+
+        # A finished import of the same file starts over as a new run
+        restarted = db.session.execute(
+            update(table).where(claimable, table.c.status == 'completed').values(
+                position=0, processed_count=0, success_count=0, failure_count=0,
+                started_at=now, completed_at=None, state=json.dumps(fresh_state),
+                **claimed
+            )
+        )
+        if restarted.rowcount == 0:
+            resumed = db.session.execute(update(table).where(claimable).values(**claimed))
+            if resumed.rowcount == 0:
+                db.session.rollback()
+                raise ImportInProgressError(f"{file_name} is already being imported")
+        db.session.commit()
+
+        checkpoint = JobCheckpoint.query.filter_by(job_key=job_key).one()
+        if not restarted.rowcount and checkpoint.position:
+            logger.info(f"Resuming import of {file_name} after row {checkpoint.position}")
+        return checkpoint
+
+    # Execution
+
+    def start_import(self, file_path: str, user_id, file_name: Optional[str] = None) -> JobCheckpoint:
+        """Claim the file's checkpoint and run the import on a background worker.
+
+        Returns the claimed checkpoint straight away; clients poll it (see
+        get_job) for progress. The worker deletes ``file_path`` when the
+        import finishes or fails. Raises ImportInProgressError if the same
+        file is already being imported.
+        """
+        checkpoint = self._claim_checkpoint(file_path, user_id, file_name)
+        if self.app is None:
+            # Not bound to an app (scripts, shell): run inline
+            self._run_job(checkpoint.id, file_path, user_id)
+            return checkpoint
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='excel-import')
+        self._executor.submit(self._run_job, checkpoint.id, file_path, user_id)
+        return checkpoint
+
+    def _run_job(self, checkpoint_id: int, file_path: str, user_id):
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self._import_chunks(db.session.get(JobCheckpoint, checkpoint_id), file_path, user_id)
+            else:
+                self._import_chunks(db.session.get(JobCheckpoint, checkpoint_id), file_path, user_id)
+        except Exception as e:
+            # Already recorded on the checkpoint for pollers
+            logger.error(f"Background import {checkpoint_id} failed: {e}")
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def import_transactions(self, file_path: str, user_id) -> Dict[str, Any]:
+        """Import a workbook in the calling thread (CLI, scripts)"""
+        return self._import_chunks(self._claim_checkpoint(file_path, user_id), file_path, user_id)
+
+    def _import_chunks(self, checkpoint: JobCheckpoint, file_path: str, user_id) -> Dict[str, Any]:
+        """Import a workbook in chunks, resuming after the last committed chunk.
+
+        Each chunk's rows and the advanced checkpoint are committed in one
+        database transaction, so a failed or interrupted import re-run with
+        the same file continues from the first uncommitted row instead of
+        re-importing from scratch.
+        """
+        from app.services.transaction_import_service import transaction_import_service
+
+        resumed_from = checkpoint.position
+        state = checkpoint.get_state()
+        errors = state.get('errors', [])
+        import_note = f"Imported on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+        try:
+            rows = islice(self.iter_rows(file_path), checkpoint.position, None)
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+
+                result = transaction_import_service.import_rows(
+                    chunk, user_id,
+                    note_suffix=import_note,
+                    first_row_number=checkpoint.position + 1,
+                    commit=False
+                )
+
+                checkpoint.position += result['total_rows']
+                checkpoint.processed_count += result['total_rows']
+                checkpoint.success_count += result['successful_imports']
+                checkpoint.failure_count += result['failed_imports']
+                errors.extend(result['errors'][:max(MAX_STORED_ERRORS - len(errors), 0)])
+                state['errors'] = errors
+                checkpoint.set_state(state)
+                db.session.commit()
+
+                logger.info(
+                    f"Import chunk committed: {checkpoint.position} rows consumed, "
+                    f"{checkpoint.success_count} imported"
+                )
+
+            checkpoint.status = 'completed'
+            checkpoint.completed_at = datetime.now(timezone.utc)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            try:
+                checkpoint.status = 'failed'
+                checkpoint.last_error = str(e)
+                db.session.commit()
+            except Exception as checkpoint_error:
+                db.session.rollback()
+                logger.error(f"Could not record import failure on checkpoint: {checkpoint_error}")
+            logger.error(f"Import failed after row {checkpoint.position}: {e}")
+            raise
+        finally:
+            if checkpoint.success_count:
+                try:
+                    from app.services.query_service import QueryService
+                    QueryService.invalidate_transaction_cache()
+                except Exception as cache_error:
+                    logger.warning(f"Failed to invalidate cache after Excel import: {cache_error}")
+
+        return {
+            'total_rows': checkpoint.processed_count,
+            'successful_imports': checkpoint.success_count,
+            'failed_imports': checkpoint.failure_count,
+            'errors': errors,
+            'resumed_from_row': resumed_from,
+            'checkpoint_id': checkpoint.id
+        }
+
+
+# Global instance
+data_import_service = DataImportService()
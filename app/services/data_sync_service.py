@@ -3,14 +3,27 @@ Data synchronization service to ensure PSP Track and Dashboard use transaction d
 """
 from app import db
 from app.models.transaction import Transaction
-from app.models.financial import PspTrack
-from datetime import datetime, date, timedelta
+from app.models.financial import PspTrack, DailyPspRollup
+from app.models.job import JobCheckpoint
+from datetime import datetime, date, timedelta, timezone
 from decimal import Decimal
+from sqlalchemy import func, select, insert, delete, update, literal, or_
 import logging
 import decimal
+import time
 
 logger = logging.getLogger(__name__)
 
+PSP_TRACK_SYNC_JOB_KEY = 'psp_track_sync'
+PSP_TRACK_SYNC_JOB_TYPE = 'psp_track_sync'
+
+# Re-read window behind the watermark, so rollup writes that committed
+# after a sync started are picked up by the next one (recompute is idempotent)
+PSP_TRACK_SYNC_OVERLAP = timedelta(seconds=60)
+
+# Dates per recompute statement
+PSP_TRACK_DATE_CHUNK = 200
+
 def safe_float(value, default=0.0):
     """Safely convert value to float, handling None and invalid values"""
     if value is None:
@@ -29,84 +42,52 @@ def safe_decimal(value, default=Decimal('0')):
     except (ValueError, TypeError, decimal.InvalidOperation):
         return default
 
+def track_psp_name(column):
+    """PSP Track name for a transaction PSP ('Unknown' when unset)"""
+    return func.coalesce(func.nullif(column, ''), 'Unknown')
+
+
+def track_source(dates=None):
+    """(date, psp_name, amount, commission, difference) grouped from transactions.
+
+    Negative amounts (refunds, chargebacks) are not tracked.
+    """
+    t = Transaction.__table__
+    psp_name = track_psp_name(t.c.psp)
+    amount = func.coalesce(t.c.amount, 0)
+    commission = func.coalesce(t.c.commission, 0)
+    query = select(
+        t.c.date,
+        psp_name.label('psp_name'),
+        func.sum(amount).label('amount'),
+        func.sum(commission).label('commission_amount'),
+        func.sum(amount - commission).label('difference')
+    ).where(
+        t.c.date.isnot(None),
+        or_(t.c.amount.is_(None), t.c.amount >= 0)
+    )
+    if dates is not None:
+        query = query.where(t.c.date.in_(dates))
+    return query.group_by(t.c.date, psp_name)
+
+
 class DataSyncService:
     """Service to synchronize data between tables"""
     
     @staticmethod
-    def sync_psp_track_from_transactions():
-        """Sync PSP Track data from actual transactions, clearing old data first"""
+    def sync_psp_track_from_transactions(full=False, keys=None):
+        """Sync PSP Track data from transactions.
+        
+        Incremental by default: only (date, psp) keys touched since the last
+        sync (plus ``keys`` given by the caller) are recomputed. ``full``
+        rebuilds every row. Either way the change is a single transaction,
+        so readers never see a partially synced table.
+        """
         try:
-            logger.info("Starting PSP Track sync from transactions...")
-            
-            # Ensure session is in a clean state
-            try:
-                db.session.rollback()
-            except:
-                pass  # Ignore if already rolled back
-            
-            # Get transaction count before sync
-            transaction_count = Transaction.query.count()
-            logger.info(f"Found {transaction_count} transactions to sync")
-            
-            # Clear all existing PSP Track data
-            old_psp_count = PspTrack.query.count()
-            PspTrack.query.delete()
-            db.session.commit()
-            logger.info(f"Cleared {old_psp_count} old PSP Track entries")
-
-            # Get all transactions
-            transactions = Transaction.query.all()
-            
-            # Group by date and PSP
-            psp_data = {}
-            skipped_negative = 0
-            
-            for transaction in transactions:
-                # Skip negative amount transactions (refunds, chargebacks)
-                if transaction.amount and safe_float(transaction.amount) < 0:
-                    skipped_negative += 1
-                    logger.warning(f"Skipping negative transaction {transaction.id}: {transaction.amount} TL")
-                    continue
-                    
-                psp_name = transaction.psp or 'Unknown'
-                key = (transaction.date, psp_name)
-                
-                if key not in psp_data:
-                    psp_data[key] = {
-                        'amount': Decimal('0'),
-                        'commission_amount': Decimal('0'),
-                        'difference': Decimal('0'),
-                        'transaction_count': 0
-                    }
-                
-                # Update totals using safe conversion
-                safe_amount = safe_decimal(transaction.amount)
-                safe_commission = safe_decimal(transaction.commission)
-                
-                psp_data[key]['amount'] += safe_amount
-                psp_data[key]['commission_amount'] += safe_commission
-                psp_data[key]['difference'] += (safe_amount - safe_commission)
-                psp_data[key]['transaction_count'] += 1
-            
-            logger.info(f"Processed {len(transactions)} transactions into {len(psp_data)} PSP/date combinations")
-            
-            # Create new PSP Track entries
-            for (date_obj, psp_name), data in psp_data.items():
-                new_entry = PspTrack(
-                    date=date_obj,
-                    psp_name=psp_name,
-                    amount=data['amount'],
-                    commission_rate=Decimal('0.0'),
-                    commission_amount=data['commission_amount'],
-                    difference=data['difference']
-                )
-                db.session.add(new_entry)
-            
-            db.session.commit()
-            logger.info(f"Successfully synced {len(psp_data)} PSP Track entries from transactions")
-            if skipped_negative > 0:
-                logger.info(f"Skipped {skipped_negative} negative transactions (refunds/chargebacks)")
-            
+            if full:
+                DataSyncService.rebuild_psp_track()
+            else:
+                DataSyncService.sync_psp_track_incremental(keys)
             return True
             
         except Exception as e:
@@ -120,6 +101,172 @@ class DataSyncService:
                 pass  # Ignore rollback errors
             return False
     
+    @staticmethod
+    def _get_checkpoint():
+        checkpoint = JobCheckpoint.query.filter_by(job_key=PSP_TRACK_SYNC_JOB_KEY).first()
+        if checkpoint is None:
+            checkpoint = JobCheckpoint(job_key=PSP_TRACK_SYNC_JOB_KEY, job_type=PSP_TRACK_SYNC_JOB_TYPE)
+            db.session.add(checkpoint)
+        return checkpoint
+    
+    @staticmethod
+    def _save_watermark(checkpoint, started_at, synced_keys):
+        checkpoint.set_state({'watermark': (started_at - PSP_TRACK_SYNC_OVERLAP).isoformat()})
+        checkpoint.status = 'completed'
+        checkpoint.processed_count = (checkpoint.processed_count or 0) + synced_keys
+        checkpoint.completed_at = datetime.now(timezone.utc)
+    
+    @staticmethod
+    def rebuild_psp_track():
+        """Replace every PSP Track row with grouped transaction totals in one transaction"""
+        start_time = time.time()
+        started_at = datetime.now(timezone.utc)
+        p = PspTrack.__table__
+        
+        try:
+            checkpoint = DataSyncService._get_checkpoint()
+            connection = db.session.connection()
+            old_psp_count = connection.execute(select(func.count()).select_from(p)).scalar() or 0
+            connection.execute(delete(p))
+            
+            source = track_source().subquery()
+            connection.execute(insert(p).from_select(
+                [p.c.date, p.c.psp_name, p.c.amount, p.c.commission_rate, p.c.commission_amount,
+                 p.c.difference, p.c.created_at, p.c.updated_at],
+                select(
+                    source.c.date, source.c.psp_name, source.c.amount, literal(Decimal('0.0')),
+                    source.c.commission_amount, source.c.difference,
+                    literal(started_at, type_=db.DateTime), literal(started_at, type_=db.DateTime)
+                )
+            ))
+            psp_count = connection.execute(select(func.count()).select_from(p)).scalar() or 0
+            
+            DataSyncService._save_watermark(checkpoint, started_at, psp_count)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        duration = time.time() - start_time
+        logger.info(f"Rebuilt PSP Track: replaced {old_psp_count} entries with {psp_count} in {duration:.2f}s")
+        return {
+            'removed': old_psp_count,
+            'psp_track_rows': psp_count,
+            'duration_seconds': round(duration, 3)
+        }
+    
+    @staticmethod
+    def sync_psp_track_incremental(keys=None):
+        """Recompute the PSP Track rows of (date, psp) keys touched since the last sync.
+        
+        Touched keys come from the daily PSP rollup, which every transaction
+        writer keeps current (its rows are rewritten with a new updated_at),
+        plus the ``keys`` passed by the caller. Rows on the touched dates
+        whose transactions are all gone are removed; deletions nobody
+        reports are left to a full rebuild. Without a watermark (first run)
+        this falls back to a full rebuild.
+        """
+        start_time = time.time()
+        started_at = datetime.now(timezone.utc)
+        
+        checkpoint = DataSyncService._get_checkpoint()
+        watermark = checkpoint.get_state().get('watermark')
+        if not watermark:
+            db.session.rollback()
+            return DataSyncService.rebuild_psp_track()
+        watermark = datetime.fromisoformat(watermark)
+        
+        try:
+            touched = {
+                (key_date, psp or 'Unknown') for key_date, psp in (keys or []) if key_date is not None
+            }
+            touched.update(db.session.query(
+                DailyPspRollup.date, track_psp_name(DailyPspRollup.psp)
+            ).filter(DailyPspRollup.updated_at > watermark).distinct().all())
+            
+            updated, inserted, removed = DataSyncService._recompute_keys(touched, started_at)
+            
+            DataSyncService._save_watermark(checkpoint, started_at, len(touched))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        duration = time.time() - start_time
+        logger.info(f"Synced PSP Track incrementally: {len(touched)} keys, {updated} updated, "
+                    f"{inserted} inserted, {removed} removed in {duration:.2f}s")
+        return {
+            'keys': len(touched),
+            'updated': updated,
+            'inserted': inserted,
+            'removed': removed,
+            'duration_seconds': round(duration, 3)
+        }
+    
+    @staticmethod
+    def _recompute_keys(keys, now):
+        """Upsert the PSP Track rows of the given (date, psp_name) keys.
+        
+        Other rows on the same dates are dropped when no tracked transaction
+        is left for them: a key whose transactions were all deleted has no
+        rollup row left to carry a new updated_at.
+        """
+        updated = inserted = removed = 0
+        dates = sorted({key_date for key_date, _ in keys})
+        
+        for start in range(0, len(dates), PSP_TRACK_DATE_CHUNK):
+            chunk = dates[start:start + PSP_TRACK_DATE_CHUNK]
+            date_totals = {
+                (row.date, row.psp_name): row
+                for row in db.session.execute(track_source(chunk)).all()
+            }
+            totals = {key: row for key, row in date_totals.items() if key in keys}
+            
+            existing = {}
+            stale_ids = []
+            for row_id, row_date, psp_name in db.session.query(
+                PspTrack.id, PspTrack.date, PspTrack.psp_name
+            ).filter(PspTrack.date.in_(chunk)).order_by(PspTrack.id):
+                key = (row_date, psp_name)
+                if key not in keys:
+                    if key not in date_totals:
+                        stale_ids.append(row_id)
+                    continue
+                if key in existing or key not in totals:
+                    # Duplicate row for a key, or no tracked transactions left
+                    stale_ids.append(row_id)
+                else:
+                    existing[key] = row_id
+            
+            updates = []
+            inserts = []
+            for key, row in totals.items():
+                values = {
+                    'amount': row.amount,
+                    'commission_amount': row.commission_amount,
+                    'difference': row.difference,
+                    'updated_at': now
+                }
+                if key in existing:
+                    values['id'] = existing[key]
+                    updates.append(values)
+                else:
+                    values.update({'date': key[0], 'psp_name': key[1], 'commission_rate': Decimal('0.0'),
+                                   'created_at': now})
+                    inserts.append(values)
+            
+            if stale_ids:
+                db.session.execute(delete(PspTrack.__table__).where(PspTrack.__table__.c.id.in_(stale_ids)))
+            if updates:
+                db.session.execute(update(PspTrack), updates)
+            if inserts:
+                db.session.execute(insert(PspTrack.__table__), inserts)
+            updated += len(updates)
+            inserted += len(inserts)
+            removed += len(stale_ids)
+        
+        return updated, inserted, removed
+    
     @staticmethod
     def validate_data_consistency():
         """Validate that dashboard and PSP Track data are consistent"""
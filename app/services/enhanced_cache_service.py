@@ -1,6 +1,6 @@
 """
 Enhanced Cache Service for PipLinePro
-Advanced Redis-based caching with intelligent invalidation and warming
+Namespaced caching on the unified cache with intelligent invalidation and warming
 """
 import json
 import logging
@@ -8,13 +8,20 @@ import time
 import hashlib
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional, Union, Callable
-from functools import wraps
-import redis
-from flask import current_app
 from app.services.event_service import event_service, EventType
+from app.utils.advanced_cache import cache, cached, invalidate_tags, CacheNamespace, TieredCache, TRANSACTION_DATA_TAG
 
 logger = logging.getLogger(__name__)
 
+# Key prefixes of entries derived from transaction data; they are tagged with
+# TRANSACTION_DATA_TAG so every transaction write drops them by tag
+TRANSACTION_DATA_KEY_PREFIXES = (
+    'pipeline:transactions:',
+    'pipeline:psp_summary:',
+    'pipeline:daily_balance:',
+    'pipeline:analytics:'
+)
+
 class CacheKey:
     """Cache key builder with namespacing"""
     
@@ -94,13 +101,14 @@ class CacheStats:
         }
 
 class EnhancedCacheService:
-    """Enhanced caching service with Redis backend"""
+    """Enhanced caching service over the unified cache (Redis as its L2 tier)"""
     
-    def __init__(self, redis_client: Optional[redis.Redis] = None):
-        self.redis_client = redis_client or self._get_redis_client()
+    def __init__(self, backend: Optional[TieredCache] = None):
+        self.backend = backend or cache
         self.stats = CacheStats()
         self.default_ttl = 3600  # 1 hour
         self.namespace = "pipeline"
+        self._store = CacheNamespace(self.backend, 'enhanced')
         
         # Cache warming strategies
         self.warming_strategies: Dict[str, Callable] = {}
@@ -108,15 +116,6 @@ class EnhancedCacheService:
         # Register cache warming strategies
         self._register_warming_strategies()
     
-    def _get_redis_client(self) -> Optional[redis.Redis]:
-        """Get Redis client"""
-        try:
-            redis_url = current_app.config.get('REDIS_URL', 'redis://localhost:6379/0')
-            return redis.from_url(redis_url, decode_responses=True)
-        except Exception as e:
-            logger.error(f"Failed to connect to Redis: {e}")
-            return None
-    
     def _register_warming_strategies(self):
         """Register cache warming strategies"""
         self.warming_strategies = {
@@ -128,18 +127,13 @@ class EnhancedCacheService:
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
-        if not self.redis_client:
-            self.stats.misses += 1
-            return None
-        
         try:
-            value = self.redis_client.get(key)
+            value = self._store.get(key)
             if value is not None:
                 self.stats.hits += 1
-                return json.loads(value)
-            else:
-                self.stats.misses += 1
-                return None
+                return value
+            self.stats.misses += 1
+            return None
         except Exception as e:
             logger.error(f"Error getting cache key {key}: {e}")
             self.stats.misses += 1
@@ -147,73 +141,59 @@ class EnhancedCacheService:
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Set value in cache"""
-        if not self.redis_client:
-            return False
-        
         try:
-            ttl = ttl or self.default_ttl
-            serialized_value = json.dumps(value, default=str)
-            result = self.redis_client.setex(key, ttl, serialized_value)
-            if result:
-                self.stats.sets += 1
-            return result
+            tags = (TRANSACTION_DATA_TAG,) if key.startswith(TRANSACTION_DATA_KEY_PREFIXES) else ()
+            self._store.set(key, value, ttl or self.default_ttl, tags)
+            self.stats.sets += 1
+            return True
         except Exception as e:
             logger.error(f"Error setting cache key {key}: {e}")
             return False
     
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
-        if not self.redis_client:
-            return False
-        
         try:
-            result = self.redis_client.delete(key)
+            result = self._store.delete(key)
             if result:
                 self.stats.deletes += 1
-            return bool(result)
+            return result
         except Exception as e:
             logger.error(f"Error deleting cache key {key}: {e}")
             return False
     
     def invalidate_pattern(self, pattern: str) -> int:
-        """Invalidate all keys matching pattern"""
-        if not self.redis_client:
-            return 0
-        
+        """Invalidate all keys matching pattern (glob, or substring without wildcards)"""
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                deleted = self.redis_client.delete(*keys)
-                self.stats.invalidations += len(keys)
+            deleted = self._store.invalidate_pattern(pattern)
+            if deleted:
+                self.stats.invalidations += deleted
                 
                 # Publish invalidation event
                 event_service.publish_event(
                     EventType.CACHE_INVALIDATED,
-                    {'pattern': pattern, 'keys_count': len(keys)},
+                    {'pattern': pattern, 'keys_count': deleted},
                     source='cache_service'
                 )
-                
-                return deleted
-            return 0
+            return deleted
         except Exception as e:
             logger.error(f"Error invalidating pattern {pattern}: {e}")
             return 0
     
     def invalidate_transaction_cache(self, transaction_id: Optional[int] = None):
         """Invalidate transaction-related cache"""
-        patterns = [
-            "pipeline:transactions:*",
-            "pipeline:psp_summary:*",
-            "pipeline:daily_balance:*",
-            "pipeline:analytics:*"
-        ]
+        # Lists, summaries and analytics here and in other services carry the tag
+        total_invalidated = invalidate_tags(TRANSACTION_DATA_TAG)
         
-        if transaction_id:
-            patterns.append(f"pipeline:transaction:{transaction_id}")
+        if transaction_id and self.delete(CacheKey.transaction_detail(transaction_id)):
+            total_invalidated += 1
         
-        total_invalidated = 0
-        for pattern in patterns:
-            total_invalidated += self.invalidate_pattern(pattern)
+        if total_invalidated:
+            self.stats.invalidations += total_invalidated
+            event_service.publish_event(
+                EventType.CACHE_INVALIDATED,
+                {'pattern': TRANSACTION_DATA_TAG, 'keys_count': total_invalidated},
+                source='cache_service'
+            )
         
         logger.info(f"Invalidated {total_invalidated} transaction cache entries")
         return total_invalidated
@@ -313,32 +293,15 @@ class EnhancedCacheService:
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        stats = self.stats.to_dict()
-        
-        if self.redis_client:
-            try:
-                info = self.redis_client.info('memory')
-                stats.update({
-                    'redis_memory_used': info.get('used_memory_human'),
-                    'redis_memory_peak': info.get('used_memory_peak_human'),
-                    'redis_keyspace_hits': info.get('keyspace_hits', 0),
-                    'redis_keyspace_misses': info.get('keyspace_misses', 0)
-                })
-            except Exception as e:
-                logger.error(f"Error getting Redis info: {e}")
-        
+        stats = self._store.get_stats()
+        stats['service'] = self.stats.to_dict()
         return stats
     
     def clear_all(self) -> bool:
         """Clear all cache"""
-        if not self.redis_client:
-            return False
-        
         try:
-            keys = self.redis_client.keys(f"{self.namespace}:*")
-            if keys:
-                self.redis_client.delete(*keys)
-                logger.info(f"Cleared {len(keys)} cache entries")
+            cleared = self.backend.invalidate_tags(self._store.tag)
+            logger.info(f"Cleared {cleared} cache entries")
             return True
         except Exception as e:
             logger.error(f"Error clearing cache: {e}")
@@ -346,33 +309,3 @@ class EnhancedCacheService:
 
 # Global cache service instance
 cache_service = EnhancedCacheService()
-
-# Cache decorator for functions
-def cached(ttl: int = 3600, key_func: Optional[Callable] = None):
-    """Decorator to cache function results"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generate cache key
-            if key_func:
-                cache_key = key_func(*args, **kwargs)
-            else:
-                key_data = {
-                    'func': func.__name__,
-                    'args': args,
-                    'kwargs': kwargs
-                }
-                cache_key = f"pipeline:func:{hashlib.md5(json.dumps(key_data, sort_keys=True, default=str).encode()).hexdigest()}"
-            
-            # Try to get from cache
-            result = cache_service.get(cache_key)
-            if result is not None:
-                return result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            cache_service.set(cache_key, result, ttl)
-            return result
-        
-        return wrapper
-    return decorator
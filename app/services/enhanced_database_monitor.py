@@ -2,11 +2,14 @@
 Enhanced Database Monitoring Service for PipLinePro
 Provides comprehensive database monitoring, query tracking, and performance analysis
 """
+import re
 import time
 import threading
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Tuple
 from collections import defaultdict, deque
+from flask import g, has_request_context, request
 from sqlalchemy import event, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
@@ -14,6 +17,30 @@ import psutil
 
 from app.utils.enhanced_logger import get_enhanced_logger, PerformanceLogger
 
+# A statement fingerprint repeated this often within one request is
+# reported as a suspected N+1 pattern
+N_PLUS_ONE_THRESHOLD = 5
+
+# Endpoints and fingerprints per endpoint kept by the request profiler
+MAX_PROFILED_ENDPOINTS = 500
+MAX_ENDPOINT_FINGERPRINTS = 50
+
+
+@lru_cache(maxsize=2048)
+def simplify_query_pattern(query: str) -> str:
+    """Normalize a statement into a fingerprint (literals replaced, whitespace collapsed)"""
+    # Replace numbers with placeholders
+    query = re.sub(r'\b\d+\b', 'N', query)
+    
+    # Replace quoted strings with placeholders
+    query = re.sub(r"'[^']*'", "'S'", query)
+    query = re.sub(r'"[^"]*"', '"S"', query)
+    
+    # Normalize whitespace
+    query = re.sub(r'\s+', ' ', query).strip()
+    
+    return query
+
 class DatabaseQueryTracker:
     """Tracks database queries with detailed performance metrics"""
     
@@ -380,20 +407,7 @@ class EnhancedDatabaseMonitor:
     
     def _simplify_query_pattern(self, query: str) -> str:
         """Simplify query for pattern matching"""
-        # Remove specific values and keep structure
-        import re
-        
-        # Replace numbers with placeholders
-        query = re.sub(r'\b\d+\b', 'N', query)
-        
-        # Replace quoted strings with placeholders
-        query = re.sub(r"'[^']*'", "'S'", query)
-        query = re.sub(r'"[^"]*"', '"S"', query)
-        
-        # Normalize whitespace
-        query = re.sub(r'\s+', ' ', query).strip()
-        
-        return query
+        return simplify_query_pattern(query)
     
     def set_slow_query_threshold(self, threshold: float):
         """Set the slow query threshold in seconds"""
@@ -409,8 +423,162 @@ class EnhancedDatabaseMonitor:
         
         self.logger.info("Query history cleared")
 
+class RequestQueryProfiler:
+    """Attributes database queries to the HTTP request that ran them.
+    
+    Engine hooks count queries, DB time and statement fingerprints on
+    ``g`` while a request is active. After the view, the totals go out as
+    a ``Server-Timing`` header and are folded into per-endpoint statistics;
+    a fingerprint executed N_PLUS_ONE_THRESHOLD or more times in one request
+    is recorded as a suspected N+1 pattern for that endpoint.
+    """
+    
+    def __init__(self, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self._listeners_registered = False
+    
+    def init_app(self, app):
+        """Register the engine hooks and request handlers"""
+        if not app.config.get('DB_REQUEST_PROFILING', True):
+            return
+        self.n_plus_one_threshold = app.config.get('DB_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        self._register_listeners()
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+    
+    def _register_listeners(self):
+        if self._listeners_registered:
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._listeners_registered = True
+    
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'query_profile' in g:
+            context._profile_start = time.perf_counter()
+    
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_profile_start', None)
+        if start is None or not has_request_context():
+            return
+        profile = g.get('query_profile')
+        if profile is None:
+            return
+        duration = time.perf_counter() - start
+        profile['count'] += 1
+        profile['time'] += duration
+        timing = profile['fingerprints'][simplify_query_pattern(statement)]
+        timing[0] += 1
+        timing[1] += duration
+    
+    @staticmethod
+    def _start_request():
+        g.query_profile = {'count': 0, 'time': 0.0, 'fingerprints': defaultdict(lambda: [0, 0.0])}
+    
+    def _finish_request(self, response):
+        profile = g.pop('query_profile', None)
+        if profile is None:
+            return response
+        
+        db_ms = profile['time'] * 1000
+        response.headers.add(
+            'Server-Timing', f'db;dur={db_ms:.1f};desc="{profile["count"]} queries"'
+        )
+        
+        if profile['count']:
+            rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+            self._record(f"{request.method} {rule}", profile)
+        return response
+    
+    def _record(self, endpoint: str, profile: Dict[str, Any]):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                if len(self.endpoints) >= MAX_PROFILED_ENDPOINTS:
+                    return
+                stats = self.endpoints[endpoint] = {
+                    'requests': 0,
+                    'queries': 0,
+                    'db_time': 0.0,
+                    'max_queries': 0,
+                    'fingerprints': {},
+                    'n_plus_one': {}
+                }
+            
+            stats['requests'] += 1
+            stats['queries'] += profile['count']
+            stats['db_time'] += profile['time']
+            stats['max_queries'] = max(stats['max_queries'], profile['count'])
+            
+            for fingerprint, (count, duration) in profile['fingerprints'].items():
+                totals = stats['fingerprints'].get(fingerprint)
+                if totals is None:
+                    if len(stats['fingerprints']) >= MAX_ENDPOINT_FINGERPRINTS:
+                        continue
+                    totals = stats['fingerprints'][fingerprint] = [0, 0.0]
+                totals[0] += count
+                totals[1] += duration
+                
+                if count >= self.n_plus_one_threshold:
+                    suspect = stats['n_plus_one'].setdefault(
+                        fingerprint, {'requests': 0, 'max_repeats': 0, 'last_seen': None}
+                    )
+                    suspect['requests'] += 1
+                    suspect['max_repeats'] = max(suspect['max_repeats'], count)
+                    suspect['last_seen'] = datetime.now(timezone.utc).isoformat()
+    
+    def get_endpoint_stats(self, limit: int = 20, sort_by: str = 'db_time') -> List[Dict[str, Any]]:
+        """Per-endpoint query statistics, heaviest first"""
+        with self.lock:
+            rows = []
+            for endpoint, stats in self.endpoints.items():
+                top = sorted(stats['fingerprints'].items(), key=lambda item: item[1][1], reverse=True)[:5]
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': stats['requests'],
+                    'total_queries': stats['queries'],
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'max_queries': stats['max_queries'],
+                    'total_db_time_ms': round(stats['db_time'] * 1000, 2),
+                    'avg_db_time_ms': round(stats['db_time'] * 1000 / stats['requests'], 2),
+                    'suspected_n_plus_one': len(stats['n_plus_one']),
+                    'top_statements': [
+                        {'fingerprint': fingerprint, 'count': count, 'total_time_ms': round(duration * 1000, 2)}
+                        for fingerprint, (count, duration) in top
+                    ]
+                })
+        
+        key = {
+            'db_time': 'total_db_time_ms',
+            'queries': 'avg_queries',
+            'requests': 'requests'
+        }.get(sort_by, 'total_db_time_ms')
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+    
+    def get_n_plus_one_report(self) -> List[Dict[str, Any]]:
+        """Suspected N+1 patterns, most repeated first"""
+        with self.lock:
+            report = [
+                {'endpoint': endpoint, 'fingerprint': fingerprint, **suspect}
+                for endpoint, stats in self.endpoints.items()
+                for fingerprint, suspect in stats['n_plus_one'].items()
+            ]
+        report.sort(key=lambda item: item['max_repeats'], reverse=True)
+        return report
+    
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
 # Global instance
 database_monitor = EnhancedDatabaseMonitor()
+request_query_profiler = RequestQueryProfiler()
 
 def init_database_monitor(app):
     """Initialize database monitor with Flask app"""
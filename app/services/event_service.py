@@ -2,19 +2,42 @@
 Event Service for PipLinePro
 Handles event-driven architecture with Redis Streams and message queues
 """
+import atexit
+import itertools
 import json
 import logging
+import threading
 import time
 import uuid
+from collections import deque
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 import redis
-from flask import current_app
 
 logger = logging.getLogger(__name__)
 
+# Seconds between background flushes of the publish buffer
+EVENT_FLUSH_INTERVAL = 0.25
+
+# Events written per pipelined flush
+EVENT_FLUSH_BATCH = 500
+
+# Buffered events before publishers flush inline (back-pressure); while the
+# transport is failing publishers never flush, and beyond twice this the
+# oldest buffered events are dropped
+EVENT_BUFFER_LIMIT = 10000
+
+# Approximate stream length kept by Redis (MAXLEN ~)
+EVENT_STREAM_MAXLEN = 10000
+
+# Worker: events read per batch, block time, and idle time after which
+# another consumer's unacknowledged events are claimed for retry
+EVENT_WORKER_BATCH = 100
+EVENT_WORKER_BLOCK_MS = 1000
+EVENT_CLAIM_IDLE_MS = 60000
+
 class EventType(Enum):
     """Event types for the system"""
     TRANSACTION_CREATED = "transaction.created"
@@ -49,60 +72,223 @@ class Event:
             'metadata': self.metadata or {}
         }
     
+    def to_fields(self) -> Dict[str, str]:
+        """Flat string fields for a Redis Stream entry"""
+        fields = self.to_dict()
+        fields['data'] = json.dumps(fields['data'], default=str)
+        fields['metadata'] = json.dumps(fields['metadata'], default=str)
+        return fields
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Event':
-        """Create event from dictionary"""
+        """Create event from dictionary (or Redis Stream fields)"""
+        payload = data['data']
+        metadata = data.get('metadata') or {}
         return cls(
             id=data['id'],
             type=EventType(data['type']),
             timestamp=datetime.fromisoformat(data['timestamp']),
             source=data['source'],
-            data=data['data'],
-            metadata=data.get('metadata', {})
+            data=json.loads(payload) if isinstance(payload, str) else payload,
+            metadata=json.loads(metadata) if isinstance(metadata, str) else metadata
+        )
+
+
+class MemoryEventTransport:
+    """In-process stand-in for the Redis Stream when Redis is disabled.
+    
+    Keeps the last EVENT_STREAM_MAXLEN events with one consumer group
+    cursor, so history, consumption and acking behave as with Redis
+    within a single process.
+    """
+    
+    name = 'memory'
+    
+    def __init__(self, maxlen: int = EVENT_STREAM_MAXLEN):
+        self._entries: deque = deque(maxlen=maxlen)
+        self._ids = itertools.count(1)
+        self._cursor = 0
+        self._pending: Dict[str, Event] = {}
+        self._lock = threading.Lock()
+    
+    def append(self, events: List[Event]) -> List[str]:
+        with self._lock:
+            ids = []
+            for event in events:
+                seq = next(self._ids)
+                self._entries.append((seq, event))
+                ids.append(f"{seq}-0")
+            return ids
+    
+    def read(self, consumer: str, count: int, block_ms: int) -> List[Tuple[str, Event]]:
+        with self._lock:
+            batch = [(seq, event) for seq, event in self._entries if seq > self._cursor][:count]
+            if batch:
+                self._cursor = batch[-1][0]
+            messages = [(f"{seq}-0", event) for seq, event in batch]
+            self._pending.update(messages)
+        if not messages and block_ms:
+            time.sleep(block_ms / 1000.0)
+        return messages
+    
+    def claim_stale(self, consumer: str, min_idle_ms: int, count: int) -> List[Tuple[str, Event]]:
+        # A single process has no other consumers to take over from
+        return []
+    
+    def ack(self, message_ids: List[str]) -> int:
+        with self._lock:
+            return sum(1 for message_id in message_ids if self._pending.pop(message_id, None) is not None)
+    
+    def history(self, count: int) -> List[Event]:
+        with self._lock:
+            return [event for _, event in list(self._entries)[-count:]][::-1]
+    
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'transport': self.name,
+                'length': len(self._entries),
+                'pending': len(self._pending),
+                'groups': 1
+            }
+
+
+class RedisEventTransport:
+    """Redis Stream with a consumer group; appends are pipelined per flush"""
+    
+    name = 'redis'
+    
+    def __init__(self, client: redis.Redis, stream_name: str, consumer_group: str,
+                 maxlen: int = EVENT_STREAM_MAXLEN):
+        self.client = client
+        self.stream_name = stream_name
+        self.consumer_group = consumer_group
+        self.maxlen = maxlen
+        self._group_ready = False
+    
+    def ensure_group(self):
+        """Create the consumer group (and stream) once"""
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(self.stream_name, self.consumer_group, id='0', mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+    
+    def append(self, events: List[Event]) -> List[str]:
+        # One round trip for the whole batch
+        pipe = self.client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream_name, event.to_fields(), maxlen=self.maxlen, approximate=True)
+        return pipe.execute()
+    
+    def _decode(self, messages) -> List[Tuple[str, Event]]:
+        decoded = []
+        for msg_id, fields in messages:
+            if not fields:
+                # Trimmed from the stream while pending
+                continue
+            try:
+                decoded.append((msg_id, Event.from_dict(fields)))
+            except Exception as e:
+                logger.error(f"Error parsing event {msg_id}: {e}")
+        return decoded
+    
+    def read(self, consumer: str, count: int, block_ms: int) -> List[Tuple[str, Event]]:
+        self.ensure_group()
+        response = self.client.xreadgroup(
+            self.consumer_group, consumer, {self.stream_name: '>'},
+            count=count, block=block_ms or None
+        )
+        messages = []
+        for _, stream_messages in response or []:
+            messages.extend(self._decode(stream_messages))
+        return messages
+    
+    def claim_stale(self, consumer: str, min_idle_ms: int, count: int) -> List[Tuple[str, Event]]:
+        """Take over events another consumer read but never acknowledged"""
+        self.ensure_group()
+        response = self.client.xautoclaim(
+            self.stream_name, self.consumer_group, consumer,
+            min_idle_time=min_idle_ms, start_id='0-0', count=count
         )
+        return self._decode(response[1])
+    
+    def ack(self, message_ids: List[str]) -> int:
+        if not message_ids:
+            return 0
+        return self.client.xack(self.stream_name, self.consumer_group, *message_ids)
+    
+    def history(self, count: int) -> List[Event]:
+        return [event for _, event in self._decode(self.client.xrevrange(self.stream_name, count=count))]
+    
+    def info(self) -> Dict[str, Any]:
+        info = self.client.xinfo_stream(self.stream_name)
+        return {
+            'transport': self.name,
+            'length': info.get('length', 0),
+            'first_entry': info.get('first-entry'),
+            'last_entry': info.get('last-entry'),
+            'groups': info.get('groups', 0)
+        }
 
 class EventService:
-    """Service for managing events and event-driven architecture"""
+    """Service for managing events and event-driven architecture.
+    
+    ``publish_event`` never waits on the transport: events are dispatched to
+    local handlers and appended to an in-process buffer, which a background
+    thread flushes to the stream in pipelined batches. Durable consumers
+    (``subscribe_worker``) run in a separate worker process (``flask events
+    worker``) that reads the stream through the consumer group and
+    acknowledges in batches; they are never run inline by the publisher.
+    """
     
     def __init__(self, redis_client: Optional[redis.Redis] = None):
-        self.redis_client = redis_client or self._get_redis_client()
         self.event_handlers: Dict[EventType, List[Callable]] = {}
+        self.worker_handlers: Dict[EventType, List[Callable]] = {}
         self.stream_name = "pipeline_events"
         self.consumer_group = "pipeline_consumers"
         self.consumer_name = f"consumer_{uuid.uuid4().hex[:8]}"
+        self.redis_client = redis_client
+        self.transport = self._make_transport(redis_client)
         
-        # Initialize consumer group
-        self._init_consumer_group()
+        self._buffer: deque = deque()
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._transport_failing = False
+        self.stats = {'published': 0, 'flushed': 0, 'flush_errors': 0, 'dropped': 0}
+        atexit.register(self.flush)
     
-    def _get_redis_client(self) -> redis.Redis:
+    def init_app(self, app):
+        """Pick the transport from config: Redis Streams when enabled, else in-memory"""
+        if self.redis_client is None and app.config.get('REDIS_ENABLED') and app.config.get('REDIS_URL'):
+            self.redis_client = self._get_redis_client(app.config['REDIS_URL'])
+        self.transport = self._make_transport(self.redis_client)
+        logger.info(f"Event transport: {self.transport.name}")
+    
+    def _get_redis_client(self, redis_url: str) -> Optional[redis.Redis]:
         """Get Redis client"""
         try:
-            redis_url = current_app.config.get('REDIS_URL', 'redis://localhost:6379/0')
-            return redis.from_url(redis_url, decode_responses=True)
+            client = redis.from_url(redis_url, decode_responses=True)
+            client.ping()
+            return client
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
-            # Return a mock client for development
+            # Fall back to the in-memory transport
             return None
     
-    def _init_consumer_group(self):
-        """Initialize Redis Stream consumer group"""
-        if not self.redis_client:
-            return
-            
-        try:
-            self.redis_client.xgroup_create(
-                self.stream_name, 
-                self.consumer_group, 
-                id='0', 
-                mkstream=True
-            )
-        except redis.exceptions.ResponseError as e:
-            if "BUSYGROUP" not in str(e):
-                logger.error(f"Failed to create consumer group: {e}")
+    def _make_transport(self, redis_client: Optional[redis.Redis]):
+        if redis_client is None:
+            return MemoryEventTransport()
+        return RedisEventTransport(redis_client, self.stream_name, self.consumer_group)
     
     def publish_event(self, event_type: EventType, data: Dict[str, Any], 
                      source: str = "pipeline", metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Publish an event to the stream"""
+        """Publish an event: run local handlers now, write to the stream on the next flush"""
         event = Event(
             id=str(uuid.uuid4()),
             type=event_type,
@@ -112,28 +298,74 @@ class EventService:
             metadata=metadata
         )
         
-        if not self.redis_client:
-            logger.warning("Redis not available, event not published")
-            return event.id
+        # Trigger local handlers immediately for real-time processing
+        self._trigger_handlers(event)
         
-        try:
-            # Add event to Redis Stream
-            event_id = self.redis_client.xadd(
-                self.stream_name,
-                event.to_dict(),
-                maxlen=10000  # Keep last 10k events
-            )
-            
-            logger.info(f"Published event {event_type.value} with ID {event_id}")
-            
-            # Also trigger local handlers immediately for real-time processing
-            self._trigger_handlers(event)
-            
-            return event_id
-            
-        except Exception as e:
-            logger.error(f"Failed to publish event: {e}")
-            return event.id
+        with self._buffer_lock:
+            self._buffer.append(event)
+            self.stats['published'] += 1
+            self._shed_overflow()
+            buffered = len(self._buffer)
+            failing = self._transport_failing
+        
+        if buffered >= EVENT_BUFFER_LIMIT and not failing:
+            # Back-pressure: the publisher helps drain a full buffer, but
+            # never retries a failing transport on the request path
+            self.flush()
+        else:
+            self._ensure_flusher()
+            if buffered >= EVENT_FLUSH_BATCH:
+                self._wakeup.set()
+        
+        return event.id
+    
+    def _shed_overflow(self):
+        """Drop the oldest buffered events beyond twice the buffer limit (buffer lock held)"""
+        overflow = len(self._buffer) - 2 * EVENT_BUFFER_LIMIT
+        if overflow <= 0:
+            return
+        for _ in range(overflow):
+            self._buffer.popleft()
+        self.stats['dropped'] += overflow
+        logger.warning(f"Event buffer full, dropped {overflow} oldest events")
+    
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._buffer_lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name='event-flusher', daemon=True)
+                self._flusher.start()
+    
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(EVENT_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+    
+    def flush(self) -> int:
+        """Write buffered events to the transport in pipelined batches"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._buffer_lock:
+                    batch = [self._buffer.popleft() for _ in range(min(EVENT_FLUSH_BATCH, len(self._buffer)))]
+                if not batch:
+                    return written
+                try:
+                    self.transport.append(batch)
+                except Exception as e:
+                    self.stats['flush_errors'] += 1
+                    logger.error(f"Failed to publish {len(batch)} events: {e}")
+                    # Keep them for the next background flush
+                    with self._buffer_lock:
+                        self._transport_failing = True
+                        self._buffer.extendleft(reversed(batch))
+                        self._shed_overflow()
+                    return written
+                self._transport_failing = False
+                written += len(batch)
+                self.stats['flushed'] += len(batch)
     
     def subscribe_to_events(self, event_types: List[EventType], 
                           handler: Callable[[Event], None]):
@@ -144,94 +376,104 @@ class EventService:
             self.event_handlers[event_type].append(handler)
             logger.info(f"Subscribed handler to {event_type.value}")
     
-    def _trigger_handlers(self, event: Event):
-        """Trigger handlers for an event"""
+    def subscribe_worker(self, event_types: List[EventType],
+                         handler: Callable[[Event], None]):
+        """Subscribe a durable handler, run by the stream worker instead of on publish"""
+        for event_type in event_types:
+            self.worker_handlers.setdefault(event_type, []).append(handler)
+            logger.info(f"Subscribed worker handler to {event_type.value}")
+    
+    def _trigger_handlers(self, event: Event) -> bool:
+        """Trigger handlers for an event; False when any handler failed"""
+        ok = True
         handlers = self.event_handlers.get(event.type, [])
         for handler in handlers:
             try:
                 handler(event)
             except Exception as e:
+                ok = False
                 logger.error(f"Error in event handler for {event.type.value}: {e}")
+        return ok
     
-    def consume_events(self, count: int = 10, block: int = 1000) -> List[Event]:
-        """Consume events from the stream"""
-        if not self.redis_client:
-            return []
+    def run_worker(self, handlers: Optional[Dict[EventType, List[Callable]]] = None,
+                   batch_size: int = EVENT_WORKER_BATCH, block_ms: int = EVENT_WORKER_BLOCK_MS,
+                   claim_idle_ms: int = EVENT_CLAIM_IDLE_MS, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Consume the stream through the consumer group until stopped.
         
-        try:
-            messages = self.redis_client.xreadgroup(
-                self.consumer_group,
-                self.consumer_name,
-                {self.stream_name: '>'},
-                count=count,
-                block=block
-            )
+        Events go to ``handlers``, by default the durable handlers registered
+        with ``subscribe_worker`` (``publish_event`` already ran the local
+        ones). Each batch is dispatched and then acknowledged with a single XACK;
+        events whose handlers fail stay pending and are reclaimed after
+        ``claim_idle_ms``. Reading only after a batch is handled bounds the
+        work in flight to ``batch_size`` (back-pressure). Events of types no
+        handler subscribes to are acknowledged, so without any handlers the
+        worker refuses to start rather than drain the stream.
+        """
+        handlers = handlers if handlers is not None else self.worker_handlers
+        if not any(handlers.values()):
+            raise ValueError("No worker handlers registered; refusing to acknowledge the event stream")
+        totals = {'batches': 0, 'processed': 0, 'acked': 0, 'failed': 0}
+        
+        while max_batches is None or totals['batches'] < max_batches:
+            try:
+                messages = self.transport.claim_stale(self.consumer_name, claim_idle_ms, batch_size)
+                if not messages:
+                    messages = self.transport.read(self.consumer_name, batch_size, block_ms)
+            except Exception as e:
+                logger.error(f"Error reading events: {e}")
+                time.sleep(block_ms / 1000.0)
+                continue
+            
+            totals['batches'] += 1
+            if not messages:
+                continue
             
-            events = []
-            for stream, msgs in messages:
-                for msg_id, fields in msgs:
+            done = []
+            for msg_id, event in messages:
+                ok = True
+                for handler in handlers.get(event.type, []):
                     try:
-                        event = Event.from_dict(fields)
-                        events.append(event)
-                        
-                        # Acknowledge message
-                        self.redis_client.xack(self.stream_name, self.consumer_group, msg_id)
-                        
+                        handler(event)
                     except Exception as e:
-                        logger.error(f"Error processing message {msg_id}: {e}")
+                        ok = False
+                        logger.error(f"Error in event handler for {event.type.value} ({msg_id}): {e}")
+                if ok:
+                    done.append(msg_id)
+                else:
+                    totals['failed'] += 1
             
-            return events
-            
-        except Exception as e:
-            logger.error(f"Error consuming events: {e}")
-            return []
+            totals['processed'] += len(messages)
+            try:
+                totals['acked'] += self.transport.ack(done)
+            except Exception as e:
+                logger.error(f"Error acknowledging {len(done)} events: {e}")
+        
+        return totals
     
     def get_event_history(self, count: int = 100) -> List[Event]:
         """Get recent event history"""
-        if not self.redis_client:
-            return []
-        
         try:
-            messages = self.redis_client.xrevrange(
-                self.stream_name,
-                count=count
-            )
-            
-            events = []
-            for msg_id, fields in messages:
-                try:
-                    event = Event.from_dict(fields)
-                    events.append(event)
-                except Exception as e:
-                    logger.error(f"Error parsing event {msg_id}: {e}")
-            
-            return events
-            
+            return self.transport.history(count)
         except Exception as e:
             logger.error(f"Error getting event history: {e}")
             return []
     
     def get_stream_info(self) -> Dict[str, Any]:
         """Get stream information"""
-        if not self.redis_client:
-            return {}
-        
         try:
-            info = self.redis_client.xinfo_stream(self.stream_name)
-            return {
-                'length': info.get('length', 0),
-                'first_entry': info.get('first-entry'),
-                'last_entry': info.get('last-entry'),
-                'groups': info.get('groups', 0)
-            }
+            info = self.transport.info()
         except Exception as e:
             logger.error(f"Error getting stream info: {e}")
-            return {}
+            info = {}
+        with self._buffer_lock:
+            info['buffered'] = len(self._buffer)
+        info.update(self.stats)
+        return info
 
 # Global event service instance
 event_service = EventService()
 
-# Event handlers for real-time processing
+# Durable event handlers, run by the stream worker
 def handle_transaction_created(event: Event):
     """Handle transaction created events"""
     logger.info(f"Transaction created: {event.data.get('transaction_id')}")
@@ -247,7 +489,7 @@ def handle_cache_invalidated(event: Event):
     logger.info(f"Cache invalidated: {event.data.get('pattern')}")
     # Could trigger cache warming or other optimizations
 
-# Register default handlers
-event_service.subscribe_to_events([EventType.TRANSACTION_CREATED], handle_transaction_created)
-event_service.subscribe_to_events([EventType.PSP_TRACK_UPDATED], handle_psp_track_updated)
-event_service.subscribe_to_events([EventType.CACHE_INVALIDATED], handle_cache_invalidated)
+# Register default handlers; the stream worker runs them off the request path
+event_service.subscribe_worker([EventType.TRANSACTION_CREATED], handle_transaction_created)
+event_service.subscribe_worker([EventType.PSP_TRACK_UPDATED], handle_psp_track_updated)
+event_service.subscribe_worker([EventType.CACHE_INVALIDATED], handle_cache_invalidated)
@@ -8,7 +8,7 @@ import yfinance as yf
 import logging
 from datetime import datetime, timezone, timedelta, date
 from decimal import Decimal
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set, Tuple
 import threading
 import time
 from app.models.exchange_rate import ExchangeRate
@@ -17,6 +17,19 @@ import requests
 
 logger = logging.getLogger(__name__)
 
+# Cached rates for today (or served from a neighbouring day) are re-read after
+# this many seconds; rates stored for past days are cached until invalidated
+RATE_CACHE_TTL = 15 * 60
+
+# Source recorded for hardcoded last-resort rates; never served as history
+FALLBACK_SOURCE = 'fallback_default'
+
+# Only used when the rate store has no rate at all for a currency
+DEFAULT_RATES = {
+    'USD': Decimal('27.0'),
+    'EUR': Decimal('30.0')
+}
+
 
 class ExchangeRateService:
     """
@@ -39,6 +52,12 @@ class ExchangeRateService:
         self.update_thread = None
         self.last_rates = {}
         self.notification_threshold = 0.5  # 0.5 TRY change triggers notification
+        # Read-through cache of the historical rate store: (pair, date) -> (rate, expires_at)
+        self._rate_cache: Dict[Tuple[str, date], Tuple[Decimal, float]] = {}
+        self._rate_cache_lock = threading.Lock()
+        # Past dates served without a stored rate, backfilled by the update loop
+        self._missing_dates: Dict[str, Set[date]] = {}
+        self._history_index_ready = False
         
     def get_current_rate_from_api(self, currency='USD') -> Optional[Dict[str, Any]]:
         """
@@ -108,8 +127,8 @@ class ExchangeRateService:
             
             # First, try to get the most recent rate from database
             def _get_db_rate():
-                recent_rate = ExchangeRate.get_current_rate('USDTRY')
-                if recent_rate and not recent_rate.is_stale(max_age_minutes=60):
+                recent_rate = ExchangeRate.get_current_rate(f"{currency}TRY")
+                if recent_rate and recent_rate.source != FALLBACK_SOURCE and not recent_rate.is_stale(max_age_minutes=60):
                     logger.info(f"Using recent database rate: {recent_rate.rate}")
                     return {
                         'rate': float(recent_rate.rate),
@@ -167,7 +186,7 @@ class ExchangeRateService:
             return {
                 'currency': currency,
                 'rate': default_rate,
-                'source': 'fallback_default',
+                'source': FALLBACK_SOURCE,
                 'timestamp': datetime.now(timezone.utc)
             }
             
@@ -216,6 +235,7 @@ class ExchangeRateService:
                 
                 # Update last rate for comparison
                 self.last_rates[currency] = new_rate.rate
+                self.invalidate_rate_cache(currency_pair)
                 
                 logger.debug(f"Exchange rate updated successfully: {new_rate.rate} TRY/{currency}")
                 return True
@@ -333,6 +353,8 @@ class ExchangeRateService:
                 else:
                     logger.error("Failed to update any exchange rates")
                 
+                self.backfill_missing_dates(self.app)
+                
                 # Wait for next update
                 time.sleep(self.update_interval)
                 
@@ -420,45 +442,208 @@ class ExchangeRateService:
     
     def get_or_fetch_rate(self, currency: str, date_obj) -> Optional[Decimal]:
         """
-        Get exchange rate for a specific currency and date, fetch if not available
+        Get exchange rate for a specific currency and date from the rate store
+        
+        Never calls the network: dates the store does not cover are served the
+        nearest stored rate and queued for the background backfill. The
+        hardcoded defaults only apply when no rate is stored for the currency.
         
         Args:
             currency (str): Currency code (USD, EUR)
             date_obj (date): Date for the rate
             
         Returns:
-            Decimal: Exchange rate or None if not available
+            Decimal: Exchange rate
         """
         try:
-            from app.models.exchange_rate import ExchangeRate
-            
-            # Try to get rate from database first
-            if currency == 'USD':
-                db_rate = ExchangeRate.get_current_rate('USDTRY')
-                if db_rate and not db_rate.is_stale(max_age_minutes=60):
-                    return db_rate.rate
-            
-            # If not available or stale, try to fetch fresh rate
-            rate_data = self.get_current_rate_from_api()
-            if rate_data and currency == 'USD':
-                return Decimal(str(rate_data['rate']))
-            
-            # Fallback rates
-            fallback_rates = {
-                'USD': Decimal('27.0'),
-                'EUR': Decimal('30.0')
-            }
-            
-            return fallback_rates.get(currency, Decimal('1.0'))
-            
+            rate = self.get_rate_for(currency, date_obj)
+            if rate is not None:
+                return rate
         except Exception as e:
             logger.error(f"Error getting exchange rate for {currency}: {e}")
-            # Return fallback rates
-            fallback_rates = {
-                'USD': Decimal('27.0'),
-                'EUR': Decimal('30.0')
+        
+        return DEFAULT_RATES.get((currency or '').upper(), Decimal('1.0'))
+    
+    # Historical rate store
+    
+    @staticmethod
+    def _as_date(date_obj) -> date:
+        if date_obj is None:
+            return date.today()
+        if isinstance(date_obj, datetime):
+            return date_obj.date()
+        if isinstance(date_obj, str):
+            return datetime.strptime(date_obj[:10], '%Y-%m-%d').date()
+        return date_obj
+    
+    def _ensure_history_index(self):
+        """Create the (pair, date) index on databases created before it existed"""
+        if self._history_index_ready:
+            return
+        for index in ExchangeRate.__table__.indexes:
+            if index.name == 'idx_currency_pair_date':
+                index.create(bind=db.engine, checkfirst=True)
+        self._history_index_ready = True
+    
+    def _read_stored_rate(self, currency_pair: str, day: date) -> Tuple[Optional[Decimal], Optional[date]]:
+        """Stored rate for day, else the latest before it, else the earliest after it"""
+        self._ensure_history_index()
+        row = db.session.query(ExchangeRate.rate, ExchangeRate.date).filter(
+            ExchangeRate.currency_pair == currency_pair,
+            ExchangeRate.source != FALLBACK_SOURCE,
+            ExchangeRate.date <= day
+        ).order_by(ExchangeRate.date.desc(), ExchangeRate.created_at.desc()).first()
+        
+        if row is None:
+            row = db.session.query(ExchangeRate.rate, ExchangeRate.date).filter(
+                ExchangeRate.currency_pair == currency_pair,
+                ExchangeRate.source != FALLBACK_SOURCE,
+                ExchangeRate.date > day
+            ).order_by(ExchangeRate.date.asc(), ExchangeRate.created_at.desc()).first()
+        
+        if row is None:
+            return None, None
+        return Decimal(str(row.rate)), row.date
+    
+    def get_rate_for(self, currency: str, date_obj=None, exact: bool = False) -> Optional[Decimal]:
+        """
+        Rate converting currency to TRY on a date, read through the in-memory
+        cache from the stored rates (no network access)
+        
+        Args:
+            exact (bool): Only return a rate stored for that very date instead
+                of the nearest stored one
+        
+        Returns:
+            Decimal: Rate, or None when nothing (or, with exact, nothing for
+            the date) is stored for the currency
+        """
+        currency = (currency or '').upper()
+        if currency in ('TL', 'TRY'):
+            return Decimal('1.0')
+        
+        currency_pair = f"{currency}TRY"
+        day = self._as_date(date_obj)
+        key = (currency_pair, day)
+        now = time.monotonic()
+        
+        cached = self._rate_cache.get(key)
+        # Only exact past-date rates are cached without expiry
+        if cached is not None and cached[1] > now and (not exact or cached[1] == float('inf')):
+            return cached[0]
+        
+        rate, rate_date = self._read_stored_rate(currency_pair, day)
+        if rate is None:
+            return None
+        
+        exact_date = rate_date == day
+        with self._rate_cache_lock:
+            self._rate_cache[key] = (rate, float('inf') if exact_date and day < date.today() else now + RATE_CACHE_TTL)
+            if not exact_date and day < date.today():
+                self._missing_dates.setdefault(currency, set()).add(day)
+        if exact and not exact_date:
+            return None
+        return rate
+    
+    def invalidate_rate_cache(self, currency_pair: Optional[str] = None):
+        """Drop cached rates for one pair (or all pairs)"""
+        with self._rate_cache_lock:
+            if currency_pair is None:
+                self._rate_cache.clear()
+            else:
+                self._rate_cache = {
+                    key: value for key, value in self._rate_cache.items() if key[0] != currency_pair
+                }
+    
+    def backfill_history(self, currency: str, start_date, end_date=None) -> Dict[str, Any]:
+        """
+        Store daily closing rates for a date range with one yfinance request
+        
+        Dates that already have a stored (non-fallback) rate are left untouched.
+        
+        Args:
+            currency (str): Currency code (USD, EUR)
+            start_date (date): First day of the range
+            end_date (date, optional): Last day of the range (defaults to today)
+            
+        Returns:
+            Dict with fetched and inserted day counts
+        """
+        currency = currency.upper()
+        if currency not in self.currency_pairs:
+            raise ValueError(f"Unsupported currency: {currency}")
+        
+        start_date = self._as_date(start_date)
+        end_date = self._as_date(end_date)
+        currency_pair = f"{currency}TRY"
+        
+        history = yf.Ticker(self.currency_pairs[currency]).history(
+            start=start_date.isoformat(),
+            end=(end_date + timedelta(days=1)).isoformat(),
+            interval='1d'
+        )
+        
+        closes = {}
+        for timestamp, row in history.iterrows():
+            close = row.get('Close')
+            if close is not None and close == close and close > 0:
+                closes[timestamp.date()] = Decimal(str(round(float(close), 4)))
+        
+        self._ensure_history_index()
+        stored = {
+            row.date for row in db.session.query(ExchangeRate.date).filter(
+                ExchangeRate.currency_pair == currency_pair,
+                ExchangeRate.source != FALLBACK_SOURCE,
+                ExchangeRate.date >= start_date,
+                ExchangeRate.date <= end_date
+            ).distinct()
+        }
+        
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                'date': day,
+                'currency_pair': currency_pair,
+                'rate': rate,
+                'source': 'yfinance_history',
+                'is_manual_override': False,
+                'data_quality': 'closing_price',
+                'created_at': now,
+                'is_active': False
             }
-            return fallback_rates.get(currency, Decimal('1.0'))
+            for day, rate in sorted(closes.items())
+            if day not in stored
+        ]
+        if rows:
+            db.session.execute(ExchangeRate.__table__.insert(), rows)
+        db.session.commit()
+        self.invalidate_rate_cache(currency_pair)
+        
+        logger.info(f"Backfilled {len(rows)} {currency_pair} daily rates ({start_date} to {end_date})")
+        return {
+            'currency': currency,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'fetched_days': len(closes),
+            'inserted_days': len(rows)
+        }
+    
+    def backfill_missing_dates(self, app=None):
+        """Backfill past dates that were served without a stored rate"""
+        with self._rate_cache_lock:
+            pending, self._missing_dates = self._missing_dates, {}
+        
+        for currency, days in pending.items():
+            if currency not in self.currency_pairs or not days:
+                continue
+            try:
+                if app:
+                    with app.app_context():
+                        self.backfill_history(currency, min(days), max(days))
+                else:
+                    self.backfill_history(currency, min(days), max(days))
+            except Exception as e:
+                logger.warning(f"Could not backfill {currency} rates: {e}")
 
 
 # Global service instance
@@ -0,0 +1,181 @@
+"""
+Export Service for PipLine Treasury System
+Streams query results as CSV or XLSX downloads in bounded memory
+"""
+import csv
+import io
+import logging
+import os
+import tempfile
+import zlib
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from flask import Response, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per database round trip (server-side cursor where supported)
+EXPORT_BATCH_SIZE = 1000
+
+# Rows buffered before a CSV chunk is emitted
+CSV_CHUNK_ROWS = 500
+
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# (header, formatter applied to the column value)
+ExportColumn = Tuple[str, Optional[Callable[[Any], Any]]]
+
+
+def format_date(value) -> str:
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+def format_datetime(value) -> str:
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def format_isoformat(value) -> str:
+    return value.isoformat() if value else ''
+
+
+def format_number(value):
+    return float(value) if value is not None else ''
+
+
+def format_text(value) -> str:
+    return value or ''
+
+
+class ExportService:
+    """Streams rows from a query to CSV/XLSX without materializing the result"""
+
+    @staticmethod
+    def iter_query_rows(query, columns: Sequence, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[tuple]:
+        """Yield plain column tuples of an ORM query, fetched in batches"""
+        for row in query.with_entities(*columns).yield_per(batch_size):
+            yield tuple(row)
+
+    @staticmethod
+    def format_rows(rows: Iterable[tuple], columns: Sequence[ExportColumn]) -> Iterator[list]:
+        """Apply the column formatters to each row"""
+        formatters = [formatter for _, formatter in columns]
+        for row in rows:
+            yield [
+                formatter(value) if formatter else value
+                for formatter, value in zip(formatters, row)
+            ]
+
+    @staticmethod
+    def iter_csv(header: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+        """Encode rows as UTF-8 CSV, a few hundred rows per chunk"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+
+        pending = 0
+        for row in rows:
+            writer.writerow(row)
+            pending += 1
+            if pending >= CSV_CHUNK_ROWS:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def iter_xlsx(header: Sequence[str], rows: Iterable[Sequence[Any]], sheet_title: str = 'Export') -> Iterator[bytes]:
+        """Write rows with openpyxl's write-only mode to a temp file and stream it.
+
+        XLSX is a zip archive, so the file is finished on disk before the
+        first byte is sent; memory stays bounded by the write-only writer.
+        """
+        from openpyxl import Workbook
+
+        handle, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(handle)
+        try:
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet(title=sheet_title[:31])
+            sheet.append(list(header))
+            for row in rows:
+                sheet.append(row)
+            workbook.save(path)
+
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(FILE_CHUNK_SIZE), b''):
+                    yield block
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Gzip a byte stream incrementally"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def stream_response(self, filename: str, columns: Sequence[ExportColumn], rows: Iterable[tuple],
+                        export_format: str = 'csv', compress: bool = False,
+                        sheet_title: str = 'Export') -> Response:
+        """Build a streamed download response for rows matching columns.
+
+        ``filename`` is given without extension. With ``compress`` the file
+        is sent as a .gz attachment.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+
+        header = [name for name, _ in columns]
+        formatted = self.format_rows(rows, columns)
+
+        if export_format == 'xlsx':
+            chunks = self.iter_xlsx(header, formatted, sheet_title)
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            filename = f"{filename}.xlsx"
+        else:
+            chunks = self.iter_csv(header, formatted)
+            mimetype = 'text/csv'
+            filename = f"{filename}.csv"
+
+        if compress:
+            chunks = self.gzip_chunks(chunks)
+            mimetype = 'application/gzip'
+            filename = f"{filename}.gz"
+
+        return Response(
+            stream_with_context(self._logged(chunks, filename)),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename={filename}',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+
+    @staticmethod
+    def _logged(chunks: Iterable[bytes], filename: str) -> Iterator[bytes]:
+        """Pass chunks through, logging the size once the export finishes"""
+        total = 0
+        try:
+            for chunk in chunks:
+                total += len(chunk)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated download
+            logger.error(f"Export {filename} failed after {total} bytes: {e}")
+            raise
+        logger.info(f"Exported {filename} ({total} bytes)")
+
+
+# Global instance
+export_service = ExportService()
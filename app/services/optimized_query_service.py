@@ -487,7 +487,7 @@ class OptimizedQueryService:
             raise
     
     def invalidate_cache(self, pattern: str = None):
-        """Invalidate cache for specific patterns"""
+        """Invalidate cache for an ad-hoc pattern, or every analytics key prefix"""
         try:
             cache_service = self._get_cache_service()
             if cache_service:
@@ -495,14 +495,14 @@ class OptimizedQueryService:
                     cache_service.invalidate_pattern(pattern)
                 else:
                     # Invalidate all analytics cache
-                    patterns = [
+                    prefixes = [
                         "dashboard_metrics",
                         "business_analytics", 
                         "psp_track_data",
                         "transaction_stats"
                     ]
-                    for p in patterns:
-                        cache_service.invalidate_pattern(p)
+                    for prefix in prefixes:
+                        cache_service.invalidate_prefix(prefix)
                 logger.info(f"Cache invalidated for pattern: {pattern or 'all analytics'}")
         except Exception as e:
             logger.error(f"Error invalidating cache: {e}")
@@ -0,0 +1,184 @@
+"""
+Principal Service for PipLine Treasury System
+Caches the authenticated user, settings and permissions per user id
+"""
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models.user import User
+from app.models.config import UserSettings
+
+logger = logging.getLogger(__name__)
+
+# Seconds a principal is trusted without re-reading it; bounds staleness
+# across worker processes, which do not see each other's invalidations
+PRINCIPAL_CACHE_TTL = 60
+
+PRINCIPAL_MODELS = (User, UserSettings)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Immutable snapshot of a user, their settings and parsed permissions"""
+    user_id: int
+    version: int
+    loaded_at: float
+    columns: Mapping[str, Any]
+    settings: Optional[Mapping[str, Any]]
+    permissions: Mapping[str, Any]
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self.columns.get('is_active'))
+
+
+def parse_permissions(raw: Optional[str]) -> Dict[str, Any]:
+    """Decode User.admin_permissions, empty dict when unset or invalid"""
+    if not raw:
+        return {}
+    try:
+        value = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+class PrincipalCache:
+    """Per-process principal cache keyed by user id and version.
+
+    ``load_user`` serves Flask-Login from the snapshot: the User instance
+    is rebuilt from cached column values and attached to the session
+    without a SELECT, so steady-state authenticated requests run no
+    identity queries. Committed writes to a User or UserSettings row bump
+    that user's version (session hooks); the TTL covers writes made by
+    other processes.
+    """
+
+    def __init__(self, ttl: int = PRINCIPAL_CACHE_TTL):
+        self.ttl = ttl
+        self._principals: Dict[int, Principal] = {}
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._hooks_registered = False
+
+    def init_app(self, app):
+        """Register session hooks that invalidate principals on user writes"""
+        self.ttl = app.config.get('PRINCIPAL_CACHE_TTL', self.ttl)
+        self.register_session_hooks()
+
+    def register_session_hooks(self):
+        if self._hooks_registered:
+            return
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+        self._hooks_registered = True
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        changed: Set[int] = session.info.setdefault('principals_changed', set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User):
+                changed.add(obj.id)
+            elif isinstance(obj, UserSettings):
+                changed.add(obj.user_id)
+
+    def _after_commit(self, session):
+        for user_id in session.info.pop('principals_changed', ()):
+            self.invalidate(user_id)
+
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        session.info.pop('principals_changed', None)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop one user's principal (or all) so the next request reloads it"""
+        with self._lock:
+            if user_id is None:
+                for cached_id in list(self._principals):
+                    self._versions[cached_id] = self._versions.get(cached_id, 0) + 1
+                self._principals.clear()
+            else:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._principals.pop(user_id, None)
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        """Principal for a user id, loaded with one query on a miss"""
+        principal = self._principals.get(user_id)
+        if principal is not None and time.monotonic() - principal.loaded_at < self.ttl:
+            return principal
+
+        version = self._versions.get(user_id, 0)
+        principal = self._load(user_id, version)
+        if principal is None:
+            return None
+        with self._lock:
+            # Keep it only if no write was committed while it was loading
+            if self._versions.get(user_id, 0) == version:
+                self._principals[user_id] = principal
+        return principal
+
+    @staticmethod
+    def _load(user_id: int, version: int) -> Optional[Principal]:
+        row = db.session.query(User.__table__, UserSettings.__table__).outerjoin(
+            UserSettings.__table__, UserSettings.__table__.c.user_id == User.__table__.c.id
+        ).filter(User.__table__.c.id == user_id).first()
+        if row is None:
+            return None
+
+        mapping = row._mapping
+        columns = {column.key: mapping[column] for column in User.__table__.columns}
+        settings = None
+        if mapping[UserSettings.__table__.c.id] is not None:
+            settings = MappingProxyType({
+                column.key: mapping[column] for column in UserSettings.__table__.columns
+            })
+
+        return Principal(
+            user_id=user_id,
+            version=version,
+            loaded_at=time.monotonic(),
+            columns=MappingProxyType(columns),
+            settings=settings,
+            permissions=MappingProxyType(parse_permissions(columns.get('admin_permissions')))
+        )
+
+    def load_user(self, user_id: int) -> Optional[User]:
+        """Active User attached to the current session, built from the cached principal"""
+        principal = self.get(user_id)
+        if principal is None or not principal.is_active:
+            return None
+
+        user = User.__mapper__.class_manager.new_instance()
+        for key, value in principal.columns.items():
+            set_committed_value(user, key, value)
+        make_transient_to_detached(user)
+        # Attach without a SELECT; later changes flush as usual
+        user = db.session.merge(user, load=False)
+        user.principal = principal
+        return user
+
+    def settings_for(self, user_id: int) -> Optional[Mapping[str, Any]]:
+        """Cached settings of a user (read-only mapping), None when unset"""
+        principal = self.get(user_id)
+        return principal.settings if principal is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'cached_principals': len(self._principals),
+            'ttl': self.ttl
+        }
+
+
+# Global instance
+principal_cache = PrincipalCache()
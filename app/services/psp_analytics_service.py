@@ -4,20 +4,60 @@ Provides comprehensive analytics and metrics for Payment Service Providers
 """
 from datetime import datetime, timedelta, date
 from decimal import Decimal, ROUND_HALF_UP
-from collections import defaultdict
-from typing import Dict, List, Any
-import statistics
+from typing import Dict, List, Any, Iterable, Optional
+import numpy as np
+import pandas as pd
 from app.models.financial import PspTrack
 from app import db
 
 # Decimal/Float type mismatch prevention
 from app.services.decimal_float_fix_service import decimal_float_service
 
+# Columns of the analytics frame, one row per PSP Track entry
+TRACK_FRAME_COLUMNS = ('psp_name', 'date', 'amount', 'commission_amount', 'difference', 'withdraw', 'allocation')
+
+# Money columns, held as integer cents so sums match Decimal arithmetic exactly
+MONEY_COLUMNS = ('amount', 'commission_amount', 'difference', 'withdraw', 'allocation')
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 
 
 class PspAnalyticsService:
     """Service for PSP analytics and metrics calculation"""
     
+    @staticmethod
+    def build_track_frame(rows: Iterable[Any]) -> pd.DataFrame:
+        """
+        Build the columnar analytics frame
+        
+        Args:
+            rows: PspTrack objects or rows exposing TRACK_FRAME_COLUMNS
+            
+        Returns:
+            DataFrame with datetime64 dates and int64 cent amounts
+        """
+        rows = list(rows)
+        count = len(rows)
+        ordinals = np.fromiter((row.date.toordinal() for row in rows), dtype='int64', count=count)
+        columns = {
+            'psp_name': [row.psp_name for row in rows],
+            'date': (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+        }
+        for column in MONEY_COLUMNS:
+            values = np.fromiter((float(getattr(row, column) or 0) for row in rows), dtype='float64', count=count)
+            columns[column] = np.rint(values * 100).astype('int64')
+        return pd.DataFrame(columns, columns=list(TRACK_FRAME_COLUMNS))
+    
+    @staticmethod
+    def load_track_frame(psp_name: Optional[str] = None, start_date: Optional[date] = None) -> pd.DataFrame:
+        """Load PSP Track columns (no ORM objects) into the analytics frame"""
+        query = db.session.query(*[getattr(PspTrack, column) for column in TRACK_FRAME_COLUMNS])
+        if psp_name is not None:
+            query = query.filter(PspTrack.psp_name == psp_name)
+        if start_date is not None:
+            query = query.filter(PspTrack.date >= start_date)
+        return PspAnalyticsService.build_track_frame(query.all())
+    
     @staticmethod
     def calculate_psp_metrics(psp_tracks: List[PspTrack]) -> Dict[str, Any]:
         """
@@ -30,37 +70,24 @@ class PspAnalyticsService:
             Dictionary containing detailed PSP metrics
         """
         if not psp_tracks:
-            return {
-                'total_active_psps': 0,
-                'total_allocation': 0,
-                'total_rollover': 0,
-                'avg_allocation': 0,
-                'psps': {},
-                'overall_metrics': {}
-            }
+            return PspAnalyticsService._empty_metrics()
+        return PspAnalyticsService.calculate_frame_metrics(PspAnalyticsService.build_track_frame(psp_tracks))
+    
+    @staticmethod
+    def calculate_frame_metrics(frame: pd.DataFrame) -> Dict[str, Any]:
+        """Calculate the metrics of calculate_psp_metrics from an analytics frame"""
+        if frame.empty:
+            return PspAnalyticsService._empty_metrics()
         
-        # Group tracks by PSP
-        psp_data = defaultdict(list)
-        for track in psp_tracks:
-            psp_data[track.psp_name].append(track)
+        psp_names, per_psp = PspAnalyticsService._calculate_grouped_metrics(frame)
+        psp_metrics = PspAnalyticsService._metrics_dicts(psp_names, per_psp)
         
-        # Calculate metrics for each PSP
-        psp_metrics = {}
-        total_allocation = Decimal('0')  # FIXED: Only user-entered allocations
-        total_amount = Decimal('0')      # FIXED: Total transaction amounts
-        total_rollover = Decimal('0')
-        total_commission = Decimal('0')
-        total_transactions = 0
-        
-        for psp_name, tracks in psp_data.items():
-            metrics = PspAnalyticsService._calculate_individual_psp_metrics(psp_name, tracks)
-            psp_metrics[psp_name] = metrics
-            
-            total_allocation += Decimal(str(metrics['total_allocation']))  # FIXED: Only user-entered allocations
-            total_amount += Decimal(str(metrics['total_amount']))          # FIXED: Total transaction amounts
-            total_rollover += Decimal(str(metrics['total_rollover']))
-            total_commission += Decimal(str(metrics['total_commission']))
-            total_transactions += metrics['transaction_count']
+        # Cent totals convert to the exact Decimal sums
+        total_allocation = Decimal(int(per_psp['total_allocation'].sum())) / 100  # FIXED: Only user-entered allocations
+        total_amount = Decimal(int(per_psp['total_amount'].sum())) / 100          # FIXED: Total transaction amounts
+        total_rollover = Decimal(int(per_psp['total_rollover'].sum())) / 100
+        total_commission = Decimal(int(per_psp['total_commission'].sum())) / 100
+        total_transactions = int(per_psp['transaction_count'].sum())
         
         # Calculate overall metrics
         overall_metrics = PspAnalyticsService._calculate_overall_metrics(
@@ -77,110 +104,154 @@ class PspAnalyticsService:
         }
     
     @staticmethod
-    def _calculate_individual_psp_metrics(psp_name: str, tracks: List[PspTrack]) -> Dict[str, Any]:
-        """Calculate detailed metrics for a single PSP"""
-        
-        # Sort tracks by date
-        tracks.sort(key=lambda x: x.date)
-        
-        # Basic calculations - FIXED: Use correct fields
-        total_amount = sum(track.amount or Decimal('0') for track in tracks)  # Total transaction amount
-        total_withdraw = sum(track.withdraw or Decimal('0') for track in tracks)
-        total_commission = sum(track.commission_amount or Decimal('0') for track in tracks)
-        total_rollover = sum(track.difference or Decimal('0') for track in tracks)
+    def _empty_metrics() -> Dict[str, Any]:
+        return {
+            'total_active_psps': 0,
+            'total_allocation': 0,
+            'total_rollover': 0,
+            'avg_allocation': 0,
+            'psps': {},
+            'overall_metrics': {}
+        }
+    
+    @staticmethod
+    def _calculate_grouped_metrics(frame: pd.DataFrame):
+        """
+        Per-PSP metrics as arrays indexed by PSP code
         
-        # FIXED: Only count allocation amounts that users have actually entered
-        total_allocation = sum(track.allocation or Decimal('0') for track in tracks if track.allocation and track.allocation > 0)
+        Returns:
+            (psp names in order of first appearance, dict of metric arrays)
+        """
+        codes, psp_names = pd.factorize(frame['psp_name'], sort=False)
+        size = len(psp_names)
+        days = frame['date'].to_numpy().astype('datetime64[D]').astype('int64')
+        amount = frame['amount'].to_numpy()
+        
+        def group_sum(values, group_codes=codes):
+            return np.bincount(group_codes, weights=values, minlength=size)
+        
+        today = (np.datetime64(date.today(), 'D') - np.datetime64(0, 'D')).astype('int64')
+        recent = days >= today - 30
+        previous = (days >= today - 60) & ~recent
+        
+        # One (PSP, day) group per distinct day a PSP has entries on
+        day_offset = days - days.min()
+        day_span = int(day_offset.max()) + 1
+        pair_keys, pair_index = np.unique(codes * day_span + day_offset, return_inverse=True)
+        pair_codes = pair_keys // day_span
+        
+        first_day = np.full(size, days.max())
+        last_day = np.full(size, days.min())
+        np.minimum.at(first_day, codes, days)
+        np.maximum.at(last_day, codes, days)
+        
+        per_psp = {
+            'total_amount': group_sum(amount),
+            'total_withdraw': group_sum(frame['withdraw'].to_numpy()),
+            'total_commission': group_sum(frame['commission_amount'].to_numpy()),
+            'total_rollover': group_sum(frame['difference'].to_numpy()),
+            # FIXED: Only count allocation amounts that users have actually entered
+            'total_allocation': group_sum(np.clip(frame['allocation'].to_numpy(), 0, None)),
+            'transaction_count': np.bincount(codes, minlength=size),
+            'active_days': np.bincount(pair_codes, minlength=size),
+            'first_day': first_day,
+            'last_day': last_day,
+            'recent_amount': group_sum(np.where(recent, amount, 0)),
+            'recent_transactions': np.bincount(codes, weights=recent, minlength=size),
+            'previous_amount': group_sum(np.where(previous, amount, 0)),
+            'previous_transactions': np.bincount(codes, weights=previous, minlength=size)
+        }
         
-        # Date range analysis
-        dates = [track.date for track in tracks]
-        active_days = len(set(dates))
-        first_date = min(dates)
-        last_date = max(dates)
-        days_active = (last_date - first_date).days + 1
+        total_amount = per_psp['total_amount'] / 100
+        total_commission = per_psp['total_commission'] / 100
+        count = per_psp['transaction_count']
+        active_days = per_psp['active_days']
         
-        # Performance metrics
-        net_amount = total_amount - total_commission
+        per_psp['net_amount'] = (per_psp['total_amount'] - per_psp['total_commission']) / 100
+        per_psp['days_active'] = last_day - first_day + 1
         
         # FIXED: ROI should be calculated based on allocation, not transaction amount
         # If no allocation is entered, ROI is undefined (set to 0)
-        if total_allocation > 0:
-            roi = float((net_amount / total_allocation * 100))
-        else:
-            roi = 0.0  # No allocation means no ROI calculation possible
-        
-        # Commission efficiency
-        avg_commission_rate = float((total_commission / total_amount * 100) if total_amount > 0 else 0)
-        
-        # Transaction patterns
-        transaction_count = len(tracks)
-        avg_daily_transactions = transaction_count / active_days if active_days > 0 else 0
+        allocation_total = per_psp['total_allocation'] / 100
+        per_psp['roi_percentage'] = PspAnalyticsService._ratio(per_psp['net_amount'] * 100, allocation_total)
+        per_psp['avg_commission_rate'] = PspAnalyticsService._ratio(total_commission * 100, total_amount)
+        per_psp['avg_daily_transactions'] = PspAnalyticsService._ratio(count, active_days)
         
         # Trend analysis (last 30 days vs previous 30 days)
-        thirty_days_ago = date.today() - timedelta(days=30)
-        sixty_days_ago = date.today() - timedelta(days=60)
-        
-        recent_tracks = [t for t in tracks if t.date >= thirty_days_ago]
-        previous_tracks = [t for t in tracks if sixty_days_ago <= t.date < thirty_days_ago]
-        
-        recent_amount = sum(t.amount or Decimal('0') for t in recent_tracks)
-        previous_amount = sum(t.amount or Decimal('0') for t in previous_tracks)
-        
-        # Growth rate calculation
-        growth_rate = 0.0
-        if previous_amount > 0:
-            growth_rate = float(((recent_amount - previous_amount) / previous_amount) * 100)
+        previous_amount = per_psp['previous_amount']
+        per_psp['growth_rate'] = PspAnalyticsService._ratio(
+            (per_psp['recent_amount'] - previous_amount) * 100, previous_amount
+        )
         
-        # Risk indicators
-        daily_amounts = []
-        for track in tracks:
-            daily_amounts.append(float(track.amount or 0))
+        # Risk indicators: sample standard deviation of entry amounts
+        values = amount / 100
+        mean_value = group_sum(values) / count
+        squares = group_sum((values - mean_value[codes]) ** 2)
+        per_psp['volatility'] = np.sqrt(PspAnalyticsService._ratio(squares, count - 1))
         
-        volatility = statistics.stdev(daily_amounts) if len(daily_amounts) > 1 else 0
-        consistency_score = PspAnalyticsService._calculate_consistency_score(tracks)
+        per_psp['consistency_score'] = PspAnalyticsService._calculate_consistency_scores(
+            np.bincount(pair_index, weights=amount), pair_codes, count, active_days
+        )
+        per_psp['efficiency_score'] = PspAnalyticsService._calculate_efficiency_scores(
+            total_amount, total_commission, active_days, count
+        )
         
         # Status determination
-        is_active = last_date >= (date.today() - timedelta(days=7))
-        performance_tier = PspAnalyticsService._determine_performance_tier(roi, growth_rate, consistency_score)
-        
-        # Efficiency metrics
-        efficiency_score = PspAnalyticsService._calculate_efficiency_score(
-            total_amount, total_commission, active_days, transaction_count
+        per_psp['is_active'] = last_day >= today - 7
+        per_psp['performance_tier'] = PspAnalyticsService._determine_performance_tiers(
+            per_psp['roi_percentage'], per_psp['growth_rate'], per_psp['consistency_score']
         )
-        
-        return {
-            'psp_name': psp_name,
-            'total_amount': float(total_amount),  # FIXED: Renamed from total_allocation
-            'total_allocation': float(total_allocation),  # FIXED: Only user-entered allocations
-            'total_withdraw': float(total_withdraw),
-            'total_commission': float(total_commission),
-            'total_rollover': float(total_rollover),
-            'net_amount': float(net_amount),
-            'transaction_count': transaction_count,
-            'active_days': active_days,
-            'days_active': days_active,
-            'first_date': first_date.isoformat(),
-            'last_date': last_date.isoformat(),
-            'roi_percentage': float(roi),
-            'avg_commission_rate': float(avg_commission_rate),
-            'avg_daily_transactions': float(avg_daily_transactions),
-            'growth_rate': float(growth_rate),
-            'volatility': float(volatility),
-            'consistency_score': float(consistency_score),
-            'efficiency_score': float(efficiency_score),
-            'is_active': is_active,
-            'performance_tier': performance_tier,
-            'recent_30_days': {
-                'amount': float(recent_amount),  # FIXED: Renamed from allocation
-                'transactions': len(recent_tracks),
-                'avg_daily': float(recent_amount / 30) if recent_amount > 0 else 0
-            },
-            'previous_30_days': {
-                'amount': float(previous_amount),
-                'transactions': len(previous_tracks),
-                'avg_daily': float(previous_amount / 30) if previous_amount > 0 else 0
+        return list(psp_names), per_psp
+    
+    @staticmethod
+    def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+        """numerator / denominator where the denominator is positive, 0.0 elsewhere"""
+        numerator = np.asarray(numerator, dtype='float64')
+        denominator = np.asarray(denominator, dtype='float64')
+        return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+    
+    @staticmethod
+    def _metrics_dicts(psp_names: List[str], per_psp: Dict[str, np.ndarray]) -> Dict[str, Dict[str, Any]]:
+        """Per-PSP metric arrays as the plain dicts served to templates and JSON"""
+        columns = {key: values.tolist() for key, values in per_psp.items()}
+        psp_metrics = {}
+        for i, psp_name in enumerate(psp_names):
+            recent_amount = int(columns['recent_amount'][i]) / 100
+            previous_amount = int(columns['previous_amount'][i]) / 100
+            psp_metrics[psp_name] = {
+                'psp_name': psp_name,
+                'total_amount': int(columns['total_amount'][i]) / 100,  # FIXED: Renamed from total_allocation
+                'total_allocation': int(columns['total_allocation'][i]) / 100,  # FIXED: Only user-entered allocations
+                'total_withdraw': int(columns['total_withdraw'][i]) / 100,
+                'total_commission': int(columns['total_commission'][i]) / 100,
+                'total_rollover': int(columns['total_rollover'][i]) / 100,
+                'net_amount': columns['net_amount'][i],
+                'transaction_count': columns['transaction_count'][i],
+                'active_days': columns['active_days'][i],
+                'days_active': columns['days_active'][i],
+                'first_date': date.fromordinal(columns['first_day'][i] + EPOCH_ORDINAL).isoformat(),
+                'last_date': date.fromordinal(columns['last_day'][i] + EPOCH_ORDINAL).isoformat(),
+                'roi_percentage': columns['roi_percentage'][i],
+                'avg_commission_rate': columns['avg_commission_rate'][i],
+                'avg_daily_transactions': columns['avg_daily_transactions'][i],
+                'growth_rate': columns['growth_rate'][i],
+                'volatility': columns['volatility'][i],
+                'consistency_score': columns['consistency_score'][i],
+                'efficiency_score': columns['efficiency_score'][i],
+                'is_active': columns['is_active'][i],
+                'performance_tier': columns['performance_tier'][i],
+                'recent_30_days': {
+                    'amount': recent_amount,  # FIXED: Renamed from allocation
+                    'transactions': int(columns['recent_transactions'][i]),
+                    'avg_daily': recent_amount / 30 if recent_amount > 0 else 0
+                },
+                'previous_30_days': {
+                    'amount': previous_amount,
+                    'transactions': int(columns['previous_transactions'][i]),
+                    'avg_daily': previous_amount / 30 if previous_amount > 0 else 0
+                }
             }
-        }
+        return psp_metrics
     
     @staticmethod
     def _calculate_overall_metrics(psp_metrics: Dict, total_amount: Decimal, 
@@ -216,102 +287,75 @@ class PspAnalyticsService:
         }
     
     @staticmethod
-    def _calculate_consistency_score(tracks: List[PspTrack]) -> float:
-        """Calculate consistency score based on transaction patterns"""
-        if len(tracks) < 2:
-            return 100.0
-        
-        # Calculate daily amounts and their consistency
-        daily_amounts = defaultdict(Decimal)
-        for track in tracks:
-            daily_amounts[track.date] += track.amount or Decimal('0')
-        
-        amounts = list(daily_amounts.values())
-        if len(amounts) < 2:
-            return 100.0
-        
-        # Calculate coefficient of variation (lower is more consistent)
-        mean_amount = sum(amounts) / len(amounts)
-        if mean_amount == 0:
-            return 100.0
-        
-        variance = sum((amount - mean_amount) ** 2 for amount in amounts) / len(amounts)
-        std_dev = float(variance) ** 0.5
-        cv = (std_dev / float(mean_amount)) * 100
+    def _calculate_consistency_scores(daily_amounts: np.ndarray, day_codes: np.ndarray,
+                                      entry_count: np.ndarray, active_days: np.ndarray) -> np.ndarray:
+        """Consistency score per PSP based on the variation of its daily amounts"""
+        size = len(active_days)
+        mean_amount = np.bincount(day_codes, weights=daily_amounts, minlength=size) / active_days
+        
+        # Coefficient of variation (lower is more consistent), population variance
+        variance = np.bincount(day_codes, weights=(daily_amounts - mean_amount[day_codes]) ** 2,
+                               minlength=size) / active_days
+        std_dev = np.sqrt(variance)
+        safe_mean = np.where(mean_amount == 0, 1, mean_amount)
+        cv = std_dev / safe_mean * 100
         
         # Convert to consistency score (0-100, higher is more consistent)
-        consistency_score = max(0, 100 - cv)
-        return float(consistency_score)
+        consistency_score = np.maximum(0, 100 - cv)
+        
+        # Fewer than two entries or days, or a zero mean, count as fully consistent
+        undefined = (entry_count < 2) | (active_days < 2) | (mean_amount == 0)
+        return np.where(undefined, 100.0, consistency_score)
     
     @staticmethod
-    def _calculate_efficiency_score(total_amount: Decimal, total_commission: Decimal, 
-                                  active_days: int, transaction_count: int) -> float:
-        """Calculate efficiency score based on multiple factors"""
-        
-        if total_amount == 0:
-            return 0.0
+    def _calculate_efficiency_scores(total_amount: np.ndarray, total_commission: np.ndarray,
+                                     active_days: np.ndarray, transaction_count: np.ndarray) -> np.ndarray:
+        """Efficiency score per PSP based on multiple factors"""
+        safe_amount = np.where(total_amount == 0, 1, total_amount)
         
         # Commission efficiency (lower commission rate is better)
-        commission_rate = float((total_commission / total_amount) * 100)
-        commission_score = max(0, 100 - commission_rate * 10)  # Scale factor
+        commission_rate = total_commission / safe_amount * 100
+        commission_score = np.maximum(0, 100 - commission_rate * 10)  # Scale factor
         
         # Activity efficiency (more transactions per day is better)
-        activity_score = min(100, (transaction_count / active_days) * 10) if active_days > 0 else 0
+        activity_score = np.minimum(100, PspAnalyticsService._ratio(transaction_count, active_days) * 10)
         
         # Volume efficiency (higher amount per transaction is better)
-        volume_score = min(100, float(total_amount / transaction_count / 1000)) if transaction_count > 0 else 0
+        volume_score = np.minimum(100, PspAnalyticsService._ratio(total_amount, transaction_count) / 1000)
         
         # Weighted average
-        efficiency_score = (commission_score * 0.4 + activity_score * 0.3 + volume_score * 0.3)
-        return float(efficiency_score)
+        efficiency_score = commission_score * 0.4 + activity_score * 0.3 + volume_score * 0.3
+        return np.where(total_amount == 0, 0.0, efficiency_score)
     
     @staticmethod
-    def _determine_performance_tier(roi: float, growth_rate: float, consistency_score: float) -> str:
-        """Determine performance tier based on metrics"""
-        
-        # Ensure all values are floats
-        roi = float(roi)
-        growth_rate = float(growth_rate)
-        consistency_score = float(consistency_score)
+    def _determine_performance_tiers(roi: np.ndarray, growth_rate: np.ndarray,
+                                     consistency_score: np.ndarray) -> np.ndarray:
+        """Performance tier per PSP based on metrics"""
         
         # Calculate composite score
-        composite_score = (roi * 0.4 + growth_rate * 0.3 + consistency_score * 0.3)
-        
-        if composite_score >= 80:
-            return 'excellent'
-        elif composite_score >= 60:
-            return 'good'
-        elif composite_score >= 40:
-            return 'average'
-        elif composite_score >= 20:
-            return 'below_average'
-        else:
-            return 'poor'
+        composite_score = roi * 0.4 + growth_rate * 0.3 + consistency_score * 0.3
+        
+        return np.select(
+            [composite_score >= 80, composite_score >= 60, composite_score >= 40, composite_score >= 20],
+            ['excellent', 'good', 'average', 'below_average'],
+            default='poor'
+        )
     
     @staticmethod
     def get_psp_trend_data(psp_name: str, days: int = 30) -> Dict[str, Any]:
         """Get trend data for a specific PSP"""
         
         start_date = date.today() - timedelta(days=days)
-        tracks = PspTrack.query.filter(
-            PspTrack.psp_name == psp_name,
-            PspTrack.date >= start_date
-        ).order_by(PspTrack.date).all()
+        frame = PspAnalyticsService.load_track_frame(psp_name=psp_name, start_date=start_date)
         
-        if not tracks:
+        if frame.empty:
             return {'dates': [], 'amounts': [], 'commissions': []}
         
-        # Group by date
-        daily_data = defaultdict(lambda: {'amount': Decimal('0'), 'commission': Decimal('0')})
-        for track in tracks:
-            daily_data[track.date]['amount'] += track.amount or Decimal('0')
-            daily_data[track.date]['commission'] += track.commission_amount or Decimal('0')
-        
-        # Sort by date
-        sorted_data = sorted(daily_data.items())
+        # Group by date (sorted)
+        daily_data = frame.groupby('date')[['amount', 'commission_amount']].sum()
         
         return {
-            'dates': [d[0].isoformat() for d in sorted_data],
-            'amounts': [float(d[1]['amount']) for d in sorted_data],
-            'commissions': [float(d[1]['commission']) for d in sorted_data]
+            'dates': [d.date().isoformat() for d in daily_data.index],
+            'amounts': [int(cents) / 100 for cents in daily_data['amount']],
+            'commissions': [int(cents) / 100 for cents in daily_data['commission_amount']]
         } 
\ No newline at end of file
@@ -3,8 +3,11 @@ PSP Options Service
 Handles fixed PSP options from database transactions
 """
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Optional
 from decimal import Decimal
+from sqlalchemy import event
 from app import db
 from app.models.config import Option
 from app.models.transaction import Transaction
@@ -14,6 +17,38 @@ logger = logging.getLogger(__name__)
 # Prevent duplicate logging by tracking logged operations
 _logged_operations = set()
 
+# Default commission rates for common PSPs (fallback only)
+DEFAULT_PSP_RATES = {
+    'stripe': Decimal('0.029'),  # 2.9%
+    'paypal': Decimal('0.034'),  # 3.4%
+    'square': Decimal('0.026'),  # 2.6%
+    'adyen': Decimal('0.025'),   # 2.5%
+    'worldpay': Decimal('0.035'), # 3.5%
+    'braintree': Decimal('0.029'), # 2.9%
+    'authorize.net': Decimal('0.029'), # 2.9%
+    'bank': Decimal('0.0'),      # 0% for bank transfers
+    'cash': Decimal('0.0'),      # 0% for cash
+    'crypto': Decimal('0.01'),   # 1% for crypto
+    'wire': Decimal('0.0'),      # 0% for wire transfers
+    # Business PSPs with specified rates
+    '#60 cashpay': Decimal('0.08'),   # 8.0%
+    '#61 cryppay': Decimal('0.075'),  # 7.5%
+    '#62 cryppay': Decimal('0.075'),  # 7.5% - New PSP
+    'atatp': Decimal('0.08'),         # 8.0%
+    'cpo': Decimal('0.05'),           # 5.0%
+    'cpo py kk': Decimal('0.11'),     # 11.0%
+    'filbox kk': Decimal('0.12'),     # 12.0%
+    'kuyumcu': Decimal('0.12'),       # 12.0%
+    'sipay': Decimal('0.0015'),       # 0.15% - Updated rate
+    'sipay-15': Decimal('0.0015'),    # 0.15% - Updated rate
+    'tether': Decimal('0.0'),         # 0.0% - No commission for TETHER
+}
+
+DEFAULT_COMMISSION_RATE = Decimal('0.025')  # 2.5%
+
+# Seconds before the rate registry reloads, bounding staleness across processes
+RATE_REGISTRY_TTL = 60
+
 class PspOptionsService:
     """Service for managing fixed PSP options"""
     
@@ -68,48 +103,11 @@ class PspOptionsService:
                 unique_psps.append(psp)
                 seen.add(psp)
         
-        # Default commission rates for common PSPs (fallback only)
-        default_rates = {
-            'stripe': Decimal('0.029'),  # 2.9%
-            'paypal': Decimal('0.034'),  # 3.4%
-            'square': Decimal('0.026'),  # 2.6%
-            'adyen': Decimal('0.025'),   # 2.5%
-            'worldpay': Decimal('0.035'), # 3.5%
-            'braintree': Decimal('0.029'), # 2.9%
-            'authorize.net': Decimal('0.029'), # 2.9%
-            'bank': Decimal('0.0'),      # 0% for bank transfers
-            'cash': Decimal('0.0'),      # 0% for cash
-            'crypto': Decimal('0.01'),   # 1% for crypto
-            'wire': Decimal('0.0'),      # 0% for wire transfers
-            # Business PSPs with specified rates
-            '#60 cashpay': Decimal('0.08'),   # 8.0%
-            '#61 cryppay': Decimal('0.075'),  # 7.5%
-            '#62 cryppay': Decimal('0.075'),  # 7.5% - New PSP
-            'atatp': Decimal('0.08'),         # 8.0%
-            'cpo': Decimal('0.05'),           # 5.0%
-            'cpo py kk': Decimal('0.11'),     # 11.0%
-            'filbox kk': Decimal('0.12'),     # 12.0%
-            'kuyumcu': Decimal('0.12'),       # 12.0%
-            'sipay': Decimal('0.0015'),       # 0.15% - Updated rate
-            'sipay-15': Decimal('0.0015'),    # 0.15% - Updated rate
-            'tether': Decimal('0.0'),         # 0.0% - No commission for TETHER
-        }
         
         fixed_options = []
         for psp in unique_psps:
-            # First try to get rate from database
-            db_option = Option.query.filter_by(
-                field_name='psp',
-                value=psp,
-                is_active=True
-            ).first()
-            
-            if db_option and db_option.commission_rate is not None:
-                commission_rate = db_option.commission_rate
-            else:
-                # Fallback to default rate based on PSP name
-                psp_lower = psp.lower().strip()
-                commission_rate = default_rates.get(psp_lower, Decimal('0.025'))  # Default 2.5%
+            # Database rate first, default rate based on PSP name as fallback
+            commission_rate = psp_rate_registry.rate_for(psp)
             
             # Log commission rate only once per PSP
             rate_key = f"rate_{psp}_{commission_rate}"
@@ -134,50 +132,7 @@ class PspOptionsService:
     @staticmethod
     def get_psp_commission_rate(psp: str) -> Decimal:
         """Get commission rate for a specific PSP"""
-        try:
-            # First try to get rate from database
-            db_option = Option.query.filter_by(
-                field_name='psp',
-                value=psp,
-                is_active=True
-            ).first()
-            
-            if db_option and db_option.commission_rate is not None:
-                return db_option.commission_rate
-            
-            # Fallback to default rates
-            default_rates = {
-                'stripe': Decimal('0.029'),
-                'paypal': Decimal('0.034'),
-                'square': Decimal('0.026'),
-                'adyen': Decimal('0.025'),
-                'worldpay': Decimal('0.035'),
-                'braintree': Decimal('0.029'),
-                'authorize.net': Decimal('0.029'),
-                'bank': Decimal('0.0'),
-                'cash': Decimal('0.0'),
-                'crypto': Decimal('0.01'),
-                'wire': Decimal('0.0'),
-                # Business PSPs with specified rates
-                '#60 cashpay': Decimal('0.08'),   # 8.0%
-                '#61 cryppay': Decimal('0.075'),  # 7.5%
-                '#62 cryppay': Decimal('0.075'),  # 7.5% - New PSP
-                'atatp': Decimal('0.08'),         # 8.0%
-                'cpo': Decimal('0.05'),           # 5.0%
-                'cpo py kk': Decimal('0.11'),     # 11.0%
-                'filbox kk': Decimal('0.12'),     # 12.0%
-                'kuyumcu': Decimal('0.12'),       # 12.0%
-                'sipay': Decimal('0.0015'),       # 0.15% - Updated rate
-                'sipay-15': Decimal('0.0015'),    # 0.15% - Updated rate
-                'tether': Decimal('0.0'),         # 0.0% - No commission for TETHER
-            }
-            
-            psp_lower = psp.lower().strip()
-            return default_rates.get(psp_lower, Decimal('0.025'))
-            
-        except Exception as e:
-            logger.error(f"Error getting commission rate for PSP '{psp}': {e}")
-            return Decimal('0.025')  # Default 2.5%
+        return psp_rate_registry.rate_for(psp)
     
     @staticmethod
     def ensure_psp_options_exist():
@@ -187,13 +142,7 @@ class PspOptionsService:
             
             for psp in psps:
                 # Check if PSP option already exists
-                existing_option = Option.query.filter_by(
-                    field_name='psp', 
-                    value=psp, 
-                    is_active=True
-                ).first()
-                
-                if not existing_option:
+                if not psp_rate_registry.has_option(psp):
                     # Create new PSP option with default commission rate
                     commission_rate = PspOptionsService.get_psp_commission_rate(psp)
                     
@@ -213,3 +162,112 @@ class PspOptionsService:
         except Exception as e:
             logger.error(f"Error ensuring PSP options: {e}")
             db.session.rollback()
+
+
+class PspRateRegistry:
+    """In-process PSP -> commission rate map, loaded with one query.
+
+    Lookups are dictionary reads. The map is rebuilt lazily after a PSP
+    option change is committed (the version is bumped by session hooks) or
+    once RATE_REGISTRY_TTL has passed, which bounds how long other processes
+    keep serving an edited rate.
+    """
+
+    def __init__(self, ttl: int = RATE_REGISTRY_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._rates: Optional[Dict[str, Optional[Decimal]]] = None
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._hooks_registered = False
+
+    def init_app(self, app):
+        """Register session hooks that invalidate the registry on PSP option writes"""
+        self.register_session_hooks()
+
+    def register_session_hooks(self):
+        if self._hooks_registered:
+            return
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+        self._hooks_registered = True
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            # Any option write may add, rename or retire a PSP
+            if isinstance(obj, Option):
+                session.info['psp_rates_changed'] = True
+                return
+
+    def _after_commit(self, session):
+        if session.info.pop('psp_rates_changed', False):
+            self.invalidate()
+
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        session.info.pop('psp_rates_changed', None)
+
+    def invalidate(self):
+        """Drop the loaded rates; the next lookup reloads them"""
+        with self._lock:
+            self.version += 1
+        logger.debug(f"PSP rate registry invalidated (version {self.version})")
+
+    def _load(self) -> Dict[str, Optional[Decimal]]:
+        with self._lock:
+            if self._is_fresh():
+                return self._rates
+            version = self.version
+            rows = db.session.query(Option.value, Option.commission_rate).filter(
+                Option.field_name == 'psp',
+                Option.is_active == True
+            ).order_by(Option.id).all()
+
+            rates: Dict[str, Optional[Decimal]] = {}
+            for value, commission_rate in rows:
+                # The first active option for a PSP wins, as with .first()
+                rates.setdefault(value, commission_rate)
+
+            self._rates = rates
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+            return rates
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._rates is not None
+            and self._loaded_version == self.version
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    def rates(self) -> Dict[str, Optional[Decimal]]:
+        """Configured rates of all active PSP options (None when an option has no rate)"""
+        if self._is_fresh():
+            return self._rates
+        try:
+            return self._load()
+        except Exception as e:
+            logger.error(f"Error loading PSP commission rates: {e}")
+            return {}
+
+    def has_option(self, psp: str) -> bool:
+        """Whether an active PSP option exists"""
+        return psp in self.rates()
+
+    def configured_rate(self, psp: str) -> Optional[Decimal]:
+        """Rate set on the PSP's active option, or None"""
+        return self.rates().get(psp)
+
+    def rate_for(self, psp: str) -> Decimal:
+        """Commission rate for a PSP: its option's rate, else the default rate for its name"""
+        rate = self.rates().get(psp)
+        if rate is not None:
+            return rate
+        return DEFAULT_PSP_RATES.get(str(psp or '').lower().strip(), DEFAULT_COMMISSION_RATE)
+
+
+# Global instance
+psp_rate_registry = PspRateRegistry()
@@ -0,0 +1,350 @@
+"""
+PSP Rollup Service for PipLine Treasury System
+Maintains the materialized daily (date, PSP, currency) rollup of transactions
+"""
+import logging
+import time
+from datetime import datetime, timezone, date
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, case, and_, or_, literal, insert, delete, select, inspect as sa_inspect
+
+from app import db
+from app.models.transaction import Transaction
+from app.models.financial import DailyPspRollup, PSPAllocation
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[date, Optional[str], Optional[str]]
+
+# Keys per DELETE / INSERT ... SELECT statement (3 bound parameters each)
+KEY_CHUNK_SIZE = 100
+
+# Sentinel for "do not filter by PSP" (None matches rows without a PSP)
+ALL_PSPS = object()
+
+
+class PspRollupService:
+    """Keeps DailyPspRollup in sync with Transaction writes and serves rollup reads"""
+
+    def __init__(self):
+        self._hooks_registered = False
+        self._enabled = True
+
+    def init_app(self, app):
+        """Register session hooks and make sure the rollup table exists"""
+        self.register_session_hooks()
+        try:
+            with app.app_context():
+                inspector = sa_inspect(db.engine)
+                if not inspector.has_table(Transaction.__tablename__):
+                    return
+                if not inspector.has_table(DailyPspRollup.__tablename__):
+                    DailyPspRollup.__table__.create(bind=db.engine, checkfirst=True)
+                    result = self.rebuild()
+                    logger.info(f"Created daily PSP rollup table with {result['rollup_rows']} rows")
+        except Exception as e:
+            logger.error(f"Error initializing daily PSP rollup: {e}")
+
+    def register_session_hooks(self):
+        """Recompute touched rollup keys whenever Transaction rows are flushed"""
+        if self._hooks_registered:
+            return
+        event.listen(db.session, 'after_flush', self._after_flush)
+        self._hooks_registered = True
+
+    def _after_flush(self, session, flush_context):
+        """Collect (date, psp, currency) keys touched by this flush and refresh them"""
+        if not self._enabled:
+            return
+
+        keys: Set[RollupKey] = set()
+        for obj in session.new:
+            if isinstance(obj, Transaction):
+                keys.add((obj.date, obj.psp, obj.currency))
+        for obj in session.deleted:
+            if isinstance(obj, Transaction):
+                keys.add(self._previous_key(obj))
+        for obj in session.dirty:
+            if isinstance(obj, Transaction) and session.is_modified(obj, include_collections=False):
+                keys.add((obj.date, obj.psp, obj.currency))
+                keys.add(self._previous_key(obj))
+
+        keys = {key for key in keys if key[0] is not None}
+        if keys:
+            self.refresh_keys(keys, connection=session.connection())
+
+    @staticmethod
+    def _previous_key(obj) -> RollupKey:
+        """Key the row belonged to before any pending attribute changes"""
+        state = sa_inspect(obj)
+        values = []
+        for attr in ('date', 'psp', 'currency'):
+            history = state.attrs[attr].history
+            if history.deleted:
+                values.append(history.deleted[0])
+            else:
+                values.append(getattr(obj, attr))
+        return tuple(values)
+
+    @staticmethod
+    def _aggregate_columns():
+        """Grouped rollup columns computed from the transaction table"""
+        t = Transaction.__table__
+        is_dep = t.c.category == 'DEP'
+        is_wd = t.c.category == 'WD'
+        is_other = or_(t.c.category.is_(None), t.c.category.notin_(['DEP', 'WD']))
+        amount_try = func.coalesce(t.c.amount_try, t.c.amount, 0)
+
+        return [
+            t.c.date,
+            t.c.psp,
+            t.c.currency,
+            func.count(t.c.id),
+            func.sum(case((is_dep, 1), else_=0)),
+            func.sum(case((is_wd, 1), else_=0)),
+            func.sum(case((is_dep, func.abs(t.c.amount)), else_=0)),
+            func.sum(case((is_wd, func.abs(t.c.amount)), else_=0)),
+            func.sum(func.coalesce(t.c.commission, 0)),
+            func.sum(func.coalesce(t.c.net_amount, 0)),
+            func.sum(case((is_dep, func.abs(amount_try)), else_=0)),
+            func.sum(case((is_wd, func.abs(amount_try)), else_=0)),
+            func.sum(case((is_other, amount_try), else_=0)),
+            func.sum(func.coalesce(t.c.commission_try, t.c.commission, 0)),
+            func.sum(func.coalesce(t.c.net_amount_try, t.c.net_amount, 0)),
+            literal(datetime.now(timezone.utc), type_=db.DateTime)
+        ]
+
+    @staticmethod
+    def _rollup_target_columns():
+        r = DailyPspRollup.__table__
+        return [
+            r.c.date, r.c.psp, r.c.currency,
+            r.c.transaction_count, r.c.deposit_count, r.c.withdraw_count,
+            r.c.deposit_amount, r.c.withdraw_amount, r.c.commission_amount, r.c.net_amount,
+            r.c.deposit_try, r.c.withdraw_try, r.c.other_try, r.c.commission_try, r.c.net_amount_try,
+            r.c.updated_at
+        ]
+
+    @staticmethod
+    def _key_predicate(table, keys: List[RollupKey]):
+        """Match any of the given keys, treating NULL psp/currency as a value"""
+        return or_(*[
+            and_(
+                table.c.date == key_date,
+                table.c.psp.is_not_distinct_from(key_psp),
+                table.c.currency.is_not_distinct_from(key_currency)
+            )
+            for key_date, key_psp, key_currency in keys
+        ])
+
+    def refresh_keys(self, keys: Iterable[RollupKey], connection=None) -> int:
+        """Recompute the rollup rows for the given keys from the transaction table.
+
+        Runs on the caller's connection so the rollup changes commit or roll
+        back together with the transaction writes that triggered them.
+        """
+        keys = list(keys)
+        if not keys:
+            return 0
+
+        connection = connection if connection is not None else db.session.connection()
+        t = Transaction.__table__
+        r = DailyPspRollup.__table__
+
+        for start in range(0, len(keys), KEY_CHUNK_SIZE):
+            chunk = keys[start:start + KEY_CHUNK_SIZE]
+            connection.execute(delete(r).where(self._key_predicate(r, chunk)))
+            source = select(*self._aggregate_columns()).where(
+                self._key_predicate(t, chunk)
+            ).group_by(t.c.date, t.c.psp, t.c.currency)
+            connection.execute(insert(r).from_select(self._rollup_target_columns(), source))
+
+        return len(keys)
+
+    def refresh_dates(self, dates: Iterable[date], connection=None) -> int:
+        """Recompute every rollup row for the given dates.
+
+        For set-based writers (bulk UPDATE/DELETE statements) that bypass the
+        ORM flush hook.
+        """
+        dates = sorted({d for d in dates if d is not None})
+        if not dates:
+            return 0
+
+        connection = connection if connection is not None else db.session.connection()
+        t = Transaction.__table__
+        r = DailyPspRollup.__table__
+
+        for start in range(0, len(dates), KEY_CHUNK_SIZE):
+            chunk = dates[start:start + KEY_CHUNK_SIZE]
+            connection.execute(delete(r).where(r.c.date.in_(chunk)))
+            source = select(*self._aggregate_columns()).where(
+                t.c.date.in_(chunk)
+            ).group_by(t.c.date, t.c.psp, t.c.currency)
+            connection.execute(insert(r).from_select(self._rollup_target_columns(), source))
+
+        return len(dates)
+
+    def clear(self, connection=None):
+        """Remove every rollup row (used together with bulk transaction deletes)"""
+        connection = connection if connection is not None else db.session.connection()
+        connection.execute(delete(DailyPspRollup.__table__))
+
+    def rebuild(self) -> Dict[str, Any]:
+        """Rebuild the whole rollup from the transaction table in one transaction"""
+        start_time = time.time()
+        t = Transaction.__table__
+        r = DailyPspRollup.__table__
+
+        try:
+            connection = db.session.connection()
+            connection.execute(delete(r))
+            source = select(*self._aggregate_columns()).where(
+                t.c.date.isnot(None)
+            ).group_by(t.c.date, t.c.psp, t.c.currency)
+            connection.execute(insert(r).from_select(self._rollup_target_columns(), source))
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error rebuilding daily PSP rollup: {e}")
+            db.session.rollback()
+            raise
+
+        rollup_rows = db.session.query(func.count(DailyPspRollup.id)).scalar() or 0
+        duration = time.time() - start_time
+        logger.info(f"Rebuilt daily PSP rollup: {rollup_rows} rows in {duration:.2f}s")
+        return {
+            'rollup_rows': rollup_rows,
+            'duration_seconds': round(duration, 3)
+        }
+
+    # Read helpers
+
+    @staticmethod
+    def _apply_date_range(query, start_date: Optional[date], end_date: Optional[date]):
+        if start_date is not None:
+            query = query.filter(DailyPspRollup.date >= start_date)
+        if end_date is not None:
+            query = query.filter(DailyPspRollup.date <= end_date)
+        return query
+
+    @staticmethod
+    def _summed_columns():
+        return [
+            func.sum(DailyPspRollup.transaction_count).label('transaction_count'),
+            func.sum(DailyPspRollup.deposit_count).label('deposit_count'),
+            func.sum(DailyPspRollup.withdraw_count).label('withdraw_count'),
+            func.sum(DailyPspRollup.deposit_amount).label('deposit_amount'),
+            func.sum(DailyPspRollup.withdraw_amount).label('withdraw_amount'),
+            func.sum(DailyPspRollup.commission_amount).label('commission_amount'),
+            func.sum(DailyPspRollup.net_amount).label('net_amount'),
+            func.sum(DailyPspRollup.deposit_try).label('deposit_try'),
+            func.sum(DailyPspRollup.withdraw_try).label('withdraw_try'),
+            func.sum(DailyPspRollup.other_try).label('other_try'),
+            func.sum(DailyPspRollup.commission_try).label('commission_try'),
+            func.sum(DailyPspRollup.net_amount_try).label('net_amount_try')
+        ]
+
+    def get_daily_psp_totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                             psp=ALL_PSPS):
+        """Totals per (date, psp) across currencies, optionally for a single PSP"""
+        query = db.session.query(
+            DailyPspRollup.date,
+            DailyPspRollup.psp,
+            *self._summed_columns()
+        )
+        if psp is not ALL_PSPS:
+            query = query.filter(DailyPspRollup.psp.is_not_distinct_from(psp))
+        query = self._apply_date_range(query, start_date, end_date)
+        return query.group_by(DailyPspRollup.date, DailyPspRollup.psp).order_by(DailyPspRollup.date).all()
+
+    def get_psp_totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None):
+        """Totals per psp across dates and currencies"""
+        query = db.session.query(
+            DailyPspRollup.psp,
+            *self._summed_columns()
+        )
+        query = self._apply_date_range(query, start_date, end_date)
+        return query.group_by(DailyPspRollup.psp).all()
+
+    def get_psp_rollover(self, as_of: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Per-PSP rollover (net minus allocations) up to and including as_of.
+
+        Two grouped queries, one over the rollup and one over the
+        allocations, so the cost follows the number of PSPs and days rather
+        than transactions. Allocations count on days with PSP activity.
+        """
+        named_psp = and_(DailyPspRollup.psp.isnot(None), DailyPspRollup.psp != '')
+        other = DailyPspRollup.other_try
+
+        query = db.session.query(
+            DailyPspRollup.psp,
+            func.sum(DailyPspRollup.transaction_count).label('transaction_count'),
+            # Uncategorized amounts count as deposits or withdrawals by sign
+            func.sum(DailyPspRollup.deposit_try + case((other > 0, other), else_=0)).label('deposits'),
+            func.sum(DailyPspRollup.withdraw_try + case((other < 0, -other), else_=0)).label('withdrawals'),
+            func.sum(DailyPspRollup.net_amount_try).label('net_amount_try'),
+            func.max(DailyPspRollup.date).label('last_activity')
+        ).filter(named_psp)
+        query = self._apply_date_range(query, None, as_of)
+        totals = query.group_by(DailyPspRollup.psp).all()
+        if not totals:
+            return []
+
+        active_dates = select(DailyPspRollup.date).where(named_psp)
+        if as_of is not None:
+            active_dates = active_dates.where(DailyPspRollup.date <= as_of)
+        allocations = dict(db.session.query(
+            PSPAllocation.psp_name,
+            func.sum(PSPAllocation.allocation_amount)
+        ).filter(
+            PSPAllocation.date.in_(active_dates.distinct())
+        ).group_by(PSPAllocation.psp_name).all())
+
+        rollover = []
+        for row in totals:
+            total_net = float(row.net_amount_try or 0)
+            total_allocations = float(allocations.get(row.psp) or 0)
+            rollover.append({
+                'psp': row.psp,
+                'total_deposits': float(row.deposits or 0),
+                'total_withdrawals': float(row.withdrawals or 0),
+                'total_net': total_net,
+                'total_allocations': total_allocations,
+                'total_rollover': total_net - total_allocations,
+                'transaction_count': int(row.transaction_count or 0),
+                'last_activity': row.last_activity
+            })
+        return rollover
+
+    def get_daily_totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None):
+        """Totals per date across PSPs and currencies"""
+        query = db.session.query(
+            DailyPspRollup.date,
+            *self._summed_columns()
+        )
+        query = self._apply_date_range(query, start_date, end_date)
+        return query.group_by(DailyPspRollup.date).order_by(DailyPspRollup.date).all()
+
+    @staticmethod
+    def get_latest_date() -> Optional[date]:
+        """Most recent date that has transactions"""
+        return db.session.query(func.max(DailyPspRollup.date)).scalar()
+
+    @staticmethod
+    def get_data_version() -> Tuple:
+        """Cheap fingerprint of the transaction data.
+
+        Every transaction write rewrites its rollup rows in the same database
+        transaction, so the row count, highest id and latest updated_at of
+        the (small) rollup table change whenever transaction totals do.
+        """
+        return tuple(db.session.query(
+            func.count(DailyPspRollup.id),
+            func.max(DailyPspRollup.id),
+            func.max(DailyPspRollup.updated_at)
+        ).one())
+
+
+# Global instance
+psp_rollup_service = PspRollupService()
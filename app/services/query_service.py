@@ -12,7 +12,7 @@ from app import db
 from app.models.transaction import Transaction
 from app.models.user import User
 from app.models.config import Option, UserSettings, ExchangeRate
-from app.utils.advanced_cache import cache_invalidate
+from app.utils.advanced_cache import invalidate_tags, TRANSACTION_DATA_TAG
 
 # Decimal/Float type mismatch prevention
 from app.services.decimal_float_fix_service import decimal_float_service
@@ -232,17 +232,12 @@ class QueryService:
     
     @staticmethod
     def invalidate_transaction_cache():
-        """Invalidate all transaction-related cache entries"""
-        patterns = [
-            "transactions_by_date_range",
-            "daily_summary", 
-            "psp_summary",
-            "recent_transactions",
-            "transaction_stats"
-        ]
+        """Invalidate all transaction-related cache entries.
         
-        for pattern in patterns:
-            cache_invalidate(pattern)
+        Every entry derived from transaction data carries TRANSACTION_DATA_TAG,
+        so this costs O(entries dropped) rather than a scan of the cache.
+        """
+        count = invalidate_tags(TRANSACTION_DATA_TAG)
         
-        logger.info(f"Invalidated transaction cache entries for patterns: {patterns}")
-        return len(patterns) 
\ No newline at end of file
+        logger.info(f"Invalidated {count} transaction cache entries")
+        return count 
\ No newline at end of file
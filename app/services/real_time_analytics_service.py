@@ -1,22 +1,46 @@
 """
 Real-time analytics service for PipLinePro
 """
+import heapq
 import logging
 import time
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict, Any, List, Optional
 from collections import defaultdict, deque
 import threading
 from app import db
 from app.models.transaction import Transaction
-from app.models.financial import PspTrack, PSPAllocation
-from sqlalchemy import func, text
+from app.models.financial import PspTrack, PSPAllocation, DailyPspRollup
+from sqlalchemy import event, func, text
 
 logger = logging.getLogger(__name__)
 
+# Seconds between re-seeding the counters from the database, which picks up
+# writes made by other processes
+RESEED_INTERVAL = 60
+
+# Recent transactions kept for the last-hour / last-5-minutes views
+RECENT_WINDOW = timedelta(hours=1)
+
+# Newest transactions loaded with their details when seeding
+RECENT_DETAIL_LIMIT = 100
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; compare them as aware UTC"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
 class RealTimeAnalyticsService:
     """
     Real-time analytics service for live dashboard updates
+    
+    Today's hourly / PSP / currency / client counters are seeded with one
+    grouped query and then kept current by session hooks that add each
+    committed transaction insert. Building the metrics reads the counters
+    only; updates, deletes and a day change trigger a re-seed.
     """
     
     def __init__(self):
@@ -30,13 +54,147 @@ class RealTimeAnalyticsService:
         self._revenue_stream = deque(maxlen=1440)  # Last 24 hours (1-minute intervals)
         self._psp_performance = defaultdict(lambda: deque(maxlen=100))
         
+        # Today's counters: {key: [count, amount]}
+        self._day = None
+        self._hourly = defaultdict(lambda: [0, 0.0])
+        self._psps = defaultdict(lambda: [0, 0.0])
+        self._currencies = defaultdict(lambda: [0, 0.0])
+        self._clients = defaultdict(lambda: [0, 0.0])
+        self._daily_counts: Dict[date, int] = {}
+        self._recent_times = deque()  # created_at of transactions within RECENT_WINDOW
+        self._seeded_at = 0.0
+        self._stale = True
+        self._version = 0
+        self._built_version = -1
+        self._hooks_registered = False
+    
+    def init_app(self, app):
+        """Register session hooks that feed committed transaction writes into the counters"""
+        if self._hooks_registered:
+            return
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+        self._hooks_registered = True
+    
+    @staticmethod
+    def _after_flush(session, flush_context):
+        for obj in session.new:
+            if isinstance(obj, Transaction):
+                session.info.setdefault('rt_analytics_new', []).append((
+                    obj.id, obj.date, _utc(obj.created_at), obj.psp, obj.currency,
+                    obj.client_name, float(obj.amount or 0)
+                ))
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Transaction):
+                session.info['rt_analytics_stale'] = True
+                return
+    
+    def _after_commit(self, session):
+        added = session.info.pop('rt_analytics_new', None)
+        stale = session.info.pop('rt_analytics_stale', False)
+        if not added and not stale:
+            return
+        with self._cache_lock:
+            if stale:
+                self._stale = True
+            for row in added or ():
+                self._add(row)
+            self._version += 1
+    
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        session.info.pop('rt_analytics_new', None)
+        session.info.pop('rt_analytics_stale', None)
+    
+    def _add(self, row):
+        """Count one committed transaction"""
+        transaction_id, day, created_at, psp, currency, client_name, amount = row
+        self._daily_counts[day] = self._daily_counts.get(day, 0) + 1
+        if created_at is not None:
+            self._recent_times.append(created_at)
+            self._transaction_stream.appendleft({
+                'id': transaction_id,
+                'amount': amount,
+                'currency': currency,
+                'psp': psp,
+                'client_name': client_name,
+                'created_at': created_at
+            })
+        if day != self._day:
+            return
+        self._count(created_at.hour if created_at else 0, psp, currency or 'TRY', client_name, 1, amount)
+    
+    def _count(self, hour: int, psp: Optional[str], currency: str, client_name: Optional[str],
+               count: int, amount: float):
+        for counter, key in ((self._hourly, hour), (self._psps, psp), (self._currencies, currency),
+                             (self._clients, client_name)):
+            if key is None or key == '':
+                continue
+            entry = counter[key]
+            entry[0] += count
+            entry[1] += amount
+    
+    def _seed(self, now: datetime):
+        """Rebuild the counters: one grouped query for today, plus recent rows and daily counts"""
+        today = now.date()
+        hour = func.extract('hour', Transaction.created_at)
+        groups = db.session.query(
+            hour, Transaction.psp, Transaction.currency, Transaction.client_name,
+            func.count(Transaction.id), func.sum(Transaction.amount)
+        ).filter(
+            Transaction.date == today
+        ).group_by(hour, Transaction.psp, Transaction.currency, Transaction.client_name).all()
+        
+        recent_times = db.session.query(Transaction.created_at).filter(
+            Transaction.created_at >= now - RECENT_WINDOW
+        ).order_by(Transaction.created_at).all()
+        recent = db.session.query(
+            Transaction.id, Transaction.date, Transaction.created_at, Transaction.psp,
+            Transaction.currency, Transaction.client_name, Transaction.amount
+        ).filter(
+            Transaction.created_at >= now - RECENT_WINDOW
+        ).order_by(Transaction.created_at.desc()).limit(RECENT_DETAIL_LIMIT).all()
+        
+        # Trends compare today/yesterday and this/last week; the rollup has the counts per day
+        week_start = today - timedelta(days=today.weekday())
+        daily = db.session.query(
+            DailyPspRollup.date, func.sum(DailyPspRollup.transaction_count)
+        ).filter(
+            DailyPspRollup.date >= week_start - timedelta(days=7)
+        ).group_by(DailyPspRollup.date).all()
+        
+        self._day = today
+        for counter in (self._hourly, self._psps, self._currencies, self._clients):
+            counter.clear()
+        for group_hour, psp, currency, client_name, count, amount in groups:
+            self._count(int(group_hour or 0), psp, currency or 'TRY', client_name, count, float(amount or 0))
+        
+        self._recent_times = deque(_utc(created_at) for created_at, in recent_times)
+        self._transaction_stream.clear()
+        for row in recent:
+            self._transaction_stream.append({
+                'id': row.id,
+                'amount': float(row.amount or 0),
+                'currency': row.currency,
+                'psp': row.psp,
+                'client_name': row.client_name,
+                'created_at': _utc(row.created_at)
+            })
+        
+        self._daily_counts = {day: int(count or 0) for day, count in daily}
+        self._seeded_at = time.monotonic()
+        self._stale = False
+        self._version += 1
+    
     def get_real_time_metrics(self) -> Dict[str, Any]:
         """Get real-time analytics metrics"""
         current_time = time.time()
         
         with self._cache_lock:
             # Check if cache is still valid
-            if current_time - self._last_update < self._cache_ttl and self._metrics_cache:
+            if (current_time - self._last_update < self._cache_ttl and self._metrics_cache
+                    and self._built_version == self._version):
                 return self._metrics_cache
             
             # Update metrics
@@ -46,31 +204,30 @@ class RealTimeAnalyticsService:
             return self._metrics_cache
     
     def _update_real_time_metrics(self):
-        """Update real-time metrics from database"""
+        """Update real-time metrics from the counters (re-seeding them when due)"""
         try:
             now = datetime.now(timezone.utc)
-            today = now.date()
-            current_hour = now.hour
+            if (self._stale or self._day != now.date()
+                    or time.monotonic() - self._seeded_at >= RESEED_INTERVAL):
+                self._seed(now)
             
-            # Get today's transactions
-            today_transactions = db.session.query(Transaction).filter(
-                Transaction.date == today
-            ).all()
+            total_transactions = sum(entry[0] for entry in self._hourly.values())
+            total_revenue = sum(entry[1] for entry in self._hourly.values())
             
             # Calculate real-time metrics
             metrics = {
                 'timestamp': now.isoformat(),
                 'today': {
-                    'total_transactions': len(today_transactions),
-                    'total_revenue': sum(float(t.amount) for t in today_transactions),
-                    'average_transaction': 0,
-                    'hourly_breakdown': self._get_hourly_breakdown(today_transactions),
-                    'psp_breakdown': self._get_psp_breakdown(today_transactions),
-                    'currency_breakdown': self._get_currency_breakdown(today_transactions)
+                    'total_transactions': total_transactions,
+                    'total_revenue': total_revenue,
+                    'average_transaction': total_revenue / total_transactions if total_transactions else 0,
+                    'hourly_breakdown': self._get_hourly_breakdown(),
+                    'psp_breakdown': self._get_psp_breakdown(),
+                    'currency_breakdown': self._get_currency_breakdown()
                 },
                 'recent_activity': {
-                    'last_hour_transactions': self._get_last_hour_count(),
-                    'last_5_minutes': self._get_recent_transactions(5),
+                    'last_hour_transactions': self._get_last_hour_count(now),
+                    'last_5_minutes': self._get_recent_transactions(5, now),
                     'active_psps': self._get_active_psps(),
                     'top_clients': self._get_top_clients_today()
                 },
@@ -81,155 +238,87 @@ class RealTimeAnalyticsService:
                     'database_connections': self._get_db_connection_count()
                 },
                 'alerts': self._get_active_alerts(),
-                'trends': self._calculate_trends()
+                'trends': self._calculate_trends(now)
             }
             
-            # Calculate average transaction
-            if metrics['today']['total_transactions'] > 0:
-                metrics['today']['average_transaction'] = (
-                    metrics['today']['total_revenue'] / metrics['today']['total_transactions']
-                )
-            
             self._metrics_cache = metrics
+            self._built_version = self._version
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error updating real-time metrics: {e}")
             self._metrics_cache = {'error': str(e), 'timestamp': datetime.now(timezone.utc).isoformat()}
     
-    def _get_hourly_breakdown(self, transactions: List[Transaction]) -> List[Dict[str, Any]]:
-        """Get hourly breakdown of transactions"""
-        hourly_data = defaultdict(lambda: {'count': 0, 'amount': 0.0})
-        
-        for transaction in transactions:
-            hour = transaction.created_at.hour if transaction.created_at else 0
-            hourly_data[hour]['count'] += 1
-            hourly_data[hour]['amount'] += float(transaction.amount)
-        
+    def _get_hourly_breakdown(self) -> List[Dict[str, Any]]:
+        """Get hourly breakdown of today's transactions"""
         return [
             {
                 'hour': hour,
-                'transactions': data['count'],
-                'revenue': data['amount']
+                'transactions': count,
+                'revenue': amount
             }
-            for hour, data in sorted(hourly_data.items())
+            for hour, (count, amount) in sorted(self._hourly.items())
         ]
     
-    def _get_psp_breakdown(self, transactions: List[Transaction]) -> List[Dict[str, Any]]:
+    def _get_psp_breakdown(self) -> List[Dict[str, Any]]:
         """Get PSP breakdown for today"""
-        psp_data = defaultdict(lambda: {'count': 0, 'amount': 0.0})
-        
-        for transaction in transactions:
-            if transaction.psp:
-                psp_data[transaction.psp]['count'] += 1
-                psp_data[transaction.psp]['amount'] += float(transaction.amount)
-        
-        total_amount = sum(data['amount'] for data in psp_data.values())
+        total_amount = sum(amount for _, amount in self._psps.values())
         
         return [
             {
                 'psp': psp,
-                'transactions': data['count'],
-                'revenue': data['amount'],
-                'percentage': (data['amount'] / total_amount * 100) if total_amount > 0 else 0
+                'transactions': count,
+                'revenue': amount,
+                'percentage': (amount / total_amount * 100) if total_amount > 0 else 0
             }
-            for psp, data in sorted(psp_data.items(), key=lambda x: x[1]['amount'], reverse=True)
+            for psp, (count, amount) in sorted(self._psps.items(), key=lambda x: x[1][1], reverse=True)
         ]
     
-    def _get_currency_breakdown(self, transactions: List[Transaction]) -> List[Dict[str, Any]]:
+    def _get_currency_breakdown(self) -> List[Dict[str, Any]]:
         """Get currency breakdown for today"""
-        currency_data = defaultdict(lambda: {'count': 0, 'amount': 0.0})
-        
-        for transaction in transactions:
-            currency = transaction.currency or 'TRY'
-            currency_data[currency]['count'] += 1
-            currency_data[currency]['amount'] += float(transaction.amount)
-        
         return [
             {
                 'currency': currency,
-                'transactions': data['count'],
-                'revenue': data['amount']
+                'transactions': count,
+                'revenue': amount
             }
-            for currency, data in sorted(currency_data.items(), key=lambda x: x[1]['amount'], reverse=True)
+            for currency, (count, amount) in sorted(self._currencies.items(), key=lambda x: x[1][1], reverse=True)
         ]
     
-    def _get_last_hour_count(self) -> int:
+    def _get_last_hour_count(self, now: datetime) -> int:
         """Get transaction count for last hour"""
-        try:
-            one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-            count = db.session.query(Transaction).filter(
-                Transaction.created_at >= one_hour_ago
-            ).count()
-            return count
-        except Exception as e:
-            logger.error(f"Error getting last hour count: {e}")
-            return 0
+        threshold = now - RECENT_WINDOW
+        while self._recent_times and self._recent_times[0] < threshold:
+            self._recent_times.popleft()
+        return len(self._recent_times)
     
-    def _get_recent_transactions(self, minutes: int) -> List[Dict[str, Any]]:
+    def _get_recent_transactions(self, minutes: int, now: datetime) -> List[Dict[str, Any]]:
         """Get recent transactions within specified minutes"""
-        try:
-            time_threshold = datetime.now(timezone.utc) - timedelta(minutes=minutes)
-            transactions = db.session.query(Transaction).filter(
-                Transaction.created_at >= time_threshold
-            ).order_by(Transaction.created_at.desc()).limit(10).all()
-            
-            return [
-                {
-                    'id': t.id,
-                    'amount': float(t.amount),
-                    'currency': t.currency,
-                    'psp': t.psp,
-                    'client_name': t.client_name,
-                    'created_at': t.created_at.isoformat() if t.created_at else None
-                }
-                for t in transactions
-            ]
-        except Exception as e:
-            logger.error(f"Error getting recent transactions: {e}")
-            return []
+        threshold = now - timedelta(minutes=minutes)
+        recent = sorted(
+            (t for t in self._transaction_stream if t['created_at'] >= threshold),
+            key=lambda t: t['created_at'], reverse=True
+        )[:10]
+        return [
+            dict(t, created_at=t['created_at'].isoformat())
+            for t in recent
+        ]
     
     def _get_active_psps(self) -> List[str]:
         """Get list of active PSPs today"""
-        try:
-            today = datetime.now(timezone.utc).date()
-            psps = db.session.query(Transaction.psp).filter(
-                Transaction.date == today,
-                Transaction.psp.isnot(None),
-                Transaction.psp != ''
-            ).distinct().all()
-            
-            return [psp[0] for psp in psps if psp[0]]
-        except Exception as e:
-            logger.error(f"Error getting active PSPs: {e}")
-            return []
+        return [psp for psp in self._psps if psp]
     
     def _get_top_clients_today(self) -> List[Dict[str, Any]]:
         """Get top clients by transaction count today"""
-        try:
-            today = datetime.now(timezone.utc).date()
-            client_stats = db.session.query(
-                Transaction.client_name,
-                func.count(Transaction.id).label('transaction_count'),
-                func.sum(Transaction.amount).label('total_amount')
-            ).filter(
-                Transaction.date == today,
-                Transaction.client_name.isnot(None),
-                Transaction.client_name != ''
-            ).group_by(Transaction.client_name).order_by(
-                func.count(Transaction.id).desc()
-            ).limit(5).all()
-            
-            return [
-                {
-                    'client_name': stat.client_name,
-                    'transaction_count': stat.transaction_count,
-                    'total_amount': float(stat.total_amount)
-                }
-                for stat in client_stats
-            ]
-        except Exception as e:
-            logger.error(f"Error getting top clients: {e}")
-            return []
+        top = heapq.nlargest(5, self._clients.items(), key=lambda item: item[1][0])
+        return [
+            {
+                'client_name': client_name,
+                'transaction_count': count,
+                'total_amount': amount
+            }
+            for client_name, (count, amount) in top
+        ]
     
     def _get_avg_response_time(self) -> float:
         """Get average API response time (mock data for now)"""
@@ -284,35 +373,25 @@ class RealTimeAnalyticsService:
         
         return alerts
     
-    def _calculate_trends(self) -> Dict[str, Any]:
-        """Calculate trend data"""
+    def _calculate_trends(self, now: datetime) -> Dict[str, Any]:
+        """Calculate trend data from the per-day counts"""
         try:
-            now = datetime.now(timezone.utc)
-            yesterday = now - timedelta(days=1)
-            week_ago = now - timedelta(days=7)
+            today = now.date()
+            yesterday = today - timedelta(days=1)
             
             # Today vs Yesterday
-            today_count = db.session.query(Transaction).filter(
-                Transaction.date == now.date()
-            ).count()
-            
-            yesterday_count = db.session.query(Transaction).filter(
-                Transaction.date == yesterday.date()
-            ).count()
+            today_count = self._daily_counts.get(today, 0)
+            yesterday_count = self._daily_counts.get(yesterday, 0)
             
             # This week vs Last week
-            this_week_start = now - timedelta(days=now.weekday())
+            this_week_start = today - timedelta(days=today.weekday())
             last_week_start = this_week_start - timedelta(days=7)
-            last_week_end = this_week_start - timedelta(days=1)
-            
-            this_week_count = db.session.query(Transaction).filter(
-                Transaction.date >= this_week_start.date()
-            ).count()
             
-            last_week_count = db.session.query(Transaction).filter(
-                Transaction.date >= last_week_start.date(),
-                Transaction.date <= last_week_end.date()
-            ).count()
+            this_week_count = sum(count for day, count in self._daily_counts.items() if day >= this_week_start)
+            last_week_count = sum(
+                count for day, count in self._daily_counts.items()
+                if last_week_start <= day < this_week_start
+            )
             
             return {
                 'daily_change': {
@@ -5,14 +5,297 @@ Handles WebSocket connections and real-time data streaming
 import json
 import logging
 import asyncio
-from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional, Set
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple
 from flask import current_app
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from sqlalchemy import event as sa_event, func, case
 from app.services.event_service import EventService, Event, EventType
 
 logger = logging.getLogger(__name__)
 
+# Seconds between broadcast ticks; changes and events within a tick are
+# coalesced into one emit per room
+BROADCAST_TICK = 1.0
+
+# Namespace the snapshot rooms live in
+SOCKET_NAMESPACE = '/'
+
+# Day ranges a snapshot room can cover; other ranges are rejected, so
+# clients cannot create unbounded rooms and rebuilds
+SNAPSHOT_WINDOWS = (1, 7, 30, 90, 365)
+
+DEFAULT_SNAPSHOT_DAYS = 30
+
+
+def snapshot_window(days: Any) -> int:
+    """The requested day range, DEFAULT_SNAPSHOT_DAYS when none is given.
+    
+    Raises ValueError for ranges outside SNAPSHOT_WINDOWS.
+    """
+    if days is None:
+        return DEFAULT_SNAPSHOT_DAYS
+    window = int(days) if str(days).isdigit() else None
+    if window not in SNAPSHOT_WINDOWS:
+        raise ValueError(f"Unsupported days {days!r}; use one of {', '.join(map(str, SNAPSHOT_WINDOWS))}")
+    return window
+
+
+def merge_patch(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON merge patch (RFC 7396) turning old into new; removed keys map to None"""
+    patch = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if key not in old:
+            patch[key] = value
+        elif isinstance(value, dict) and isinstance(previous, dict):
+            nested = merge_patch(previous, value)
+            if nested:
+                patch[key] = nested
+        elif value != previous:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def build_transaction_totals(days: int) -> Dict[str, Any]:
+    """Transaction totals of the last `days` days and of today, in one aggregate query"""
+    from app import db
+    from app.models.transaction import Transaction
+    
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days)
+    is_today = Transaction.date == end_date
+    row = db.session.query(
+        func.count(Transaction.id),
+        func.sum(Transaction.amount),
+        func.sum(Transaction.commission),
+        func.sum(Transaction.net_amount),
+        func.sum(case((is_today, 1), else_=0)),
+        func.sum(case((is_today, Transaction.amount), else_=0)),
+        func.sum(case((is_today, Transaction.commission), else_=0))
+    ).filter(
+        Transaction.date >= start_date,
+        Transaction.date <= end_date
+    ).one()
+    count, amount, commission, net, today_count, today_amount, today_commission = row
+    return {
+        'total_amount': float(amount or 0),
+        'total_commission': float(commission or 0),
+        'total_net': float(net or 0),
+        'transaction_count': int(count or 0),
+        'today_amount': float(today_amount or 0),
+        'today_commission': float(today_commission or 0),
+        'today_count': int(today_count or 0)
+    }
+
+
+def build_analytics_snapshot(days: int) -> Dict[str, Any]:
+    totals = build_transaction_totals(days)
+    snapshot = {key: totals[key] for key in ('total_amount', 'total_commission', 'transaction_count')}
+    snapshot['days'] = days
+    return snapshot
+
+
+def build_dashboard_snapshot(days: int) -> Dict[str, Any]:
+    return {**build_transaction_totals(days), 'days': days}
+
+
+class SnapshotFanout:
+    """Pushes shared snapshots to Socket.IO rooms.
+    
+    Viewers of the same data share a room (channel plus parameters). A room's
+    snapshot is computed once per change, not per viewer: data changes only
+    mark channels dirty, and a background tick rebuilds each dirty room once
+    and emits a JSON merge patch against the previous snapshot. Queued events
+    are flushed the same way, one emit per room and tick. Server work
+    therefore follows the change rate, not the number of connected clients.
+    """
+    
+    def __init__(self, tick: float = BROADCAST_TICK):
+        self.tick = tick
+        self.app = None
+        self.socketio: Optional[SocketIO] = None
+        # channel -> (builder, event name)
+        self._channels: Dict[str, Tuple[Callable[..., Dict[str, Any]], str]] = {}
+        # room -> (channel, params)
+        self._rooms: Dict[str, Tuple[str, Tuple]] = {}
+        # room -> (version, snapshot)
+        self._snapshots: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._dirty: Set[str] = set()
+        self._pending_events: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        self._lock = threading.RLock()
+        self._task = None
+        self._hooks_registered = False
+    
+    def init_app(self, app, socketio: SocketIO):
+        """Bind to the app and mark snapshots dirty on committed transaction writes"""
+        self.app = app
+        self.socketio = socketio
+        self.register_channel('analytics', build_analytics_snapshot, 'analytics_update')
+        self.register_channel('dashboard', build_dashboard_snapshot, 'dashboard_update')
+        self.register_session_hooks()
+    
+    def register_session_hooks(self):
+        if self._hooks_registered:
+            return
+        from app import db
+        sa_event.listen(db.session, 'after_flush', self._after_flush)
+        sa_event.listen(db.session, 'after_commit', self._after_commit)
+        sa_event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+        self._hooks_registered = True
+    
+    @staticmethod
+    def _after_flush(session, flush_context):
+        from app.models.transaction import Transaction
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Transaction):
+                session.info['snapshots_changed'] = True
+                return
+    
+    def _after_commit(self, session):
+        if session.info.pop('snapshots_changed', False):
+            self.mark_dirty()
+    
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        session.info.pop('snapshots_changed', None)
+    
+    def register_channel(self, channel: str, builder: Callable[..., Dict[str, Any]], event_name: str):
+        """Register how a channel's snapshot is built and which event carries it"""
+        self._channels[channel] = (builder, event_name)
+    
+    @staticmethod
+    def room_name(channel: str, params: Tuple) -> str:
+        return ':'.join([channel] + [str(param) for param in params])
+    
+    def subscribe(self, channel: str, *params) -> Dict[str, Any]:
+        """Join the calling client to the channel's room and return the full snapshot.
+        
+        Must be called from a Socket.IO handler. The snapshot is only built
+        when the room has none yet or it is dirty.
+        """
+        room = self.room_name(channel, params)
+        join_room(room)
+        with self._lock:
+            self._rooms[room] = (channel, params)
+            entry = self._snapshots.get(room)
+            if entry is None or room in self._dirty:
+                entry = self._rebuild(room)
+        self._ensure_task()
+        version, snapshot = entry
+        return {'room': room, 'version': version, 'data': snapshot}
+    
+    def mark_dirty(self, *channels: str):
+        """Flag channels (all when none given) for rebuilding on the next tick"""
+        with self._lock:
+            for room, (channel, _) in self._rooms.items():
+                if not channels or channel in channels:
+                    self._dirty.add(room)
+        self._ensure_task()
+    
+    def queue_event(self, room: str, event_name: str, payload: Dict[str, Any]):
+        """Queue an event for a room; queued events go out as one `<event_name>_batch` emit per tick"""
+        with self._lock:
+            self._pending_events[(room, event_name)].append(payload)
+        self._ensure_task()
+    
+    def _ensure_task(self):
+        if self._task is not None or self.socketio is None:
+            return
+        with self._lock:
+            if self._task is None:
+                self._task = self.socketio.start_background_task(self._run)
+    
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error broadcasting snapshots: {e}")
+    
+    def _has_participants(self, room: str) -> bool:
+        try:
+            return any(True for _ in self.socketio.server.manager.get_participants(SOCKET_NAMESPACE, room))
+        except Exception:
+            return True
+    
+    def _rebuild(self, room: str) -> Tuple[int, Dict[str, Any]]:
+        channel, params = self._rooms[room]
+        builder, _ = self._channels[channel]
+        snapshot = builder(*params)
+        previous = self._snapshots.get(room)
+        if previous is None:
+            entry = (1, snapshot)
+        elif previous[1] == snapshot:
+            entry = previous
+        else:
+            entry = (previous[0] + 1, snapshot)
+        self._snapshots[room] = entry
+        self._dirty.discard(room)
+        return entry
+    
+    def flush(self):
+        """Emit one delta per dirty room and one `_batch` emit per queued room event"""
+        with self._lock:
+            dirty = list(self._dirty)
+            pending = self._pending_events
+            self._pending_events = defaultdict(list)
+        
+        timestamp = datetime.now(timezone.utc).isoformat()
+        for (room, event_name), events in pending.items():
+            self.socketio.emit(f"{event_name}_batch", {
+                'events': events,
+                'count': len(events),
+                'timestamp': timestamp
+            }, room=room)
+        
+        if not dirty:
+            return
+        
+        with self.app.app_context():
+            for room in dirty:
+                with self._lock:
+                    if room not in self._rooms:
+                        continue
+                    if not self._has_participants(room):
+                        # Nobody is watching: forget the room until someone subscribes again
+                        self._rooms.pop(room, None)
+                        self._snapshots.pop(room, None)
+                        self._dirty.discard(room)
+                        continue
+                    previous = self._snapshots.get(room)
+                    version, snapshot = self._rebuild(room)
+                
+                if previous is None or previous[0] == version:
+                    continue
+                _, event_name = self._channels[self._rooms[room][0]]
+                self.socketio.emit(f"{event_name}_delta", {
+                    'room': room,
+                    'days': snapshot.get('days'),
+                    'base_version': previous[0],
+                    'version': version,
+                    'patch': merge_patch(previous[1], snapshot),
+                    'timestamp': timestamp
+                }, room=room)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'rooms': len(self._rooms),
+            'dirty_rooms': len(self._dirty),
+            'pending_events': sum(len(events) for events in self._pending_events.values()),
+            'versions': {room: entry[0] for room, entry in self._snapshots.items()}
+        }
+
+
+# Global fan-out instance (bound to the app in the app factory)
+snapshot_fanout = SnapshotFanout()
+
 class RealTimeService:
     """Service for managing real-time connections and data streaming"""
     
@@ -135,46 +418,43 @@ class RealTimeService:
         return None
     
     def _handle_transaction_events(self, event: Event):
-        """Handle transaction-related events"""
+        """Handle transaction-related events (batched per broadcast tick)"""
         try:
-            # Broadcast to all users subscribed to transactions
-            self.socketio.emit('transaction_update', {
+            payload = {
                 'type': event.type.value,
                 'data': event.data,
                 'timestamp': event.timestamp.isoformat()
-            }, room='global')
+            }
+            # Broadcast to all users subscribed to transactions
+            snapshot_fanout.queue_event('global', 'transaction_update', payload)
             
             # Send to specific user if transaction belongs to them
             user_id = event.data.get('user_id')
             if user_id:
-                self.socketio.emit('transaction_update', {
-                    'type': event.type.value,
-                    'data': event.data,
-                    'timestamp': event.timestamp.isoformat()
-                }, room=f"transactions_{user_id}")
+                snapshot_fanout.queue_event(f"transactions_{user_id}", 'transaction_update', payload)
+            
+            # Shared dashboard snapshots are rebuilt once on the next tick
+            snapshot_fanout.mark_dirty()
                 
         except Exception as e:
             logger.error(f"Error handling transaction event: {e}")
     
     def _handle_financial_events(self, event: Event):
-        """Handle financial-related events"""
+        """Handle financial-related events (batched per broadcast tick)"""
         try:
-            # Broadcast to all users subscribed to analytics
-            self.socketio.emit('financial_update', {
+            payload = {
                 'type': event.type.value,
                 'data': event.data,
                 'timestamp': event.timestamp.isoformat()
-            }, room='global')
+            }
+            # Broadcast to all users subscribed to analytics
+            snapshot_fanout.queue_event('global', 'financial_update', payload)
             
             # Send to PSP track subscribers
             if event.type == EventType.PSP_TRACK_UPDATED:
                 psp_name = event.data.get('psp_name')
                 if psp_name:
-                    self.socketio.emit('psp_track_update', {
-                        'type': event.type.value,
-                        'data': event.data,
-                        'timestamp': event.timestamp.isoformat()
-                    }, room=f"psp_{psp_name}")
+                    snapshot_fanout.queue_event(f"psp_{psp_name}", 'psp_track_update', payload)
                 
         except Exception as e:
             logger.error(f"Error handling financial event: {e}")
@@ -219,7 +499,8 @@ class RealTimeService:
         return {
             'connected_users': len(self.connected_users),
             'total_rooms': len(set().union(*self.user_rooms.values())) if self.user_rooms else 0,
-            'user_rooms': {user_id: list(rooms) for user_id, rooms in self.user_rooms.items()}
+            'user_rooms': {user_id: list(rooms) for user_id, rooms in self.user_rooms.items()},
+            'snapshots': snapshot_fanout.get_stats()
         }
 
 # Global real-time service instance (will be initialized in app factory)
@@ -0,0 +1,275 @@
+"""
+Transaction Backfill Service for PipLine Treasury System
+Resumable batch recompute of TL amounts and WD net amounts
+"""
+import logging
+import time
+from datetime import datetime, timezone, date
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import update, and_, or_
+
+from app import db
+from app.models.transaction import Transaction
+from app.models.job import JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = 'transaction_backfill'
+JOB_KEY = 'transaction_backfill:try_amounts'
+
+# Rows read, recomputed and written per committed chunk
+BACKFILL_BATCH_SIZE = 1000
+
+FOREIGN_CURRENCIES = ('USD', 'EUR')
+
+BACKFILL_COLUMNS = (
+    Transaction.id,
+    Transaction.date,
+    Transaction.psp,
+    Transaction.currency,
+    Transaction.category,
+    Transaction.amount,
+    Transaction.commission,
+    Transaction.net_amount,
+)
+
+
+def needs_backfill():
+    """Rows the backfill rewrites: foreign-currency rows missing TL amounts,
+    and WD rows with zero commission whose net amount was never reset"""
+    return or_(
+        and_(
+            Transaction.currency.in_(FOREIGN_CURRENCIES),
+            or_(
+                Transaction.amount_try.is_(None),
+                Transaction.commission_try.is_(None),
+                Transaction.net_amount_try.is_(None)
+            )
+        ),
+        and_(
+            Transaction.category == 'WD',
+            Transaction.commission == 0,
+            Transaction.net_amount != Transaction.amount
+        )
+    )
+
+
+class TransactionBackfillService:
+    """Recomputes derived transaction amounts in id-keyed chunks.
+
+    Exchange rates for every (currency, date) still to process are
+    resolved once before the first chunk. Each chunk is written with one
+    executemany UPDATE, and its last id is committed to a JobCheckpoint
+    together with the rows, so an interrupted run resumes after the last
+    committed chunk.
+    """
+
+    def __init__(self):
+        self._tables_ready = False
+
+    def _ensure_tables(self):
+        if self._tables_ready:
+            return
+        JobCheckpoint.__table__.create(bind=db.engine, checkfirst=True)
+        self._tables_ready = True
+
+    def get_checkpoint(self) -> Optional[JobCheckpoint]:
+        self._ensure_tables()
+        return JobCheckpoint.query.filter_by(job_key=JOB_KEY).first()
+
+    def _start_checkpoint(self, restart: bool) -> JobCheckpoint:
+        checkpoint = self.get_checkpoint()
+        if checkpoint is None:
+            checkpoint = JobCheckpoint(job_key=JOB_KEY, job_type=JOB_TYPE)
+            db.session.add(checkpoint)
+        if restart or checkpoint.status == 'completed':
+            # A finished run starts over from the first id: needs_backfill
+            # skips rows already done, so the rescan is idempotent and picks
+            # up rows left without a rate or changed below the old position
+            checkpoint.position = 0
+            checkpoint.processed_count = 0
+            checkpoint.success_count = 0
+            checkpoint.failure_count = 0
+            checkpoint.completed_at = None
+        checkpoint.status = 'running'
+        checkpoint.last_error = None
+        db.session.commit()
+        return checkpoint
+
+    @staticmethod
+    def resolve_rates(after_id: int) -> Dict[Tuple[str, date], Optional[Decimal]]:
+        """Rate stored for every (currency, date) of the rows still to process.
+
+        Only exact-date rates are used; pairs without one map to None and
+        their rows are counted as errors instead of being converted with a
+        neighbouring day's or a default rate.
+        """
+        from app.services.exchange_rate_service import exchange_rate_service
+
+        pairs = db.session.query(Transaction.currency, Transaction.date).filter(
+            Transaction.id > after_id,
+            Transaction.currency.in_(FOREIGN_CURRENCIES),
+            needs_backfill()
+        ).distinct().all()
+
+        return {
+            (currency, day): exchange_rate_service.get_rate_for(currency, day, exact=True)
+            for currency, day in pairs
+        }
+
+    @staticmethod
+    def _fetch_chunk(after_id: int, batch_size: int) -> List[Any]:
+        return db.session.query(*BACKFILL_COLUMNS).filter(
+            Transaction.id > after_id,
+            needs_backfill()
+        ).order_by(Transaction.id).limit(batch_size).all()
+
+    @staticmethod
+    def recompute(row, rate: Optional[Decimal]) -> Optional[Dict[str, Any]]:
+        """New column values for a row (as Transaction.calculate_try_amounts would set them)"""
+        values: Dict[str, Any] = {}
+        commission = row.commission or Decimal('0')
+        net_amount = row.net_amount
+
+        if row.category == 'WD' and commission == 0:
+            # WD transactions carry no commission
+            net_amount = row.amount
+            values['net_amount'] = net_amount
+
+        if row.currency in FOREIGN_CURRENCIES:
+            if rate is None:
+                return None
+            if row.currency == 'USD':
+                amount_try = abs(row.amount) * rate
+                net_amount_try = abs(net_amount) * rate
+                if row.category == 'WD':
+                    amount_try = -amount_try
+                    net_amount_try = -net_amount_try
+                commission_try = abs(commission) * rate
+            else:
+                amount_try = row.amount * rate
+                net_amount_try = net_amount * rate
+                commission_try = commission * rate
+            values.update({
+                'exchange_rate': rate,
+                'amount_try': amount_try,
+                'commission_try': commission_try,
+                'net_amount_try': net_amount_try
+            })
+
+        return values
+
+    def run(self, batch_size: int = BACKFILL_BATCH_SIZE, dry_run: bool = False, restart: bool = False,
+            progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Backfill all pending rows, resuming from the persisted checkpoint.
+
+        With ``dry_run`` nothing is written (not even the checkpoint); the
+        result reports what a real run would change.
+        """
+        from app.services.psp_rollup_service import psp_rollup_service
+
+        start_time = time.time()
+        if dry_run:
+            checkpoint = self.get_checkpoint()
+            resume = checkpoint is not None and not restart and checkpoint.status != 'completed'
+            last_id = (checkpoint.position or 0) if resume else 0
+        else:
+            checkpoint = self._start_checkpoint(restart)
+            last_id = checkpoint.position or 0
+
+        summary = {'processed': 0, 'updated': 0, 'errors': 0, 'chunks': 0, 'dry_run': dry_run,
+                   'resumed_from_id': last_id}
+        rates = self.resolve_rates(last_id)
+        summary['rate_pairs'] = len(rates)
+
+        try:
+            while True:
+                rows = self._fetch_chunk(last_id, batch_size)
+                if not rows:
+                    break
+
+                now = datetime.now(timezone.utc)
+                updates = []
+                keys = set()
+                errors = 0
+                for row in rows:
+                    values = self.recompute(row, rates.get((row.currency, row.date)))
+                    if values is None:
+                        errors += 1
+                        logger.warning(f"No exchange rate for transaction {row.id} ({row.currency} {row.date})")
+                        continue
+                    if values:
+                        values.update({'id': row.id, 'updated_at': now})
+                        updates.append(values)
+                        keys.add((row.date, row.psp, row.currency))
+
+                last_id = rows[-1].id
+                summary['processed'] += len(rows)
+                summary['updated'] += len(updates)
+                summary['errors'] += errors
+                summary['chunks'] += 1
+
+                if not dry_run:
+                    if updates:
+                        # ORM bulk UPDATE by primary key: one executemany per column set
+                        db.session.execute(update(Transaction), updates)
+                        # Bulk writes bypass the flush hook that maintains the rollup
+                        psp_rollup_service.refresh_keys(keys)
+                    checkpoint.position = last_id
+                    checkpoint.processed_count = (checkpoint.processed_count or 0) + len(rows)
+                    checkpoint.success_count = (checkpoint.success_count or 0) + len(updates)
+                    checkpoint.failure_count = (checkpoint.failure_count or 0) + errors
+                    db.session.commit()
+
+                if progress_callback:
+                    progress_callback(self._progress(summary, start_time, last_id))
+
+        except Exception as e:
+            db.session.rollback()
+            if not dry_run:
+                checkpoint.status = 'failed'
+                checkpoint.last_error = str(e)
+                db.session.commit()
+            logger.error(f"Transaction backfill failed after id {last_id}: {e}")
+            raise
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            checkpoint.status = 'completed'
+            checkpoint.completed_at = datetime.now(timezone.utc)
+            db.session.commit()
+            if summary['updated']:
+                self._invalidate_caches()
+
+        result = self._progress(summary, start_time, last_id)
+        logger.info(
+            f"Transaction backfill {'dry run ' if dry_run else ''}processed {result['processed']} rows, "
+            f"updated {result['updated']}, {result['errors']} errors "
+            f"({result['rows_per_second']} rows/s)"
+        )
+        return result
+
+    @staticmethod
+    def _progress(summary: Dict[str, Any], start_time: float, last_id: int) -> Dict[str, Any]:
+        duration = time.time() - start_time
+        return {
+            **summary,
+            'last_id': last_id,
+            'duration_seconds': round(duration, 3),
+            'rows_per_second': round(summary['processed'] / duration) if duration > 0 else summary['processed']
+        }
+
+    @staticmethod
+    def _invalidate_caches():
+        try:
+            from app.services.query_service import QueryService
+            QueryService.invalidate_transaction_cache()
+        except Exception as cache_error:
+            logger.warning(f"Failed to invalidate cache after transaction backfill: {cache_error}")
+
+
+# Global instance
+transaction_backfill_service = TransactionBackfillService()
@@ -0,0 +1,493 @@
+"""
+Transaction Import Service for PipLine Treasury System
+Streams CSV/XLSX rows into the transaction table in validated, batched inserts
+"""
+import csv
+import logging
+import os
+import time
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app import db
+from app.models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Rows per bulk INSERT (executemany) statement
+IMPORT_BATCH_SIZE = 2000
+
+# Errors/warnings kept in the result; the counters stay exact
+MAX_REPORTED_MESSAGES = 100
+
+ALLOWED_CURRENCIES = {'TL', 'USD', 'EUR'}
+
+CATEGORY_ALIASES = {
+    'DEPOSIT': 'DEP',
+    'WITHDRAW': 'WD',
+    'WITHDRAWAL': 'WD',
+    'ÇEKME': 'WD',
+    'YATIRMA': 'DEP'
+}
+
+DATE_FORMATS = ['%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y']
+
+MAX_AMOUNT = Decimal('999999999.99')
+CENT = Decimal('0.01')
+
+
+def _column(rows: List[Dict[str, Any]], name: str) -> np.ndarray:
+    """One field of a batch of row dicts as an object array (None where missing)"""
+    column = np.empty(len(rows), dtype=object)
+    column[:] = [row.get(name) for row in rows]
+    return column
+
+
+def _factorize_text(column: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct cell values as stripped text, and each cell's index into them.
+
+    Missing cells get code -1, which selects the trailing ''. Per-value
+    work (case folding, lookups, date parsing) then runs once per distinct
+    value and is broadcast back through the codes.
+    """
+    codes, uniques = pd.factorize(column)
+    return codes, np.array([str(value).strip() for value in uniques] + [''], dtype=object)
+
+
+def _text_column(column: np.ndarray) -> np.ndarray:
+    """Cell values as stripped text, '' for empty cells"""
+    codes, texts = _factorize_text(column)
+    return texts[codes]
+
+
+def _numeric_column(text: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse amount text, tolerating thousands separators and currency symbols.
+
+    Returns the parseable text (for exact Decimal values) and its float
+    value, NaN where the text is not a number.
+    """
+    try:
+        # Clean columns convert in one step
+        value = text.astype('float64')
+    except ValueError:
+        value = pd.to_numeric(text, errors='coerce').astype('float64')
+    retry = np.isnan(value) & (text != '')
+    if not retry.any():
+        return text, value
+    # Strip thousands separators and currency symbols
+    cleaned = text[retry].astype(str)
+    for symbol in (',', '₺', '$', '€'):
+        cleaned = np.char.replace(cleaned, symbol, '')
+    cleaned = np.char.strip(cleaned)
+    value[retry] = pd.to_numeric(cleaned, errors='coerce')
+    text = text.copy()
+    text[retry] = cleaned
+    return text, value
+
+
+def _parse_dates(texts: np.ndarray) -> np.ndarray:
+    """Parse date text trying DATE_FORMATS in order; None where none matches"""
+    # Spreadsheet exports may carry a time component
+    candidate = np.array([text.split(' ')[0] for text in texts], dtype=object)
+    parsed = np.full(len(texts), np.datetime64('NaT'), dtype='datetime64[D]')
+    pending = candidate != ''
+    for date_format in DATE_FORMATS:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(candidate[pending], format=date_format, errors='coerce')
+        parsed[pending] = attempt.to_numpy().astype('datetime64[D]')
+        pending &= np.isnat(parsed)
+    result = parsed.astype(object)
+    result[np.isnat(parsed)] = None
+    return result
+
+
+class _ImportRun:
+    """State for a single import: caches, pending batch and counters"""
+
+    def __init__(self, user_id, commission_rates: Dict[str, Optional[Decimal]], convert_currency: bool,
+                 rate_fallback: Optional[Callable[[str], Optional[Decimal]]], note_suffix: Optional[str]):
+        self.user_id = user_id
+        self.convert_currency = convert_currency
+        self.rate_fallback = rate_fallback
+        self.note_suffix = note_suffix
+        self.today = date.today()
+
+        self.commission_rates = commission_rates
+        self.exchange_rates: Dict[Tuple[str, date], Optional[Decimal]] = {}
+
+        self.total_rows = 0
+        self.successful = 0
+        self.failed = 0
+        self.total_amount = Decimal('0')
+        self.categories = set()
+        self.rollup_keys = set()
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+
+    def error(self, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_MESSAGES:
+            self.errors.append(message)
+
+    def warn(self, message: str):
+        if len(self.warnings) < MAX_REPORTED_MESSAGES:
+            self.warnings.append(message)
+
+    def commission_rate(self, psp: str) -> Optional[Decimal]:
+        if psp in self.commission_rates:
+            return self.commission_rates[psp]
+        rate = self.rate_fallback(psp) if (psp and self.rate_fallback) else None
+        self.commission_rates[psp] = rate
+        return rate
+
+    def exchange_rate(self, currency: str, transaction_date: date) -> Optional[Decimal]:
+        key = (currency, transaction_date)
+        if key not in self.exchange_rates:
+            from app.services.exchange_rate_service import exchange_rate_service
+            try:
+                self.exchange_rates[key] = exchange_rate_service.get_or_fetch_rate(currency, transaction_date)
+            except Exception as e:
+                logger.warning(f"Exchange rate lookup failed for {currency} on {transaction_date}: {e}")
+                self.exchange_rates[key] = None
+        return self.exchange_rates[key]
+
+    def build_batch(self, rows: List[Dict[str, Any]], first_row_number: int,
+                    created_at: datetime) -> List[Dict[str, Any]]:
+        """Validate a batch column by column; returns the insert mappings of the valid rows.
+
+        Every check is a mask over the whole batch. A row fails on the first
+        check it does not pass (in the order a single row used to be
+        checked) and gets no later messages; messages are reported in row
+        order.
+        """
+        size = len(rows)
+        row_numbers = np.arange(first_row_number, first_row_number + size)
+        failed = np.zeros(size, dtype=bool)
+        messages: List[Tuple[int, int, bool, str]] = []
+
+        def report(mask: np.ndarray, step: int, is_error: bool, render: Callable[[int], str]):
+            # Only rows still valid at this step are reported (and failed)
+            mask = mask & ~failed
+            for i in np.flatnonzero(mask):
+                messages.append((int(row_numbers[i]), step, is_error, f"Row {row_numbers[i]}: {render(i)}"))
+            if is_error:
+                failed[mask] = True
+
+        client_name = _text_column(_column(rows, 'client_name'))
+        missing_client = client_name == ''
+        client_name[missing_client] = [f"Unknown_Client_{number}" for number in row_numbers[missing_client]]
+        report(missing_client, 0, False, lambda i: f"Generated client name '{client_name[i]}' for missing client")
+        name_length = np.fromiter((len(name) for name in client_name), dtype=np.int64, count=size)
+        report(name_length > 100, 1, True, lambda i: f"Client name too long for {client_name[i][:40]}...")
+
+        codes, texts = _factorize_text(_column(rows, 'currency'))
+        currencies = np.array([text.upper() or 'TL' for text in texts], dtype=object)
+        currency = currencies[codes]
+        allowed = np.array([code in ALLOWED_CURRENCIES for code in currencies])[codes]
+        report(~allowed, 2, True, lambda i: f"Currency must be one of: {sorted(ALLOWED_CURRENCIES)}")
+
+        codes, texts = _factorize_text(_column(rows, 'category'))
+        raw_categories = np.array([text.upper() for text in texts], dtype=object)
+        raw_category = raw_categories[codes]
+        known = np.isin(raw_categories, ['DEP', 'WD'])[codes]
+        aliased = np.isin(raw_categories, list(CATEGORY_ALIASES))[codes]
+        category = np.array([
+            value if value in ('DEP', 'WD') else CATEGORY_ALIASES.get(value, 'DEP') for value in raw_categories
+        ], dtype=object)[codes]
+        report(raw_category == '', 3, False, lambda i: "No category specified, defaulting to 'DEP'")
+        report(aliased, 3, False, lambda i: f"Mapped category '{raw_category[i]}' to '{category[i]}'")
+        report(~known & ~aliased & (raw_category != ''), 3, False,
+               lambda i: f"Unknown category '{raw_category[i]}', defaulting to 'DEP'")
+
+        raw_amount = _column(rows, 'amount')
+        amount_text, amount_value = _numeric_column(_text_column(raw_amount))
+        report(np.isnan(amount_value), 4, True, lambda i: f"Invalid amount format '{raw_amount[i]}'")
+        is_wd = category == 'WD'
+        # Amounts are stored positive; the category carries the direction
+        amount_value = np.where(is_wd, np.abs(amount_value), amount_value)
+        report(amount_value <= 0, 5, True, lambda i: f"Amount must be positive for {client_name[i]}")
+        report(amount_value > float(MAX_AMOUNT), 6, True, lambda i: f"Amount too large for {client_name[i]}")
+
+        raw_date = _column(rows, 'date')
+        codes, texts = _factorize_text(raw_date)
+        date_text = texts[codes]
+        transaction_date = _parse_dates(texts)[codes]
+        undated = pd.isna(transaction_date)
+        transaction_date[undated] = self.today
+        report(undated & (date_text != ''), 7, False,
+               lambda i: f"Invalid date format '{raw_date[i]}', using current date")
+        report(undated & (date_text == ''), 7, False, lambda i: "No date specified, using current date")
+
+        raw_commission = _column(rows, 'commission')
+        commission_text, commission_value = _numeric_column(_text_column(raw_commission))
+        provided_commission = commission_text != ''
+        report(provided_commission & np.isnan(commission_value), 8, True,
+               lambda i: f"Invalid amount format '{raw_commission[i]}'")
+
+        for _, _, is_error, message in sorted(messages, key=lambda entry: entry[:2]):
+            if is_error:
+                self.error(message)
+            else:
+                self.warn(message)
+
+        valid = np.flatnonzero(~failed)
+        if not len(valid):
+            return []
+
+        # Decimal values only for the rows that are inserted
+        psps = _text_column(_column(rows, 'psp'))[valid].tolist()
+        has_commission = (provided_commission & (commission_value != 0))[valid].tolist()
+        commission_texts = np.asarray(commission_text, dtype=object)[valid].tolist()
+        categories = category[valid].tolist()
+        currencies = currency[valid].tolist()
+        dates = transaction_date[valid].tolist()
+        rates = {psp: self.commission_rate(psp) if psp else None for psp in set(psps)}
+
+        amounts, commissions = [], []
+        for text, wd, psp, provided, given in zip(np.asarray(amount_text, dtype=object)[valid].tolist(),
+                                                  is_wd[valid].tolist(), psps, has_commission, commission_texts):
+            amount = abs(Decimal(text)) if wd else Decimal(text)
+            amounts.append(amount)
+            if provided:
+                commissions.append(Decimal(given))
+            elif wd or rates[psp] is None:
+                commissions.append(Decimal('0'))
+            else:
+                commissions.append((amount * rates[psp]).quantize(CENT))
+
+        notes = _text_column(_column(rows, 'notes'))[valid].tolist()
+        if self.note_suffix:
+            notes = [f"{note} | {self.note_suffix}" if note else self.note_suffix for note in notes]
+
+        companies = _text_column(_column(rows, 'company'))[valid].tolist()
+        payment_methods = _text_column(_column(rows, 'payment_method'))[valid].tolist()
+
+        exchange_rates = {}
+        if self.convert_currency:
+            # One lookup per distinct (currency, date) of the batch
+            exchange_rates = {
+                key: self.exchange_rate(*key)
+                for key in set(zip(currencies, dates)) if key[0] != 'TL'
+            }
+
+        mappings = []
+        for i, position in enumerate(valid.tolist()):
+            amount, commission, currency_code = amounts[i], commissions[i], currencies[i]
+            net_amount = amount - commission
+            amount_try = commission_try = net_amount_try = exchange_rate = None
+            if self.convert_currency:
+                if currency_code == 'TL':
+                    exchange_rate = Decimal('1.0')
+                    amount_try, commission_try, net_amount_try = amount, commission, net_amount
+                else:
+                    exchange_rate = exchange_rates[(currency_code, dates[i])]
+                    if exchange_rate:
+                        amount_try = (amount * exchange_rate).quantize(CENT)
+                        commission_try = (commission * exchange_rate).quantize(CENT)
+                        net_amount_try = (net_amount * exchange_rate).quantize(CENT)
+                        if categories[i] == 'WD' and currency_code == 'USD':
+                            # Matches Transaction.calculate_try_amounts sign handling
+                            amount_try, net_amount_try = -amount_try, -net_amount_try
+
+            mappings.append({
+                'client_name': client_name[position],
+                'company': companies[i] or 'Unknown',
+                'payment_method': payment_methods[i] or 'Unknown',
+                'category': categories[i],
+                'amount': amount,
+                'commission': commission,
+                'net_amount': net_amount,
+                'currency': currency_code,
+                'psp': psps[i] or 'Unknown',
+                'notes': notes[i],
+                'date': dates[i],
+                'amount_try': amount_try,
+                'commission_try': commission_try,
+                'net_amount_try': net_amount_try,
+                'exchange_rate': exchange_rate,
+                'created_by': self.user_id,
+                'created_at': created_at,
+                'updated_at': created_at
+            })
+        return mappings
+
+    def insert(self, mappings: List[Dict[str, Any]]):
+        if not mappings:
+            # An empty parameter list would run one INSERT of column defaults
+            return
+        # Core executemany: no identity map or ORM bookkeeping per row
+        db.session.execute(Transaction.__table__.insert(), mappings)
+        for mapping in mappings:
+            self.rollup_keys.add((mapping['date'], mapping['psp'], mapping['currency']))
+            self.total_amount += mapping['amount']
+            self.categories.add(mapping['category'])
+        self.successful += len(mappings)
+
+
+class TransactionImportService:
+    """Validates and inserts transaction rows in batches.
+
+    Rows are consumed lazily from any iterable (JSON payloads, CSV readers,
+    read-only XLSX worksheets), so memory stays bounded by the batch size.
+    Commission rates are loaded once per import and exchange rates resolved
+    once per (currency, date); rows go in through executemany INSERTs, which
+    bypass the ORM flush hook, so the daily PSP rollup is refreshed for the
+    touched keys before the single commit.
+    """
+
+    # File readers
+
+    @staticmethod
+    def _normalize_header(value) -> str:
+        return str(value or '').strip().lower().replace(' ', '_')
+
+    def iter_file_rows(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield one dict per data row of a CSV or XLSX file without loading it whole"""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == '.csv':
+            yield from self._iter_csv_rows(file_path)
+        elif extension in ('.xlsx', '.xlsm'):
+            yield from self._iter_xlsx_rows(file_path)
+        else:
+            raise ValueError(f"Unsupported import file type: {extension or file_path}")
+
+    def _iter_csv_rows(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        # utf-8-sig strips the BOM Excel writes in front of CSV exports
+        with open(file_path, newline='', encoding='utf-8-sig') as handle:
+            reader = csv.reader(handle)
+            header = next(reader, None)
+            if header is None:
+                return
+            keys = [self._normalize_header(column) for column in header]
+            for values in reader:
+                if not any(values):
+                    continue
+                yield dict(zip(keys, values))
+
+    def _iter_xlsx_rows(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            keys = [self._normalize_header(column) for column in header]
+            for values in rows:
+                if not any(value not in (None, '') for value in values):
+                    continue
+                yield dict(zip(keys, values))
+        finally:
+            workbook.close()
+
+    # Lookups resolved once per import
+
+    @staticmethod
+    def load_commission_rates() -> Dict[str, Decimal]:
+        """Active PSP commission rates from the shared rate registry"""
+        from app.services.psp_options_service import psp_rate_registry
+
+        return {value: rate for value, rate in psp_rate_registry.rates().items() if rate is not None}
+
+    def import_rows(self, rows: Iterable[Dict[str, Any]], user_id, batch_size: int = IMPORT_BATCH_SIZE,
+                    convert_currency: bool = False,
+                    rate_fallback: Optional[Callable[[str], Optional[Decimal]]] = None,
+                    note_suffix: Optional[str] = None,
+                    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    first_row_number: int = 1, commit: bool = True) -> Dict[str, Any]:
+        """Validate and insert rows in batches, committing once at the end.
+
+        Args:
+            rows: Iterable of dicts keyed by transaction field names
+            user_id: Stored as created_by on every row
+            batch_size: Rows per bulk INSERT
+            convert_currency: Fill the TRY columns (exchange rate once per currency/date)
+            rate_fallback: Called once per PSP without an active option rate
+            note_suffix: Appended to every row's notes
+            progress_callback: Receives the running counters after each batch
+            first_row_number: Number of the first row in error messages
+            commit: Leave the transaction open so the caller can commit its
+                own bookkeeping atomically with the rows (caches are then the
+                caller's to invalidate)
+
+        Returns:
+            Dict with total_rows, successful_imports, failed_imports, errors,
+            warnings, total_amount, categories_imported, duration_seconds and
+            rows_per_second
+        """
+        start_time = time.time()
+        run = _ImportRun(user_id, self.load_commission_rates(), convert_currency, rate_fallback, note_suffix)
+        batch: List[Dict[str, Any]] = []
+        created_at = datetime.now()
+
+        def progress() -> Dict[str, Any]:
+            return {
+                'processed_rows': run.total_rows,
+                'successful_imports': run.successful,
+                'failed_imports': run.failed
+            }
+
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    run.insert(run.build_batch(batch, first_row_number + run.total_rows, created_at))
+                    run.total_rows += len(batch)
+                    batch = []
+                    logger.info(f"Import progress: {run.total_rows} rows processed, {run.successful} inserted")
+                    if progress_callback:
+                        progress_callback(progress())
+
+            if batch:
+                run.insert(run.build_batch(batch, first_row_number + run.total_rows, created_at))
+                run.total_rows += len(batch)
+                if progress_callback:
+                    progress_callback(progress())
+
+            if run.rollup_keys:
+                from app.services.psp_rollup_service import psp_rollup_service
+                psp_rollup_service.refresh_keys(run.rollup_keys)
+
+            if commit:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if commit and run.successful:
+            try:
+                from app.services.query_service import QueryService
+                QueryService.invalidate_transaction_cache()
+            except Exception as cache_error:
+                logger.warning(f"Failed to invalidate cache after transaction import: {cache_error}")
+
+        duration = time.time() - start_time
+        logger.info(
+            f"Imported {run.successful}/{run.total_rows} transactions "
+            f"({run.failed} failed) in {duration:.2f}s"
+        )
+        return {
+            'total_rows': run.total_rows,
+            'successful_imports': run.successful,
+            'failed_imports': run.failed,
+            'errors': run.errors,
+            'warnings': run.warnings,
+            'total_amount': float(run.total_amount),
+            'categories_imported': sorted(run.categories),
+            'duration_seconds': round(duration, 3),
+            'rows_per_second': round(run.total_rows / duration) if duration > 0 else run.total_rows
+        }
+
+    def import_file(self, file_path: str, user_id, **options) -> Dict[str, Any]:
+        """Stream a CSV/XLSX file through import_rows"""
+        return self.import_rows(self.iter_file_rows(file_path), user_id, **options)
+
+
+# Global instance
+transaction_import_service = TransactionImportService()
@@ -6,20 +6,43 @@ Continuously monitors transaction calculations and alerts on discrepancies
 import logging
 import threading
 import time
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Dict, List, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable, Tuple
 from dataclasses import dataclass
 import json
 
+import pandas as pd
+from sqlalchemy import and_, or_
+
 from app import db
 from app.models.transaction import Transaction
-from app.models.exchange_rate import ExchangeRate
+from app.models.job import JobCheckpoint
 from app.services.decimal_float_fix_service import decimal_float_service
-from app.services.exchange_rate_service import ExchangeRateService
+from app.services.exchange_rate_service import exchange_rate_service
 
 logger = logging.getLogger(__name__)
 
+JOB_TYPE = 'transaction_monitor'
+JOB_KEY = 'transaction_monitor:calculations'
+
+# Changed rows fetched and screened per batch
+MONITOR_BATCH_SIZE = 500
+
+# Rows updated within this window are left for the next run, so a write
+# committed after a later one cannot slip below the watermark
+WATERMARK_SAFETY_LAG = timedelta(seconds=60)
+
+# On the very first run only rows changed within this window are checked
+INITIAL_LOOKBACK = timedelta(days=1)
+
+# Columns read for checking (Row attributes match Transaction attributes)
+MONITORED_COLUMNS = (
+    Transaction.id, Transaction.updated_at, Transaction.date, Transaction.currency,
+    Transaction.category, Transaction.psp, Transaction.amount, Transaction.commission,
+    Transaction.net_amount, Transaction.amount_try, Transaction.exchange_rate
+)
+
 @dataclass
 class CalculationAlert:
     """Alert for calculation discrepancy"""
@@ -69,31 +92,25 @@ class TransactionMonitoringService:
             'critical': Decimal('100.00') # 100 TL
         }
         
-        # Commission rates for verification
-        self.commission_rates = {
-            'iyzico': Decimal('0.025'),  # 2.5%
-            'paytr': Decimal('0.02'),    # 2%
-            'stripe': Decimal('0.029'),  # 2.9%
-            'default': Decimal('0.015')  # 1.5%
-        }
-        
-        # Exchange rate service
-        self.exchange_rate_service = ExchangeRateService()
-        
         # Alert callbacks
         self.alert_callbacks: List[Callable[[CalculationAlert], None]] = []
         
-        # Last checked transaction IDs to avoid duplicate alerts
-        self.last_checked_transactions = set()
+        # Application whose context the monitoring thread runs in
+        self.app = None
+        self._tables_ready = False
         
         logger.info("🔍 Transaction Monitoring Service initialized")
     
-    def start_monitoring(self):
+    def start_monitoring(self, app=None):
         """Start the monitoring service"""
         if self.is_running:
             logger.warning("Monitoring service is already running")
             return
         
+        if app is None:
+            from flask import current_app
+            app = current_app._get_current_object()
+        self.app = app
         self.is_running = True
         self.monitoring_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
         self.monitoring_thread.start()
@@ -121,7 +138,8 @@ class TransactionMonitoringService:
                 check_start = datetime.now()
                 
                 # Perform calculation check
-                self._check_calculations()
+                with self.app.app_context():
+                    self._check_calculations()
                 
                 # Update statistics
                 check_duration = (datetime.now() - check_start).total_seconds()
@@ -147,59 +165,166 @@ class TransactionMonitoringService:
                 logger.error(f"❌ Error in monitoring loop: {e}")
                 time.sleep(60)  # Wait 1 minute before retrying
     
-    def _check_calculations(self):
-        """Check all transaction calculations"""
+    def _ensure_tables(self):
+        """Create the checkpoint table and change-feed index on older databases"""
+        if self._tables_ready:
+            return
+        JobCheckpoint.__table__.create(bind=db.engine, checkfirst=True)
+        for index in Transaction.__table__.indexes:
+            if index.name == 'idx_transaction_updated_at_id':
+                index.create(bind=db.engine, checkfirst=True)
+        self._tables_ready = True
+    
+    def _load_checkpoint(self) -> JobCheckpoint:
+        """Checkpoint holding the (updated_at, id) high-water mark"""
+        checkpoint = JobCheckpoint.query.filter_by(job_key=JOB_KEY).first()
+        if checkpoint is None:
+            checkpoint = JobCheckpoint(job_key=JOB_KEY, job_type=JOB_TYPE, status='running', position=0)
+            start = datetime.now(timezone.utc).replace(tzinfo=None) - INITIAL_LOOKBACK
+            checkpoint.set_state({'updated_at': start.isoformat()})
+            db.session.add(checkpoint)
+            db.session.commit()
+        return checkpoint
+    
+    @staticmethod
+    def _watermark(checkpoint: JobCheckpoint) -> Tuple[datetime, int]:
+        updated_at = checkpoint.get_state().get('updated_at')
+        return datetime.fromisoformat(updated_at), checkpoint.position or 0
+    
+    def _fetch_changed(self, watermark: Tuple[datetime, int], cutoff: datetime) -> List[Any]:
+        """Next batch of rows changed after the watermark, in (updated_at, id) order"""
+        updated_at, last_id = watermark
+        return db.session.query(*MONITORED_COLUMNS).filter(
+            or_(
+                Transaction.updated_at > updated_at,
+                and_(Transaction.updated_at == updated_at, Transaction.id > last_id)
+            ),
+            Transaction.updated_at <= cutoff
+        ).order_by(Transaction.updated_at, Transaction.id).limit(MONITOR_BATCH_SIZE).all()
+    
+    def _check_calculations(self) -> Dict[str, int]:
+        """Check transactions changed since the last run.
+        
+        Rows are read in (updated_at, id) order after the persisted
+        watermark, and each batch's watermark is committed once the batch is
+        checked, so the cost follows the write rate and a restart resumes
+        where the last run stopped.
+        """
+        summary = {'checked': 0, 'flagged': 0, 'alerts': 0}
         try:
-            # Get recent transactions (last 24 hours)
-            yesterday = date.today() - timedelta(days=1)
-            recent_transactions = Transaction.query.filter(
-                Transaction.date >= yesterday
-            ).all()
+            self._ensure_tables()
+            checkpoint = self._load_checkpoint()
+            watermark = self._watermark(checkpoint)
+            cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - WATERMARK_SAFETY_LAG
             
-            logger.debug(f"🔍 Checking {len(recent_transactions)} recent transactions")
-            
-            for transaction in recent_transactions:
-                # Skip if already checked recently
-                if transaction.id in self.last_checked_transactions:
-                    continue
-                
-                # Check transaction calculations
-                alerts = self._check_transaction(transaction)
+            while True:
+                rows = self._fetch_changed(watermark, cutoff)
+                if not rows:
+                    break
                 
-                # Add alerts
+                alerts, flagged = self._check_batch(rows)
                 for alert in alerts:
-                    self.alerts.append(alert)
-                    self.stats.alerts_generated += 1
-                    
-                    # Trigger alert callbacks
-                    for callback in self.alert_callbacks:
-                        try:
-                            callback(alert)
-                        except Exception as e:
-                            logger.error(f"Error in alert callback: {e}")
+                    self._record_alert(alert)
                 
-                # Mark as checked
-                self.last_checked_transactions.add(transaction.id)
+                last = rows[-1]
+                watermark = (last.updated_at, last.id)
+                checkpoint.position = last.id
+                checkpoint.set_state({'updated_at': last.updated_at.isoformat()})
+                checkpoint.processed_count = (checkpoint.processed_count or 0) + len(rows)
+                checkpoint.success_count = (checkpoint.success_count or 0) + len(rows) - flagged
+                checkpoint.failure_count = (checkpoint.failure_count or 0) + flagged
+                db.session.commit()
+                
+                summary['checked'] += len(rows)
+                summary['flagged'] += flagged
+                summary['alerts'] += len(alerts)
+                
+                if len(rows) < MONITOR_BATCH_SIZE:
+                    break
             
-            # Clean up old checked transactions (keep last 1000)
-            if len(self.last_checked_transactions) > 1000:
-                self.last_checked_transactions = set(list(self.last_checked_transactions)[-1000:])
+            logger.debug(f"🔍 Checked {summary['checked']} changed transactions, {summary['alerts']} alerts")
             
             # Clean up old alerts (keep last 100)
             if len(self.alerts) > 100:
                 self.alerts = self.alerts[-100:]
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"❌ Error checking calculations: {e}")
+        
+        return summary
+    
+    def _record_alert(self, alert: CalculationAlert):
+        self.alerts.append(alert)
+        self.stats.alerts_generated += 1
+        
+        # Trigger alert callbacks
+        for callback in self.alert_callbacks:
+            try:
+                callback(alert)
+            except Exception as e:
+                logger.error(f"Error in alert callback: {e}")
+    
+    def _resolve_rates(self, frame: pd.DataFrame) -> Dict[Tuple[date, str], Optional[Decimal]]:
+        """Exchange rate for each distinct (date, currency) of a batch, resolved once"""
+        rates = {}
+        foreign = frame[frame['currency'] != 'TL']
+        for day, currency in foreign[['date', 'currency']].drop_duplicates().itertuples(index=False):
+            rates[(day, currency)] = self._get_exchange_rate(day, currency)
+        return rates
+    
+    def _check_batch(self, rows: List[Any]) -> Tuple[List[CalculationAlert], int]:
+        """Screen a batch with column arithmetic; only suspicious rows are checked in detail"""
+        from app.services.psp_options_service import psp_rate_registry
+        
+        frame = pd.DataFrame.from_records(rows, columns=[column.key for column in MONITORED_COLUMNS])
+        frame['currency'] = frame['currency'].fillna('TL').str.upper()
+        for column in ('amount', 'commission', 'net_amount', 'amount_try', 'exchange_rate'):
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').astype(float)
+        
+        # Currency breakdown of checked rows
+        for currency, count in frame['currency'].value_counts().items():
+            self.stats.currency_breakdown[currency] = self.stats.currency_breakdown.get(currency, 0) + int(count)
+        
+        rates = self._resolve_rates(frame)
+        psp = frame['psp'].fillna('')
+        psp_rates = {name: float(psp_rate_registry.rate_for(name or None)) for name in psp.unique()}
+        
+        amount = frame['amount'].fillna(0.0)
+        commission = frame['commission'].fillna(0.0)
+        is_withdraw = frame['category'].fillna('').str.upper() == 'WD'
+        expected_commission = (amount * psp.map(psp_rates).astype(float)).where(~is_withdraw, 0.0)
+        threshold = float(self.thresholds['low'])
+        
+        suspicious = (expected_commission - commission).abs().round(2) > threshold
+        suspicious |= (amount - commission - frame['net_amount'].fillna(0.0)).abs().round(2) > threshold
+        suspicious |= (amount <= 0) | (amount > 999999999.99)
+        
+        foreign = frame['currency'] != 'TL'
+        frame_rate = pd.Series(
+            [rates.get((day, currency)) for day, currency in zip(frame['date'], frame['currency'])],
+            index=frame.index, dtype=object
+        )
+        suspicious |= foreign & frame_rate.map(lambda rate: not rate)
+        used_rate = frame['exchange_rate'].fillna(frame_rate.map(lambda rate: float(rate) if rate else float('nan')))
+        has_try = foreign & frame['amount_try'].notna() & used_rate.notna()
+        suspicious |= has_try & ((amount * used_rate - frame['amount_try']).abs().round(2) > threshold)
+        
+        alerts: List[CalculationAlert] = []
+        flagged = 0
+        for position in frame.index[suspicious]:
+            row = rows[position]
+            row_alerts = self._check_transaction(row, rates.get((row.date, (row.currency or 'TL').upper())))
+            if row_alerts:
+                flagged += 1
+                alerts.extend(row_alerts)
+        return alerts, flagged
     
-    def _check_transaction(self, transaction: Transaction) -> List[CalculationAlert]:
-        """Check calculations for a single transaction"""
+    def _check_transaction(self, transaction, exchange_rate: Optional[Decimal] = None) -> List[CalculationAlert]:
+        """Check calculations for a single transaction (or a row with the same attributes)"""
         alerts = []
         
         try:
-            # Get exchange rate
-            exchange_rate = self._get_exchange_rate(transaction.date, transaction.currency)
-            
             # Check commission calculation
             commission_alert = self._check_commission(transaction, exchange_rate)
             if commission_alert:
@@ -344,6 +469,29 @@ class TransactionMonitoringService:
                 description=f"Missing exchange rate for {transaction.currency} on {transaction.date}"
             )
         
+        # TRY amount against the rate stored on the transaction (else the date's rate)
+        if transaction.amount_try is None:
+            return None
+        rate = decimal_float_service.safe_decimal(transaction.exchange_rate) if transaction.exchange_rate else exchange_rate
+        expected_try = (decimal_float_service.safe_decimal(transaction.amount) * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        actual_try = decimal_float_service.safe_decimal(transaction.amount_try)
+        difference = abs(expected_try - actual_try)
+        
+        if difference > self.thresholds['low']:
+            percentage_diff = (difference / expected_try * 100) if expected_try > 0 else 0
+            return CalculationAlert(
+                transaction_id=transaction.id,
+                field_name='amount_try',
+                expected_value=expected_try,
+                actual_value=actual_try,
+                difference=difference,
+                percentage_diff=float(percentage_diff),
+                currency=transaction.currency or 'TL',
+                severity=self._determine_severity(difference),
+                timestamp=datetime.now(),
+                description=f"TRY conversion discrepancy: expected {expected_try}, got {actual_try}"
+            )
+        
         return None
     
     def _calculate_expected_commission(self, transaction: Transaction) -> Decimal:
@@ -354,9 +502,9 @@ class TransactionMonitoringService:
         if transaction.category and transaction.category.upper() == 'WD':
             return Decimal('0')
         
-        # Get commission rate based on PSP
-        psp = transaction.psp or 'default'
-        commission_rate = self.commission_rates.get(psp.lower(), self.commission_rates['default'])
+        # Get commission rate based on PSP, as used when the commission was calculated
+        from app.services.psp_options_service import psp_rate_registry
+        commission_rate = psp_rate_registry.rate_for(transaction.psp)
         
         expected_commission = decimal_float_service.safe_multiply(amount, commission_rate, 'decimal')
         return expected_commission.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
@@ -367,20 +515,8 @@ class TransactionMonitoringService:
             return None
         
         try:
-            # Get exchange rate from database
-            exchange_rate = ExchangeRate.query.filter_by(
-                date=transaction_date
-            ).first()
-            
-            if exchange_rate:
-                if currency.upper() == 'USD':
-                    return decimal_float_service.safe_decimal(exchange_rate.usd_to_tl)
-                elif currency.upper() == 'EUR':
-                    return decimal_float_service.safe_decimal(exchange_rate.eur_to_tl)
-                elif currency.upper() == 'GBP':
-                    return decimal_float_service.safe_decimal(exchange_rate.gbp_to_tl)
-            
-            return None
+            # Stored rate for the date, read through the rate service's cache
+            return exchange_rate_service.get_rate_for(currency, transaction_date)
             
         except Exception as e:
             logger.error(f"Error getting exchange rate for {currency} on {transaction_date}: {e}")
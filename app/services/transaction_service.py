@@ -20,7 +20,7 @@ except ImportError:
     SYNC_AVAILABLE = False
 
 # Import PSP options service
-from app.services.psp_options_service import PspOptionsService
+from app.services.psp_options_service import psp_rate_registry
 
 # Import enhanced services
 try:
@@ -131,7 +131,7 @@ class TransactionService:
             # Sync PSP Track if available
             if SYNC_AVAILABLE:
                 try:
-                    DataSyncService.sync_psp_track_from_transactions()
+                    DataSyncService.sync_psp_track_from_transactions(keys=[(transaction.date, transaction.psp)])
                 except Exception as sync_error:
                     logger.warning(f'PSP Track sync failed after transaction creation: {sync_error}')
             
@@ -167,6 +167,7 @@ class TransactionService:
             
             # Store original currency for comparison
             original_currency = transaction.currency
+            original_key = (transaction.date, transaction.psp)
             
             # Update fields
             for key, value in data.items():
@@ -219,7 +220,9 @@ class TransactionService:
             # Sync PSP Track if available
             if SYNC_AVAILABLE:
                 try:
-                    DataSyncService.sync_psp_track_from_transactions()
+                    DataSyncService.sync_psp_track_from_transactions(
+                        keys=[original_key, (transaction.date, transaction.psp)]
+                    )
                 except Exception as sync_error:
                     logger.warning(f'PSP Track sync failed after transaction update: {sync_error}')
             
@@ -259,7 +262,7 @@ class TransactionService:
             # Sync PSP Track if available
             if SYNC_AVAILABLE:
                 try:
-                    DataSyncService.sync_psp_track_from_transactions()
+                    DataSyncService.sync_psp_track_from_transactions(keys=[(date_obj, psp)])
                 except Exception as sync_error:
                     logger.warning(f'PSP Track sync failed after transaction deletion: {sync_error}')
             
@@ -289,7 +292,7 @@ class TransactionService:
         # Get commission rate from PSP service for DEP transactions
         try:
             if psp:
-                commission_rate = PspOptionsService.get_psp_commission_rate(psp)
+                commission_rate = psp_rate_registry.rate_for(psp)
                 commission = amount * commission_rate
                 return round(commission, 2)
         except Exception as e:
@@ -313,13 +316,14 @@ class TransactionService:
     def update_daily_balance(date_obj, psp):
         """Update daily balance for a specific date and PSP"""
         try:
-            # Get all transactions for the date and PSP
-            transactions = Transaction.query.filter_by(date=date_obj, psp=psp).all()
+            # Read the day's totals from the daily PSP rollup instead of the transaction rows
+            from app.services.psp_rollup_service import psp_rollup_service
+            rollup = psp_rollup_service.get_daily_psp_totals(date_obj, date_obj, psp=psp)
             
             # Calculate totals
-            total_inflow = sum(t.amount for t in transactions if t.category == 'DEP')
-            total_outflow = sum(t.amount for t in transactions if t.category == 'WD')
-            total_commission = sum(t.commission for t in transactions)
+            total_inflow = sum((row.deposit_amount or Decimal('0')) for row in rollup)
+            total_outflow = sum((row.withdraw_amount or Decimal('0')) for row in rollup)
+            total_commission = sum((row.commission_amount or Decimal('0')) for row in rollup)
             net_amount = total_inflow - total_outflow - total_commission
             
             # Update or create daily balance
@@ -350,38 +354,24 @@ class TransactionService:
 
     @staticmethod
     def import_transactions(file_data, user_id):
-        """Import transactions from file"""
+        """Import transactions from a CSV/XLSX file path.
+
+        Streams the file through the batched import engine; TL amounts are
+        filled using one exchange rate lookup per (currency, date).
+        """
         try:
-            # Read file data
-            df = pd.read_excel(file_data) if file_data.endswith('.xlsx') else pd.read_csv(file_data)
+            from app.services.transaction_import_service import transaction_import_service
             
-            imported_count = 0
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Prepare transaction data
-                    transaction_data = {
-                        'client_name': row.get('client_name', ''),
-                        'amount': safe_float(row.get('amount', 0)),
-                        'date': pd.to_datetime(row.get('date')).date(),
-                        'currency': row.get('currency', 'TL'),
-                        'psp': row.get('psp', ''),
-                        'category': row.get('category', ''),
-                        'payment_method': row.get('payment_method', ''),
-                        'notes': row.get('notes', '')
-                    }
-                    
-                    # Create transaction
-                    TransactionService.create_transaction(transaction_data, user_id)
-                    imported_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {index + 1}: {str(e)}")
+            result = transaction_import_service.import_file(
+                file_data,
+                user_id,
+                convert_currency=True,
+                rate_fallback=psp_rate_registry.rate_for
+            )
             
             return {
-                'imported_count': imported_count,
-                'errors': errors
+                'imported_count': result['successful_imports'],
+                'errors': result['errors']
             }
             
         except Exception as e:
@@ -418,84 +408,16 @@ class TransactionService:
             raise
 
     @staticmethod
-    def backfill_existing_transactions():
-        """Backfill TL amounts for existing USD/EUR transactions and commissions for WD transactions"""
-        try:
-            # Get all USD and EUR transactions without TL amounts
-            usd_eur_transactions = Transaction.query.filter(
-                Transaction.currency.in_(['USD', 'EUR']),
-                (Transaction.amount_try.is_(None) | Transaction.commission_try.is_(None) | Transaction.net_amount_try.is_(None))
-            ).all()
-            
-            # Get all WD transactions with zero commission
-            wd_transactions = Transaction.query.filter(
-                Transaction.category == 'WD',
-                (Transaction.commission == 0 or Transaction.commission == Decimal('0'))
-            ).all()
-            
-            # Combine both lists
-            transactions = usd_eur_transactions + wd_transactions
-            
-            updated_count = 0
-            error_count = 0
-            
-            for transaction in transactions:
-                try:
-                    # Handle USD/EUR transactions (TL amounts)
-                    if transaction.currency in ['USD', 'EUR']:
-                        # Fetch exchange rate
-                        exchange_rate = exchange_rate_service.get_or_fetch_rate(
-                            transaction.currency, transaction.date
-                        )
-                        
-                        if exchange_rate:
-                            # Calculate TL amounts
-                            transaction.calculate_try_amounts(exchange_rate)
-                            updated_count += 1
-                            logger.info(f"Backfilled TL amounts for transaction {transaction.id}")
-                        else:
-                            error_count += 1
-                            logger.warning(f"Failed to fetch rate for transaction {transaction.id}")
-                    
-                    # Handle WD transactions (commissions)
-                    if transaction.category == 'WD' and (transaction.commission == 0 or transaction.commission == Decimal('0')):
-                        try:
-                            from app.models.config import Option
-                            psp_option = Option.query.filter_by(
-                                field_name='psp',
-                                value=transaction.psp,
-                                is_active=True
-                            ).first()
-                            
-                            # WD transactions always have 0 commission
-                            commission = Decimal('0')
-                            logger.info(f"WD transaction - setting commission to 0 for amount: {transaction.amount}")
-                            
-                            logger.info(f"Before update - Transaction {transaction.id}: commission={transaction.commission}, net_amount={transaction.net_amount}")
-                            
-                            transaction.commission = commission
-                            transaction.net_amount = transaction.amount - commission
-                            
-                            logger.info(f"After update - Transaction {transaction.id}: commission={transaction.commission}, net_amount={transaction.net_amount}")
-                            
-                            updated_count += 1
-                            logger.info(f"Backfilled commission for WD transaction {transaction.id}: {commission}")
-                        except Exception as e:
-                            logger.warning(f"Failed to backfill commission for transaction {transaction.id}: {e}")
-                
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"Error backfilling transaction {transaction.id}: {e}")
-            
-            db.session.commit()
-            
-            logger.info(f"Backfill completed: {updated_count} updated, {error_count} errors")
-            return {
-                'updated_count': updated_count,
-                'error_count': error_count
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in backfill: {e}")
-            db.session.rollback()
-            raise 
\ No newline at end of file
+    def backfill_existing_transactions(batch_size: int = 1000, dry_run: bool = False):
+        """Backfill TL amounts for existing USD/EUR transactions and net amounts for WD transactions
+        
+        Runs the resumable chunked backfill job (see TransactionBackfillService).
+        """
+        from app.services.transaction_backfill_service import transaction_backfill_service
+        
+        result = transaction_backfill_service.run(batch_size=batch_size, dry_run=dry_run)
+        logger.info(f"Backfill completed: {result['updated']} updated, {result['errors']} errors")
+        return {
+            'updated_count': result['updated'],
+            'error_count': result['errors']
+        }
\ No newline at end of file
@@ -1,9 +1,12 @@
 import json
 import os
 import re
+import threading
+import time
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple, Any
 from flask import current_app
+from sqlalchemy import event
 from app import db
 from app.models.translation import (
     TranslationKey, Translation, CustomDictionary, 
@@ -13,6 +16,175 @@ from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Seconds a compiled catalog is served before it is rebuilt, which bounds
+# how long other processes (and edits to the locale JSON files) lag behind
+TRANSLATION_CATALOG_TTL = 300
+
+# Models whose writes change compiled catalogs
+CATALOG_MODELS = (TranslationKey, Translation, CustomDictionary, TranslationSettings)
+
+
+def _locale_json_path(language: str) -> str:
+    return f"frontend/src/locales/{language}.json"
+
+
+class TranslationCatalog:
+    """Per-language key_path -> final text maps, compiled once.
+
+    A catalog merges the locale JSON file with the database translations
+    (database wins) and has the custom dictionary already applied, so a
+    lookup is a single dictionary read. Catalogs are rebuilt lazily after a
+    translation, key, dictionary or settings change is committed (the
+    version is bumped by session hooks) or once the TTL has passed.
+    """
+
+    def __init__(self, ttl: int = TRANSLATION_CATALOG_TTL):
+        self.ttl = ttl
+        self.version = 0
+        # (language, default_language) -> (version, loaded_at, catalog)
+        self._catalogs: Dict[Tuple[str, str], Tuple[int, float, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+        self._hooks_registered = False
+
+    def init_app(self, app):
+        """Register session hooks that invalidate catalogs on translation writes"""
+        self.register_session_hooks()
+
+    def register_session_hooks(self):
+        if self._hooks_registered:
+            return
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+        self._hooks_registered = True
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, CATALOG_MODELS):
+                session.info['translations_changed'] = True
+                return
+
+    def _after_commit(self, session):
+        if session.info.pop('translations_changed', False):
+            self.invalidate()
+
+    @staticmethod
+    def _after_rollback(session, previous_transaction):
+        session.info.pop('translations_changed', None)
+
+    def invalidate(self):
+        """Drop compiled catalogs; the next lookup recompiles them"""
+        with self._lock:
+            self.version += 1
+            self._catalogs.clear()
+        logger.debug(f"Translation catalog invalidated (version {self.version})")
+
+    def get(self, language: str, default_language: str) -> Dict[str, str]:
+        """Compiled catalog for a language"""
+        cache_key = (language, default_language)
+        entry = self._catalogs.get(cache_key)
+        if entry and entry[0] == self.version and time.monotonic() - entry[1] < self.ttl:
+            return entry[2]
+
+        with self._lock:
+            entry = self._catalogs.get(cache_key)
+            if entry and entry[0] == self.version and time.monotonic() - entry[1] < self.ttl:
+                return entry[2]
+            version = self.version
+            catalog = self._compile(language, default_language)
+            self._catalogs[cache_key] = (version, time.monotonic(), catalog)
+            return catalog
+
+    def lookup(self, key_path: str, language: str, default_language: str) -> Optional[str]:
+        """Final text for a key, or None when no source has it"""
+        return self.get(language, default_language).get(key_path)
+
+    def _compile(self, language: str, default_language: str) -> Dict[str, str]:
+        start_time = time.time()
+        catalog = self._load_json(language)
+        catalog.update(self._load_database(language))
+
+        substitutions = self._load_substitutions(language, default_language)
+        if substitutions:
+            for key_path, text in catalog.items():
+                for pattern, target_term in substitutions:
+                    text = pattern.sub(target_term, text)
+                catalog[key_path] = text
+
+        logger.debug(f"Compiled {language} translation catalog: {len(catalog)} keys, "
+                     f"{len(substitutions)} dictionary terms in {time.time() - start_time:.3f}s")
+        return catalog
+
+    @staticmethod
+    def _load_json(language: str) -> Dict[str, str]:
+        """Flatten the locale JSON file into dotted key paths"""
+        flat: Dict[str, str] = {}
+        json_path = _locale_json_path(language)
+        try:
+            if not os.path.exists(json_path):
+                return flat
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading JSON file for {language}: {e}")
+            return flat
+
+        def walk(node: Dict, prefix: str = ""):
+            for key, value in node.items():
+                path = f"{prefix}.{key}" if prefix else key
+                if isinstance(value, dict):
+                    walk(value, path)
+                else:
+                    flat[path] = str(value) if value else ""
+
+        if isinstance(data, dict):
+            walk(data)
+        return flat
+
+    @staticmethod
+    def _load_database(language: str) -> Dict[str, str]:
+        """Database translations of active keys, in one query"""
+        translations: Dict[str, str] = {}
+        try:
+            rows = db.session.query(TranslationKey.key_path, Translation.translation_text).join(
+                Translation, Translation.key_id == TranslationKey.id
+            ).filter(
+                Translation.language_code == language,
+                TranslationKey.is_active == True
+            ).order_by(Translation.id).all()
+            for key_path, text in rows:
+                translations.setdefault(key_path, text)
+        except Exception as e:
+            logger.error(f"Database error loading {language} translations: {e}")
+        return translations
+
+    @staticmethod
+    def _load_substitutions(language: str, default_language: str) -> List[Tuple[re.Pattern, str]]:
+        """Compiled custom dictionary patterns, applied in the stored order"""
+        if language == default_language:
+            return []
+        try:
+            entries = db.session.query(CustomDictionary.source_term, CustomDictionary.target_term).filter_by(
+                source_language=default_language,
+                target_language=language,
+                is_active=True
+            ).order_by(CustomDictionary.id).all()
+        except Exception as e:
+            logger.error(f"Error loading custom dictionary: {e}")
+            return []
+
+        # Word boundaries avoid partial matches; the replacement is literal
+        return [
+            (re.compile(r'\b' + re.escape(source_term) + r'\b', re.IGNORECASE),
+             target_term.replace('\\', '\\\\'))
+            for source_term, target_term in entries
+        ]
+
+
+# Global instance
+translation_catalog = TranslationCatalog()
+
 
 class TranslationService:
     """Comprehensive translation service with automation and custom dictionary support"""
@@ -55,16 +227,8 @@ class TranslationService:
         """Get translation for a specific key and language"""
         try:
             self._ensure_settings_loaded()
-            # First check database
-            translation = self._get_from_database(key_path, language)
-            if translation:
-                text = translation.translation_text
-            else:
-                # Fallback to JSON files
-                text = self._get_from_json_files(key_path, language)
-            
-            # Apply custom dictionary substitutions
-            text = self._apply_custom_dictionary(text, language)
+            # Database, JSON fallback and custom dictionary are compiled into the catalog
+            text = translation_catalog.lookup(key_path, language, self.default_language)
             
             # Replace parameters
             if params:
@@ -76,41 +240,6 @@ class TranslationService:
             logger.error(f"Error getting translation for {key_path} in {language}: {e}")
             return key_path
     
-    def _get_from_database(self, key_path: str, language: str) -> Optional[Translation]:
-        """Get translation from database"""
-        try:
-            key = TranslationKey.query.filter_by(key_path=key_path, is_active=True).first()
-            if key:
-                return Translation.query.filter_by(
-                    key_id=key.id, 
-                    language_code=language
-                ).first()
-        except Exception as e:
-            logger.error(f"Database error getting translation: {e}")
-        return None
-    
-    def _get_from_json_files(self, key_path: str, language: str) -> str:
-        """Get translation from JSON files (fallback)"""
-        try:
-            json_path = f"frontend/src/locales/{language}.json"
-            if os.path.exists(json_path):
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Navigate through nested keys
-                keys = key_path.split('.')
-                value = data
-                for key in keys:
-                    if isinstance(value, dict) and key in value:
-                        value = value[key]
-                    else:
-                        return ""
-                
-                return str(value) if value else ""
-        except Exception as e:
-            logger.error(f"Error reading JSON file for {language}: {e}")
-        return ""
-    
     def _apply_custom_dictionary(self, text: str, language: str) -> str:
         """Apply custom dictionary substitutions"""
         try:
@@ -373,7 +502,7 @@ class TranslationService:
     def sync_translations_from_json(self, language: str) -> Dict[str, Any]:
         """Sync translations from JSON files to database"""
         try:
-            json_path = f"frontend/src/locales/{language}.json"
+            json_path = _locale_json_path(language)
             if not os.path.exists(json_path):
                 return {"success": False, "error": f"JSON file not found: {json_path}"}
             
@@ -1,118 +1,176 @@
 """
 Advanced Caching System for PipLinePro
-Provides intelligent caching with TTL, invalidation, and performance monitoring
+Provides the unified tiered cache: an in-process LRU (L1) with TTL and tag
+invalidation, an optional Redis L2, and performance monitoring. The other
+cache services are thin adapters over the ``cache`` instance defined here.
 """
 import time
 import json
+import pickle
+import fnmatch
+import heapq
 import hashlib
 import logging
-from typing import Any, Optional, Dict, Callable, Union
+from collections import OrderedDict
+from typing import Any, Optional, Dict, Callable, Iterable, List, Set, Tuple
 from functools import wraps
-from datetime import datetime, timedelta
+from datetime import datetime
 import threading
 
 logger = logging.getLogger(__name__)
 
+# Tag carried by every entry derived from transaction data; writers
+# invalidate it through QueryService.invalidate_transaction_cache()
+TRANSACTION_DATA_TAG = 'transaction_data'
+
+_MISSING = object()
+
+
+def _index_terms(key: str, tags: Iterable[str]) -> Set[tuple]:
+    """Index terms for a key: its tags, its ':'-delimited prefixes and segments.
+
+    ``consolidated_dashboard:<hash>`` is indexed under the prefixes
+    ``consolidated_dashboard`` and ``consolidated_dashboard:<hash>`` and the
+    segments ``consolidated_dashboard`` and ``<hash>``.
+    """
+    terms = {('tag', tag) for tag in tags}
+    segments = key.split(':')
+    for position, segment in enumerate(segments):
+        terms.add(('prefix', ':'.join(segments[:position + 1])))
+        terms.add(('segment', segment))
+    return terms
+
+
+def _is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in '*?[')
+
+
 class AdvancedCache:
-    """Advanced in-memory caching system with performance monitoring"""
+    """In-process LRU cache with TTL, tags and performance monitoring (L1)
+
+    Entries live in an OrderedDict kept in recency order, so hits and LRU
+    eviction are O(1). An inverted index over tags, key prefixes and key
+    segments makes tag and prefix invalidation cost O(matching keys) and
+    narrows the keys a pattern is tested against; expirations are drained
+    from a heap instead of scanning every entry.
+    """
     
     def __init__(self, max_size: int = 1000, default_ttl: int = 300):
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        # Ordered least to most recently used; hits move keys to the end
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._index: Dict[tuple, Set[str]] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
         self._stats = {
             'hits': 0,
             'misses': 0,
             'sets': 0,
             'deletes': 0,
             'expired': 0,
+            'evictions': 0,
             'total_requests': 0
         }
         self._max_size = max_size
         self._default_ttl = default_ttl
         self._lock = threading.RLock()
-        self._cleanup_interval = 60  # Cleanup every minute
-        self._last_cleanup = time.time()
         
-    def _cleanup_expired(self):
-        """Remove expired entries from cache"""
+    def _unlink(self, key: str) -> Optional[Dict[str, Any]]:
+        """Remove an entry and its index memberships; caller holds the lock"""
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            for term in entry['terms']:
+                keys = self._index.get(term)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._index[term]
+        return entry
+
+    def _cleanup_expired(self) -> int:
+        """Remove expired entries from cache, oldest expiry first"""
         current_time = time.time()
-        expired_keys = []
+        heap = self._expiry_heap
+        expired = 0
         
-        for key, entry in self._cache.items():
-            if current_time >= entry['expires_at']:
-                expired_keys.append(key)
-                self._stats['expired'] += 1
+        while heap and heap[0][0] <= current_time:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._cache.get(key)
+            # Overwritten or deleted keys leave stale heap items behind
+            if entry is not None and entry['expires_at'] == expires_at:
+                self._unlink(key)
+                expired += 1
         
-        for key in expired_keys:
-            del self._cache[key]
+        if len(heap) > 2 * len(self._cache) + 64:
+            self._expiry_heap = [(entry['expires_at'], key) for key, entry in self._cache.items()]
+            heapq.heapify(self._expiry_heap)
             
-        if expired_keys:
-            logger.debug(f"Cleaned up {len(expired_keys)} expired cache entries")
-    
-    def _cleanup_if_needed(self):
-        """Cleanup expired entries if needed"""
-        current_time = time.time()
-        if current_time - self._last_cleanup > self._cleanup_interval:
-            self._cleanup_expired()
-            self._last_cleanup = current_time
+        self._stats['expired'] += expired
+        if expired:
+            logger.debug(f"Cleaned up {expired} expired cache entries")
+        return expired
     
     def _make_space(self):
-        """Remove oldest entries if cache is full"""
-        if len(self._cache) >= self._max_size:
-            # Remove oldest entries (LRU-like behavior)
-            sorted_items = sorted(
-                self._cache.items(),
-                key=lambda x: x[1]['created_at']
-            )
+        """Evict least recently used entries until there is room for one more"""
+        while len(self._cache) >= self._max_size:
+            key = next(iter(self._cache))
+            self._unlink(key)
+            self._stats['evictions'] += 1
+            logger.debug(f"Evicted least recently used cache entry: {key}")
             
-            # Remove 10% of oldest entries
-            remove_count = max(1, len(sorted_items) // 10)
-            for i in range(remove_count):
-                key = sorted_items[i][0]
-                del self._cache[key]
-                
-            logger.debug(f"Removed {remove_count} old cache entries to make space")
+    def _remove(self, keys: Iterable[str]) -> int:
+        count = 0
+        for key in list(keys):
+            if self._unlink(key) is not None:
+                count += 1
+        self._stats['deletes'] += count
+        return count
     
     def get(self, key: str, default: Any = None) -> Any:
         """Get value from cache with hit tracking"""
         with self._lock:
             self._stats['total_requests'] += 1
-            self._cleanup_if_needed()
             
-            if key in self._cache:
-                entry = self._cache[key]
-                current_time = time.time()
-                
-                if current_time < entry['expires_at']:
-                    # Update access time for LRU
-                    entry['last_accessed'] = current_time
+            entry = self._cache.get(key)
+            if entry is not None:
+                if time.time() < entry['expires_at']:
+                    self._cache.move_to_end(key)
+                    entry['last_accessed'] = time.time()
                     self._stats['hits'] += 1
                     logger.debug(f"Cache HIT for key: {key}")
                     return entry['value']
-                else:
-                    # Expired, remove it
-                    del self._cache[key]
-                    self._stats['expired'] += 1
-                    logger.debug(f"Cache EXPIRED for key: {key}")
+
+                # Expired, remove it
+                self._unlink(key)
+                self._stats['expired'] += 1
+                logger.debug(f"Cache EXPIRED for key: {key}")
             
             self._stats['misses'] += 1
             logger.debug(f"Cache MISS for key: {key}")
             return default
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Set value in cache with TTL"""
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> None:
+        """Set value in cache with TTL and optional invalidation tags"""
         with self._lock:
-            self._cleanup_if_needed()
+            self._cleanup_expired()
+            self._unlink(key)
             self._make_space()
             
             ttl = ttl or self._default_ttl
             current_time = time.time()
+            tags = frozenset(tags or ())
+            terms = _index_terms(key, tags)
             
             self._cache[key] = {
                 'value': value,
                 'created_at': current_time,
                 'last_accessed': current_time,
-                'expires_at': current_time + ttl
+                'expires_at': current_time + ttl,
+                'ttl': ttl,
+                'tags': tags,
+                'terms': terms
             }
+            for term in terms:
+                self._index.setdefault(term, set()).add(key)
+            heapq.heappush(self._expiry_heap, (current_time + ttl, key))
             
             self._stats['sets'] += 1
             logger.debug(f"Cache SET for key: {key} (TTL: {ttl}s)")
@@ -120,8 +178,7 @@ class AdvancedCache:
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
         with self._lock:
-            if key in self._cache:
-                del self._cache[key]
+            if self._unlink(key) is not None:
                 self._stats['deletes'] += 1
                 logger.debug(f"Cache DELETE for key: {key}")
                 return True
@@ -131,7 +188,92 @@ class AdvancedCache:
         """Clear all cache entries"""
         with self._lock:
             self._cache.clear()
+            self._index.clear()
+            self._expiry_heap.clear()
             logger.info("Cache cleared")
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Delete every entry carrying any of the tags"""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._index.get(('tag', tag), ()))
+            return self._remove(keys)
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """Delete entries whose key is prefix or starts with prefix + ':'"""
+        with self._lock:
+            return self._remove(self._index.get(('prefix', prefix.rstrip(':')), ()))
+
+    def _pattern_candidates(self, pattern: str) -> Iterable[str]:
+        """Keys that may match pattern, from the index where the pattern allows it"""
+        if _is_glob(pattern):
+            literal = pattern.split('*')[0].split('?')[0].split('[')[0]
+            if ':' in literal:
+                # Globs anchored on a ':'-delimited prefix only look under it
+                return self._index.get(('prefix', literal.rsplit(':', 1)[0]), ())
+        else:
+            # A substring's end segments may fall inside longer key segments,
+            # but segments with ':' on both sides must be whole key segments
+            segments = [segment for segment in pattern.split(':')[1:-1] if segment]
+            if segments:
+                matches = [self._index.get(('segment', segment), set()) for segment in segments]
+                return set.intersection(*matches) if len(matches) > 1 else matches[0]
+        return self._cache.keys()
+
+    def invalidate_pattern(self, pattern: str, within: Optional[str] = None) -> int:
+        """Delete entries matching pattern, optionally only under the ``within`` prefix.
+
+        Globs (``*``, ``?``, ``[``) match the whole key; other patterns match
+        any key containing them, so ``user:1`` also drops ``user:12``. With
+        ``within`` the pattern is matched against the key after that prefix.
+        This is the same matching TieredCache applies to Redis with SCAN.
+        The index only narrows the keys tested: globs starting with a
+        ':'-delimited prefix look under that prefix, and substrings with
+        inner ':'-delimited segments look at keys containing those segments.
+        """
+        with self._lock:
+            candidates = self._pattern_candidates(pattern)
+            offset = 0
+            if within is not None:
+                within = within.rstrip(':')
+                scope = self._index.get(('prefix', within), set())
+                candidates = [key for key in candidates if key in scope]
+                offset = len(within) + 1
+            if _is_glob(pattern):
+                keys = [key for key in candidates if fnmatch.fnmatchcase(key, pattern)]
+            else:
+                keys = [key for key in candidates if pattern in key[offset:]]
+            return self._remove(keys)
+
+    def count_tag(self, tag: str) -> int:
+        """Number of live entries carrying tag"""
+        with self._lock:
+            return len(self._index.get(('tag', tag), ()))
+
+    def cleanup_expired(self) -> int:
+        """Remove expired entries now, returning how many were dropped"""
+        with self._lock:
+            return self._cleanup_expired()
+
+    def get_entry_info(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get detailed information about a cache entry"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            current_time = time.time()
+            return {
+                'key': key,
+                'created_at': datetime.fromtimestamp(entry['created_at']).isoformat(),
+                'last_accessed': datetime.fromtimestamp(entry['last_accessed']).isoformat(),
+                'expires_at': datetime.fromtimestamp(entry['expires_at']).isoformat(),
+                'ttl': entry['ttl'],
+                'tags': sorted(entry['tags']),
+                'is_expired': current_time >= entry['expires_at'],
+                'age_seconds': current_time - entry['created_at'],
+                'time_to_expire': entry['expires_at'] - current_time
+            }
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache performance statistics"""
@@ -141,7 +283,9 @@ class AdvancedCache:
                 **self._stats,
                 'hit_rate': round(hit_rate, 2),
                 'current_size': len(self._cache),
-                'max_size': self._max_size
+                'entries': len(self._cache),
+                'max_size': self._max_size,
+                'index_terms': len(self._index)
             }
     
     def generate_key(self, prefix: str, *args, **kwargs) -> str:
@@ -158,11 +302,295 @@ class AdvancedCache:
         
         return f"{prefix}:{key_hash}"
 
+
+class TieredCache:
+    """L1 AdvancedCache in front of an optional Redis L2.
+
+    Reads fall through L1 -> L2 and promote L2 hits into L1; writes and
+    invalidations go to both tiers. Tags and ':'-delimited key prefixes are
+    mirrored into Redis sets so tag and prefix invalidation also reach entries
+    written by other processes without scanning the keyspace. When L2 is
+    enabled, L1 lifetimes are capped so other processes' invalidations show
+    up locally within that bound.
+    """
+
+    def __init__(self, l1: AdvancedCache, namespace: str = 'pipeline:cache', l1_max_ttl: int = 60):
+        self.l1 = l1
+        self.namespace = namespace
+        self.l1_max_ttl = l1_max_ttl
+        self._redis = None
+        self._l2_stats = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'errors': 0,
+            'skipped': 0
+        }
+
+    def init_app(self, app, redis_client=None):
+        """Attach a Redis L2 when CACHE_L2_ENABLED (defaults to REDIS_ENABLED) is set"""
+        if not app.config.get('CACHE_L2_ENABLED', app.config.get('REDIS_ENABLED', False)):
+            return
+        try:
+            if redis_client is None:
+                # Own binary connection: redis_service decodes responses to str
+                import redis
+                redis_client = redis.Redis(
+                    host=app.config.get('REDIS_HOST', 'localhost'),
+                    port=app.config.get('REDIS_PORT', 6379),
+                    db=app.config.get('REDIS_DB', 0),
+                    password=app.config.get('REDIS_PASSWORD'),
+                    ssl=app.config.get('REDIS_SSL', False),
+                    socket_connect_timeout=5,
+                    socket_timeout=5
+                )
+            redis_client.ping()
+            self._redis = redis_client
+            self.l1_max_ttl = app.config.get('CACHE_L1_MAX_TTL', self.l1_max_ttl)
+            logger.info("Cache L2 (Redis) enabled")
+        except Exception as e:
+            self._redis = None
+            logger.warning(f"Cache L2 (Redis) unavailable, using in-process cache only: {e}")
+
+    @property
+    def l2_enabled(self) -> bool:
+        return self._redis is not None
+
+    def _l2_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _prefix_key(self, prefix: str) -> str:
+        return f"{self.namespace}:prefix:{prefix}"
+
+    def _l2_error(self, operation: str, error: Exception):
+        self._l2_stats['errors'] += 1
+        logger.warning(f"Cache L2 {operation} failed: {error}")
+
+    def _l1_ttl(self, ttl: Optional[int]) -> Optional[int]:
+        if self._redis is None:
+            return ttl
+        return min(ttl or self.l1._default_ttl, self.l1_max_ttl)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get value from L1, falling back to L2"""
+        value = self.l1.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self._redis is None:
+            return default
+
+        try:
+            payload = self._redis.get(self._l2_key(key))
+        except Exception as e:
+            self._l2_error('get', e)
+            return default
+        if payload is None:
+            self._l2_stats['misses'] += 1
+            return default
+
+        try:
+            ttl, tags, value = pickle.loads(payload)
+        except Exception as e:
+            self._l2_error('decode', e)
+            return default
+        self._l2_stats['hits'] += 1
+        self.l1.set(key, value, self._l1_ttl(ttl), tags)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        """Set value in both tiers"""
+        tags = tuple(tags or ())
+        self.l1.set(key, value, self._l1_ttl(ttl), tags)
+        if self._redis is None:
+            return True
+
+        ttl = ttl or self.l1._default_ttl
+        try:
+            payload = pickle.dumps((ttl, tags, value), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Responses and other unpicklable values stay process-local
+            self._l2_stats['skipped'] += 1
+            return True
+
+        try:
+            pipe = self._redis.pipeline()
+            pipe.setex(self._l2_key(key), ttl, payload)
+            members = [self._tag_key(tag) for tag in tags]
+            segments = key.split(':')
+            members.extend(self._prefix_key(':'.join(segments[:position])) for position in range(1, len(segments)))
+            for member_key in members:
+                pipe.sadd(member_key, key)
+                pipe.expire(member_key, max(ttl, 3600))
+            pipe.execute()
+            self._l2_stats['sets'] += 1
+        except Exception as e:
+            self._l2_error('set', e)
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Delete key from both tiers"""
+        deleted = self.l1.delete(key)
+        if self._redis is not None:
+            try:
+                deleted = bool(self._redis.delete(self._l2_key(key))) or deleted
+            except Exception as e:
+                self._l2_error('delete', e)
+        return deleted
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Delete every entry carrying any of the tags, in both tiers"""
+        count = self.l1.invalidate_tags(tags)
+        if self._redis is not None:
+            for tag in tags:
+                self._l2_invalidate_members(self._tag_key(tag), 'tag invalidation')
+        if count:
+            logger.debug(f"Invalidated {count} cache entries tagged {', '.join(tags)}")
+        return count
+
+    def _l2_invalidate_members(self, set_key: str, operation: str, *extra_keys: str):
+        # Delete the keys recorded in a tag or prefix set, and the set itself
+        try:
+            members = self._redis.smembers(set_key)
+            keys = [self._l2_key(m.decode() if isinstance(m, bytes) else m) for m in members]
+            self._redis.delete(set_key, *extra_keys, *keys)
+        except Exception as e:
+            self._l2_error(operation, e)
+
+    def _l2_invalidate_match(self, match: str, operation: str):
+        # SCAN walks the whole Redis keyspace; L2 matching is a superset of L1's
+        try:
+            keys = list(self._redis.scan_iter(match=self._l2_key(match), count=500))
+            if keys:
+                self._redis.delete(*keys)
+        except Exception as e:
+            self._l2_error(operation, e)
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """Delete entries under a ':'-delimited key prefix, in both tiers"""
+        count = self.l1.invalidate_prefix(prefix)
+        if self._redis is not None:
+            prefix = prefix.rstrip(':')
+            self._l2_invalidate_members(self._prefix_key(prefix), 'prefix invalidation', self._l2_key(prefix))
+        return count
+
+    def invalidate_pattern(self, pattern: str, within: Optional[str] = None) -> int:
+        """Delete entries matching pattern (see AdvancedCache.invalidate_pattern), in both tiers.
+
+        Substrings without inner ':'-delimited segments test every L1 key and
+        SCAN Redis, so this is for ad-hoc patterns; writers invalidate by tag
+        or with invalidate_prefix.
+        """
+        count = self.l1.invalidate_pattern(pattern, within)
+        if self._redis is not None:
+            match = pattern if _is_glob(pattern) else f"*{pattern}*"
+            if within is not None:
+                match = f"{within.rstrip(':')}:{match}"
+            self._l2_invalidate_match(match, 'pattern invalidation')
+        return count
+
+    def clear(self) -> bool:
+        """Clear all entries in both tiers"""
+        self.l1.clear()
+        if self._redis is not None:
+            try:
+                keys = list(self._redis.scan_iter(match=f"{self.namespace}:*", count=500))
+                if keys:
+                    self._redis.delete(*keys)
+            except Exception as e:
+                self._l2_error('clear', e)
+                return False
+        return True
+
+    def cleanup_expired(self) -> int:
+        """Remove expired L1 entries (Redis expires L2 entries itself)"""
+        return self.l1.cleanup_expired()
+
+    def get_entry_info(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.l1.get_entry_info(key)
+
+    def count_tag(self, tag: str) -> int:
+        return self.l1.count_tag(tag)
+
+    def generate_key(self, prefix: str, *args, **kwargs) -> str:
+        return self.l1.generate_key(prefix, *args, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics for both tiers in one place"""
+        stats = self.l1.get_stats()
+        stats['l2_enabled'] = self._redis is not None
+        if self._redis is not None:
+            stats['l2'] = dict(self._l2_stats)
+        return stats
+
+
+class CacheNamespace:
+    """Keyed view over the unified cache for one cache service.
+
+    Keys are prefixed with the namespace and every entry is tagged with it,
+    so services share one LRU budget and invalidation path while ``clear``
+    only drops the service's own entries.
+    """
+
+    def __init__(self, backend: TieredCache, name: str):
+        self.backend = backend
+        self.name = name
+        self.tag = f"ns:{name}"
+
+    def key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.backend.get(self.key(key), default)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[Iterable[str]] = None) -> bool:
+        return self.backend.set(self.key(key), value, ttl, (self.tag, *(tags or ())))
+
+    def delete(self, key: str) -> bool:
+        return self.backend.delete(self.key(key))
+
+    def exists(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """Delete this namespace's entries under a ':'-delimited key prefix"""
+        return self.backend.invalidate_prefix(self.key(prefix))
+
+    def invalidate_pattern(self, pattern: str) -> int:
+        """Delete this namespace's entries containing pattern (or matching it, for globs)"""
+        if _is_glob(pattern):
+            return self.backend.invalidate_pattern(self.key(pattern))
+        return self.backend.invalidate_pattern(pattern, within=self.name)
+
+    def clear(self) -> bool:
+        self.backend.invalidate_tags(self.tag)
+        return True
+
+    def get_entry_info(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get_entry_info(self.key(key))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Unified cache statistics plus this namespace's entry count"""
+        stats = self.backend.get_stats()
+        stats['namespace'] = self.name
+        stats['namespace_entries'] = self.backend.count_tag(self.tag)
+        return stats
+
+
 # Global cache instance
-cache = AdvancedCache(max_size=2000, default_ttl=300)
+cache = TieredCache(AdvancedCache(max_size=2000, default_ttl=300))
+
+
+def get_cache() -> TieredCache:
+    """Get the unified cache instance"""
+    return cache
+
+def cached(ttl: int = 300, key_prefix: str = "default", tags: Optional[Iterable[str]] = None):
+    """Decorator for caching function results, optionally tagged for invalidation"""
+    tags = tuple(tags or ())
 
-def cached(ttl: int = 300, key_prefix: str = "default"):
-    """Decorator for caching function results"""
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -176,7 +604,7 @@ def cached(ttl: int = 300, key_prefix: str = "default"):
             
             # Execute function and cache result
             result = func(*args, **kwargs)
-            cache.set(cache_key, result, ttl)
+            cache.set(cache_key, result, ttl, tags)
             
             return result
         
@@ -184,13 +612,22 @@ def cached(ttl: int = 300, key_prefix: str = "default"):
     return decorator
 
 def cache_invalidate(pattern: str):
-    """Invalidate cache entries matching pattern"""
-    with cache._lock:
-        keys_to_delete = [key for key in cache._cache.keys() if pattern in key]
-        for key in keys_to_delete:
-            del cache._cache[key]
+    """Invalidate cache entries containing pattern (or matching it, for globs).
+
+    Ad-hoc patterns only: without inner ':'-delimited segments this tests
+    every key, so writers use invalidate_tags or invalidate_prefix.
+    """
+    count = cache.invalidate_pattern(pattern)
+    logger.info(f"Invalidated {count} cache entries matching pattern: {pattern}")
+    return count
         
-        logger.info(f"Invalidated {len(keys_to_delete)} cache entries matching pattern: {pattern}")
+def invalidate_tags(*tags: str) -> int:
+    """Invalidate cache entries carrying any of the tags"""
+    return cache.invalidate_tags(*tags)
+
+def invalidate_prefix(prefix: str) -> int:
+    """Invalidate cache entries under a ':'-delimited key prefix"""
+    return cache.invalidate_prefix(prefix)
 
 # Performance monitoring decorator
 def monitor_performance(func: Callable) -> Callable:
@@ -214,4 +651,7 @@ def monitor_performance(func: Callable) -> Callable:
     return wrapper
 
 # Export commonly used functions
-__all__ = ['cache', 'cached', 'cache_invalidate', 'monitor_performance', 'AdvancedCache']
+__all__ = [
+    'cache', 'cached', 'cache_invalidate', 'invalidate_tags', 'invalidate_prefix', 'monitor_performance',
+    'get_cache', 'AdvancedCache', 'TieredCache', 'CacheNamespace', 'TRANSACTION_DATA_TAG'
+]
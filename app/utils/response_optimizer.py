@@ -3,18 +3,34 @@ Response Optimization Utilities
 Provides compression, caching headers, and response optimization
 """
 import gzip
+import hashlib
 import json
 import time
-from typing import Any, Dict, Optional
-from flask import Response, request, jsonify
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+from flask import Response, request, jsonify, current_app
+from werkzeug.http import unquote_etag
 from functools import wraps
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def transaction_data_version():
+    """Data version of everything derived from transactions"""
+    from app.services.psp_rollup_service import psp_rollup_service
+    return psp_rollup_service.get_data_version()
+
+
+# Named data versions usable as ETag sources by optimized_response
+DATA_VERSION_SOURCES: Dict[str, Callable[[], Any]] = {
+    'transactions': transaction_data_version,
+}
+
+
 class ResponseOptimizer:
     """Advanced response optimization"""
-    
+
     def __init__(self):
         self.compression_threshold = 1024  # Compress responses > 1KB
         self.cache_headers = {
@@ -23,26 +39,81 @@ class ResponseOptimizer:
             'system': 'public, max-age=60',      # 1 minute
             'static': 'public, max-age=3600',    # 1 hour
         }
-    
+        # Responses with a data-version ETag are revalidated on every request;
+        # a 304 costs one small query instead of the view
+        self.revalidate_header = 'private, no-cache'
+
+    def register_data_version(self, name: str, source: Callable[[], Any]):
+        """Register a callable returning a cheap version of some data"""
+        DATA_VERSION_SOURCES[name] = source
+
+    def compute_etag(self, *parts: Any) -> str:
+        """Weak ETag over the given parts.
+
+        Weak, because the representation may still be re-encoded
+        (Flask-Compress) without changing what it means.
+        """
+        digest = hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+        return f'W/"{digest}"'
+
+    def data_etag(self, source: str) -> Optional[str]:
+        """ETag for the current request derived from a named data version.
+
+        Views resolve ranges such as the last 7 days against the current
+        (UTC) date, so the date is part of the ETag and a new day's request
+        is never answered with the previous day's 304.
+        """
+        version_source = DATA_VERSION_SOURCES.get(source)
+        if version_source is None:
+            logger.warning(f"Unknown ETag data source: {source}")
+            return None
+
+        try:
+            version = version_source()
+        except Exception as e:
+            logger.warning(f"Could not read data version {source}: {e}")
+            return None
+
+        try:
+            from flask_login import current_user
+            user_id = current_user.get_id() if current_user.is_authenticated else None
+        except Exception:
+            user_id = None
+
+        today = datetime.now(timezone.utc).date()
+        return self.compute_etag(source, version, today, request.full_path, user_id)
+
+    def accepts_gzip(self) -> bool:
+        """Whether the client negotiated gzip"""
+        return 'gzip' in request.accept_encodings
+
+    def app_compresses(self, mimetype: str) -> bool:
+        """Whether Flask-Compress will compress this response after the view"""
+        config = current_app.config
+        return bool(config.get('COMPRESS_REGISTER')) and mimetype in config.get('COMPRESS_MIMETYPES', ())
+
     def compress_response(self, data: Any, content_type: str = 'application/json') -> Response:
-        """Compress response data if beneficial"""
+        """Compress response data if beneficial and accepted by the client"""
         # Convert to JSON if needed
         if not isinstance(data, (str, bytes)):
             json_data = json.dumps(data, default=str)
         else:
             json_data = data
-        
-        # Check if compression is beneficial
-        if len(json_data.encode('utf-8')) < self.compression_threshold:
+        body = json_data.encode('utf-8') if isinstance(json_data, str) else json_data
+
+        # Leave encoding to Flask-Compress when it handles this mimetype,
+        # and never gzip for clients that did not ask for it
+        if (len(body) < self.compression_threshold or self.app_compresses(content_type)
+                or not self.accepts_gzip()):
             return Response(
-                json_data,
+                body,
                 mimetype=content_type,
-                headers={'Content-Length': str(len(json_data.encode('utf-8')))}
+                headers={'Vary': 'Accept-Encoding'}
             )
-        
+
         # Compress the data
-        compressed_data = gzip.compress(json_data.encode('utf-8'))
-        
+        compressed_data = gzip.compress(body)
+
         return Response(
             compressed_data,
             mimetype=content_type,
@@ -52,90 +123,110 @@ class ResponseOptimizer:
                 'Vary': 'Accept-Encoding'
             }
         )
-    
-    def add_cache_headers(self, response: Response, cache_type: str = 'default') -> Response:
+
+    def add_cache_headers(self, response: Response, cache_type: str = 'default',
+                          etag: Optional[str] = None, revalidate: bool = False) -> Response:
         """Add appropriate cache headers to response"""
-        cache_header = self.cache_headers.get(cache_type, 'no-cache')
-        
-        # Add cache headers
-        response.headers['Cache-Control'] = cache_header
-        response.headers['ETag'] = f'"{int(time.time())}"'
-        response.headers['Last-Modified'] = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime())
-        
+        if revalidate:
+            response.headers['Cache-Control'] = self.revalidate_header
+        else:
+            response.headers['Cache-Control'] = self.cache_headers.get(cache_type, 'no-cache')
+        if etag:
+            response.headers['ETag'] = etag
+
         return response
-    
-    def optimize_json_response(self, data: Any, cache_type: str = 'default', 
-                             compress: bool = True) -> Response:
+
+    def optimize_json_response(self, data: Any, cache_type: str = 'default',
+                             compress: bool = True, etag: Optional[str] = None) -> Response:
         """Create optimized JSON response with compression and caching"""
         response = self.compress_response(data) if compress else Response(
             json.dumps(data, default=str),
             mimetype='application/json'
         )
-        
-        return self.add_cache_headers(response, cache_type)
-    
-    def handle_conditional_request(self, etag: str = None, last_modified: str = None) -> Optional[Response]:
-        """Handle conditional requests (304 Not Modified)"""
-        if_none_match = request.headers.get('If-None-Match')
-        if_modified_since = request.headers.get('If-Modified-Since')
-        
-        # Check ETag
-        if etag and if_none_match and etag in if_none_match:
+
+        return self.add_cache_headers(response, cache_type, etag)
+
+    def content_etag(self, response: Response) -> Optional[str]:
+        """ETag from the body of a buffered, successful response"""
+        if response.is_streamed or response.status_code != 200:
+            return None
+        return f'W/"{hashlib.sha1(response.get_data()).hexdigest()}"'
+
+    def not_modified(self, etag: str, cache_type: str = 'default', revalidate: bool = False) -> Response:
+        """Empty 304 carrying the validator"""
+        response = Response(status=304)
+        return self.add_cache_headers(response, cache_type, etag, revalidate)
+
+    def handle_conditional_request(self, etag: str = None) -> Optional[Response]:
+        """Handle conditional requests (304 Not Modified) for GET/HEAD"""
+        if not etag or request.method not in ('GET', 'HEAD'):
+            return None
+
+        # Weak comparison, as required for If-None-Match
+        if request.if_none_match.contains_weak(unquote_etag(etag)[0]):
             return Response(status=304)
-        
-        # Check Last-Modified
-        if last_modified and if_modified_since:
-            try:
-                last_modified_time = time.mktime(time.strptime(last_modified, '%a, %d %b %Y %H:%M:%S GMT'))
-                if_modified_time = time.mktime(time.strptime(if_modified_since, '%a, %d %b %Y %H:%M:%S GMT'))
-                
-                if last_modified_time <= if_modified_time:
-                    return Response(status=304)
-            except ValueError:
-                pass  # Invalid date format, continue with normal response
-        
+
         return None
 
 # Global response optimizer instance
 response_optimizer = ResponseOptimizer()
 
-def optimized_response(cache_type: str = 'default', compress: bool = True):
-    """Decorator for optimized API responses"""
+def optimized_response(cache_type: str = 'default', compress: bool = True, etag_source: Optional[str] = None):
+    """Decorator for optimized API responses.
+
+    With ``etag_source`` (a name in DATA_VERSION_SOURCES) the ETag is derived
+    from the data version and If-None-Match is checked before the view runs.
+    Otherwise the ETag is a hash of the produced body. Place it above
+    ``@cached`` so revalidation happens before the cache lookup.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             start_time = time.time()
-            
+
             try:
+                # Revalidate against the data version without running the view
+                etag = response_optimizer.data_etag(etag_source) if etag_source else None
+                if response_optimizer.handle_conditional_request(etag):
+                    return response_optimizer.not_modified(etag, cache_type, revalidate=True)
+
                 # Execute the function
                 result = func(*args, **kwargs)
-                
-                # Handle conditional requests
-                conditional_response = response_optimizer.handle_conditional_request()
-                if conditional_response:
-                    return conditional_response
-                
+
                 # Optimize the response
                 if isinstance(result, tuple) and len(result) == 2:
                     # Handle (data, status_code) tuple
                     data, status_code = result
-                    response = response_optimizer.optimize_json_response(data, cache_type, compress)
+                    if isinstance(data, Response):
+                        response = data
+                    else:
+                        response = response_optimizer.optimize_json_response(data, cache_type, compress)
                     response.status_code = status_code
+                    # Error responses are neither cached nor revalidated
                     return response
-                elif hasattr(result, 'json'):
-                    # Handle Flask Response object
-                    return response_optimizer.add_cache_headers(result, cache_type)
+                elif isinstance(result, Response):
+                    response = result
                 else:
                     # Handle plain data
-                    return response_optimizer.optimize_json_response(result, cache_type, compress)
-                    
+                    response = response_optimizer.optimize_json_response(result, cache_type, compress)
+
+                if response.status_code != 200:
+                    return response
+
+                if etag is None:
+                    etag = response_optimizer.content_etag(response)
+                    if response_optimizer.handle_conditional_request(etag):
+                        return response_optimizer.not_modified(etag, cache_type)
+
+                return response_optimizer.add_cache_headers(response, cache_type, etag, revalidate=bool(etag_source))
+
             except Exception as e:
                 execution_time = time.time() - start_time
                 logger.error(f"Error in optimized response for {func.__name__}: {e} (took {execution_time:.2f}s)")
                 return jsonify({'error': str(e)}), 500
-                
+
         return wrapper
     return decorator
 
 # Export commonly used functions
-__all__ = ['ResponseOptimizer', 'response_optimizer', 'optimized_response']
+__all__ = ['ResponseOptimizer', 'response_optimizer', 'optimized_response', 'DATA_VERSION_SOURCES']
@@ -91,6 +91,15 @@ class Config:
     DB_PERFORMANCE_MONITORING = True
     DB_SLOW_QUERY_THRESHOLD = 0.5  # 500ms threshold for slow queries
     DB_CONNECTION_POOL_MONITORING = True
+    DB_REQUEST_PROFILING = True  # Per-request query counts and Server-Timing header
+    DB_N_PLUS_ONE_THRESHOLD = 5  # Same statement this often in one request = suspected N+1
+    
+    # Authenticated principal cache (user, settings, permissions)
+    PRINCIPAL_CACHE_TTL = 60  # Seconds before a cached principal is re-read
+    
+    # Audit log writer (records are queued and inserted in batches)
+    AUDIT_FLUSH_SIZE = 200  # Flush once this many records are queued
+    AUDIT_FLUSH_INTERVAL = 2.0  # Seconds between background flushes
     DB_QUERY_CACHE_ENABLED = True
     DB_QUERY_CACHE_TTL = 600  # 10 minutes cache TTL
     